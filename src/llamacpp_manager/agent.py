@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import secrets
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .utils import app_support_dir, ensure_dir
+
+
+DEFAULT_PORT = 7391
+TOKEN_ENV = "LLAMACPP_MANAGER_AGENT_TOKEN"
+ACTIONS = ("start", "stop", "restart")
+# request bodies are a single {"target": ...} object
+MAX_BODY = 64 * 1024
+
+# HTTP API served by `llamacpp-manager agent` (all but /health need
+# "Authorization: Bearer <token>"):
+#   GET  /health                 {"status": "ok"}
+#   GET  /v1/status              {"host", "models": [status --json rows]}
+#   POST /v1/{start|stop|restart}  {"target": NAME|"all"} -> {"rc", "output", "errors"}
+
+
+def token_path() -> Path:
+    return app_support_dir() / "agent.token"
+
+
+def load_token(create: bool = False) -> Optional[str]:
+    """The agent's shared secret: $LLAMACPP_MANAGER_AGENT_TOKEN, else ``agent.token`` in the config dir.
+
+    With ``create`` a random token is written (mode 0600) when there is none yet.
+    """
+    env = os.environ.get(TOKEN_ENV)
+    if env:
+        return env.strip()
+    p = token_path()
+    try:
+        return p.read_text().strip() or None
+    except OSError:
+        if not create:
+            return None
+    ensure_dir(p.parent)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(str(p), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    return token
+
+
+class AgentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "llamacpp-manager-agent"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, {"error": {"code": status, "message": message}}, headers)
+
+    def _authorized(self, headers: Optional[Dict[str, str]] = None) -> bool:
+        auth = self.headers.get("Authorization") or ""
+        given = auth[7:].strip() if auth[:7].lower() == "bearer " else ""
+        if given and hmac.compare_digest(given.encode("utf-8"), self.server.token.encode("utf-8")):  # type: ignore[attr-defined]
+            return True
+        self._error(401, "missing or wrong agent token", {"WWW-Authenticate": "Bearer", **(headers or {})})
+        return False
+
+    def _body(self) -> Optional[Dict[str, Any]]:
+        # a body that is not read leaves the connection unusable, so those errors close it
+        raw = (self.headers.get("Content-Length") or "").strip()
+        if not raw.isdigit():
+            self._error(400, "a valid Content-Length is required", {"Connection": "close"})
+            return None
+        n = int(raw)
+        if n > MAX_BODY:
+            self._error(413, f"request body over {MAX_BODY} bytes", {"Connection": "close"})
+            return None
+        try:
+            doc = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            doc = None
+        if not isinstance(doc, dict):
+            self._error(400, "expected a JSON object")
+            return None
+        return doc
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/health":
+            self._send(200, {"status": "ok"})
+            return
+        if not self._authorized():
+            return
+        if path == "/v1/status":
+            self._send(200, {"host": socket.gethostname(), "models": self.server.status()})  # type: ignore[attr-defined]
+            return
+        self._error(404, "not found")
+
+    def do_POST(self) -> None:
+        # nothing is read from an unauthenticated client; its body is left unread and the connection closed
+        if not self._authorized({"Connection": "close"}):
+            return
+        body = self._body()
+        if body is None:
+            return
+        action = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+        if not self.path.startswith("/v1/") or action not in ACTIONS:
+            self._error(404, "not found")
+            return
+        target = body.get("target")
+        if not isinstance(target, str) or not target:
+            self._error(400, "'target' must be a model name or 'all'")
+            return
+        self._send(200, self.server.act(action, target))  # type: ignore[attr-defined]
+
+
+class AgentServer(ThreadingHTTPServer):
+    """Serves one host's status and start/stop/restart to a controller.
+
+    ``status`` returns the same rows as ``status --json``; ``act(action,
+    target)`` runs one CLI action and returns ``{rc, output, errors}``.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: Tuple[str, int], token: str,
+        status: Callable[[], List[Dict[str, Any]]], act: Callable[[str, str], Dict[str, Any]],
+    ):
+        self.token = token
+        self.status = status
+        self.act = act
+        super().__init__(address, AgentHandler)
+
+
+def serve(address: Tuple[str, int], token: str, status: Callable[[], List[Dict[str, Any]]], act: Callable[[str, str], Dict[str, Any]]) -> AgentServer:
+    """Start an agent in a background thread; returns the server."""
+    srv = AgentServer(address, token, status, act)
+    threading.Thread(target=srv.serve_forever, name=f"agent-{srv.server_address[1]}", daemon=True).start()
+    return srv
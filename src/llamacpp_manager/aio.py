@@ -0,0 +1,263 @@
+"""asyncio API for driving the manager from a service.
+
+Every coroutine takes one model name, a list of names, or None for all
+configured models, and works on the caller's event loop: probes and waits
+for many models run concurrently without threads or subprocesses. Config,
+launch arguments and runtime state are shared with the CLI, so both see
+the same state::
+
+    from llamacpp_manager import aio
+
+    await aio.start(["qwen", "smollm3"])
+    ready = await aio.wait_ready(["qwen", "smollm3"], timeout=300)
+    for s in await aio.status():
+        print(s["name"], s["state"])
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .config import DEFAULT_READY_TIMEOUT_S, load_config, stop_timeout
+from .health import health_state
+from .memory import admission
+from .process import _has_exited, _open_pidfd, launch_spec, live_port, record_launch, spawn_process
+from .utils import port_in_use, process_alive, read_pid, read_runtime, remove_pid
+
+
+Names = Union[str, Iterable[str], None]
+
+_LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def _select(cfg: Dict[str, Any], names: Names) -> List[Dict[str, Any]]:
+    models = cfg.get("models", [])
+    if names is None or names == "all":
+        return list(models)
+    wanted = [names] if isinstance(names, str) else list(names)
+    by_name = {m.get("name"): m for m in models}
+    missing = [n for n in wanted if n not in by_name]
+    if missing:
+        raise KeyError(f"model(s) not found: {', '.join(missing)}")
+    return [by_name[n] for n in wanted]
+
+
+def _pid_alive(name: str, runtime: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[Optional[int], Optional[bool]]:
+    try:
+        pid = read_pid(name, runtime)
+    except Exception:
+        return None, None
+    return pid, process_alive(pid)
+
+
+async def _http_get(host: str, port: int, path: str, timeout: float) -> Optional[Tuple[int, bytes]]:
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        status = int(head.split(b" ", 2)[1])
+        body = await asyncio.wait_for(reader.read(1 << 16), timeout)
+        return status, body
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def probe(host: str, port: int, timeout: float = 2.0) -> Dict[str, Any]:
+    """Async counterpart of ``health.check_endpoint``: ``{up, latency_ms, http_status, health}``."""
+    start = time.perf_counter()
+    try:
+        _, w = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        w.close()
+        up = True
+    except (OSError, asyncio.TimeoutError):
+        up = False
+    latency_ms = int((time.perf_counter() - start) * 1000)
+    http_status = health = None
+    if up:
+        r = await _http_get(host, port, "/health", timeout)
+        if r is None:
+            health = "error"
+        elif r[0] != 404:
+            http_status = r[0]
+            health = {200: "ok", 503: "loading"}.get(r[0], "error")
+        else:
+            r = await _http_get(host, port, "/v1/models", timeout)
+            http_status = r[0] if r else None
+    return {"up": up, "latency_ms": latency_ms, "http_status": http_status, "health": health}
+
+
+async def _status_one(cfg: Dict[str, Any], m: Dict[str, Any], runtime: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    name = m["name"]
+    host = m.get("host", "127.0.0.1")
+    port = live_port(m, runtime)
+    pid, alive = _pid_alive(name, runtime)
+    p = await probe(host, port, timeout=max(0.1, int(cfg.get("timeout_ms", 2000)) / 1000.0))
+    rec = runtime.get(name) or {}
+    slow = cfg.get("degraded_latency_ms")
+    state = health_state(
+        p,
+        alive,
+        started_at=rec.get("started_at") if alive else None,
+        warmup=rec.get("warmup") if alive else None,
+        ready_timeout=float(cfg.get("ready_timeout_s", DEFAULT_READY_TIMEOUT_S)),
+        slow_ms=int(slow) if slow else None,
+    )
+    return {
+        "name": name,
+        "pid": pid,
+        "host": host,
+        "port": port,
+        "public_port": m.get("public_port"),
+        "mode": "direct" if alive else "stopped",
+        "state": state,
+        **p,
+    }
+
+
+async def status(names: Names = None, *, cfg: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Probe the selected models concurrently; entries match ``status --json`` fields."""
+    cfg = load_config() if cfg is None else cfg
+    runtime = read_runtime()
+    return list(await asyncio.gather(*(_status_one(cfg, m, runtime) for m in _select(cfg, names))))
+
+
+async def start(
+    names: Names = None,
+    *,
+    cfg: Optional[Dict[str, Any]] = None,
+    ignore_memory: bool = False,
+    allow_remote: bool = False,
+) -> List[Dict[str, Any]]:
+    """Launch the selected models (skipping running ones) and return ``{name, started, pid, port, error}`` each.
+
+    Launches are admitted one at a time, since each one changes the memory
+    committed for the next; use ``wait_ready`` to wait for loading.
+    """
+    cfg = load_config() if cfg is None else cfg
+    llama_path = cfg.get("llama_server_path")
+    log_dir = Path(cfg.get("log_dir")).expanduser()
+    results = []
+    for m in _select(cfg, names):
+        spec = launch_spec(cfg, m)
+        res: Dict[str, Any] = {"name": spec.name, "started": False, "pid": None, "port": spec.port, "error": None}
+        results.append(res)
+        pid, alive = _pid_alive(spec.name)
+        if alive:
+            res.update(pid=pid, error="already running")
+        elif spec.host not in _LOCAL_HOSTS and not allow_remote:
+            res["error"] = f"refusing to bind non-local host '{spec.host}'"
+        elif port_in_use(spec.host, spec.port):
+            res["error"] = f"port {spec.port} on {spec.host} is already in use"
+        elif not ignore_memory and not (a := admission(cfg, spec))["ok"]:
+            res["error"] = f"not enough memory ({' and '.join(a['reasons'])} exceeded)"
+        else:
+            # fork/exec returns immediately; spawn_process keeps the Popen, so an exit is reaped and seen by wait_ready
+            proc = spawn_process(llama_path, spec, log_dir)
+            record_launch(llama_path, spec, proc.pid, log_dir=log_dir)
+            res.update(started=True, pid=proc.pid)
+        await asyncio.sleep(0)
+    return results
+
+
+async def _ready(host: str, port: int, deadline: float, interval: float, pid: Optional[int] = None) -> bool:
+    loop = asyncio.get_running_loop()
+    while True:
+        if pid is not None and not process_alive(pid):
+            return False
+        p = await probe(host, port, timeout=min(2.0, max(0.1, deadline - loop.time())))
+        if p["health"] == "ok" or (p["up"] and p["health"] is None and p["http_status"] == 200):
+            return True
+        if loop.time() + interval > deadline:
+            return False
+        await asyncio.sleep(interval)
+
+
+async def wait_ready(
+    names: Names = None,
+    *,
+    timeout: float = DEFAULT_READY_TIMEOUT_S,
+    interval: float = 0.5,
+    cfg: Optional[Dict[str, Any]] = None,
+) -> Dict[str, bool]:
+    """Wait until each model's ``/health`` answers 200; returns ``{name: ready}`` after at most ``timeout``.
+
+    A model whose process exits while loading is reported as not ready straight away.
+    """
+    cfg = load_config() if cfg is None else cfg
+    runtime = read_runtime()
+    models = _select(cfg, names)
+    deadline = asyncio.get_running_loop().time() + timeout
+    done = await asyncio.gather(*(
+        _ready(m.get("host", "127.0.0.1"), live_port(m, runtime), deadline, interval, _pid_alive(m["name"], runtime)[0])
+        for m in models
+    ))
+    return {m["name"]: ok for m, ok in zip(models, done)}
+
+
+async def _wait_exit(pid: int, timeout: float) -> bool:
+    loop = asyncio.get_running_loop()
+    try:
+        fd = _open_pidfd(pid)
+    except ProcessLookupError:
+        return True
+    if fd is None:
+        deadline = loop.time() + timeout
+        while not _has_exited(pid, None):
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+    exited = loop.create_future()
+    loop.add_reader(fd, lambda: exited.done() or exited.set_result(True))
+    try:
+        await asyncio.wait_for(exited, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return _has_exited(pid, fd)
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+
+
+async def _stop_one(name: str, pid: int, grace: float) -> Dict[str, Any]:
+    started = time.monotonic()
+    killed = False
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    else:
+        if not await _wait_exit(pid, max(0.1, grace)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                killed = True
+            except ProcessLookupError:
+                pass
+    return {"name": name, "pid": pid, "duration_s": round(time.monotonic() - started, 3), "killed": killed}
+
+
+async def stop(names: Names = None, *, cfg: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """SIGTERM the selected running models together, SIGKILL after each one's ``stop_timeout``.
+
+    Returns ``{name, pid, duration_s, killed}`` for each model that had a recorded PID.
+    """
+    cfg = load_config() if cfg is None else cfg
+    jobs = []
+    for m in _select(cfg, names):
+        try:
+            pid = read_pid(m["name"])
+        except Exception:
+            continue
+        # as in the CLI: drop the PID record first so a supervisor sees an intentional stop
+        remove_pid(m["name"])
+        jobs.append(_stop_one(m["name"], pid, stop_timeout(cfg, m)))
+    return list(await asyncio.gather(*jobs))
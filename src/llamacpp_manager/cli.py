@@ -1,25 +1,40 @@
 import argparse
 import os
+import queue
+from dataclasses import replace
 import shlex
 import sys
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
 from . import __version__
 from .config import (
     DEFAULT_LLAMA_SERVER_PATH,
+    DEFAULT_READY_TIMEOUT_S,
     ModelSpec,
     add_model,
     load_config,
+    plan_manifest,
     remove_model,
     save_config,
+    stop_timeout,
     update_model,
 )
-from .utils import app_support_dir, logs_dir, config_path, ensure_dir, to_json, migrate_directory, write_pid, read_pid, remove_pid, process_alive, port_in_use
-from .process import start_process, stop_process, build_argv
-from .health import check_endpoint
+from .utils import app_support_dir, child_exit, logs_dir, config_lock, config_path, ensure_dir, read_yaml, to_json, migrate_directory, read_pid, remove_pid, process_alive, port_in_use, pid_dir, pid_names, read_runtime, update_runtime, instance_lock, pid_fields, write_pid
+from .process import start_process, stop_processes, argv_hash, build_argv, launch_spec, live_port, record_launch, spec_hash
+from .health import check_endpoint, health_state, wait_idle, wait_ready
+from .proxy import Router, serve
+from .warmup import run_warmup
 from .launchd import render_plist, plist_path, write_plist, launchctl_bootstrap, launchctl_kickstart, launchctl_bootout
-from .discovery import find_llama_processes
+from .discovery import ModelIndex, find_llama_processes, reconcile, server_args
+from .watch import FileWatcher, ProbeScheduler, RuntimeChanges, TableRenderer
+from .supervisor import Supervisor
+from .topology import format_cpulist, placement_for_config
+from . import agent, fanout, fleet, history, integrity, logsearch, qos, trace, tune
+from .draft import acceptance as draft_acceptance, parse_draft
+from . import slots
+from .memory import admission, admit, committed_memory, estimate_model_memory, fmt_bytes, process_rss
 
 
 def parse_env(items: List[str]) -> Dict[str, str]:
@@ -45,18 +60,47 @@ def cmd_init(args: argparse.Namespace) -> int:
     # Ensure directories and default config
     ensure_dir(app_support_dir())
     ensure_dir(logs_dir())
-    cfg = load_config()
-    # Backfill default paths if missing
-    cfg.setdefault("llama_server_path", DEFAULT_LLAMA_SERVER_PATH)
-    cfg.setdefault("log_dir", str(logs_dir()))
-    save_config(cfg)
+    with config_lock():
+        cfg = load_config()
+        # Backfill default paths if missing
+        cfg.setdefault("llama_server_path", DEFAULT_LLAMA_SERVER_PATH)
+        cfg.setdefault("log_dir", str(logs_dir()))
+        save_config(cfg)
     print(f"Initialized config at {config_path()}")
     print(f"Logs directory at {logs_dir()}")
     return 0
 
 
+def _warmup_from_args(args: argparse.Namespace, current: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    w = dict(current or {})
+    if args.warmup_prompt is not None:
+        w["prompts"] = list(args.warmup_prompt)
+    if args.warmup_tokens is not None:
+        w["tokens"] = int(args.warmup_tokens)
+    # an empty prompt list switches warm-up off
+    return w if w.get("prompts") else None
+
+
+def _draft_from_args(args: argparse.Namespace, current: Any = None) -> Optional[Dict[str, Any]]:
+    d = {"path": current} if isinstance(current, str) else dict(current or {})
+    if args.draft_model:
+        d["path"] = args.draft_model
+    if args.draft_max is not None:
+        d["max"] = int(args.draft_max)
+    if args.draft_min is not None:
+        d["min"] = int(args.draft_min)
+    return d if d.get("path") else None
+
+
 def cmd_config(args: argparse.Namespace) -> int:
-    cfg = load_config()
+    if args.subcommand in ("add", "update", "remove", "apply"):
+        # read-modify-write under config.lock so concurrent writers cannot lose each other's edits
+        with config_lock():
+            return _config_command(args, load_config())
+    return _config_command(args, load_config())
+
+
+def _config_command(args: argparse.Namespace, cfg: Dict[str, Any]) -> int:
     sub = args.subcommand
     if sub == "list":
         if args.json:
@@ -84,6 +128,15 @@ def cmd_config(args: argparse.Namespace) -> int:
             args=parse_args_list(args.extra_args),
             env=parse_env(args.env or []),
             autostart=args.autostart,
+            stop_timeout=args.stop_timeout,
+            cpu_weight=args.cpu_weight,
+            nice=args.nice,
+            ionice=args.ionice,
+            public_port=args.public_port,
+            warmup=_warmup_from_args(args),
+            draft_model=_draft_from_args(args),
+            slot_cache=True if args.slot_cache else None,
+            digest=args.digest or None,
         )
         try:
             add_model(cfg, spec)
@@ -114,8 +167,35 @@ def cmd_config(args: argparse.Namespace) -> int:
             updates["env"] = parse_env(args.env)
         if args.autostart is not None:
             updates["autostart"] = bool(args.autostart)
+        if args.stop_timeout is not None:
+            updates["stop_timeout"] = float(args.stop_timeout)
+        if args.cpu_weight is not None:
+            updates["cpu_weight"] = float(args.cpu_weight)
+        if args.nice is not None:
+            updates["nice"] = int(args.nice)
+        if args.ionice is not None:
+            updates["ionice"] = args.ionice
+        if args.public_port is not None:
+            updates["public_port"] = int(args.public_port)
+        if args.warmup_prompt is not None or args.warmup_tokens is not None:
+            cur = ([m for m in cfg.get("models", []) if m.get("name") == args.name] or [{}])[0].get("warmup") or {}
+            updates["warmup"] = _warmup_from_args(args, cur)
+        if args.draft_model or args.draft_max is not None or args.draft_min is not None:
+            cur = ([m for m in cfg.get("models", []) if m.get("name") == args.name] or [{}])[0].get("draft_model")
+            updates["draft_model"] = _draft_from_args(args, cur)
+        if args.slot_cache is not None:
+            updates["slot_cache"] = True if args.slot_cache else None
+        if args.digest:
+            updates["digest"] = args.digest
         try:
             update_model(cfg, args.name, updates)
+            if args.slot_cache is False:
+                [m for m in cfg["models"] if m.get("name") == args.name][0].pop("slot_cache", None)
+            if args.draft_model == "":
+                # an empty path removes the draft model
+                [m for m in cfg["models"] if m.get("name") == args.name][0].pop("draft_model", None)
+            if args.digest == "":
+                [m for m in cfg["models"] if m.get("name") == args.name][0].pop("digest", None)
             save_config(cfg)
         except Exception as e:
             print(f"error: {e}", file=sys.stderr)
@@ -139,6 +219,39 @@ def cmd_config(args: argparse.Namespace) -> int:
         print(f"Removed model '{args.name}'")
         return 0
 
+    if sub == "apply":
+        path = Path(args.manifest).expanduser()
+        try:
+            if not path.is_file():
+                raise FileNotFoundError(f"{path} not found")
+            manifest = read_yaml(path)
+        except Exception as e:
+            print(f"error: cannot read manifest: {e}", file=sys.stderr)
+            return 2
+        plan = plan_manifest(cfg, manifest, prune=args.prune)
+        if args.json:
+            print(to_json({k: v for k, v in plan.items() if k != "config"}))
+        if plan["errors"]:
+            for err in plan["errors"]:
+                print(f"error: {err}", file=sys.stderr)
+            return 2
+        if not args.json:
+            for name in plan["add"]:
+                print(f"add {name}")
+            for name, fields in plan["update"].items():
+                print(f"update {name} ({', '.join(fields)})")
+            for name in plan["remove"]:
+                print(f"remove {name}")
+            for key in plan["settings"]:
+                print(f"set {key}")
+        changed = bool(plan["add"] or plan["update"] or plan["remove"] or plan["settings"])
+        if changed and not args.dry_run:
+            save_config(plan["config"])
+        if not args.json:
+            verb = "would change" if args.dry_run else "changed"
+            print(f"{len(plan['unchanged'])} unchanged" + (f", {verb} config" if changed else ", nothing to do"))
+        return 0
+
     if sub == "migrate":
         # Determine current directories from environment (already applied in main)
         cur_cfg_dir = app_support_dir()
@@ -194,6 +307,18 @@ def build_parser() -> argparse.ArgumentParser:
     sp_cfg_add.add_argument("--extra-args", help="Additional llama-server args as a single string")
     sp_cfg_add.add_argument("--env", nargs="*", help="Environment variables KEY=VALUE ...")
     sp_cfg_add.add_argument("--autostart", action="store_true", help="Mark model for autostart (used by launchd mode)")
+    sp_cfg_add.add_argument("--stop-timeout", type=float, help="Seconds to wait after SIGTERM before SIGKILL (default: stop_timeout_s)")
+    sp_cfg_add.add_argument("--cpu-weight", type=float, help="Share of CPU cores when cpu_placement is enabled (0 opts out)")
+    sp_cfg_add.add_argument("--nice", type=int, help="Scheduling priority (-20..19) applied at launch")
+    sp_cfg_add.add_argument("--ionice", help="I/O priority: idle | best-effort[:0-7] | realtime[:0-7] (Linux)")
+    sp_cfg_add.add_argument("--public-port", type=int, help="Port served by 'llamacpp-manager proxy' in front of this model")
+    sp_cfg_add.add_argument("--warmup-prompt", action="append", help="Prompt sent after each start before the model counts as ready (repeatable)")
+    sp_cfg_add.add_argument("--warmup-tokens", type=int, help="Tokens to generate per warm-up prompt (default 16)")
+    sp_cfg_add.add_argument("--draft-model", help="GGUF draft model for speculative decoding (must share the tokenizer)")
+    sp_cfg_add.add_argument("--draft-max", type=int, help="Max tokens drafted per step (--draft-max)")
+    sp_cfg_add.add_argument("--draft-min", type=int, help="Min tokens drafted per step (--draft-min)")
+    sp_cfg_add.add_argument("--slot-cache", action="store_true", help="Save slot KV caches on stop/restart and restore them after start")
+    sp_cfg_add.add_argument("--digest", help="Pinned model file digest checked by 'verify' (sha256:<hex> or blake2b:<hex>)")
     sp_cfg_add.set_defaults(func=cmd_config)
 
     sp_cfg_upd = cfg_sub.add_parser("update", help="Update an existing model entry")
@@ -205,12 +330,32 @@ def build_parser() -> argparse.ArgumentParser:
     sp_cfg_upd.add_argument("--env", nargs="*", help="Replace env vars: KEY=VALUE ... (omit to keep, pass empty to clear)")
     sp_cfg_upd.add_argument("--autostart", dest="autostart", action="store_true")
     sp_cfg_upd.add_argument("--no-autostart", dest="autostart", action="store_false")
+    sp_cfg_upd.add_argument("--stop-timeout", type=float, help="Seconds to wait after SIGTERM before SIGKILL")
+    sp_cfg_upd.add_argument("--cpu-weight", type=float, help="Share of CPU cores when cpu_placement is enabled (0 opts out)")
+    sp_cfg_upd.add_argument("--nice", type=int, help="Scheduling priority (-20..19) applied at launch")
+    sp_cfg_upd.add_argument("--ionice", help="I/O priority: idle | best-effort[:0-7] | realtime[:0-7] (Linux)")
+    sp_cfg_upd.add_argument("--public-port", type=int, help="Port served by 'llamacpp-manager proxy' in front of this model")
+    sp_cfg_upd.add_argument("--warmup-prompt", action="append", help="Prompt sent after each start before the model counts as ready (repeatable)")
+    sp_cfg_upd.add_argument("--warmup-tokens", type=int, help="Tokens to generate per warm-up prompt (default 16)")
+    sp_cfg_upd.add_argument("--draft-model", help="GGUF draft model for speculative decoding ('' removes it)")
+    sp_cfg_upd.add_argument("--draft-max", type=int, help="Max tokens drafted per step (--draft-max)")
+    sp_cfg_upd.add_argument("--draft-min", type=int, help="Min tokens drafted per step (--draft-min)")
+    sp_cfg_upd.add_argument("--slot-cache", dest="slot_cache", action="store_true", default=None, help="Save slot KV caches on stop/restart and restore them after start")
+    sp_cfg_upd.add_argument("--no-slot-cache", dest="slot_cache", action="store_false")
+    sp_cfg_upd.add_argument("--digest", help="Pinned model file digest (sha256:<hex> or blake2b:<hex>; '' removes it)")
     sp_cfg_upd.set_defaults(func=cmd_config)
 
     sp_cfg_rm = cfg_sub.add_parser("remove", help="Remove a model entry")
     sp_cfg_rm.add_argument("name")
     sp_cfg_rm.set_defaults(func=cmd_config)
 
+    sp_cfg_apply = cfg_sub.add_parser("apply", help="Make the model list match a manifest (config.yaml's shape)")
+    sp_cfg_apply.add_argument("manifest", help="YAML file with a 'models' list and optional top-level settings")
+    sp_cfg_apply.add_argument("--prune", action="store_true", help="Remove models that are not in the manifest")
+    sp_cfg_apply.add_argument("--dry-run", action="store_true", help="Show the changes without writing them")
+    sp_cfg_apply.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    sp_cfg_apply.set_defaults(func=cmd_config)
+
     sp_cfg_mig = cfg_sub.add_parser("migrate", help="Migrate config and/or logs to new locations")
     sp_cfg_mig.add_argument("--to-config-dir", help="Destination directory for config (Application Support)")
     sp_cfg_mig.add_argument("--to-log-dir", help="Destination directory for logs")
@@ -224,8 +369,21 @@ def build_parser() -> argparse.ArgumentParser:
     sp_start.add_argument("--dry-run", action="store_true", help="Print the command without executing")
     sp_start.add_argument("--launchd", action="store_true", help="Use launchd to start instead of direct process")
     sp_start.add_argument("--allow-remote", action="store_true", help="Allow non-local host binds (0.0.0.0 or external IP)")
+    sp_start.add_argument("--ignore-memory", action="store_true", help="Start even if the memory budget would be exceeded")
+    sp_start.add_argument("--wait-memory", type=float, default=0.0, metavar="S", help="Wait up to S seconds for memory to become available")
+    sp_start.add_argument("--no-warmup", action="store_true", help="Skip the configured warm-up prompts")
+    sp_start.add_argument("--verify", action="store_true", help="Check model files against their pinned digests first (always on with verify_on_start)")
     sp_start.set_defaults(func=cmd_start)
 
+    # verify
+    sp_verify = sub.add_parser("verify", help="Hash model files and check them against their pinned digests")
+    sp_verify.add_argument("target", help="Model name or 'all'")
+    sp_verify.add_argument("--json", action="store_true")
+    sp_verify.add_argument("--refresh", action="store_true", help="Rehash even when the cached digest is still valid")
+    sp_verify.add_argument("--jobs", type=int, default=None, help="Files hashed in parallel (default: CPU count, at most 8)")
+    sp_verify.add_argument("--pin", action="store_true", help="Write the digest into config entries that have none")
+    sp_verify.set_defaults(func=cmd_verify)
+
     sp_stop = sub.add_parser("stop", help="Stop a model or all models")
     sp_stop.add_argument("target", help="Model name or 'all'")
     sp_stop.add_argument("--launchd", action="store_true", help="Stop launchd agent instead of PID stop")
@@ -236,15 +394,122 @@ def build_parser() -> argparse.ArgumentParser:
     sp_restart.add_argument("--dry-run", action="store_true")
     sp_restart.add_argument("--launchd", action="store_true")
     sp_restart.add_argument("--allow-remote", action="store_true")
+    sp_restart.add_argument("--ignore-memory", action="store_true")
+    sp_restart.add_argument("--verify", action="store_true", help="Check model files against their pinned digests before stopping anything")
+    sp_restart.add_argument("--rolling", action="store_true", help="Zero-downtime: start the new instance on a spare port and switch the proxy to it once ready")
+    sp_restart.add_argument("--ready-timeout", type=float, default=600.0, help="With --rolling: seconds to wait for the new instance to load (default 600)")
+    sp_restart.add_argument("--drain", type=float, default=30.0, help="With --rolling: max seconds to let in-flight requests finish on the old instance (default 30)")
+    sp_restart.add_argument("--no-warmup", action="store_true", help="Skip the configured warm-up prompts")
     sp_restart.set_defaults(func=cmd_restart)
 
+    sp_proxy = sub.add_parser("proxy", help="Serve each model's public_port and forward to its live instance(s)")
+    sp_proxy.add_argument("--host", default="127.0.0.1")
+    sp_proxy.add_argument("--allow-remote", action="store_true")
+    sp_proxy.add_argument("--upstream-timeout", type=float, default=600.0, help="Seconds to wait on a backend response (default 600)")
+    sp_proxy.add_argument("--trace-sample", type=float, help="Fraction of requests to trace (default: trace.sample in config, else 0.1)")
+    sp_proxy.add_argument("--no-trace", action="store_true", help="Do not write request traces")
+    sp_proxy.set_defaults(func=cmd_proxy)
+
+    sp_reload = sub.add_parser("reload", help="Apply config changes: restart changed models, stop removed ones, start new autostart ones")
+    sp_reload.add_argument("--dry-run", action="store_true", help="Show the plan without acting on it")
+    sp_reload.add_argument("--watch", action="store_true", help="Keep running and reload whenever config.yaml changes")
+    sp_reload.add_argument("--allow-remote", action="store_true")
+    sp_reload.add_argument("--no-warmup", action="store_true", help="Skip the configured warm-up prompts")
+    sp_reload.set_defaults(func=cmd_reload)
+
+    sp_hist = sub.add_parser("history", help="Uptime and latency history recorded by status")
+    sp_hist.add_argument("name", help="Model name")
+    sp_hist.add_argument("--since", default="24h", help="Start: 30m, 12h, 7d, ISO date/time or epoch (default 24h)")
+    sp_hist.add_argument("--until", help="End (default now)")
+    sp_hist.add_argument("--resolution", choices=["auto", "raw", "minute", "hour", "day"], default="auto")
+    sp_hist.add_argument("--json", action="store_true")
+    sp_hist.set_defaults(func=cmd_history)
+
+    sp_logs = sub.add_parser("logs", help="Work with model logs")
+    logs_sub = sp_logs.add_subparsers(dest="subcommand", required=True)
+    sp_logs_search = logs_sub.add_parser("search", help="Search current, rotated and compressed logs")
+    sp_logs_search.add_argument("pattern", help="Regular expression")
+    sp_logs_search.add_argument("--since", help="Start: 30m, 12h, 7d, ISO date/time or epoch")
+    sp_logs_search.add_argument("--until", help="End (default: no bound)")
+    sp_logs_search.add_argument("--model", action="append", help="Model to search (repeatable; default all)")
+    sp_logs_search.add_argument("-i", "--ignore-case", action="store_true")
+    sp_logs_search.add_argument("--limit", type=int, default=1000, help="Stop after this many matches, earliest first (0 = no limit; default 1000)")
+    sp_logs_search.add_argument("--workers", type=int, help="Parallel file scans (default: CPU count)")
+    sp_logs_search.add_argument("--json", action="store_true")
+    sp_logs_search.set_defaults(func=cmd_logs_search)
+
+    sp_trace = sub.add_parser("trace", help="Work with the proxy's request traces")
+    trace_sub = sp_trace.add_subparsers(dest="subcommand", required=True)
+    sp_trace_sum = trace_sub.add_parser("summarize", help="Latency by phase and model from the sampled traces")
+    sp_trace_sum.add_argument("--since", help="Start: 30m, 12h, 7d, ISO date/time or epoch")
+    sp_trace_sum.add_argument("--until", help="End (default: no bound)")
+    sp_trace_sum.add_argument("--model", action="append", help="Model to include (repeatable; default all)")
+    sp_trace_sum.add_argument("--json", action="store_true")
+    sp_trace_sum.set_defaults(func=cmd_trace_summarize)
+
+    sp_tune = sub.add_parser("tune", help="Sweep launch parameters on a scratch port and report (or apply) the fastest")
+    sp_tune.add_argument("name", help="Model name")
+    sp_tune.add_argument("--objective", choices=list(tune.OBJECTIVES), default="tokens_per_s", help="Maximise throughput or minimise p95 request latency (default tokens_per_s)")
+    sp_tune.add_argument("--budget", default="20m", help="Wall-clock budget: 90s, 20m, 1h (default 20m)")
+    sp_tune.add_argument("--space", action="append", metavar="NAME=V1,V2", help="Candidate values for parallel, threads, batch, ubatch, flash_attn or ctx (repeatable; empty drops the parameter)")
+    sp_tune.add_argument("--requests", type=int, default=16, help="Workload requests per candidate (default 16)")
+    sp_tune.add_argument("--tokens", type=int, default=64, help="Tokens generated per request (default 64)")
+    sp_tune.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once (default 4)")
+    sp_tune.add_argument("--prune-margin", type=float, default=0.25, help="Stop a candidate after its first round when it trails the best by this fraction (default 0.25)")
+    sp_tune.add_argument("--port", type=int, help="Scratch port (default: a free one)")
+    sp_tune.add_argument("--ready-timeout", type=float, default=600.0, help="Seconds to wait for each candidate to load (default 600)")
+    sp_tune.add_argument("--ignore-memory", action="store_true", help="Run even if a second instance would exceed the memory budget")
+    sp_tune.add_argument("--stub", action="store_true", help="Run candidates against the bundled stub server instead of llama-server (offline dry run)")
+    sp_tune.add_argument("--apply", action="store_true", help="Write the winning args to the config")
+    sp_tune.add_argument("--json", action="store_true")
+    sp_tune.set_defaults(func=cmd_tune)
+
+    sp_rec = sub.add_parser("reconcile", help="Classify running llama-servers as managed, adoptable, conflicting, orphaned or foreign")
+    sp_rec.add_argument("--adopt", action="store_true", help="Record the PIDs of adoptable processes")
+    sp_rec.add_argument("--reap", action="store_true", help="Stop orphaned processes started from this config (SIGTERM, SIGKILL after stop_timeout_s)")
+    sp_rec.add_argument("--json", action="store_true")
+    sp_rec.set_defaults(func=cmd_reconcile)
+
+    sp_sup = sub.add_parser("supervise", help="Run models in the foreground and restart them when they crash")
+    sp_sup.add_argument("target", help="Model name or 'all'")
+    sp_sup.add_argument("--backoff", type=float, default=1.0, help="Initial restart delay seconds (doubles per consecutive crash)")
+    sp_sup.add_argument("--backoff-max", type=float, default=60.0, help="Maximum restart delay seconds")
+    sp_sup.add_argument("--crash-limit", type=int, default=5, help="Give up after this many crashes within --crash-window")
+    sp_sup.add_argument("--crash-window", type=float, default=120.0, help="Crash-loop detection window seconds")
+    sp_sup.set_defaults(func=cmd_supervise)
+
     # status
     sp_status = sub.add_parser("status", help="Show model status and health")
     sp_status.add_argument("--json", action="store_true", help="Output JSON array")
     sp_status.add_argument("--watch", action="store_true", help="Refresh repeatedly")
-    sp_status.add_argument("--interval", type=float, default=2.0, help="Watch refresh interval seconds")
+    sp_status.add_argument("--interval", type=float, default=2.0, help="Watch probe interval seconds for models that are down or changing")
+    sp_status.add_argument("--max-interval", type=float, default=30.0, help="Watch probe interval ceiling for stable healthy models")
+    sp_status.add_argument("--follow", action="store_true", help="Stream NDJSON: a snapshot, then change events and heartbeats")
+    sp_status.add_argument("--heartbeat", type=float, default=15.0, help="With --follow: seconds between heartbeats when nothing changes (default 15)")
+    sp_status.add_argument("--latency-threshold", type=float, default=1000.0, help="With --follow: probe latency (ms) above which a model counts as slow (default 1000)")
+    sp_status.add_argument("--memory-threshold", type=float, default=1.2, help="With --follow: RSS/estimate ratio above which a model counts as over memory (default 1.2)")
     sp_status.set_defaults(func=cmd_status)
 
+    sp_agent = sub.add_parser("agent", help="Serve this host's status and start/stop/restart over an authenticated HTTP API")
+    sp_agent.add_argument("--host", default="127.0.0.1")
+    sp_agent.add_argument("--port", type=int, default=agent.DEFAULT_PORT, help=f"Listen port (default {agent.DEFAULT_PORT})")
+    sp_agent.add_argument("--allow-remote", action="store_true")
+    sp_agent.set_defaults(func=cmd_agent)
+
+    sp_fleet = sub.add_parser("fleet", help="Status and actions across the agents listed in config.yaml")
+    fleet_sub = sp_fleet.add_subparsers(dest="subcommand", required=True)
+    sp_fleet_status = fleet_sub.add_parser("status", help="Merged status of every agent's models")
+    sp_fleet_status.add_argument("--json", action="store_true")
+    sp_fleet_status.add_argument("--timeout", type=float, default=fleet.DEFAULT_TIMEOUT_S, help=f"Deadline for all agents to answer, seconds (default {fleet.DEFAULT_TIMEOUT_S:g})")
+    sp_fleet_status.set_defaults(func=cmd_fleet)
+    for action in agent.ACTIONS:
+        sp_fleet_act = fleet_sub.add_parser(action, help=f"{action.capitalize()} models on one agent or all of them")
+        sp_fleet_act.add_argument("agent", help="Agent name or 'all'")
+        sp_fleet_act.add_argument("target", help="Model name or 'all'")
+        sp_fleet_act.add_argument("--timeout", type=float, default=900.0, help="Deadline for the agents to finish, seconds (default 900)")
+        sp_fleet_act.add_argument("--json", action="store_true")
+        sp_fleet_act.set_defaults(func=cmd_fleet)
+
     # launchd
     sp_ld = sub.add_parser("launchd", help="Manage launchd agents per model")
     ld_sub = sp_ld.add_subparsers(dest="subcommand", required=True)
@@ -260,6 +525,11 @@ def build_parser() -> argparse.ArgumentParser:
     # ensure-running (auto-start missing autostart models)
     sp_ens = sub.add_parser("ensure-running", help="Start models with autostart=true that are not reachable")
     sp_ens.add_argument("--mode", choices=["direct", "launchd"], default="direct", help="How to start missing models")
+    sp_ens.add_argument("--loop", action="store_true", help="Keep reconciling every --interval seconds (one loop per config dir)")
+    sp_ens.add_argument("--interval", type=float, default=30.0, help="With --loop: seconds between probe rounds (default 30)")
+    sp_ens.add_argument("--max-starts", type=int, default=3, help="With --loop: max starts per model within --start-window (default 3)")
+    sp_ens.add_argument("--start-window", type=float, default=600.0, help="With --loop: rate-limit window in seconds (default 600)")
+    sp_ens.add_argument("--no-warmup", action="store_true", help="Skip the configured warm-up prompts")
     sp_ens.set_defaults(func=cmd_ensure_running)
 
     return p
@@ -289,67 +559,290 @@ def _select_models(cfg: Dict[str, Any], target: str) -> List[Dict[str, Any]]:
     return sel
 
 
+def _check_binary(llama_path: str) -> bool:
+    # Validate llama-server binary unless overridden for tests
+    if os.environ.get("LLAMACPP_MANAGER_SKIP_BIN_CHECK"):
+        return True
+    lp = Path(llama_path).expanduser()
+    if not (lp.exists() and os.access(str(lp), os.X_OK)):
+        print(f"error: llama-server not found or not executable at {lp}. Install via Homebrew: brew install llama.cpp", file=sys.stderr)
+        return False
+    return True
+
+
 def cmd_start(args: argparse.Namespace) -> int:
     cfg = load_config()
     llama_path = cfg.get("llama_server_path")
-    log_dir = Path(cfg.get("log_dir"))
-    # Validate llama-server binary unless overridden for tests
-    if not os.environ.get("LLAMACPP_MANAGER_SKIP_BIN_CHECK"):
-        lp = Path(llama_path).expanduser()
-        if not (lp.exists() and os.access(str(lp), os.X_OK)):
-            print(f"error: llama-server not found or not executable at {lp}. Install via Homebrew: brew install llama.cpp", file=sys.stderr)
-            return 2
+    if not _check_binary(llama_path):
+        return 2
     selected = _select_models(cfg, args.target)
     rc = 0
+    if not args.dry_run:
+        ok = _verify_before_start(cfg, selected, args)
+        rc = 2 if len(ok) < len(selected) else 0
+        selected = ok
+    started = []
     for m in selected:
-        spec = ModelSpec(
-            name=m["name"],
-            model_path=m["model_path"],
-            host=m.get("host", "127.0.0.1"),
-            port=int(m["port"]),
-            args=list(m.get("args", []) or []),
-            env=dict(m.get("env", {}) or {}),
-            autostart=bool(m.get("autostart", False)),
-        )
-        # Warn/refuse remote binds unless explicitly allowed
-        if spec.host not in ("127.0.0.1", "localhost", "::1") and not getattr(args, "allow_remote", False):
-            print(f"error: refusing to bind non-local host '{spec.host}' without --allow-remote", file=sys.stderr)
+        r = _start_model(cfg, m, args)
+        rc = max(rc, r)
+        if r == 0:
+            started.append(m)
+    if not args.dry_run and not args.launchd:
+        rc = max(rc, _warm_up_all(cfg, started, args))
+    return rc
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    cfg = load_config()
+    selected = _select_models(cfg, args.target)
+    rows = integrity.verify_models(selected, workers=args.jobs, refresh=args.refresh)
+    pin = {r["name"]: f"{r['algorithm']}:{r['digest']}" for r in rows if args.pin and r["expected"] is None and r["digest"]}
+    if pin:
+        with config_lock():
+            cfg = load_config()
+            for m in cfg.get("models", []):
+                if m.get("name") in pin and not m.get("digest"):
+                    m["digest"] = pin[m["name"]]
+            save_config(cfg)
+    if args.json:
+        print(to_json(rows))
+    rc = 0
+    for r in rows:
+        why = integrity.problem(r)
+        if why:
+            print(f"error: {r['name']}: {why}", file=sys.stderr)
             rc = 2
             continue
-        argv = build_argv(llama_path, spec)
-        if args.dry_run:
-            print("DRY-RUN:", " ".join(shlex.quote(a) for a in argv))
+        if args.json:
             continue
-        if getattr(args, "launchd", False):
-            data = render_plist(llama_path, spec, log_dir=log_dir)
-            p = plist_path(spec.name)
-            write_plist(p, data)
-            r1 = launchctl_bootstrap(p)
-            if r1.returncode != 0 and "Service already loaded" not in (r1.stderr or ""):
-                print(f"error: launchctl bootstrap failed for {spec.name}: {r1.stderr}", file=sys.stderr)
-                rc = 2
-                continue
-            _ = launchctl_kickstart(spec.name)
-            print(f"launchd started {spec.name} port={spec.port}")
+        how = "cached" if r["cached"] else f"{fmt_bytes(r['bytes'])} in {r['duration_s']:.1f}s"
+        if r["ok"]:
+            print(f"ok {r['name']} {r['algorithm']}:{r['digest'][:16]}... ({how})")
         else:
-            # Prevent collision if port already in use by some service
-            if port_in_use(spec.host, spec.port):
-                print(f"error: port {spec.port} on {spec.host} is already in use; cannot start {spec.name}", file=sys.stderr)
-                rc = 2
-                continue
-            pid = start_process(llama_path, spec, log_dir)
-            write_pid(spec.name, pid)
-            print(f"started {spec.name} pid={pid} port={spec.port}")
+            state = "pinned" if r["name"] in pin else "unpinned"
+            print(f"{state} {r['name']} {r['algorithm']}:{r['digest']} ({how})")
     return rc
 
 
+def _record_warmup(name: str, result: Dict[str, Any]) -> int:
+    import time
+    rec = {"state": "done" if result["ok"] else "failed", "duration_s": result["duration_s"], "requests": result["requests"], "finished_at": time.time()}
+    if result["errors"]:
+        rec["errors"] = result["errors"]
+    update_runtime(name, {"warmup": rec})
+    if result["ok"]:
+        print(f"warmed up {name} in {result['duration_s']:.1f}s ({result['requests']} request(s))")
+        return 0
+    print(f"warning: warm-up of {name} failed: {'; '.join(result['errors'])}", file=sys.stderr)
+    return 1
+
+
+def _restore_slot_cache(name: str, host: str, port: int, slot_dir: Optional[str]) -> int:
+    """Load saved slots into a ready instance and record the outcome in runtime.json."""
+    import time
+    if not slot_dir:
+        return 0
+    result = slots.restore(host, port, Path(slot_dir))
+    rec = {"state": "restored" if result["ok"] else "failed", "slots": result["slots"], "tokens": result["tokens"], "duration_s": result["duration_s"], "finished_at": time.time()}
+    if result["errors"]:
+        rec["errors"] = result["errors"]
+    update_runtime(name, {"slot_cache": rec})
+    if result["errors"]:
+        print(f"warning: restoring slots of {name}: {'; '.join(result['errors'])}", file=sys.stderr)
+        return 1
+    if result["slots"]:
+        print(f"restored {result['slots']} slot(s) of {name} ({result['tokens']} tokens) in {result['duration_s']:.1f}s")
+    return 0
+
+
+def _warm_up(cfg: Dict[str, Any], m: Dict[str, Any], warm: bool = True) -> int:
+    """Wait for a fresh instance to load, restore its saved slots, then send its warm-up prompts and record the outcome."""
+    name = m["name"]
+    host = m.get("host", "127.0.0.1")
+    runtime = read_runtime()
+    port = live_port(m, runtime)
+    warm = warm and bool(m.get("warmup"))
+    ready_timeout = float(cfg.get("ready_timeout_s", DEFAULT_READY_TIMEOUT_S))
+    pid = (runtime.get(name) or {}).get("pid")
+    if warm:
+        update_runtime(name, {"warmup": {"state": "running"}})
+    if not wait_ready(host, port, timeout=ready_timeout, pid=pid):
+        error = f"not ready after {ready_timeout:g}s"
+        if pid is not None and not process_alive(pid):
+            code = child_exit(pid)
+            error = f"exited with code {code} while loading" if code is not None else "exited while loading"
+        if warm:
+            update_runtime(name, {"warmup": {"state": "failed", "errors": [error]}})
+        print(f"warning: {name} {error}; warm-up skipped", file=sys.stderr)
+        return 1
+    # restored prefixes make the warm-up prompts (and first real requests) cache hits
+    rc = _restore_slot_cache(name, host, port, (runtime.get(name) or {}).get("slot_dir")) if m.get("slot_cache") else 0
+    if not warm:
+        return rc
+    return max(rc, _record_warmup(name, run_warmup(host, port, m["warmup"])))
+
+
+def _warm_up_all(cfg: Dict[str, Any], models: List[Dict[str, Any]], args: argparse.Namespace) -> int:
+    """Restore slot caches and warm up freshly started models concurrently (each waits for its own load)."""
+    warm = not getattr(args, "no_warmup", False)
+    models = [m for m in models if m.get("slot_cache") or (warm and m.get("warmup"))]
+    if not models:
+        return 0
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(models)) as ex:
+        return max(ex.map(lambda m: _warm_up(cfg, m, warm), models), default=0)
+
+
+def _start_model(cfg: Dict[str, Any], m: Dict[str, Any], args: argparse.Namespace) -> int:
+    llama_path = cfg.get("llama_server_path")
+    log_dir = Path(cfg.get("log_dir"))
+    spec = launch_spec(cfg, m)
+    # Warn/refuse remote binds unless explicitly allowed
+    if spec.host not in ("127.0.0.1", "localhost", "::1") and not getattr(args, "allow_remote", False):
+        print(f"error: refusing to bind non-local host '{spec.host}' without --allow-remote", file=sys.stderr)
+        return 2
+    argv = build_argv(llama_path, spec)
+    if getattr(args, "dry_run", False):
+        print("DRY-RUN:", " ".join(shlex.quote(a) for a in argv))
+        return 0
+    if getattr(args, "launchd", False):
+        data = render_plist(llama_path, spec, log_dir=log_dir)
+        p = plist_path(spec.name)
+        write_plist(p, data)
+        r1 = launchctl_bootstrap(p)
+        if r1.returncode != 0 and "Service already loaded" not in (r1.stderr or ""):
+            print(f"error: launchctl bootstrap failed for {spec.name}: {r1.stderr}", file=sys.stderr)
+            return 2
+        _ = launchctl_kickstart(spec.name)
+        print(f"launchd started {spec.name} port={spec.port}")
+        return 0
+    # Prevent collision if port already in use by some service
+    if port_in_use(spec.host, spec.port):
+        print(f"error: port {spec.port} on {spec.host} is already in use; cannot start {spec.name}", file=sys.stderr)
+        return 2
+    if not getattr(args, "ignore_memory", False) and not _wait_for_memory(cfg, spec, float(getattr(args, "wait_memory", 0) or 0)):
+        return 2
+    pid = start_process(llama_path, spec, log_dir)
+    record_launch(llama_path, spec, pid, log_dir=log_dir)
+    print(f"started {spec.name} pid={pid} port={spec.port}")
+    return 0
+
+
+def _verify_before_start(
+    cfg: Dict[str, Any], models: List[Dict[str, Any]], args: Optional[argparse.Namespace] = None, action: str = "starting",
+) -> List[Dict[str, Any]]:
+    """The models whose pinned digests check out, when asked to verify (``--verify`` or ``verify_on_start``).
+
+    All pinned files are hashed in one parallel pass before anything is
+    stopped or started; each mismatch is reported and its model dropped.
+    """
+    pinned = [m for m in models if m.get("digest")]
+    if not pinned or not (getattr(args, "verify", False) or cfg.get("verify_on_start")):
+        return list(models)
+    bad = set()
+    for row in integrity.verify_models(pinned):
+        why = integrity.problem(row)
+        if why:
+            print(f"error: {row['name']}: {why}; not {action} it", file=sys.stderr)
+            bad.add(row["name"])
+    return [m for m in models if m.get("name") not in bad]
+
+
+def _admission(cfg: Dict[str, Any], spec: ModelSpec, alongside: bool = False) -> Dict[str, Any]:
+    return admission(cfg, spec, alongside)
+
+
+def _memory_report(spec: ModelSpec, a: Dict[str, Any]) -> str:
+    return (
+        f"{spec.name} needs ~{fmt_bytes(a['need'])}; committed {fmt_bytes(a['committed'])} "
+        f"of {fmt_bytes(a['budget'])} budget, {fmt_bytes(a['available'])} available"
+    )
+
+
+def _wait_for_memory(cfg: Dict[str, Any], spec: ModelSpec, wait_s: float, alongside: bool = False) -> bool:
+    """Admit the model, optionally waiting up to wait_s for memory to free up."""
+    import time
+    deadline = time.monotonic() + wait_s
+    a = _admission(cfg, spec, alongside)
+    while not a["ok"] and time.monotonic() < deadline:
+        time.sleep(min(2.0, max(0.0, deadline - time.monotonic())))
+        a = _admission(cfg, spec, alongside)
+    if not a["ok"]:
+        what = f"a second instance of {spec.name} next to the running one" if alongside else spec.name
+        print(f"error: not enough memory to start {what} ({' and '.join(a['reasons'])} exceeded): {_memory_report(spec, a)}; use --ignore-memory to override", file=sys.stderr)
+    return a["ok"]
+
+
+def _print_stopped(name: str, result: Dict[str, Any]) -> None:
+    if _stop_failed(name, result):
+        return
+    how = " (killed after grace period)" if result["killed"] else ""
+    print(f"stopped {name} pid={result['pid']} in {result['duration_s']:.2f}s{how}", flush=True)
+
+
+def _stop_failed(name: str, result: Dict[str, Any]) -> bool:
+    """Report a model that could not be signalled and give back the PID record _stop_targets dropped."""
+    if not result.get("error"):
+        return False
+    if process_alive(result["pid"]):
+        update_runtime(name, pid_fields(result["pid"]))
+    print(f"error: could not stop {name} pid={result['pid']}: {result['error']}", file=sys.stderr, flush=True)
+    return True
+
+
+def _stop_targets(cfg: Dict[str, Any], selected: List[Dict[str, Any]]) -> Tuple[Dict[str, Tuple[int, float]], int]:
+    """Collect (pid, grace) per running model, saving slot caches and dropping PID records first."""
+    targets: Dict[str, Tuple[int, float]] = {}
+    rc = 0
+    pids: Dict[str, int] = {}
+    for m in selected:
+        name = m["name"]
+        try:
+            pids[name] = read_pid(name)
+        except FileNotFoundError:
+            print(f"warning: no pid recorded for {name}", file=sys.stderr)
+            rc = max(rc, 1)
+    _save_slots([m for m in selected if m["name"] in pids and m.get("slot_cache") and process_alive(pids[m["name"]])])
+    for m in selected:
+        name = m["name"]
+        if name not in pids:
+            continue
+        # Drop the PID record first so a supervisor treats the exit as intentional
+        remove_pid(name)
+        targets[name] = (pids[name], stop_timeout(cfg, m))
+    return targets, rc
+
+
+def _save_slot_cache(m: Dict[str, Any], rec: Dict[str, Any]) -> int:
+    name = m["name"]
+    if not rec.get("slot_dir"):
+        print(f"warning: {name} was not launched with a slot cache; nothing saved", file=sys.stderr)
+        return 1
+    result = slots.save(m.get("host", "127.0.0.1"), live_port(m, {name: rec}), Path(rec["slot_dir"]))
+    if result["errors"]:
+        print(f"warning: saving slots of {name}: {'; '.join(result['errors'])}", file=sys.stderr)
+    if result["slots"]:
+        print(f"saved {result['slots']} slot(s) of {name} ({result['tokens']} tokens) in {result['duration_s']:.1f}s")
+    return 0 if result["ok"] else 1
+
+
+def _save_slots(models: List[Dict[str, Any]]) -> None:
+    """Save the slot caches of running models concurrently, before they are stopped."""
+    if not models:
+        return
+    runtime = read_runtime()
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(models)) as ex:
+        list(ex.map(lambda m: _save_slot_cache(m, runtime.get(m["name"]) or {}), models))
+
+
 def cmd_stop(args: argparse.Namespace) -> int:
     cfg = load_config()
     selected = _select_models(cfg, args.target)
     rc = 0
-    for m in selected:
-        name = m["name"]
-        if getattr(args, "launchd", False):
+    if getattr(args, "launchd", False):
+        for m in selected:
+            name = m["name"]
             r = launchctl_bootout(name)
             if r.returncode != 0 and "No such process" not in (r.stderr or ""):
                 print(f"warning: bootout returned {r.returncode} for {name}: {r.stderr}", file=sys.stderr)
@@ -360,105 +853,1038 @@ def cmd_stop(args: argparse.Namespace) -> int:
             except Exception:
                 pass
             print(f"launchd stopped {name}")
-        else:
+        return rc
+    # Signal every target first, then wait on all of them together
+    targets, rc = _stop_targets(cfg, selected)
+    failed: List[str] = []
+
+    def on_exit(name: str, result: Dict[str, Any]) -> None:
+        _print_stopped(name, result)
+        if result.get("error"):
+            failed.append(name)
+
+    try:
+        stop_processes(targets, on_exit=on_exit)
+    except Exception as e:
+        print(f"error stopping {', '.join(targets)}: {e}", file=sys.stderr)
+        rc = 2
+    return 2 if failed else rc
+
+
+def _stop_then_start(targets: Dict[str, Tuple[int, float]], start: Callable[[str], None], rcs: List[int]) -> None:
+    """Stop ``targets`` and call ``start(name)`` for each one as soon as it has exited.
+
+    Starts run in order on a worker thread, so one waiting for its port or
+    for memory never holds up the stop loop's deadlines for the others.
+    Returns once every start has finished; failures append 2 to ``rcs``.
+    """
+    stopped: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def starter() -> None:
+        while True:
+            name = stopped.get()
+            if name is None:
+                return
             try:
-                pid = read_pid(name)
-            except FileNotFoundError:
-                print(f"warning: no pid file for {name}", file=sys.stderr)
-                rc = max(rc, 1)
+                start(name)
+            except Exception as e:
+                print(f"error: failed to start {name}: {e}", file=sys.stderr)
+                rcs.append(2)
+
+    worker = threading.Thread(target=starter, name="restart-starter", daemon=True)
+    worker.start()
+
+    def on_exit(name: str, result: Dict[str, Any]) -> None:
+        _print_stopped(name, result)
+        if result.get("error"):
+            rcs.append(2)
+        else:
+            stopped.put(name)
+
+    try:
+        stop_processes(targets, on_exit=on_exit)
+    finally:
+        stopped.put(None)
+        worker.join()
+
+
+def cmd_restart(args: argparse.Namespace) -> int:
+    if getattr(args, "rolling", False):
+        return _cmd_rolling_restart(args)
+    if args.dry_run or getattr(args, "launchd", False):
+        names = [args.target]
+        r0 = 0
+        if not args.dry_run:
+            cfg = load_config()
+            selected = _select_models(cfg, args.target)
+            ok = _verify_before_start(cfg, selected, args, "restarting")
+            if len(ok) < len(selected):
+                r0, names = 2, [m["name"] for m in ok]
+        # Stop ignores missing PID records
+        r1 = max((cmd_stop(argparse.Namespace(target=n, launchd=getattr(args, "launchd", False))) for n in names), default=0)
+        if args.dry_run:
+            return 0
+        r2 = max((cmd_start(argparse.Namespace(target=n, dry_run=False, launchd=getattr(args, "launchd", False), allow_remote=getattr(args, "allow_remote", False), ignore_memory=getattr(args, "ignore_memory", False))) for n in names), default=0)
+        return max(r0, r1, r2)
+
+    import time
+    cfg = load_config()
+    if not _check_binary(cfg.get("llama_server_path")):
+        return 2
+    selected = _select_models(cfg, args.target)
+    rcs: List[int] = []
+    # a model whose file fails its check keeps running on the old instance
+    ok = _verify_before_start(cfg, selected, args, "restarting")
+    if len(ok) < len(selected):
+        rcs.append(2)
+    selected = ok
+    by_name = {m["name"]: m for m in selected}
+    start_args = argparse.Namespace(dry_run=False, launchd=False, allow_remote=getattr(args, "allow_remote", False), ignore_memory=getattr(args, "ignore_memory", False))
+    started: List[Dict[str, Any]] = []
+
+    def start(m: Dict[str, Any]) -> None:
+        rc = _start_model(cfg, m, start_args)
+        rcs.append(rc)
+        if rc == 0:
+            started.append(m)
+
+    def start_when_port_free(name: str) -> None:
+        m = by_name[name]
+        host, port = m.get("host", "127.0.0.1"), int(m["port"])
+        deadline = time.monotonic() + 5.0
+        while port_in_use(host, port) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        start(m)
+
+    targets, _ = _stop_targets(cfg, selected)
+    # Models that were not running can start while the others shut down
+    for name in by_name:
+        if name not in targets:
+            start(by_name[name])
+
+    try:
+        _stop_then_start(targets, start_when_port_free, rcs)
+    except Exception as e:
+        print(f"error stopping {', '.join(targets)}: {e}", file=sys.stderr)
+        return 2
+    rcs.append(_warm_up_all(cfg, started, args))
+    return max(rcs, default=0)
+
+
+def _spare_port(host: str, preferred: int) -> int:
+    """The configured port if it is free, else one the kernel picks."""
+    if not port_in_use(host, preferred):
+        return preferred
+    return _free_port(host)
+
+
+def _free_port(host: str) -> int:
+    import socket
+    with socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def _rolling_restart(cfg: Dict[str, Any], m: Dict[str, Any], args: argparse.Namespace) -> int:
+    """Start a replacement on a spare port, switch the proxy route once it is ready, then drain and stop the old one."""
+    llama_path = cfg.get("llama_server_path")
+    log_dir = Path(cfg.get("log_dir"))
+    name = m["name"]
+    spec = launch_spec(cfg, m)
+    try:
+        old_pid: Optional[int] = read_pid(name)
+    except Exception:
+        old_pid = None
+    if old_pid is None or not process_alive(old_pid):
+        return _start_model(cfg, m, args)
+    old_port = live_port(m, read_runtime())
+    if not getattr(args, "ignore_memory", False) and not _wait_for_memory(cfg, spec, 0, alongside=True):
+        return 2
+    port = _spare_port(spec.host, spec.port)
+    live = replace(spec, port=port)
+    try:
+        pid = start_process(llama_path, live, log_dir)
+    except Exception as e:
+        print(f"error: failed to start {name}: {e}", file=sys.stderr)
+        return 2
+    print(f"started {name} pid={pid} port={port} (replacing pid={old_pid} port={old_port})")
+    # start_process registers the child, so a replacement that crashes while loading is noticed on the next poll
+    if not wait_ready(spec.host, port, timeout=args.ready_timeout, pid=pid):
+        if not process_alive(pid):
+            code = child_exit(pid)
+            exited = f"exited with code {code}" if code is not None else "exited"
+            print(f"error: {name} replacement pid={pid} {exited} while loading; keeping pid={old_pid}", file=sys.stderr)
+            return 2
+        print(f"error: {name} not ready on port {port} after {args.ready_timeout:g}s; keeping pid={old_pid}", file=sys.stderr)
+        stop_processes({name: (pid, stop_timeout(cfg, m))})
+        return 2
+    if m.get("slot_cache"):
+        # hand the old instance's prompt caches over before it gets any traffic
+        old_rec = read_runtime().get(name) or {}
+        if old_rec.get("slot_dir"):
+            _save_slot_cache(m, old_rec)
+        new_dir = slots.slot_dir_of(build_argv(llama_path, spec))
+        _restore_slot_cache(name, spec.host, port, str(new_dir) if new_dir else None)
+    # Warm up before any client traffic reaches the new instance
+    warm = run_warmup(spec.host, port, m["warmup"]) if m.get("warmup") and not getattr(args, "no_warmup", False) else None
+    # The proxy re-reads runtime.json on its next request
+    record_launch(llama_path, spec, pid, port=port, log_dir=log_dir)
+    if warm is not None:
+        _record_warmup(name, warm)
+    print(f"switched {name} :{m['public_port']} -> {port}")
+    if not wait_idle(spec.host, old_port, timeout=args.drain):
+        print(f"warning: {name} pid={old_pid} still busy after {args.drain:g}s drain", file=sys.stderr)
+    stop_processes({name: (old_pid, stop_timeout(cfg, m))}, on_exit=_print_stopped)
+    return 0
+
+
+def _cmd_rolling_restart(args: argparse.Namespace) -> int:
+    if args.dry_run or getattr(args, "launchd", False):
+        print("error: --rolling cannot be combined with --dry-run or --launchd", file=sys.stderr)
+        return 2
+    cfg = load_config()
+    if not _check_binary(cfg.get("llama_server_path")):
+        return 2
+    selected = _select_models(cfg, args.target)
+    missing = [m["name"] for m in selected if m.get("public_port") is None]
+    if missing:
+        print(f"error: --rolling needs a public_port (served by 'llamacpp-manager proxy') for: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    ok = _verify_before_start(cfg, selected, args, "restarting")
+    rc = 2 if len(ok) < len(selected) else 0
+    # One model at a time, so at most one extra instance is loaded at once
+    for m in ok:
+        rc = max(rc, _rolling_restart(cfg, m, args))
+    return rc
+
+
+def cmd_proxy(args: argparse.Namespace) -> int:
+    cfg = load_config()
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.allow_remote:
+        print(f"error: refusing to bind non-local host '{args.host}' without --allow-remote", file=sys.stderr)
+        return 2
+    try:
+        tcfg = trace.parse_trace(cfg.get("trace"))
+        if args.trace_sample is not None:
+            tcfg = trace.parse_trace({**tcfg, "sample": args.trace_sample})
+        qcfg = qos.parse_qos(cfg.get("qos"))
+        fcfg = fanout.parse_embeddings(cfg.get("embeddings"))
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    router = Router()
+    ports = sorted(router.routes(force=True))
+    if not ports:
+        print("error: no model has a public_port; set one with 'config update <name> --public-port N'", file=sys.stderr)
+        return 2
+    tracer = None
+    if not args.no_trace and tcfg["sample"] > 0:
+        trace_path = Path(cfg.get("log_dir")).expanduser() / trace.TRACE_FILE
+        ensure_dir(trace_path.parent)
+        tracer = trace.TraceWriter(trace_path, tcfg["sample"], int(tcfg["max_mb"] * 1024 * 1024), int(tcfg["backups"]))
+    try:
+        gates = qos.QoS(qcfg, router.slots) if qcfg else None
+        servers = serve(ports, router, host=args.host, upstream_timeout=args.upstream_timeout, tracer=tracer, qos=gates, fanout=fcfg)
+    except OSError as e:
+        print(f"error: cannot listen: {e}", file=sys.stderr)
+        if tracer is not None:
+            tracer.close()
+        return 2
+    for port, r in sorted(router.routes().items()):
+        print(f"proxy {args.host}:{port} -> {', '.join(r['models'])}", flush=True)
+    if tracer is not None:
+        print(f"tracing {tcfg['sample'] * 100:g}% of requests to {tracer.path}", flush=True)
+    if qcfg:
+        classes = " > ".join(f"{c['name']}({c['queue']})" for c in qcfg["classes"])
+        print(f"admission control: {classes}; stats at {qos.STATS_PATH}", flush=True)
+    import time
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for srv in servers:
+            srv.shutdown()
+            srv.server_close()
+        if tracer is not None:
+            tracer.close()
+            if tracer.dropped:
+                print(f"warning: {tracer.dropped} trace record(s) dropped (writer fell behind)", file=sys.stderr)
+    return 0
+
+
+def _reload_plan(cfg: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Diff configured models against running ones via their launch hashes."""
+    llama_path = cfg.get("llama_server_path")
+    runtime = read_runtime()
+    configured = {m["name"]: m for m in cfg.get("models", [])}
+    running = set()
+    for name in set(pid_names(runtime)) | set(configured):
+        try:
+            if process_alive(read_pid(name, runtime)):
+                running.add(name)
+        except Exception:
+            continue
+    plan: Dict[str, List[str]] = {"stop": [], "restart": [], "start": [], "unchanged": []}
+    for name in sorted(running - set(configured)):
+        plan["stop"].append(name)
+    for name, m in configured.items():
+        if name in running:
+            recorded = (runtime.get(name) or {}).get("argv_hash")
+            if recorded and recorded != spec_hash(llama_path, launch_spec(cfg, m)):
+                plan["restart"].append(name)
+            else:
+                plan["unchanged"].append(name)
+        elif m.get("autostart"):
+            plan["start"].append(name)
+    return plan
+
+
+def _apply_reload(cfg: Dict[str, Any], args: argparse.Namespace) -> int:
+    plan = _reload_plan(cfg)
+    for action in ("stop", "restart", "start"):
+        for name in plan[action]:
+            print(f"reload: {action} {name}")
+    if args.dry_run:
+        print(f"reload (dry-run): {len(plan['unchanged'])} unchanged")
+        return 0
+    configured = {m["name"]: m for m in cfg.get("models", [])}
+    start_args = argparse.Namespace(dry_run=False, launchd=False, allow_remote=getattr(args, "allow_remote", False), ignore_memory=False)
+    rcs: List[int] = []
+    # checked before anything is stopped: a changed model whose file fails keeps its old instance
+    launching = [configured[n] for n in plan["start"] + plan["restart"]]
+    ok = {m["name"] for m in _verify_before_start(cfg, launching, args)}
+    if len(ok) < len(launching):
+        rcs.append(2)
+        plan = {**plan, "start": [n for n in plan["start"] if n in ok], "restart": [n for n in plan["restart"] if n in ok]}
+    # Removed models are not in the config any more: stop them with the global grace period
+    targets, _ = _stop_targets(cfg, [configured.get(n) or {"name": n} for n in plan["stop"] + plan["restart"]])
+    for name in plan["start"]:
+        rcs.append(_start_model(cfg, configured[name], start_args))
+
+    def start(name: str) -> None:
+        if name in plan["restart"]:
+            rcs.append(_start_model(cfg, configured[name], start_args))
+
+    _stop_then_start(targets, start, rcs)
+    rcs.append(_warm_up_all(cfg, [configured[n] for n in plan["start"] + plan["restart"]], args))
+    print(
+        f"reload: started {len(plan['start'])}, stopped {len(plan['stop'])}, "
+        f"restarted {len(plan['restart'])}, unchanged {len(plan['unchanged'])}"
+    )
+    return max(rcs, default=0)
+
+
+def cmd_reload(args: argparse.Namespace) -> int:
+    cfg = load_config()
+    if not _check_binary(cfg.get("llama_server_path")):
+        return 2
+    rc = _apply_reload(cfg, args)
+    if not args.watch:
+        return rc
+    import time
+    # in-place saves count; runtime.json in the same dir does not
+    watcher = FileWatcher([config_path().parent], [config_path().stem], writes=True, shared=set)
+    print(f"watching {config_path()} for changes", flush=True)
+    try:
+        while True:
+            if not watcher.wait(3600):
                 continue
+            # let the writer finish (editors often save in several steps)
+            while watcher.wait(0.5):
+                pass
             try:
-                stop_process(pid)
-                remove_pid(name)
-                print(f"stopped {name} pid={pid}")
+                cfg = load_config()
             except Exception as e:
-                print(f"error stopping {name}: {e}", file=sys.stderr)
-                rc = 2
+                print(f"error: config not reloaded: {e}", file=sys.stderr, flush=True)
+                continue
+            _apply_reload(cfg, args)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
     return rc
 
 
-def cmd_restart(args: argparse.Namespace) -> int:
-    # Stop ignores missing pid files
-    r1 = cmd_stop(argparse.Namespace(target=args.target, launchd=getattr(args, "launchd", False)))
-    if args.dry_run:
+def cmd_history(args: argparse.Namespace) -> int:
+    import time
+    cfg = load_config()
+    _select_models(cfg, args.name)
+    now = time.time()
+    try:
+        since = history.parse_time(args.since, now)
+        until = history.parse_time(args.until, now) if args.until else now
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    res = {"raw": 1, "minute": 60, "hour": 3600, "day": 86400}.get(args.resolution) or history.auto_resolution(since, until)
+    result = history.query(args.name, since, until, res)
+    if args.json:
+        print(to_json(result))
         return 0
-    r2 = cmd_start(argparse.Namespace(target=args.target, dry_run=False, launchd=getattr(args, "launchd", False), allow_remote=getattr(args, "allow_remote", False)))
-    return max(r1, r2)
+    s = result["summary"]
+    if not s["samples"]:
+        print(f"no history for {args.name} in that range")
+        return 0
+    up = f"{s['up_ratio'] * 100:.2f}%"
+    print(
+        f"{args.name}: up {up} of {s['samples']} samples, {s['down_buckets']} bucket(s) with downtime; "
+        f"latency avg {s['latency_avg_ms']} ms, max {s['latency_max_ms']} ms; rss max {fmt_bytes(s['rss_max']) if s['rss_max'] else '-'}"
+    )
+    headers = ["time", "samples", "up_%", "lat_avg_ms", "lat_max_ms"]
+    print(" ".join(f"{h:>19}" if h == "time" else f"{h:>12}" for h in headers))
+    for b in result["buckets"]:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(b["ts"]))
+        print(f"{when:>19} {b['samples']:>12} {b['up_ratio'] * 100:>12.1f} {str(b['latency_avg_ms']):>12} {str(b['latency_max_ms']):>12}")
+    return 0
 
 
-def _gather_status(cfg: Dict[str, Any]) -> list:
+def cmd_logs_search(args: argparse.Namespace) -> int:
+    import re
+    import time
+    cfg = load_config()
+    names = [m["name"] for m in _select_models(cfg, "all")] if not args.model else [
+        m["name"] for n in args.model for m in _select_models(cfg, n)
+    ]
+    now = time.time()
+    try:
+        since = history.parse_time(args.since, now) if args.since else None
+        until = history.parse_time(args.until, now) if args.until else None
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    log_dir = Path(cfg.get("log_dir")).expanduser()
+    try:
+        found = logsearch.search(
+            log_dir, names, args.pattern, since=since, until=until,
+            ignore_case=args.ignore_case, limit=args.limit or None, workers=args.workers,
+        )
+    except re.error as e:
+        print(f"error: invalid pattern: {e}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(to_json(found))
+        return 0
+    for r in found:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["ts"])) if r["ts"] is not None else "-"
+        print(f"{r['model']} {when} {r['line']}")
+    if args.limit and len(found) >= args.limit:
+        print(f"(stopped at --limit {args.limit})", file=sys.stderr)
+    return 0
+
+
+def cmd_trace_summarize(args: argparse.Namespace) -> int:
+    import time
+    cfg = load_config()
+    now = time.time()
+    try:
+        since = history.parse_time(args.since, now) if args.since else None
+        until = history.parse_time(args.until, now) if args.until else None
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    path = Path(cfg.get("log_dir")).expanduser() / trace.TRACE_FILE
+    result = trace.summarize(trace.read_traces(path, since, until), args.model)
+    if args.json:
+        print(to_json(result))
+        return 0
+    if not result:
+        print(f"no traces in {path}; run 'llamacpp-manager proxy' (trace.sample > 0) and send it requests")
+        return 0
+    for name in sorted(result, key=lambda n: (n == "*", n)):
+        r = result[name]
+        tps = f", decode {r['decode_tokens_per_s']} tok/s" if r["decode_tokens_per_s"] is not None else ""
+        rejected = f", {r['rejected']} rejected" if r["rejected"] else ""
+        print(
+            f"{'all models' if name == '*' else name}: {r['requests']} request(s), {r['errors']} error(s){rejected}, "
+            f"{r['prompt_tokens']} prompt / {r['completion_tokens']} completion tokens{tps}"
+        )
+        print(f"  {'phase':<8} {'count':>6} {'mean_ms':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+        for phase, st in r["phases"].items():
+            if not st["count"]:
+                continue
+            cols = " ".join(f"{st[k]:>9}" for k in ("mean", "p50", "p95", "p99", "max"))
+            print(f"  {phase:<8} {st['count']:>6} {cols}")
+    return 0
+
+
+def _fmt_params(params: Dict[str, Any]) -> str:
+    flags = dict(tune.PARAMS)
+    return " ".join(f"{flags[k][0]} {v}" for k, v in params.items() if v is not None) or "(defaults)"
+
+
+def cmd_tune(args: argparse.Namespace) -> int:
+    import time
+    cfg = load_config()
+    m = _select_models(cfg, args.name)[0]
+    try:
+        budget = tune.parse_duration(args.budget)
+        space = tune.parse_space(args.space or [])
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if min(args.requests, args.tokens, args.concurrency) < 1:
+        print("error: --requests, --tokens and --concurrency must be at least 1", file=sys.stderr)
+        return 2
+    llama_path = cfg.get("llama_server_path") or DEFAULT_LLAMA_SERVER_PATH
+    if not args.stub and not _check_binary(llama_path):
+        return 2
+    spec = launch_spec(cfg, m)
+    if not args.stub and not args.ignore_memory:
+        # the candidate runs next to everything already up, this model included
+        need = estimate_model_memory(spec)["total"]
+        verdict = admit(cfg, need, committed_memory(cfg, "", read_runtime()))
+        if not verdict["ok"]:
+            print(f"error: {m['name']}: a tuning instance needs ~{fmt_bytes(need)}; {', '.join(verdict['reasons'])} exceeded (use --ignore-memory to run anyway)", file=sys.stderr)
+            return 2
+    host = "127.0.0.1"
+    port = args.port or _free_port(host)
+    base_args = list(spec.args or [])
+    base = tune.current_params(base_args)
+    workload = {"requests": args.requests, "tokens": args.tokens, "concurrency": args.concurrency}
+    log_path = Path(cfg.get("log_dir")).expanduser() / f"{m['name']}.tune.log"
+    doc: Dict[str, Any] = {
+        "model": m["name"], "objective": args.objective, "budget_s": budget, "started_at": time.time(),
+        "workload": workload, "space": space, "base_args": base_args, "stub": args.stub, "trials": [],
+    }
+
+    def trial(params: Dict[str, Any], best: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        effective = tune.slot_context(base, params)
+        # scratch instances neither save nor restore the model's slot cache
+        cand = replace(spec, args=tune.with_params(base_args, effective), host=host, port=port, slot_cache=None)
+        argv = build_argv(llama_path, cand)
+        if args.stub:
+            argv = tune.stub_argv(argv)
+        res = tune.run_trial(
+            argv, host, port, workload, objective=args.objective, best=best,
+            prune_margin=args.prune_margin, ready_timeout=args.ready_timeout, log_path=log_path, env=spec.env,
+        )
+        res["args"] = cand.args
+        res["effective"] = effective
+        return res
+
+    def on_trial(res: Dict[str, Any]) -> None:
+        doc["trials"].append(res)
+        tune.save_results(m["name"], doc)
+        if args.json:
+            return
+        n = len(doc["trials"])
+        if res["status"] == "failed":
+            print(f"trial {n:>2}: failed {_fmt_params(res['effective'])}: {res['error']}", flush=True)
+        else:
+            print(f"trial {n:>2}: {res['status']:<6} {res['tokens_per_s']:>8.1f} tok/s  p95 {res['p95_latency_ms']:>8.1f} ms  {_fmt_params(res['effective'])}", flush=True)
+
+    try:
+        result = tune.search(base, space, trial, objective=args.objective, budget_s=budget, on_trial=on_trial)
+    except KeyboardInterrupt:
+        print(f"interrupted; results so far in {tune.results_path(m['name'])}", file=sys.stderr)
+        return 1
+    best = result["best"]
+    doc.update(stopped=result["stopped"], best=best and {"params": best["effective"], **{k: best[k] for k in ("args", "tokens_per_s", "p95_latency_ms")}})
+    path = tune.save_results(m["name"], doc)
+    if best is None:
+        if args.json:
+            print(to_json(doc))
+        print(f"error: {m['name']}: current args did not run: {result['trials'][0]['error']}", file=sys.stderr)
+        return 2
+    # compare the tuned values, not the args: with_params reorders and normalises flags
+    changed = any(v != base.get(k) for k, v in best["effective"].items())
+    if args.apply and changed:
+        try:
+            # the sweep can take many minutes: re-read the config and touch only this model's args
+            with config_lock():
+                cfg = load_config()
+                cur = ([x for x in cfg.get("models", []) if x.get("name") == m["name"]] or [None])[0]
+                if cur is None:
+                    raise ValueError(f"model '{m['name']}' was removed while tuning")
+                update_model(cfg, m["name"], {"args": tune.with_params(list(cur.get("args") or []), best["effective"])})
+                save_config(cfg)
+        except Exception as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+    if args.json:
+        print(to_json(doc))
+        return 0
+    baseline = result["trials"][0]
+    metric = "tokens_per_s" if args.objective == "tokens_per_s" else "p95_latency_ms"
+    gain = (best[metric] - baseline[metric]) / baseline[metric] * 100 if baseline[metric] else 0.0
+    if result["stopped"] == "budget":
+        print(f"budget of {args.budget} reached after {len(result['trials'])} trial(s)")
+    print(f"results: {path}")
+    if not changed:
+        print(f"{m['name']}: current args are the best found ({metric} {baseline[metric]})")
+        return 0
+    print(f"best: {_fmt_params(best['effective'])} ({metric} {best[metric]}, {gain:+.1f}% vs current)")
+    print(f"args: {shlex.join(best['args'])}")
+    if args.apply:
+        print(f"Updated model '{m['name']}' (restart or reload to use it)")
+    else:
+        print("rerun with --apply to write these args to the config")
+    return 0
+
+
+def cmd_supervise(args: argparse.Namespace) -> int:
+    cfg = load_config()
+    llama_path = cfg.get("llama_server_path")
+    log_dir = Path(cfg.get("log_dir")).expanduser()
+    if not _check_binary(llama_path):
+        return 2
+    specs = [launch_spec(cfg, m) for m in _select_models(cfg, args.target)]
+    sup = Supervisor(
+        llama_path,
+        specs,
+        log_dir,
+        backoff_base=args.backoff,
+        backoff_max=args.backoff_max,
+        crash_limit=args.crash_limit,
+        crash_window=args.crash_window,
+        log=lambda msg: print(msg, flush=True),
+    )
+    sup.run()
+    return 0
+
+
+def _match_process(m: Dict[str, Any], procs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # match discovered processes by host:port, else by canonical model path
+    index = ModelIndex([m])
+    path = index.path_of.get(m["name"])
+    by_path = None
+    for p in procs:
+        info = server_args(p.get("argv", []), p.get("pid"))
+        if index.at(info["host"], info["port"]):
+            return p
+        if by_path is None and path and info["model_path"] == path:
+            by_path = p
+    return by_path
+
+
+def _live_owners() -> Dict[int, str]:
+    owners = {}
+    runtime = read_runtime()
+    for name in pid_names(runtime):
+        try:
+            pid = read_pid(name, runtime)
+        except Exception:
+            continue
+        if process_alive(pid):
+            owners[pid] = name
+    return owners
+
+
+def _adopt(cfg: Dict[str, Any], m: Dict[str, Any], row: Dict[str, Any]) -> None:
+    import time
+    spec = launch_spec(cfg, m)
+    # a process launched exactly as configured keeps the spec hash, so reload leaves it alone;
+    # anything else is hashed as found and gets restarted by the next reload
+    same = row["argv"][1:] == build_argv(cfg.get("llama_server_path"), spec)[1:]
+    update_runtime(spec.name, {
+        "argv_hash": spec_hash(cfg.get("llama_server_path"), spec) if same else argv_hash(row["argv"]),
+        "started_at": time.time(), "port": row["port"], "warmup": None, "adopted": True,
+        "slot_dir": str(slots.slot_dir_of(row["argv"]) or "") or None,
+    })
+    write_pid(spec.name, row["pid"])
+
+
+def cmd_reconcile(args: argparse.Namespace) -> int:
+    cfg = load_config()
+    models = cfg.get("models", [])
+    runtime = read_runtime()
+    ports = {n: [rec["port"]] for n, rec in runtime.items() if rec.get("port")}
+    roots = [str(app_support_dir()), str(Path(cfg.get("log_dir")).expanduser()), str(pid_dir())]
+    rows = reconcile(models, find_llama_processes(), _live_owners(), ports, roots)
+    by_name = {m["name"]: m for m in models}
+    if args.adopt:
+        for r in rows:
+            if r["class"] == "adoptable":
+                _adopt(cfg, by_name[r["model"]], r)
+                r["action"] = "adopted"
+    if args.reap:
+        targets = {str(r["pid"]): (r["pid"], stop_timeout(cfg, {})) for r in rows if r["class"] == "orphaned"}
+        done = stop_processes(targets) if targets else {}
+        for r in rows:
+            res = done.get(str(r["pid"]))
+            if res and res.get("error"):
+                r["reason"] += f"; reap failed: {res['error']}"
+            elif res:
+                r["action"] = "reaped"
+    if args.json:
+        print(to_json(rows))
+    else:
+        print(f"{'class':<12} {'pid':>7} {'model':<16} {'endpoint':<22} detail")
+        for r in rows:
+            detail = r.get("action") or r["reason"] or (r["model_path"] or "")
+            endpoint = f"{r['host']}:{r['port']}"
+            print(f"{r['class']:<12} {r['pid']:>7} {r['model'] or '-':<16} {endpoint:<22} {detail}")
+        if not rows:
+            print("no llama-server processes found")
+    # foreign processes (hand-run, or another config dir's) are reported but are not ours to fix
+    open_issues = [r for r in rows if r["class"] in ("adoptable", "conflicting", "orphaned") and not r.get("action")]
+    if open_issues:
+        print(f"warning: {len(open_issues)} unmanaged llama-server process(es); see --adopt/--reap", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _pid_alive(name: str) -> Optional[bool]:
+    """None without a PID record, else whether its process is running."""
+    try:
+        return process_alive(read_pid(name))
+    except Exception:
+        return None
+
+
+def _model_state(cfg: Dict[str, Any], probe: Dict[str, Any], pid_alive: Optional[bool], rec: Dict[str, Any]) -> str:
+    slow = cfg.get("degraded_latency_ms")
+    return health_state(
+        probe,
+        pid_alive,
+        started_at=rec.get("started_at") if pid_alive else None,
+        warmup=rec.get("warmup") if pid_alive else None,
+        ready_timeout=float(cfg.get("ready_timeout_s", DEFAULT_READY_TIMEOUT_S)),
+        slow_ms=int(slow) if slow else None,
+    )
+
+
+def _status_entry(cfg: Dict[str, Any], m: Dict[str, Any], procs, runtime: Dict[str, Dict[str, Any]], placements: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
     timeout_ms = int(cfg.get("timeout_ms", 2000))
-    procs = find_llama_processes()
+    name = m.get("name")
+    host = m.get("host", "127.0.0.1")
+    port = live_port(m, runtime)
+    pid = None
+    mode = "stopped"
+    try:
+        pid = read_pid(name, runtime)
+        mode = "direct" if process_alive(pid) else "stopped"
+    except Exception:
+        found = _match_process(m, procs())
+        if found:
+            pid = found.get("pid")
+            mode = "direct"
+    health = check_endpoint(host, port, timeout_ms=timeout_ms)
+    rec = runtime.get(name) or {}
+    pid_alive = (mode == "direct") if pid is not None else None
+    memory = _observe_memory(m, pid if mode == "direct" else None, rec)
+    log_path = rec.get("log_path") or str(Path(cfg.get("log_dir")).expanduser() / f"{name}.log")
+    return {
+        "name": name,
+        "pid": pid,
+        "host": host,
+        "port": port,
+        "public_port": m.get("public_port"),
+        "up": bool(health.get("up")),
+        "latency_ms": health.get("latency_ms"),
+        "http_status": health.get("http_status"),
+        "version": health.get("version"),
+        "mode": mode,
+        "state": _model_state(cfg, health, pid_alive, rec),
+        "health": health.get("health"),
+        "log_path": log_path,
+        "restarts": rec.get("restarts", 0),
+        "last_exit_code": rec.get("last_exit_code"),
+        "supervisor": rec.get("supervisor"),
+        "warmup": rec.get("warmup"),
+        "slot_cache": rec.get("slot_cache") if m.get("slot_cache") else None,
+        "placement": _placement_view(placements.get(name)),
+        "memory": memory,
+        "draft": _draft_view(m, log_path if mode == "direct" else None),
+    }
+
+
+def _draft_view(m: Dict[str, Any], log_path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Draft model and its acceptance since launch (from llama-server's slot timings)."""
+    if not m.get("draft_model"):
+        return None
+    try:
+        path = parse_draft(m["draft_model"])["path"]
+    except ValueError:
+        return None
+    return {"model_path": path, "acceptance": draft_acceptance(Path(log_path)) if log_path else None}
+
+
+def _observe_memory(m: Dict[str, Any], pid: Optional[int], rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Report estimate vs RSS for a running model and record new RSS peaks for calibration."""
+    if not pid:
+        return None
+    rss = process_rss(pid)
+    spec = ModelSpec.from_dict(m)
+    raw = estimate_model_memory(spec)["total"]
+    if rss and rss > int(rec.get("rss_bytes") or 0) * 1.05:
+        rec = update_runtime(spec.name, {"rss_bytes": rss, "estimate_bytes": raw})
+    return {"estimate": estimate_model_memory(spec, rec)["total"], "rss": rss}
+
+
+def _placement_view(pl: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not pl:
+        return None
+    return {"cpus": format_cpulist(pl["cpus"]), "threads": pl["threads"], "node": pl["node"]}
+
+
+def _gather_status(cfg: Dict[str, Any], names: Optional[List[str]] = None) -> list:
+    # Process discovery spawns `ps`; only run it when a model lacks a PID record
+    cache: Dict[str, Any] = {}
+
+    def procs() -> List[Dict[str, Any]]:
+        if "procs" not in cache:
+            cache["procs"] = find_llama_processes()
+        return cache["procs"]
+
+    runtime = read_runtime()
+    placements = placement_for_config(cfg)
     out = []
     for m in cfg.get("models", []):
-        name = m.get("name")
-        host = m.get("host", "127.0.0.1")
-        port = int(m.get("port"))
-        pid = None
-        mode = "stopped"
-        try:
-            pid = read_pid(name)
-            mode = "direct" if process_alive(pid) else "stopped"
-        except Exception:
-            # try to match discovered processes by model_path or --port
-            model_path = str(m.get("model_path", ""))
-            found = None
-            for p in procs:
-                argv = p.get("argv", [])
-                if model_path and model_path in argv:
-                    found = p
-                    break
-                if "--port" in argv:
-                    try:
-                        idx = argv.index("--port")
-                        if str(port) == argv[idx + 1]:
-                            found = p
-                            break
-                    except Exception:
-                        pass
-            if found:
-                pid = found.get("pid")
-                mode = "direct"
-        health = check_endpoint(host, port, timeout_ms=timeout_ms)
-        entry = {
-            "name": name,
-            "pid": pid,
-            "host": host,
-            "port": port,
-            "up": bool(health.get("up")),
-            "latency_ms": health.get("latency_ms"),
-            "http_status": health.get("http_status"),
-            "version": health.get("version"),
-            "mode": mode,
-            "log_path": str(Path(cfg.get("log_dir")).expanduser() / f"{name}.log"),
-        }
-        out.append(entry)
+        if names is not None and m.get("name") not in names:
+            continue
+        out.append(_status_entry(cfg, m, procs, runtime, placements))
+    _record_history(cfg, out)
     return out
 
 
+def _record_history(cfg: Dict[str, Any], entries: List[Dict[str, Any]]) -> None:
+    if not history.enabled(cfg):
+        return
+    try:
+        history.record(entries, cfg)
+    except Exception as e:
+        # history is a side channel; never fail a status or reconcile round over it
+        print(f"warning: status history not recorded: {e}", file=sys.stderr)
+
+
+# one CLI action at a time per agent: they share runtime.json and stdout
+_AGENT_LOCK = threading.Lock()
+
+STATUS_HEADERS = ["name", "mode", "state", "pid", "host", "port", "up", "latency_ms"]
+
+
+def _status_headers(rows: list) -> List[str]:
+    headers = list(STATUS_HEADERS)
+    if any(r.get("placement") for r in rows):
+        headers += ["cpus", "threads"]
+    if any(r.get("draft") for r in rows):
+        headers.append("draft_accept")
+    return headers
+
+
+def _cell(r: Dict[str, Any], h: str) -> Any:
+    if h in ("cpus", "threads"):
+        return (r.get("placement") or {}).get(h)
+    if h == "draft_accept":
+        acc = (r.get("draft") or {}).get("acceptance")
+        return f"{acc['rate'] * 100:.1f}%" if acc else None
+    return r.get(h)
+
+
+def _format_row(r: Dict[str, Any], headers: List[str] = STATUS_HEADERS) -> str:
+    return " ".join(f"{str(_cell(r, h)):>12}" for h in headers)
+
+
+def _format_header(headers: List[str] = STATUS_HEADERS) -> str:
+    return " ".join(f"{h:>12}" for h in headers)
+
+
 def _print_table(rows: list) -> None:
-    headers = ["name", "mode", "pid", "host", "port", "up", "latency_ms"]
-    print(" ".join(f"{h:>12}" for h in headers))
+    headers = _status_headers(rows)
+    print(_format_header(headers))
     for r in rows:
-        vals = [r.get("name"), r.get("mode"), r.get("pid"), r.get("host"), r.get("port"), r.get("up"), r.get("latency_ms")]
-        print(" ".join(f"{str(v):>12}" for v in vals))
+        print(_format_row(r, headers))
 
 
 def cmd_status(args: argparse.Namespace) -> int:
     cfg = load_config()
-    import time
-    while True:
+    if getattr(args, "follow", False):
+        return _follow_status(cfg, args)
+    if not args.watch:
         rows = _gather_status(cfg)
         if args.json:
             print(to_json(rows))
         else:
             _print_table(rows)
-        if not args.watch:
-            break
+        return 0
+    return _watch_status(cfg, args)
+
+
+def _agent_action(action: str, target: str) -> Dict[str, Any]:
+    """Run one CLI action for the agent, capturing what it prints."""
+    import io
+    from contextlib import redirect_stderr, redirect_stdout
+    out, err = io.StringIO(), io.StringIO()
+    with _AGENT_LOCK, redirect_stdout(out), redirect_stderr(err):
         try:
-            time.sleep(max(0.2, float(args.interval)))
-        except KeyboardInterrupt:
-            break
+            rc = main([action, target])
+        except SystemExit as e:
+            rc = e.code if isinstance(e.code, int) else 2
+            if not isinstance(e.code, int):
+                print(f"error: {e.code}", file=sys.stderr)
+    return {"rc": rc, "output": out.getvalue(), "errors": err.getvalue()}
+
+
+def cmd_agent(args: argparse.Namespace) -> int:
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.allow_remote:
+        print(f"error: refusing to bind non-local host '{args.host}' without --allow-remote", file=sys.stderr)
+        return 2
+    load_config()
+    token = agent.load_token(create=True)
+    try:
+        srv = agent.serve((args.host, args.port), token, lambda: _gather_status(load_config()), _agent_action)
+    except OSError as e:
+        print(f"error: cannot listen: {e}", file=sys.stderr)
+        return 2
+    where = f"${agent.TOKEN_ENV}" if os.environ.get(agent.TOKEN_ENV) else str(agent.token_path())
+    print(f"agent {args.host}:{srv.server_address[1]} (token: {where})", flush=True)
+    import time
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.shutdown()
+        srv.server_close()
+    return 0
+
+
+def cmd_fleet(args: argparse.Namespace) -> int:
+    cfg = load_config()
+    try:
+        agents = fleet.parse_agents(cfg.get("agents"))
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if not agents:
+        print("error: no agents configured; add an 'agents' list (name, url, token) to config.yaml", file=sys.stderr)
+        return 2
+    f = fleet.Fleet(agents)
+    try:
+        if args.subcommand == "status":
+            result = f.status(timeout=args.timeout)
+            if args.json:
+                print(to_json(result))
+            else:
+                headers = ["agent"] + _status_headers(result["models"])
+                print(_format_header(headers))
+                for r in result["models"]:
+                    print(_format_row(r, headers))
+            down = [a for a in result["agents"] if not a["ok"]]
+            for a in down:
+                print(f"warning: agent {a['agent']}: {a['error']}", file=sys.stderr)
+            return 1 if down else 0
+        try:
+            results = f.act(args.subcommand, args.agent, args.target, timeout=args.timeout)
+        except KeyError as e:
+            print(f"error: {e.args[0]}", file=sys.stderr)
+            return 2
+    finally:
+        f.close()
+    if args.json:
+        print(to_json(results))
+    else:
+        for r in results:
+            if r.get("error"):
+                print(f"[{r['agent']}] error: {r['error']}", file=sys.stderr)
+                continue
+            for line in r["output"].splitlines():
+                print(f"[{r['agent']}] {line}")
+            for line in r["errors"].splitlines():
+                print(f"[{r['agent']}] {line}", file=sys.stderr)
+    rcs = [r["rc"] if r.get("rc") is not None else 2 for r in results]
+    return max(rcs, default=0)
+
+
+def _follow_view(entry: Dict[str, Any], latency_ms: float, memory_ratio: float) -> Dict[str, Any]:
+    """The fields whose change is worth an event; metrics only as threshold crossings."""
+    mem = entry.get("memory") or {}
+    rss, est = mem.get("rss"), mem.get("estimate")
+    latency = entry.get("latency_ms")
+    return {
+        "mode": entry.get("mode"),
+        "pid": entry.get("pid"),
+        "up": entry.get("up"),
+        "state": entry.get("state"),
+        "port": entry.get("port"),
+        "slow": bool(entry.get("up") and latency is not None and latency > latency_ms),
+        "over_memory": bool(rss and est and rss > est * memory_ratio),
+    }
+
+
+def _follow_status(cfg: Dict[str, Any], args: argparse.Namespace) -> int:
+    """NDJSON stream: one snapshot, then change events per model, heartbeats in between."""
+    import json
+    import time
+    names = [m.get("name") for m in cfg.get("models", [])]
+    min_interval = max(0.2, float(args.interval))
+    scheduler = ProbeScheduler(names, min_interval=min_interval, max_interval=max(min_interval, float(args.max_interval)))
+    watcher = FileWatcher([pid_dir(), Path(cfg.get("log_dir")).expanduser()], names, shared=RuntimeChanges(read_runtime))
+    views: Dict[str, Dict[str, Any]] = {}
+    heartbeat = max(1.0, float(args.heartbeat))
+
+    def emit(event: Dict[str, Any]) -> None:
+        print(json.dumps({"event": event.pop("event"), "ts": round(time.time(), 3), **event}, ensure_ascii=False, separators=(",", ":")), flush=True)
+
+    last_emit = time.monotonic()
+    try:
+        snapshot = _gather_status(cfg)
+        for entry in snapshot:
+            views[entry["name"]] = _follow_view(entry, args.latency_threshold, args.memory_threshold)
+            scheduler.record(entry["name"], entry, time.monotonic())
+        emit({"event": "snapshot", "models": snapshot})
+        while True:
+            due = scheduler.due(time.monotonic())
+            if due:
+                for entry in _gather_status(cfg, names=due):
+                    name = entry["name"]
+                    scheduler.record(name, entry, time.monotonic())
+                    view = _follow_view(entry, args.latency_threshold, args.memory_threshold)
+                    old = views.get(name, {})
+                    changes = {k: {"from": old.get(k), "to": v} for k, v in view.items() if old.get(k) != v}
+                    views[name] = view
+                    if changes:
+                        emit({"event": "change", "name": name, "changes": changes, "model": entry})
+                        last_emit = time.monotonic()
+            now = time.monotonic()
+            if now - last_emit >= heartbeat:
+                emit({"event": "heartbeat"})
+                last_emit = now
+            timeout = min(scheduler.next_deadline(), last_emit + heartbeat) - time.monotonic()
+            scheduler.poke(watcher.wait(timeout))
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+
+def _watch_status(cfg: Dict[str, Any], args: argparse.Namespace) -> int:
+    import time
+    names = [m.get("name") for m in cfg.get("models", [])]
+    min_interval = max(0.2, float(args.interval))
+    scheduler = ProbeScheduler(names, min_interval=min_interval, max_interval=max(min_interval, float(args.max_interval)))
+    watcher = FileWatcher([pid_dir(), Path(cfg.get("log_dir")).expanduser()], names, shared=RuntimeChanges(read_runtime))
+    renderer = TableRenderer(sys.stdout)
+    rows: Dict[str, Dict[str, Any]] = {}
+    last_json = None
+    try:
+        while True:
+            due = scheduler.due(time.monotonic())
+            if due:
+                for entry in _gather_status(cfg, names=due):
+                    rows[entry["name"]] = entry
+                    scheduler.record(entry["name"], entry, time.monotonic())
+                ordered = [rows[n] for n in names if n in rows]
+                if args.json:
+                    text = to_json(ordered)
+                    if text != last_json:
+                        print(text, flush=True)
+                        last_json = text
+                else:
+                    headers = _status_headers(ordered)
+                    renderer.render(_format_header(headers), [_format_row(r, headers) for r in ordered])
+            timeout = scheduler.next_deadline() - time.monotonic()
+            scheduler.poke(watcher.wait(timeout))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
     return 0
 
 
@@ -469,15 +1895,7 @@ def cmd_launchd(args: argparse.Namespace) -> int:
     log_dir = Path(cfg.get("log_dir")).expanduser()
     if args.subcommand == "install":
         for m in selected:
-            spec = ModelSpec(
-                name=m["name"],
-                model_path=m["model_path"],
-                host=m.get("host", "127.0.0.1"),
-                port=int(m["port"]),
-                args=list(m.get("args", []) or []),
-                env=dict(m.get("env", {}) or {}),
-                autostart=bool(m.get("autostart", False)),
-            )
+            spec = ModelSpec.from_dict(m)
             data = render_plist(llama_path, spec, log_dir=log_dir)
             p = plist_path(spec.name)
             write_plist(p, data)
@@ -510,30 +1928,74 @@ def cmd_launchd(args: argparse.Namespace) -> int:
     return 2
 
 
-def cmd_ensure_running(args: argparse.Namespace) -> int:
-    cfg = load_config()
+class _StartLimiter:
+    """Allow at most ``limit`` starts per model within a sliding ``window`` of seconds."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = max(1, int(limit))
+        self.window = float(window)
+        self._starts: Dict[str, List[float]] = {}
+
+    def allow(self, name: str, now: float) -> bool:
+        recent = [t for t in self._starts.get(name, []) if now - t < self.window]
+        self._starts[name] = recent
+        return len(recent) < self.limit
+
+    def retry_in(self, name: str, now: float) -> float:
+        recent = self._starts.get(name) or [now]
+        return max(0.0, recent[0] + self.window - now)
+
+    def record(self, name: str, now: float) -> None:
+        self._starts.setdefault(name, []).append(now)
+
+
+def _ensure_pass(cfg: Dict[str, Any], args: argparse.Namespace, limiter: Optional[_StartLimiter] = None) -> Tuple[int, int, List[Dict[str, Any]]]:
+    """Probe every autostart model concurrently, then start the stopped ones.
+
+    Returns (started, queued, started models).
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
     llama_path = cfg.get("llama_server_path")
     log_dir = Path(cfg.get("log_dir")).expanduser()
     timeout_ms = int(cfg.get("timeout_ms", 2000))
+    runtime = read_runtime() if args.mode != "launchd" else {}
+    models = [m for m in cfg.get("models", []) if bool(m.get("autostart", False))]
+    if not models:
+        return 0, 0, []
+    with ThreadPoolExecutor(max_workers=min(32, len(models))) as ex:
+        probes = list(ex.map(lambda m: check_endpoint(m.get("host", "127.0.0.1"), live_port(m, runtime), timeout_ms=timeout_ms), models))
     started = 0
-    for m in cfg.get("models", []):
-        if not bool(m.get("autostart", False)):
-            continue
+    queued = 0
+    fresh: List[Dict[str, Any]] = []
+    observed = []
+    launch: List[Tuple[Dict[str, Any], ModelSpec, float]] = []
+    for m, health in zip(models, probes):
         name = m.get("name")
-        host = m.get("host", "127.0.0.1")
-        port = int(m.get("port"))
-        health = check_endpoint(host, port, timeout_ms=timeout_ms)
-        if health.get("up"):
+        state = _model_state(cfg, health, _pid_alive(name) if args.mode != "launchd" else None, runtime.get(name) or {})
+        observed.append({"name": name, **health, "state": state})
+        if state == "unhealthy":
+            print(f"warning: {name} is unhealthy; not starting a duplicate (use restart)", file=sys.stderr)
+            continue
+        if state != "stopped":
+            # starting/loading instances are left alone rather than launched twice
+            continue
+        now = time.monotonic()
+        if limiter is not None and not limiter.allow(name, now):
+            print(f"warning: {name} started {limiter.limit} times in {limiter.window:g}s; next attempt in {limiter.retry_in(name, now):.0f}s", file=sys.stderr)
+            continue
+        spec = launch_spec(cfg, m)
+        if port_in_use(spec.host, spec.port):
+            print(f"warning: port {spec.port} on {spec.host} is in use by something else; not starting {name}", file=sys.stderr)
+            continue
+        launch.append((m, spec, now))
+    # pinned files of everything about to start are hashed together
+    ok = {m["name"] for m in _verify_before_start(cfg, [m for m, _, _ in launch])}
+    for m, spec, now in launch:
+        name = m["name"]
+        host, port = m.get("host", "127.0.0.1"), live_port(m, runtime)
+        if name not in ok:
             continue
-        spec = ModelSpec(
-            name=name,
-            model_path=m["model_path"],
-            host=host,
-            port=port,
-            args=list(m.get("args", []) or []),
-            env=dict(m.get("env", {}) or {}),
-            autostart=True,
-        )
         if args.mode == "launchd":
             data = render_plist(llama_path, spec, log_dir=log_dir)
             p = plist_path(spec.name)
@@ -544,15 +2006,69 @@ def cmd_ensure_running(args: argparse.Namespace) -> int:
                 continue
             _ = launchctl_kickstart(spec.name)
             print(f"launchd started {spec.name} on {host}:{port}")
-            started += 1
         else:
+            a = _admission(cfg, spec)
+            if not a["ok"]:
+                # left for a later run once memory frees up
+                print(f"queued {spec.name}: over memory {' and '.join(a['reasons'])}: {_memory_report(spec, a)}", file=sys.stderr)
+                queued += 1
+                continue
             pid = start_process(llama_path, spec, log_dir)
-            write_pid(spec.name, pid)
+            record_launch(llama_path, spec, pid, log_dir=log_dir)
             print(f"started {spec.name} pid={pid} port={spec.port}")
-            started += 1
-    print(f"ensure-running: started {started} model(s)")
+            fresh.append(m)
+        started += 1
+        if limiter is not None:
+            limiter.record(name, now)
+    if limiter is not None:
+        # the loop is the long-running observer; one-shot runs leave history to status
+        _record_history(cfg, observed)
+    return started, queued, fresh
+
+
+def _ensure_loop(args: argparse.Namespace) -> int:
+    import threading
+    import time
+    limiter = _StartLimiter(args.max_starts, args.start_window)
+    print(f"ensure-running: reconciling every {args.interval:g}s (pid {os.getpid()})", flush=True)
+    try:
+        while True:
+            try:
+                cfg = load_config()
+            except Exception as e:
+                print(f"error: config not loaded: {e}", file=sys.stderr, flush=True)
+            else:
+                try:
+                    started, queued, fresh = _ensure_pass(cfg, args, limiter)
+                except Exception as e:
+                    # one bad round (a failed launch, an unreadable runtime.json) must not end the reconciler
+                    print(f"error: ensure-running round failed: {e}", file=sys.stderr, flush=True)
+                    started, queued, fresh = 0, 0, []
+                if started or queued:
+                    print(f"ensure-running: started {started} model(s)" + (f", {queued} queued for memory" if queued else ""), flush=True)
+                if fresh:
+                    # warm-ups wait for loading; do not hold up the next probe round
+                    threading.Thread(target=_warm_up_all, args=(cfg, fresh, args), daemon=True).start()
+            time.sleep(max(1.0, float(args.interval)))
+    except KeyboardInterrupt:
+        pass
     return 0
 
 
+def cmd_ensure_running(args: argparse.Namespace) -> int:
+    # One reconciler per config dir: cron runs that overlap a loop (or each other) exit at once
+    with instance_lock("ensure-running") as holder:
+        if holder is not None:
+            print(f"ensure-running: another reconciler is active{f' (pid {holder})' if holder else ''}; exiting")
+            return 0
+        if getattr(args, "loop", False):
+            return _ensure_loop(args)
+        cfg = load_config()
+        started, queued, fresh = _ensure_pass(cfg, args)
+        print(f"ensure-running: started {started} model(s)" + (f", {queued} queued for memory" if queued else ""))
+        _warm_up_all(cfg, fresh, args)
+        return 0
+
+
 if __name__ == "__main__":  # pragma: no cover
     sys.exit(main())
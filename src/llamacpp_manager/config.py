@@ -1,12 +1,36 @@
 import os
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
+from .draft import parse_draft, vocab_mismatch
+from .fanout import parse_embeddings
+from .fleet import parse_agents
+from .integrity import parse_digest
+from .qos import parse_qos
+from .slots import parse_slot_cache
+from .topology import parse_ionice
+from .trace import parse_trace
+from .warmup import parse_warmup
 from .utils import app_support_dir, config_path, logs_dir, ensure_dir, read_yaml, write_yaml
 
 
 DEFAULT_LLAMA_SERVER_PATH = "/opt/homebrew/bin/llama-server"
+DEFAULT_STOP_TIMEOUT_S = 5.0
+DEFAULT_READY_TIMEOUT_S = 600.0
+
+# Optional per-model settings; omitted from YAML when unset
+OPTIONAL_FIELDS = ("stop_timeout", "cpu_weight", "nice", "ionice", "public_port", "warmup", "draft_model", "slot_cache", "digest")
+# Computed at launch time; never written to YAML
+RUNTIME_FIELDS = ("placement",)
+# Top-level config.yaml keys besides ``models``
+SETTINGS = (
+    "llama_server_path", "log_dir", "timeout_ms", "stop_timeout_s", "ready_timeout_s", "degraded_latency_ms",
+    "memory_budget_mb", "memory_budget_fraction", "cpu_placement", "verify_on_start", "history",
+    "qos", "trace", "embeddings", "agents",
+)
+_SETTING_PARSERS = {"qos": parse_qos, "trace": parse_trace, "embeddings": parse_embeddings, "agents": parse_agents}
+_HISTORY_KEYS = ("raw_days", "minute_days", "hour_days", "enabled")
 
 
 @dataclass
@@ -18,6 +42,37 @@ class ModelSpec:
     args: Optional[List[str]] = None
     env: Optional[Dict[str, str]] = None
     autostart: bool = False
+    stop_timeout: Optional[float] = None
+    cpu_weight: Optional[float] = None
+    nice: Optional[int] = None
+    ionice: Optional[str] = None
+    public_port: Optional[int] = None
+    warmup: Optional[Dict[str, Any]] = None
+    draft_model: Optional[Union[str, Dict[str, Any]]] = None
+    slot_cache: Optional[Union[bool, Dict[str, Any]]] = None
+    digest: Optional[str] = None
+    placement: Optional[Dict[str, Any]] = field(default=None, compare=False)
+
+    @classmethod
+    def from_dict(cls, m: Dict[str, Any]) -> "ModelSpec":
+        return cls(
+            name=m["name"],
+            model_path=m["model_path"],
+            host=m.get("host", "127.0.0.1"),
+            port=int(m["port"]),
+            args=list(m.get("args", []) or []),
+            env=dict(m.get("env", {}) or {}),
+            autostart=bool(m.get("autostart", False)),
+            stop_timeout=_opt_float(m.get("stop_timeout")),
+            cpu_weight=_opt_float(m.get("cpu_weight")),
+            nice=None if m.get("nice") is None else int(m["nice"]),
+            ionice=m.get("ionice"),
+            public_port=None if m.get("public_port") is None else int(m["public_port"]),
+            warmup=m.get("warmup"),
+            draft_model=m.get("draft_model"),
+            slot_cache=m.get("slot_cache"),
+            digest=m.get("digest"),
+        )
 
     def to_dict(self) -> Dict[str, Any]:
         d = asdict(self)
@@ -26,9 +81,26 @@ class ModelSpec:
             d["args"] = []
         if d.get("env") is None:
             d["env"] = {}
+        for k in OPTIONAL_FIELDS:
+            if d.get(k) is None:
+                d.pop(k, None)
+        for k in RUNTIME_FIELDS:
+            d.pop(k, None)
         return d
 
 
+def _opt_float(v: Any) -> Optional[float]:
+    return None if v is None else float(v)
+
+
+def stop_timeout(cfg: Dict[str, Any], m: Dict[str, Any]) -> float:
+    """Grace period before SIGKILL: per-model ``stop_timeout``, else global ``stop_timeout_s``."""
+    v = m.get("stop_timeout")
+    if v is None:
+        v = cfg.get("stop_timeout_s", DEFAULT_STOP_TIMEOUT_S)
+    return float(v)
+
+
 def default_config() -> Dict[str, Any]:
     return {
         "llama_server_path": DEFAULT_LLAMA_SERVER_PATH,
@@ -68,6 +140,24 @@ def validate_port_unique(cfg: Dict[str, Any], port: int, *, ignore_name: Optiona
 
 
 def validate_model(cfg: Dict[str, Any], model: ModelSpec, *, updating: bool = False) -> List[str]:
+    errors = model_errors(model)
+    if model.public_port is not None:
+        # Models may share a public_port (replicas), but it must not be anyone's backend port
+        clash = [m.get("name") for m in cfg.get("models", []) if int(m.get("port") or 0) == model.public_port]
+        if model.public_port == model.port or clash:
+            errors.append(f"public_port {model.public_port} is a backend port of model '{clash[0] if clash else model.name}'")
+    fronted = [m.get("name") for m in cfg.get("models", []) if m.get("public_port") is not None and int(m["public_port"]) == int(model.port)]
+    if fronted:
+        errors.append(f"port {model.port} is the public_port of model '{fronted[0]}'")
+    # Unique port check
+    conflict = validate_port_unique(cfg, model.port, ignore_name=model.name if updating else None)
+    if conflict:
+        errors.append(f"port {model.port} already used by model '{conflict}'")
+    return errors
+
+
+def model_errors(model: ModelSpec) -> List[str]:
+    """Checks of one model on its own; see validate_model and uniqueness_errors for the ones across models."""
     errors: List[str] = []
     if not model.name:
         errors.append("name is required")
@@ -79,13 +169,191 @@ def validate_model(cfg: Dict[str, Any], model: ModelSpec, *, updating: bool = Fa
             errors.append(f"model_path not found: {p}")
     if not (1 <= int(model.port) <= 65535):
         errors.append("port must be in 1..65535")
-    # Unique port check
-    conflict = validate_port_unique(cfg, model.port, ignore_name=model.name if updating else None)
-    if conflict:
-        errors.append(f"port {model.port} already used by model '{conflict}'")
+    if model.stop_timeout is not None and model.stop_timeout <= 0:
+        errors.append("stop_timeout must be positive")
+    if model.cpu_weight is not None and model.cpu_weight < 0:
+        errors.append("cpu_weight must be >= 0")
+    if model.nice is not None and not (-20 <= model.nice <= 19):
+        errors.append("nice must be in -20..19")
+    if model.ionice:
+        try:
+            parse_ionice(model.ionice)
+        except ValueError as e:
+            errors.append(str(e))
+    if model.warmup is not None:
+        try:
+            parse_warmup(model.warmup)
+        except ValueError as e:
+            errors.append(str(e))
+    if model.draft_model is not None:
+        errors.extend(_draft_errors(model))
+    if model.slot_cache is not None:
+        try:
+            parse_slot_cache(model.slot_cache)
+        except ValueError as e:
+            errors.append(str(e))
+        if "--slot-save-path" in (model.args or []):
+            errors.append("slot save path given both as slot_cache and in args")
+    if model.public_port is not None and not (1 <= model.public_port <= 65535):
+        errors.append("public_port must be in 1..65535")
+    if model.digest is not None:
+        try:
+            parse_digest(model.digest)
+        except ValueError as e:
+            errors.append(str(e))
     return errors
 
 
+def uniqueness_errors(models: List[Dict[str, Any]]) -> List[str]:
+    """Name and port clashes across a whole model list, from one pass that indexes names and ports."""
+    names: Dict[str, int] = {}
+    ports: Dict[int, List[str]] = {}
+    public: Dict[int, List[str]] = {}
+    for m in models:
+        names[m.get("name")] = names.get(m.get("name"), 0) + 1
+        try:
+            ports.setdefault(int(m.get("port")), []).append(m.get("name"))
+            if m.get("public_port") is not None:
+                public.setdefault(int(m["public_port"]), []).append(m.get("name"))
+        except (TypeError, ValueError):
+            continue
+    errors = [f"model name '{n}' is used {c} times" for n, c in names.items() if c > 1]
+    errors += [f"port {p} used by models {', '.join(repr(n) for n in ns)}" for p, ns in ports.items() if len(ns) > 1]
+    # Models may share a public_port (replicas), but it must not be anyone's backend port
+    errors += [
+        f"public_port {p} of {', '.join(repr(n) for n in ns)} is a backend port of model '{ports[p][0]}'"
+        for p, ns in public.items() if p in ports
+    ]
+    return errors
+
+
+def _normalized(m: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return ModelSpec.from_dict(m).to_dict()
+    except (KeyError, TypeError, ValueError):
+        return dict(m)
+
+
+def settings_errors(cfg: Dict[str, Any]) -> List[str]:
+    """Problems with the top-level settings in ``cfg``, checked with the parsers the consumers use."""
+    errors: List[str] = []
+    for key, parse in _SETTING_PARSERS.items():
+        if key in cfg:
+            try:
+                parse(cfg[key])
+            except (TypeError, ValueError) as e:
+                errors.append(str(e) if str(e).startswith(key) else f"{key}: {e}")
+    for key in ("llama_server_path", "log_dir"):
+        if key in cfg and (not isinstance(cfg[key], str) or not cfg[key]):
+            errors.append(f"{key} must be a non-empty path")
+    for key in ("timeout_ms", "stop_timeout_s", "ready_timeout_s", "degraded_latency_ms", "memory_budget_mb"):
+        v = cfg.get(key)
+        if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float)) or v <= 0):
+            errors.append(f"{key} must be a positive number")
+    v = cfg.get("memory_budget_fraction")
+    if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float)) or not 0 < v <= 1):
+        errors.append("memory_budget_fraction must be in (0, 1]")
+    for key in ("cpu_placement", "verify_on_start"):
+        if key in cfg and not isinstance(cfg[key], bool):
+            errors.append(f"{key} must be true or false")
+    history = cfg.get("history")
+    if history is not None:
+        if not isinstance(history, dict):
+            errors.append("history must be a mapping of " + ", ".join(_HISTORY_KEYS))
+        else:
+            for k, v in history.items():
+                if k not in _HISTORY_KEYS:
+                    errors.append(f"history: unknown key '{k}'")
+                elif k == "enabled" and not isinstance(v, bool):
+                    errors.append("history.enabled must be true or false")
+                elif k != "enabled" and v is not None and (isinstance(v, bool) or not isinstance(v, (int, float)) or v < 0):
+                    errors.append(f"history.{k} must be a number of days")
+    return errors
+
+
+def plan_manifest(cfg: Dict[str, Any], manifest: Dict[str, Any], *, prune: bool = False) -> Dict[str, Any]:
+    """Diff a declarative manifest (config.yaml's shape) against ``cfg``.
+
+    Each manifest model is the model's whole desired entry: fields it
+    leaves out return to their defaults. Models missing from the manifest
+    are kept unless ``prune``. Only added and changed models get the
+    per-model checks (file existence, GGUF reads); name and port clashes
+    are checked across the resulting list at once. Top-level settings must
+    be known keys, and the merged settings must parse. Returns ``{add, update
+    (name -> changed fields), remove, unchanged, settings, errors, config}``
+    where ``config`` is the config to write when ``errors`` is empty.
+    """
+    errors: List[str] = []
+    desired: Dict[str, ModelSpec] = {}
+    models = manifest.get("models") or []
+    if not isinstance(models, list):
+        return {"add": [], "update": {}, "remove": [], "unchanged": [], "settings": [], "errors": ["models must be a list"], "config": cfg}
+    for i, m in enumerate(models):
+        if not isinstance(m, dict) or not m.get("name"):
+            errors.append(f"models[{i}]: name is required")
+            continue
+        if m["name"] in desired:
+            errors.append(f"models[{i}]: duplicate name '{m['name']}'")
+            continue
+        try:
+            desired[m["name"]] = ModelSpec.from_dict(m)
+        except KeyError as e:
+            errors.append(f"{m['name']}: {e.args[0]} is required")
+        except (TypeError, ValueError) as e:
+            errors.append(f"{m['name']}: {e}")
+    plan: Dict[str, Any] = {"add": [], "update": {}, "remove": [], "unchanged": [], "settings": []}
+    out: List[Dict[str, Any]] = []
+    current = {m.get("name"): m for m in cfg.get("models", [])}
+    for name, m in current.items():
+        if name not in desired:
+            if prune:
+                plan["remove"].append(name)
+            else:
+                out.append(m)
+            continue
+        new, old = desired[name].to_dict(), _normalized(m)
+        changed = sorted(k for k in set(new) | set(old) if new.get(k) != old.get(k))
+        if changed:
+            plan["update"][name] = changed
+            out.append(new)
+        else:
+            plan["unchanged"].append(name)
+            out.append(m)
+    for name, spec in desired.items():
+        if name not in current:
+            plan["add"].append(name)
+            out.append(spec.to_dict())
+    for name in plan["add"] + list(plan["update"]):
+        errors.extend(f"{name}: {e}" for e in model_errors(desired[name]))
+    errors.extend(uniqueness_errors(out))
+    settings = {k: v for k, v in manifest.items() if k != "models"}
+    errors.extend(f"unknown setting '{k}'" for k in settings if k not in SETTINGS)
+    merged = {**cfg, **settings, "models": out}
+    # the merged result is what every later command will parse, so check all of it
+    errors.extend(settings_errors(merged))
+    plan["settings"] = sorted(k for k, v in settings.items() if cfg.get(k) != v)
+    plan["errors"] = errors
+    plan["config"] = merged
+    return plan
+
+
+def _draft_errors(model: ModelSpec) -> List[str]:
+    try:
+        draft = parse_draft(model.draft_model)
+    except ValueError as e:
+        return [str(e)]
+    if set(model.args or []) & {"-md", "--model-draft"}:
+        return ["draft model given both as draft_model and in args"]
+    p = Path(os.path.expanduser(draft["path"]))
+    if not p.exists():
+        return [f"draft_model not found: {p}"]
+    if model.model_path and Path(os.path.expanduser(model.model_path)).exists():
+        why = vocab_mismatch(model.model_path, str(p))
+        if why:
+            return [f"draft_model is not compatible with {model.name}: {why}"]
+    return []
+
+
 def list_models(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
     return list(cfg.get("models", []))
 
@@ -111,15 +379,8 @@ def update_model(cfg: Dict[str, Any], name: str, updates: Dict[str, Any]) -> Non
     if not m:
         raise ValueError(f"model '{name}' not found")
     merged = {**m, **{k: v for k, v in updates.items() if v is not None}}
-    spec = ModelSpec(
-        name=merged.get("name", name),
-        model_path=merged["model_path"],
-        host=merged.get("host", "127.0.0.1"),
-        port=int(merged["port"]),
-        args=list(merged.get("args", []) or []),
-        env=dict(merged.get("env", {}) or {}),
-        autostart=bool(merged.get("autostart", False)),
-    )
+    merged.setdefault("name", name)
+    spec = ModelSpec.from_dict(merged)
     errs = validate_model(cfg, spec, updating=True)
     if errs:
         raise ValueError("; ".join(errs))
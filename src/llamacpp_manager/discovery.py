@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import os
+import re
 import shlex
 import subprocess
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
 def _ps_output() -> str:
@@ -16,6 +18,20 @@ def _ps_output() -> str:
         return ""
 
 
+SERVER_NAME = "llama-server"
+# a llama-server script run through its interpreter shows up as e.g. "python3 /path/llama-server ..."
+_INTERPRETER = re.compile(r"^(python[\d.]*|(ba|z|da)?sh)$")
+
+
+def is_llama_server(argv: List[str]) -> bool:
+    """Whether argv runs a program named llama-server (by basename, not substring)."""
+    if not argv:
+        return False
+    if os.path.basename(argv[0]) == SERVER_NAME:
+        return True
+    return len(argv) > 1 and bool(_INTERPRETER.match(os.path.basename(argv[0]))) and os.path.basename(argv[1]) == SERVER_NAME
+
+
 def find_llama_processes() -> List[Dict[str, Any]]:
     """Parse process table to find llama-server processes.
 
@@ -39,6 +55,165 @@ def find_llama_processes() -> List[Dict[str, Any]]:
             argv = shlex.split(rest)
         except Exception:
             argv = rest.split()
+        if not is_llama_server(argv):
+            continue
         out.append({"pid": pid, "argv": argv})
     return out
 
+
+
+# llama-server's own defaults when --host/--port are not given
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+_LOOPBACK = {"localhost": "127.0.0.1", "::1": "127.0.0.1"}
+_WILDCARD = ("0.0.0.0", "::")
+
+CLASSES = ("managed", "adoptable", "conflicting", "orphaned", "foreign")
+# argv values naming model weights; those may live anywhere and say nothing about ownership
+_WEIGHTS = ("-m", "--model", "-md", "--model-draft")
+
+
+def _opt(argv: List[str], *names: str) -> Optional[str]:
+    for i, a in enumerate(argv):
+        for n in names:
+            if a == n and i + 1 < len(argv):
+                return argv[i + 1]
+            if a.startswith(n + "="):
+                return a[len(n) + 1:]
+    return None
+
+
+def canonical_path(path: str, pid: Optional[int] = None) -> str:
+    """Absolute, symlink-free form of a model path; relative paths resolve against the process cwd."""
+    p = os.path.expanduser(path)
+    if not os.path.isabs(p) and pid is not None:
+        try:
+            p = os.path.join(os.readlink(f"/proc/{pid}/cwd"), p)
+        except OSError:
+            pass
+    return os.path.realpath(p)
+
+
+def server_args(argv: List[str], pid: Optional[int] = None) -> Dict[str, Any]:
+    """``{host, port, model_path}`` a llama-server argv listens on and serves."""
+    model = _opt(argv, "-m", "--model")
+    host = _opt(argv, "--host") or DEFAULT_HOST
+    port = _opt(argv, "--port")
+    try:
+        port_n = int(port) if port is not None else DEFAULT_PORT
+    except ValueError:
+        port_n = None
+    return {
+        "host": _LOOPBACK.get(host, host),
+        "port": port_n,
+        "model_path": canonical_path(model, pid) if model else None,
+    }
+
+
+def ownership(pid: int, argv: List[str], roots: Iterable[str]) -> Optional[str]:
+    """Evidence that a process was started from this config, or None.
+
+    Either an argv path (such as ``--slot-save-path``) lies under one of
+    ``roots`` (the config, log and pid dirs), or its stdout is a log file
+    under them (Linux, via /proc).
+    """
+    dirs = [os.path.realpath(os.path.expanduser(str(r))) for r in roots]
+
+    def under(path: str) -> bool:
+        rp = os.path.realpath(path)
+        return any(rp == d or rp.startswith(d + os.sep) for d in dirs)
+
+    for i, a in enumerate(argv[1:], start=1):
+        if argv[i - 1] in _WEIGHTS:
+            continue
+        v = a.split("=", 1)[1] if a.startswith("-") and "=" in a else a
+        v = os.path.expanduser(v)
+        if os.path.isabs(v) and under(v):
+            return f"argv names {v}"
+    try:
+        out = os.readlink(f"/proc/{pid}/fd/1")
+    except OSError:
+        return None
+    return f"logs to {out}" if os.path.isabs(out) and under(out) else None
+
+
+class ModelIndex:
+    """Configured models indexed by (host, port) and by canonical model path."""
+
+    def __init__(self, models: Iterable[Dict[str, Any]], ports: Optional[Dict[str, Iterable[int]]] = None):
+        self.by_port: Dict[int, List[Tuple[str, str]]] = {}
+        self.by_path: Dict[str, List[str]] = {}
+        self.path_of: Dict[str, str] = {}
+        for m in models:
+            name = m["name"]
+            host = m.get("host", DEFAULT_HOST)
+            host = _LOOPBACK.get(host, host)
+            for port in set((ports or {}).get(name, ())) | {int(m["port"])}:
+                self.by_port.setdefault(int(port), []).append((host, name))
+            if m.get("model_path"):
+                path = canonical_path(str(m["model_path"]))
+                self.path_of[name] = path
+                self.by_path.setdefault(path, []).append(name)
+
+    def at(self, host: str, port: Optional[int]) -> Optional[str]:
+        """Model configured to listen on ``host:port`` (wildcard binds overlap any host)."""
+        for h, name in self.by_port.get(port, ()) if port is not None else ():
+            if h == host or h in _WILDCARD or host in _WILDCARD:
+                return name
+        return None
+
+
+def reconcile(
+    models: List[Dict[str, Any]],
+    procs: List[Dict[str, Any]],
+    owners: Dict[int, str],
+    ports: Optional[Dict[str, Iterable[int]]] = None,
+    roots: Iterable[str] = (),
+) -> List[Dict[str, Any]]:
+    """Classify each discovered llama-server against the config in one pass.
+
+    ``owners`` maps live recorded PIDs to model names; ``ports`` adds
+    per-model ports beyond the configured one (e.g. a rolling restart's
+    live port). Each process is
+
+    - ``managed``: its PID is the one recorded for a model;
+    - ``adoptable``: serves a configured model on that model's host:port,
+      and the model has no live recorded PID;
+    - ``conflicting``: holds a configured model's host:port but serves other
+      weights, or duplicates a model that is already managed;
+    - ``orphaned``: matches no configured model's host:port, but was
+      started from this config (see ``ownership`` over ``roots``);
+    - ``foreign``: matches no configured model and shows no sign of being
+      ours: run by hand, or by another config dir.
+    """
+    index = ModelIndex(models, ports)
+    roots = list(roots)
+    # a model can be claimed by one process only
+    claimed = set(owners.values())
+    out = []
+    for p in procs:
+        pid = int(p["pid"])
+        argv = p.get("argv", [])
+        info = server_args(argv, pid)
+        row = {"pid": pid, **info, "argv": argv, "class": None, "model": None, "reason": ""}
+        name = index.at(info["host"], info["port"])
+        if pid in owners:
+            row.update({"class": "managed", "model": owners[pid]})
+        elif name is None:
+            same = index.by_path.get(info["model_path"] or "", [])
+            why = f"serves the weights of {', '.join(same)} on another port" if same else "matches no configured model"
+            evidence = ownership(pid, argv, roots) if roots else None
+            if evidence:
+                row.update({"class": "orphaned", "reason": f"{why}; {evidence}"})
+            else:
+                row.update({"class": "foreign", "reason": f"{why}; not started from this config"})
+        elif info["model_path"] != index.path_of.get(name):
+            row.update({"class": "conflicting", "model": name, "reason": f"holds {name}'s port with a different model"})
+        elif name in claimed:
+            row.update({"class": "conflicting", "model": name, "reason": f"duplicates {name}, which is already managed or adoptable"})
+        else:
+            claimed.add(name)
+            row.update({"class": "adoptable", "model": name})
+        out.append(row)
+    return out
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .gguf import GGUFError, read_metadata
+
+
+# draft_model keys -> llama-server flags (besides ``path`` -> -md)
+_FLAGS = (
+    ("max", "--draft-max"),
+    ("min", "--draft-min"),
+    ("p_min", "--draft-p-min"),
+    ("gpu_layers", "-ngld"),
+    ("ctx_size", "-cd"),
+)
+
+# llama.cpp (common/speculative.cpp) refuses drafts whose vocab size differs by more
+# than this, or whose token texts differ from this id on
+VOCAB_MAX_SIZE_DIFFERENCE = 128
+VOCAB_CHECK_START_TOKEN_ID = 5
+
+_TOKENIZER_KEYS = (
+    "tokenizer.ggml.model",
+    "tokenizer.ggml.add_bos_token",
+    "tokenizer.ggml.add_eos_token",
+    "tokenizer.ggml.bos_token_id",
+    "tokenizer.ggml.eos_token_id",
+)
+_TOKENS = "tokenizer.ggml.tokens"
+
+# slot timings: "draft acceptance rate = 0.57576 (   19 accepted /    33 generated)"
+_ACCEPTANCE = re.compile(rb"draft acceptance rate = [\d.]+ \(\s*(\d+) accepted /\s*(\d+) generated\)")
+_LAUNCH = re.compile(rb"^\[llamacpp-manager\] \S+ launch\b", re.M)
+
+
+def parse_draft(value: Any) -> Dict[str, Any]:
+    """Normalise a model's ``draft_model``: a GGUF path, or a mapping with ``path`` and tuning keys."""
+    if isinstance(value, str):
+        value = {"path": value}
+    if not isinstance(value, dict) or not isinstance(value.get("path"), str) or not value["path"]:
+        raise ValueError("draft_model must be a GGUF path or a mapping with 'path'")
+    unknown = set(value) - {"path"} - {k for k, _ in _FLAGS}
+    if unknown:
+        raise ValueError(f"draft_model: unknown key(s) {', '.join(sorted(unknown))}")
+    out: Dict[str, Any] = {"path": value["path"]}
+    for key, _ in _FLAGS:
+        v = value.get(key)
+        if v is None:
+            continue
+        if key == "p_min":
+            if isinstance(v, bool) or not isinstance(v, (int, float)) or not 0 <= v <= 1:
+                raise ValueError("draft_model.p_min must be between 0 and 1")
+        elif isinstance(v, bool) or not isinstance(v, int) or v < 0:
+            raise ValueError(f"draft_model.{key} must be a non-negative integer")
+        out[key] = v
+    return out
+
+
+def draft_args(value: Any) -> List[str]:
+    """llama-server arguments pairing the draft model, or [] without one."""
+    if not value:
+        return []
+    d = parse_draft(value)
+    args = ["-md", d["path"]]
+    for key, flag in _FLAGS:
+        if key in d:
+            args += [flag, str(d[key])]
+    return args
+
+
+@lru_cache(maxsize=16)
+def _vocab(path: str, size: int, mtime_ns: int) -> Dict[str, Any]:
+    # keyed by size/mtime so a replaced file is re-read; only the token list is materialised
+    meta = read_metadata(Path(path), arrays={_TOKENS})
+    return {k: meta.get(k) for k in (*_TOKENIZER_KEYS, _TOKENS)}
+
+
+def _load_vocab(path: str) -> Dict[str, Any]:
+    p = Path(path).expanduser()
+    st = p.stat()
+    return _vocab(str(p), st.st_size, st.st_mtime_ns)
+
+
+def vocab_mismatch(target_path: str, draft_path: str) -> Optional[str]:
+    """Why a draft cannot speculate for a target, from their GGUF headers; None when compatible.
+
+    Applies llama-server's own rules: same tokenizer type and special
+    tokens, vocab sizes within VOCAB_MAX_SIZE_DIFFERENCE, and identical token
+    texts from VOCAB_CHECK_START_TOKEN_ID up to the smaller vocab.
+    """
+    try:
+        t = _load_vocab(target_path)
+        d = _load_vocab(draft_path)
+    except (OSError, GGUFError) as e:
+        return f"cannot read GGUF tokenizer metadata: {e}"
+    for key in _TOKENIZER_KEYS:
+        if t[key] is not None and d[key] is not None and t[key] != d[key]:
+            return f"{key} differs (target {t[key]!r}, draft {d[key]!r})"
+    tt, dt = t[_TOKENS], d[_TOKENS]
+    if not isinstance(tt, list) or not isinstance(dt, list):
+        return "tokenizer vocabulary missing from GGUF metadata"
+    if abs(len(tt) - len(dt)) > VOCAB_MAX_SIZE_DIFFERENCE:
+        return f"vocab sizes differ by more than {VOCAB_MAX_SIZE_DIFFERENCE} (target {len(tt)}, draft {len(dt)})"
+    for i in range(VOCAB_CHECK_START_TOKEN_ID, min(len(tt), len(dt))):
+        if tt[i] != dt[i]:
+            return f"token {i} differs (target {tt[i]!r}, draft {dt[i]!r})"
+    return None
+
+
+def acceptance(log_path: Path, tail_bytes: int = 256 * 1024) -> Optional[Dict[str, Any]]:
+    """Draft acceptance since the last launch, from the slot timings at the end of a model's log."""
+    try:
+        with Path(log_path).open("rb") as f:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - tail_bytes))
+            data = f.read()
+    except OSError:
+        return None
+    launches = list(_LAUNCH.finditer(data))
+    if launches:
+        data = data[launches[-1].end():]
+    accepted = generated = 0
+    for m in _ACCEPTANCE.finditer(data):
+        accepted += int(m.group(1))
+        generated += int(m.group(2))
+    if not generated:
+        return None
+    return {"accepted": accepted, "generated": generated, "rate": round(accepted / generated, 4)}
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import http.client
+import json
+import threading
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Deque, Dict, List, Optional, Tuple
+
+from .qos import Rejected
+
+
+Backend = Tuple[str, int]
+
+DEFAULT_CHUNK = 64
+DEFAULT_ATTEMPTS = 3
+PATHS = ("/v1/embeddings",)
+
+
+def parse_embeddings(value: Any) -> Optional[Dict[str, Any]]:
+    """Normalise the top-level ``embeddings`` section: ``chunk`` inputs per request and ``attempts`` per chunk.
+
+    Fan-out is on by default; ``embeddings: false`` turns it off.
+    """
+    if value is False:
+        return None
+    if value is None or value is True:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError("embeddings must be false or a mapping with 'chunk' and/or 'attempts'")
+    unknown = set(value) - {"chunk", "attempts"}
+    if unknown:
+        raise ValueError(f"embeddings: unknown key(s) {', '.join(sorted(unknown))}")
+    out = {"chunk": value.get("chunk", DEFAULT_CHUNK), "attempts": value.get("attempts", DEFAULT_ATTEMPTS)}
+    for key, v in out.items():
+        if isinstance(v, bool) or not isinstance(v, int) or v < 1:
+            raise ValueError(f"embeddings.{key} must be a positive integer")
+    return out
+
+
+def splittable(body: bytes, chunk: int) -> Optional[Dict[str, Any]]:
+    """The parsed request when its ``input`` is a list of more than ``chunk`` inputs, else None.
+
+    A flat list of token ids is one input, not many, and is left alone.
+    """
+    try:
+        doc = json.loads(body)
+    except ValueError:
+        return None
+    inputs = doc.get("input") if isinstance(doc, dict) else None
+    if not isinstance(inputs, list) or len(inputs) <= chunk:
+        return None
+    if any(isinstance(x, int) for x in inputs):
+        return None
+    return doc
+
+
+def merge(parts: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """One OpenAI-style embeddings response from per-chunk responses, ``index`` rebased to the full input."""
+    data: List[Dict[str, Any]] = []
+    usage: Dict[str, int] = {}
+    model = None
+    for start, doc in sorted(parts, key=lambda p: p[0]):
+        model = model or doc.get("model")
+        for item in sorted(doc.get("data") or [], key=lambda d: d.get("index", 0)):
+            data.append({**item, "index": start + int(item.get("index", 0))})
+        for k, v in (doc.get("usage") or {}).items():
+            if isinstance(v, int):
+                usage[k] = usage.get(k, 0) + v
+    out: Dict[str, Any] = {"object": "list", "data": data, "model": model}
+    if usage:
+        out["usage"] = usage
+    return out
+
+
+class _Chunk:
+    __slots__ = ("start", "body", "attempts")
+
+    def __init__(self, start: int, body: bytes):
+        self.start = start
+        self.body = body
+        self.attempts = 0
+
+
+def fan_out(
+    backends: Dict[Backend, int], path: str, headers: Dict[str, str], doc: Dict[str, Any],
+    chunk: int = DEFAULT_CHUNK, attempts: int = DEFAULT_ATTEMPTS, timeout: float = 600.0,
+    using: Callable[[Backend], ContextManager[Any]] = lambda b: nullcontext(),
+    admit: Callable[[], ContextManager[Any]] = nullcontext,
+) -> Tuple[int, bytes, Dict[str, Any]]:
+    """Embed ``doc["input"]`` in chunks spread over ``backends`` (backend -> slots) concurrently.
+
+    Each backend gets one worker per slot, each with its own keep-alive
+    connection, pulling chunks from a shared queue. Every chunk is sent
+    inside ``admit()`` (the QoS gate's slot admission), so a fan-out takes
+    free slots one chunk at a time and higher-priority requests get them
+    first. A backend that fails a chunk (connection error or 5xx) takes no
+    more work for this request and the chunk goes back on the queue for the
+    others, up to ``attempts`` tries. A 4xx is the client's fault and is
+    returned as is; Rejected from ``admit`` ends the request and is raised
+    once the workers have stopped. Returns ``(status, body, info)`` with
+    ``info`` = ``{chunks, backends, retries}``.
+    """
+    inputs = doc["input"]
+    pending: Deque[_Chunk] = deque(
+        _Chunk(i, json.dumps({**doc, "input": inputs[i:i + chunk]}).encode("utf-8")) for i in range(0, len(inputs), chunk)
+    )
+    total = len(pending)
+    cond = threading.Condition()
+    healthy = set(backends)
+    parts: List[Tuple[int, Dict[str, Any]]] = []
+    state: Dict[str, Any] = {"failure": None, "retries": 0, "used": set(), "rejected": None}
+
+    def done() -> bool:
+        return state["failure"] is not None or len(parts) == total
+
+    def fail(status: int, body: bytes) -> None:
+        if state["failure"] is None:
+            state["failure"] = (status, body)
+        cond.notify_all()
+
+    def worker(backend: Backend) -> None:
+        conn: Optional[http.client.HTTPConnection] = None
+        try:
+            while True:
+                with cond:
+                    while not pending and not done() and backend in healthy:
+                        cond.wait()
+                    if done() or backend not in healthy:
+                        return
+                    c = pending.popleft()
+                    c.attempts += 1
+                error: Optional[Tuple[int, bytes]] = None
+                try:
+                    with admit():
+                        with cond:
+                            if done():
+                                return
+                        conn = conn or http.client.HTTPConnection(*backend, timeout=timeout)
+                        with using(backend):
+                            conn.request("POST", path, body=c.body, headers={**headers, "Content-Length": str(len(c.body))})
+                            resp = conn.getresponse()
+                            raw = resp.read()
+                    if resp.status == 200:
+                        part = json.loads(raw)
+                    else:
+                        error = (resp.status, raw)
+                except Rejected as e:
+                    with cond:
+                        if state["failure"] is None:
+                            state["rejected"] = e
+                        fail(e.status, str(e).encode("utf-8"))
+                    return
+                except (OSError, http.client.HTTPException, ValueError) as e:
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+                    error = (502, json.dumps({"error": {"code": 502, "message": f"upstream error: {e}"}}).encode("utf-8"))
+                with cond:
+                    if error is None:
+                        parts.append((c.start, part))
+                        state["used"].add(backend)
+                        if done():
+                            cond.notify_all()
+                        continue
+                    if 400 <= error[0] < 500:
+                        fail(*error)
+                        return
+                    healthy.discard(backend)
+                    if c.attempts >= attempts or not healthy:
+                        fail(*error)
+                    else:
+                        state["retries"] += 1
+                        pending.appendleft(c)
+                        cond.notify_all()
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+
+    workers = [
+        threading.Thread(target=worker, args=(b,), name=f"embed-{b[1]}-{i}", daemon=True)
+        for b, slots in backends.items() for i in range(max(1, min(slots, total)))
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if state["rejected"] is not None:
+        raise state["rejected"]
+    info = {"chunks": total, "backends": len(state["used"]), "retries": state["retries"]}
+    if state["failure"] is not None:
+        return state["failure"][0], state["failure"][1], info
+    if len(parts) < total:
+        return 502, json.dumps({"error": {"code": 502, "message": "no backend left to embed the remaining chunks"}}).encode("utf-8"), info
+    return 200, json.dumps(merge(parts)).encode("utf-8"), info
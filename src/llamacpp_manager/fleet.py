@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import http.client
+import json
+import queue
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .agent import DEFAULT_PORT
+
+
+DEFAULT_TIMEOUT_S = 5.0
+
+
+def parse_agents(value: Any) -> List[Dict[str, Any]]:
+    """Normalise the top-level ``agents`` list: ``name``, ``url`` and ``token`` (or ``token_file``) each."""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError("agents must be a list of {name, url, token}")
+    out: List[Dict[str, Any]] = []
+    for a in value:
+        if not isinstance(a, dict) or not a.get("name") or not a.get("url"):
+            raise ValueError("agents entries need a 'name' and a 'url'")
+        if any(o["name"] == a["name"] for o in out):
+            raise ValueError(f"agents: duplicate name '{a['name']}'")
+        u = urlsplit(str(a["url"]) if "://" in str(a["url"]) else f"http://{a['url']}")
+        if u.scheme not in ("http", "https") or not u.hostname:
+            raise ValueError(f"agents.{a['name']}: url must be http(s)://host[:port]")
+        token = a.get("token")
+        if token is None and a.get("token_file"):
+            try:
+                token = Path(str(a["token_file"])).expanduser().read_text().strip()
+            except OSError as e:
+                raise ValueError(f"agents.{a['name']}: cannot read token_file: {e}")
+        if not token:
+            raise ValueError(f"agents.{a['name']}: needs a 'token' or 'token_file'")
+        out.append({
+            "name": str(a["name"]), "scheme": u.scheme, "host": u.hostname,
+            "port": u.port or DEFAULT_PORT, "token": str(token),
+        })
+    return out
+
+
+class AgentError(Exception):
+    pass
+
+
+def _stale(e: BaseException, sent: bool) -> bool:
+    """Whether a pooled connection failed because the agent had already closed it, so the request never ran."""
+    # socket.timeout is only an alias of TimeoutError from Python 3.10
+    if isinstance(e, (socket.timeout, TimeoutError)):
+        return False
+    if sent:
+        # closed without a single byte of response: the idle connection was dropped
+        return isinstance(e, http.client.RemoteDisconnected)
+    return isinstance(e, (BrokenPipeError, ConnectionResetError, ConnectionAbortedError))
+
+
+class AgentClient:
+    """Keep-alive connections to one agent, reused across calls.
+
+    Connections are checked out of a small LIFO pool, so concurrent calls
+    to the same agent each get their own and a warm one is reused first.
+    A connection that fails is dropped. The call is retried once on a fresh
+    one only when the failure shows the agent closed the idle connection
+    before taking the request; after a timeout or any other error the
+    request may have run, and a POST must not run twice.
+    """
+
+    def __init__(self, spec: Dict[str, Any], pool_size: int = 4):
+        self.name = spec["name"]
+        self._spec = spec
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._spec["scheme"] == "https" else http.client.HTTPConnection
+        return cls(self._spec["host"], self._spec["port"], timeout=timeout)
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None, timeout: float = DEFAULT_TIMEOUT_S) -> Any:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Authorization": f"Bearer {self._spec['token']}"}
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            try:
+                conn = self._pool.get_nowait()
+                fresh = False
+            except queue.Empty:
+                conn, fresh = self._connect(timeout), True
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            sent = False
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                sent = True
+                resp = conn.getresponse()
+                raw = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if fresh or attempt or not _stale(e, sent):
+                    raise AgentError(str(e) or type(e).__name__)
+                continue
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+            try:
+                doc = json.loads(raw or b"null")
+            except ValueError:
+                raise AgentError(f"HTTP {resp.status}: not JSON")
+            if resp.status != 200:
+                msg = ((doc or {}).get("error") or {}).get("message") if isinstance(doc, dict) else None
+                raise AgentError(f"HTTP {resp.status}" + (f": {msg}" if msg else ""))
+            return doc
+        raise AgentError("unreachable")  # pragma: no cover
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class Fleet:
+    """Concurrent calls to many agents, each bounded by one overall deadline."""
+
+    def __init__(self, agents: List[Dict[str, Any]], max_workers: int = 32):
+        self.clients = [AgentClient(a) for a in agents]
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(agents))), thread_name_prefix="fleet")
+
+    def _call_all(self, clients: List[AgentClient], method: str, path: str, body: Optional[Dict[str, Any]], timeout: float) -> List[Tuple[AgentClient, Any, Optional[str], float]]:
+        deadline = time.monotonic() + timeout
+
+        def one(c: AgentClient) -> Tuple[Any, float]:
+            start = time.perf_counter()
+            doc = c.request(method, path, body, timeout=max(0.05, deadline - time.monotonic()))
+            return doc, (time.perf_counter() - start) * 1000
+
+        futures = {c: self._pool.submit(one, c) for c in clients}
+        wait(list(futures.values()), timeout=max(0.0, deadline - time.monotonic()))
+        out = []
+        for c, f in futures.items():
+            if not f.done():
+                out.append((c, None, f"no answer within {timeout:g}s", 0.0))
+                continue
+            try:
+                doc, ms = f.result()
+                out.append((c, doc, None, ms))
+            except AgentError as e:
+                out.append((c, None, str(e), 0.0))
+        return out
+
+    def status(self, timeout: float = DEFAULT_TIMEOUT_S) -> Dict[str, Any]:
+        """Every agent's models in one list (each row gains ``agent``), plus per-agent reachability."""
+        models: List[Dict[str, Any]] = []
+        agents: List[Dict[str, Any]] = []
+        for c, doc, err, ms in self._call_all(self.clients, "GET", "/v1/status", None, timeout):
+            if err is not None:
+                agents.append({"agent": c.name, "ok": False, "error": err})
+                continue
+            rows = doc.get("models") or []
+            agents.append({"agent": c.name, "ok": True, "host": doc.get("host"), "models": len(rows), "latency_ms": round(ms, 1)})
+            models.extend({"agent": c.name, **r} for r in rows)
+        return {"agents": agents, "models": models}
+
+    def act(self, action: str, agent: str, target: str, timeout: float = 900.0) -> List[Dict[str, Any]]:
+        """Run start/stop/restart of ``target`` on one agent (or ``all``) concurrently."""
+        clients = [c for c in self.clients if agent in ("all", c.name)]
+        if not clients:
+            raise KeyError(f"agent '{agent}' not found")
+        out = []
+        for c, doc, err, _ in self._call_all(clients, "POST", f"/v1/{action}", {"target": target}, timeout):
+            out.append({"agent": c.name, "ok": False, "rc": None, "error": err} if err is not None else {"agent": c.name, "ok": doc.get("rc") == 0, **doc})
+        return out
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        for c in self.clients:
+            c.close()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+import struct
+from pathlib import Path
+from typing import Any, BinaryIO, Collection, Dict, Optional, Union
+
+
+GGUF_MAGIC = b"GGUF"
+
+# GGUF metadata value types
+_SCALARS = {
+    0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d",
+}
+_STRING = 8
+_ARRAY = 9
+# smallest encoding of a non-scalar element: a string's u64 length, an array's u32 type + u64 count
+_MIN_SIZE = {_STRING: 8, _ARRAY: 12}
+# lengths below this are read directly; a short read already reports truncation
+_CHECK_LEN = 1 << 20
+
+
+class GGUFError(ValueError):
+    pass
+
+
+def _left(f: BinaryIO) -> int:
+    return os.fstat(f.fileno()).st_size - f.tell()
+
+
+def _read(f: BinaryIO, n: int) -> bytes:
+    # a corrupt length field must not turn into a multi-GiB allocation
+    if n >= _CHECK_LEN and n > _left(f):
+        raise GGUFError("truncated GGUF header")
+    b = f.read(n)
+    if len(b) != n:
+        raise GGUFError("truncated GGUF header")
+    return b
+
+
+def _u32(f: BinaryIO) -> int:
+    return struct.unpack("<I", _read(f, 4))[0]
+
+
+def _u64(f: BinaryIO) -> int:
+    return struct.unpack("<Q", _read(f, 8))[0]
+
+
+def _string(f: BinaryIO) -> str:
+    return _read(f, _u64(f)).decode("utf-8", errors="replace")
+
+
+def _value(f: BinaryIO, vtype: int, arrays: bool) -> Any:
+    if vtype in _SCALARS:
+        fmt = _SCALARS[vtype]
+        return struct.unpack(fmt, _read(f, struct.calcsize(fmt)))[0]
+    if vtype == _STRING:
+        return _string(f)
+    if vtype == _ARRAY:
+        itype = _u32(f)
+        count = _u64(f)
+        size = struct.calcsize(_SCALARS[itype]) if itype in _SCALARS else _MIN_SIZE.get(itype)
+        if size is None:
+            raise GGUFError(f"unknown GGUF value type {itype}")
+        if count * size > _left(f):
+            raise GGUFError("truncated GGUF header")
+        if arrays:
+            return [_value(f, itype, arrays) for _ in range(count)]
+        # skip without materialising (token lists can hold 100k+ entries)
+        if itype in _SCALARS:
+            f.seek(size * count, 1)
+        else:
+            for _ in range(count):
+                _value(f, itype, False)
+        return {"array_type": itype, "len": count}
+    raise GGUFError(f"unknown GGUF value type {vtype}")
+
+
+def is_gguf(path: Path) -> bool:
+    try:
+        with Path(path).expanduser().open("rb") as f:
+            return f.read(4) == GGUF_MAGIC
+    except OSError:
+        return False
+
+
+def read_metadata(path: Path, *, arrays: Union[bool, Collection[str]] = False) -> Dict[str, Any]:
+    """Read the key/value metadata block of a GGUF (v2/v3) file.
+
+    Array values are summarised as ``{array_type, len}`` unless ``arrays``
+    is true, or is a collection naming the keys to read in full. Raises
+    GGUFError for files that are not GGUF or whose header is truncated or
+    claims more data than the file holds.
+    """
+    with Path(path).expanduser().open("rb") as f:
+        if f.read(4) != GGUF_MAGIC:
+            raise GGUFError(f"not a GGUF file: {path}")
+        version = _u32(f)
+        if version < 2:
+            raise GGUFError(f"unsupported GGUF version {version}")
+        _tensor_count = _u64(f)
+        kv_count = _u64(f)
+        # each pair is at least a key length, a type and a one-byte value
+        if kv_count * 13 > _left(f):
+            raise GGUFError("truncated GGUF header")
+        meta: Dict[str, Any] = {"gguf.version": version}
+        for _ in range(kv_count):
+            key = _string(f)
+            meta[key] = _value(f, _u32(f), arrays if isinstance(arrays, bool) else key in arrays)
+        return meta
+
+
+def arch_value(meta: Dict[str, Any], key: str) -> Optional[Any]:
+    """Look up an architecture-scoped key, e.g. ``block_count`` -> ``llama.block_count``."""
+    arch = meta.get("general.architecture")
+    return meta.get(f"{arch}.{key}") if arch else None
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 import http.client
+import json
 import socket
 import time
 from typing import Any, Dict, Optional
 
+from .utils import process_alive
+
 
 def _http_get(host: str, port: int, path: str, timeout: float) -> Optional[Dict[str, Any]]:
     try:
@@ -23,15 +26,18 @@ def _http_get(host: str, port: int, path: str, timeout: float) -> Optional[Dict[
 
 
 def check_endpoint(host: str, port: int, timeout_ms: int = 2000) -> Dict[str, Any]:
-    """Return status dict: { up, latency_ms, http_status?, version? }.
+    """Return status dict: { up, latency_ms, http_status?, version?, health? }.
 
-    Attempts TCP connect, then tries HTTP GET /v1/models and /.
+    Attempts TCP connect, then llama-server's GET /health: ``health`` is
+    ``ok`` (200), ``loading`` (503) or ``error``. Servers without /health
+    fall back to GET /v1/models and /, leaving ``health`` None.
     """
     timeout_s = max(0.1, timeout_ms / 1000.0)
     start = time.perf_counter()
     up = False
     http_status: Optional[int] = None
     version: Optional[str] = None
+    health: Optional[str] = None
 
     # TCP connect
     try:
@@ -43,12 +49,20 @@ def check_endpoint(host: str, port: int, timeout_ms: int = 2000) -> Dict[str, An
     elapsed_ms = int((time.perf_counter() - start) * 1000)
 
     if up:
+        r = _http_get(host, port, "/health", timeout_s)
+        if r and r["status"] != 404:
+            http_status = r["status"]
+            health = {200: "ok", 503: "loading"}.get(r["status"], "error")
+        elif r is None:
+            # connected but no HTTP answer in time
+            health = "error"
+    if up and health in (None, "ok"):
         # attempt llama.cpp-friendly path first
         for path in ("/v1/models", "/"):
             r = _http_get(host, port, path, timeout_s)
             if not r:
                 continue
-            http_status = r["status"]
+            http_status = http_status or r["status"]
             # best-effort version sniffing
             try:
                 b = r["body"].decode("utf-8", errors="ignore")
@@ -63,5 +77,96 @@ def check_endpoint(host: str, port: int, timeout_ms: int = 2000) -> Dict[str, An
         "latency_ms": elapsed_ms,
         "http_status": http_status,
         "version": version,
+        "health": health,
     }
 
+
+# Lifecycle states reported by ``status`` and used by ``ensure-running``
+STATES = ("stopped", "starting", "loading", "ready", "degraded", "unhealthy")
+
+
+def health_state(
+    probe: Dict[str, Any],
+    pid_alive: Optional[bool],
+    *,
+    started_at: Optional[float] = None,
+    warmup: Optional[Dict[str, Any]] = None,
+    ready_timeout: float = 600.0,
+    slow_ms: Optional[int] = None,
+    now: Optional[float] = None,
+) -> str:
+    """Combine a ``check_endpoint`` probe with the recorded PID into one of STATES.
+
+    ``pid_alive`` is None without a recorded PID (e.g. launchd or unmanaged).
+    starting: process alive, port not accepting yet. loading: /health 503 or
+    warm-up running. unhealthy: HTTP errors, or still not serving
+    ``ready_timeout`` seconds after launch. degraded: serving, but warm-up
+    failed, the probe was slower than ``slow_ms``, or a stale PID record means
+    something else answers on the port.
+    """
+    now = time.time() if now is None else now
+    overdue = started_at is not None and now - started_at > ready_timeout
+    if not probe.get("up"):
+        if pid_alive:
+            return "unhealthy" if overdue else "starting"
+        return "stopped"
+    health = probe.get("health")
+    if health == "error":
+        return "unhealthy"
+    if health == "loading":
+        return "unhealthy" if overdue else "loading"
+    warm = (warmup or {}).get("state")
+    if warm == "running":
+        return "loading"
+    if warm == "failed" or pid_alive is False:
+        return "degraded"
+    if slow_ms and (probe.get("latency_ms") or 0) > slow_ms:
+        return "degraded"
+    return "ready"
+
+
+def wait_ready(host: str, port: int, timeout: float, interval: float = 0.5, pid: Optional[int] = None) -> bool:
+    """Poll until llama-server answers ``/health`` with 200 (it returns 503 while loading).
+
+    Servers without ``/health`` (404) count as ready once ``/v1/models`` answers 200.
+    Returns False if ``timeout`` seconds pass first, or as soon as process
+    ``pid`` (when given) has exited.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if pid is not None and not process_alive(pid):
+            return False
+        r = _http_get(host, port, "/health", min(2.0, max(0.1, timeout)))
+        if r and r["status"] == 404:
+            r = _http_get(host, port, "/v1/models", min(2.0, max(0.1, timeout)))
+        if r and r["status"] == 200:
+            return True
+        if time.monotonic() + interval > deadline:
+            return False
+        time.sleep(interval)
+
+
+def slots_busy(host: str, port: int, timeout: float = 2.0) -> Optional[int]:
+    """Number of llama-server slots processing a request, from ``/slots``.
+
+    None when the endpoint is unavailable (``--no-slots``) or unparseable.
+    """
+    r = _http_get(host, port, "/slots", timeout)
+    if not r or r["status"] != 200:
+        return None
+    try:
+        slots = json.loads(r["body"])
+        # newer servers report is_processing, older ones state (0 = idle)
+        return sum(1 for s in slots if s.get("is_processing") or s.get("state", 0) != 0)
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def wait_idle(host: str, port: int, timeout: float, interval: float = 0.5) -> bool:
+    """Wait until no slot is busy. Without ``/slots`` the full ``timeout`` is waited out."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if slots_busy(host, port) == 0:
+            return True
+        time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+    return False
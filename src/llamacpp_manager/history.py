@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from .utils import app_support_dir, ensure_dir
+
+
+# Default retention per tier, in days: raw samples roll up into minutes, minutes into hours
+DEFAULT_RETENTION = {"raw_days": 2, "minute_days": 30, "hour_days": 400}
+COMPACT_EVERY_S = 600
+
+_TIERS = (("samples", 1), ("minute", 60), ("hour", 3600))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    name TEXT NOT NULL, ts INTEGER NOT NULL, up INTEGER NOT NULL, pid INTEGER,
+    latency_ms REAL, http_status INTEGER, rss INTEGER, state TEXT,
+    PRIMARY KEY (name, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minute (
+    name TEXT NOT NULL, ts INTEGER NOT NULL, n INTEGER NOT NULL, up_n INTEGER NOT NULL,
+    latency_sum REAL NOT NULL, latency_n INTEGER NOT NULL, latency_max REAL, rss_max INTEGER,
+    PRIMARY KEY (name, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hour (
+    name TEXT NOT NULL, ts INTEGER NOT NULL, n INTEGER NOT NULL, up_n INTEGER NOT NULL,
+    latency_sum REAL NOT NULL, latency_n INTEGER NOT NULL, latency_max REAL, rss_max INTEGER,
+    PRIMARY KEY (name, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# every tier seen as (ts, n, up_n, latency_sum, latency_n, latency_max, rss_max)
+_AS_AGG = {
+    "samples": "ts, 1 AS n, up AS up_n, COALESCE(latency_ms, 0) AS ls, latency_ms IS NOT NULL AS ln, latency_ms AS lm, rss AS rm",
+    "minute": "ts, n, up_n, latency_sum AS ls, latency_n AS ln, latency_max AS lm, rss_max AS rm",
+    "hour": "ts, n, up_n, latency_sum AS ls, latency_n AS ln, latency_max AS lm, rss_max AS rm",
+}
+
+
+def history_path() -> Path:
+    return app_support_dir() / "history.sqlite3"
+
+
+def connect(path: Optional[Path] = None) -> sqlite3.Connection:
+    path = history_path() if path is None else path
+    ensure_dir(path.parent)
+    conn = sqlite3.connect(str(path), timeout=5.0)
+    # WAL: status writers never block history readers
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def retention(cfg: Dict[str, Any]) -> Dict[str, float]:
+    """``history`` retention from config.yaml, falling back to DEFAULT_RETENTION."""
+    out = dict(DEFAULT_RETENTION)
+    for k, v in ((cfg.get("history") or {}).items()):
+        if k in out and v is not None:
+            out[k] = float(v)
+    return out
+
+
+def enabled(cfg: Dict[str, Any]) -> bool:
+    return bool((cfg.get("history") or {}).get("enabled", True))
+
+
+def _sample(entry: Dict[str, Any], ts: int) -> tuple:
+    mem = entry.get("memory") or {}
+    return (
+        entry["name"], ts, int(bool(entry.get("up"))), entry.get("pid"),
+        entry.get("latency_ms") if entry.get("up") else None, entry.get("http_status"), mem.get("rss"), entry.get("state"),
+    )
+
+
+def record(entries: Iterable[Dict[str, Any]], cfg: Dict[str, Any], *, now: Optional[float] = None, path: Optional[Path] = None) -> None:
+    """Store one sample per status entry and compact old samples every COMPACT_EVERY_S."""
+    now = time.time() if now is None else now
+    rows = [_sample(e, int(now)) for e in entries if e.get("name")]
+    if not rows:
+        return
+    with closing(connect(path)) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        last = conn.execute("SELECT value FROM meta WHERE key = 'compacted_at'").fetchone()
+        if last is None or now - float(last[0]) >= COMPACT_EVERY_S:
+            _compact(conn, retention(cfg), now)
+
+
+def compact(cfg: Dict[str, Any], *, now: Optional[float] = None, path: Optional[Path] = None) -> None:
+    with closing(connect(path)) as conn, conn:
+        _compact(conn, retention(cfg), time.time() if now is None else now)
+
+
+def _compact(conn: sqlite3.Connection, keep: Dict[str, float], now: float) -> None:
+    # Roll each tier's expired rows into the next coarser tier, then drop them.
+    # Tiers stay disjoint in time, so queries can simply union all three.
+    day = 86400
+    for (src, _), (dst, width), days in zip(_TIERS, _TIERS[1:], (keep["raw_days"], keep["minute_days"])):
+        # cut on a bucket boundary so no bucket is split between tiers
+        cutoff = int(now - days * day) // width * width
+        conn.execute(
+            f"""
+            INSERT INTO {dst} (name, ts, n, up_n, latency_sum, latency_n, latency_max, rss_max)
+            SELECT name, ts / {width} * {width} AS b, SUM(n), SUM(up_n), SUM(ls), SUM(ln), MAX(lm), MAX(rm)
+            FROM (SELECT name, {_AS_AGG[src]} FROM {src} WHERE ts < ?)
+            WHERE true GROUP BY name, b
+            ON CONFLICT (name, ts) DO UPDATE SET
+                n = n + excluded.n, up_n = up_n + excluded.up_n,
+                latency_sum = latency_sum + excluded.latency_sum, latency_n = latency_n + excluded.latency_n,
+                latency_max = MAX(COALESCE(latency_max, excluded.latency_max), COALESCE(excluded.latency_max, latency_max)),
+                rss_max = MAX(COALESCE(rss_max, excluded.rss_max), COALESCE(excluded.rss_max, rss_max))
+            """,
+            (cutoff,),
+        )
+        conn.execute(f"DELETE FROM {src} WHERE ts < ?", (cutoff,))
+    conn.execute("DELETE FROM hour WHERE ts < ?", (int(now - keep["hour_days"] * day),))
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('compacted_at', ?)", (str(now),))
+
+
+_REL = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_time(text: str, now: Optional[float] = None) -> float:
+    """Epoch seconds from ``30m``/``12h``/``7d`` (ago), an ISO date or datetime, or epoch seconds."""
+    now = time.time() if now is None else now
+    text = text.strip()
+    m = _REL.match(text)
+    if m:
+        return now - float(m.group(1)) * _UNITS[m.group(2)]
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"unrecognised time '{text}' (use e.g. 30m, 12h, 7d, 2024-05-01 or 2024-05-01T12:00)")
+
+
+def auto_resolution(since: float, until: float) -> int:
+    span = until - since
+    if span <= 6 * 3600:
+        return 60
+    if span <= 14 * 86400:
+        return 3600
+    return 86400
+
+
+def query(name: str, since: float, until: float, resolution: int, *, path: Optional[Path] = None) -> Dict[str, Any]:
+    """Aggregate a model's history into ``resolution``-second buckets plus an overall summary."""
+    union = " UNION ALL ".join(
+        f"SELECT {_AS_AGG[t]} FROM {t} WHERE name = :name AND ts >= :since AND ts <= :until" for t, _ in _TIERS
+    )
+    sql = f"""
+        SELECT ts / :res * :res AS b, SUM(n), SUM(up_n), SUM(ls), SUM(ln), MAX(lm), MAX(rm)
+        FROM ({union})
+        GROUP BY b ORDER BY b
+    """
+    params = {"name": name, "since": int(since), "until": int(until), "res": int(resolution)}
+    with closing(connect(path)) as conn:
+        raw = conn.execute(sql, params).fetchall()
+    buckets = [
+        {
+            "ts": b, "samples": n, "up_ratio": round(up / n, 4) if n else None,
+            "latency_avg_ms": round(ls / ln, 1) if ln else None, "latency_max_ms": lm, "rss_max": rm,
+        }
+        for b, n, up, ls, ln, lm, rm in raw
+    ]
+    n = sum(r[1] for r in raw)
+    up = sum(r[2] for r in raw)
+    ln = sum(r[4] for r in raw)
+    summary = {
+        "name": name, "since": int(since), "until": int(until), "resolution_s": int(resolution), "samples": n,
+        "up_ratio": round(up / n, 4) if n else None,
+        "down_buckets": sum(1 for r in raw if r[2] < r[1]),
+        "latency_avg_ms": round(sum(r[3] for r in raw) / ln, 1) if ln else None,
+        "latency_max_ms": max((r[5] for r in raw if r[5] is not None), default=None),
+        "rss_max": max((r[6] for r in raw if r[6] is not None), default=None),
+    }
+    return {"summary": summary, "buckets": buckets}
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import app_support_dir, atomic_write_text
+
+
+ALGORITHMS = ("sha256", "blake2b")
+# sha256 matches the checksums Hugging Face publishes for GGUF files
+DEFAULT_ALGORITHM = "sha256"
+CHUNK = 64 << 20
+CACHE_FILE = "digests.json"
+
+
+def parse_digest(value: Any) -> Tuple[str, str]:
+    """Split a model's pinned ``digest`` (``sha256:<hex>`` or ``blake2b:<hex>``) into (algorithm, hex)."""
+    if not isinstance(value, str) or ":" not in value:
+        raise ValueError("digest must look like 'sha256:<hex>' or 'blake2b:<hex>'")
+    algo, hexd = (s.strip().lower() for s in value.split(":", 1))
+    if algo not in ALGORITHMS:
+        raise ValueError(f"digest: unknown algorithm '{algo}' (use {' or '.join(ALGORITHMS)})")
+    width = hashlib.new(algo).digest_size * 2
+    if len(hexd) != width or any(c not in "0123456789abcdef" for c in hexd):
+        raise ValueError(f"digest: expected {width} hex digits after '{algo}:'")
+    return algo, hexd
+
+
+def _advise(mm: mmap.mmap, name: str, start: int = 0, length: int = 0) -> None:
+    advice = getattr(mmap, name, None)
+    if advice is None or not hasattr(mm, "madvise"):
+        return
+    try:
+        mm.madvise(advice, start, length) if length else mm.madvise(advice)
+    except OSError:
+        pass
+
+
+def file_digest(path: Path, algorithm: str = DEFAULT_ALGORITHM, chunk: int = CHUNK) -> str:
+    """Hex digest of a file, read through mmap in ``chunk``-sized pieces.
+
+    While one chunk is hashed (hashlib drops the GIL for large buffers) the
+    kernel is asked to read the next one ahead, so disk and CPU overlap.
+    """
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            _advise(mm, "MADV_SEQUENTIAL")
+            with memoryview(mm) as view:
+                for off in range(0, size, chunk):
+                    if off + chunk < size:
+                        _advise(mm, "MADV_WILLNEED", off + chunk, min(chunk, size - off - chunk))
+                    with view[off:off + chunk] as part:
+                        h.update(part)
+    return h.hexdigest()
+
+
+def cache_path() -> Path:
+    return app_support_dir() / CACHE_FILE
+
+
+def _load_cache() -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(cache_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _cache_key(st: os.stat_result) -> str:
+    return f"{st.st_dev}:{st.st_ino}"
+
+
+def verify_files(
+    files: List[Tuple[str, Optional[str]]], workers: Optional[int] = None,
+    refresh: bool = False, chunk: int = CHUNK,
+) -> List[Dict[str, Any]]:
+    """Hash ``(path, pinned digest or None)`` pairs concurrently and compare with the pins.
+
+    Digests are cached in ``digests.json`` in the config dir, keyed by
+    (device, inode) and valid while size and mtime are unchanged, so an
+    untouched file costs one stat. ``refresh`` ignores the cache. Each
+    file is hashed once however often it is listed. Returns one row per
+    pair: ``{path, algorithm, digest, expected, ok, cached, bytes,
+    duration_s, error}``; ``ok`` is None when nothing is pinned.
+    """
+    cache = _load_cache()
+    jobs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    rows: List[Dict[str, Any]] = []
+    for path, pinned in files:
+        row: Dict[str, Any] = {"path": path, "algorithm": DEFAULT_ALGORITHM, "digest": None, "expected": None, "ok": None, "cached": False, "bytes": 0, "duration_s": 0.0, "error": None}
+        try:
+            if pinned:
+                row["algorithm"], row["expected"] = parse_digest(pinned)
+        except ValueError as e:
+            row["error"] = str(e)
+        rows.append(row)
+        if row["error"] is None:
+            jobs.setdefault((str(Path(os.path.expanduser(path)).resolve()), row["algorithm"]), {})
+
+    updates: Dict[str, Dict[str, Any]] = {}
+
+    def one(key: Tuple[str, str]) -> Dict[str, Any]:
+        path, algo = key
+        start = time.perf_counter()
+        try:
+            st = os.stat(path)
+            rec = cache.get(_cache_key(st)) or {}
+            if not refresh and rec.get("size") == st.st_size and rec.get("mtime_ns") == st.st_mtime_ns and rec.get(algo):
+                return {"digest": rec[algo], "cached": True}
+            digest = file_digest(Path(path), algo, chunk)
+            after = os.stat(path)
+            if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                return {"error": "file changed while it was being hashed"}
+        except OSError as e:
+            return {"error": str(e)}
+        fresh = {} if rec.get("size") != st.st_size or rec.get("mtime_ns") != st.st_mtime_ns else dict(rec)
+        fresh.update({"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, algo: digest})
+        updates[_cache_key(st)] = fresh
+        return {"digest": digest, "bytes": st.st_size, "duration_s": time.perf_counter() - start}
+
+    if jobs:
+        n = workers or min(len(jobs), os.cpu_count() or 4, 8)
+        with ThreadPoolExecutor(max_workers=max(1, n), thread_name_prefix="verify") as pool:
+            for key, result in zip(list(jobs), pool.map(one, list(jobs))):
+                jobs[key] = result
+    if updates:
+        # merge into what is on disk now: another run may have added entries meanwhile
+        merged = _load_cache()
+        for k, rec in updates.items():
+            merged[k] = {**(merged.get(k) or {}), **rec} if (merged.get(k) or {}).get("mtime_ns") == rec["mtime_ns"] else rec
+        try:
+            atomic_write_text(cache_path(), json.dumps(merged, indent=1, sort_keys=True))
+        except OSError:
+            pass
+
+    for row in rows:
+        if row["error"] is not None:
+            row["ok"] = False
+            continue
+        row.update(jobs[(str(Path(os.path.expanduser(row["path"])).resolve()), row["algorithm"])])
+        if row["error"] is not None:
+            row["ok"] = False
+        elif row["expected"] is not None:
+            row["ok"] = row["digest"] == row["expected"]
+    return rows
+
+
+def verify_models(models: List[Dict[str, Any]], workers: Optional[int] = None, refresh: bool = False) -> List[Dict[str, Any]]:
+    """``verify_files`` over each model's ``model_path`` against its ``digest``; rows gain ``name``."""
+    rows = verify_files([(str(m.get("model_path") or ""), m.get("digest")) for m in models], workers=workers, refresh=refresh)
+    return [{"name": m.get("name"), **r} for m, r in zip(models, rows)]
+
+
+def problem(row: Dict[str, Any]) -> Optional[str]:
+    """Why a verified row failed, for messages; None when it did not."""
+    if row["error"] is not None:
+        return f"cannot verify {row['path']}: {row['error']}"
+    if row["ok"] is False:
+        return f"digest mismatch for {row['path']}: expected {row['algorithm']}:{row['expected']}, got {row['algorithm']}:{row['digest']}"
+    return None
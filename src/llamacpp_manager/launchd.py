@@ -8,6 +8,7 @@ from pathlib import Path
 from typing import Dict, Any, List, Optional
 
 from .config import ModelSpec
+from .draft import draft_args
 
 
 def agent_label(name: str) -> str:
@@ -26,6 +27,7 @@ def build_program_arguments(llama_server_path: str, spec: ModelSpec) -> List[str
     argv: List[str] = [llama_server_path, "-m", spec.model_path]
     if spec.args:
         argv.extend(spec.args)
+    argv.extend(draft_args(spec.draft_model))
     argv.extend(["--host", spec.host, "--port", str(spec.port)])
     return argv
 
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import bisect
+import bz2
+import gzip
+import json
+import lzma
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from .utils import atomic_write_text
+
+
+# One index entry per INDEX_STEP bytes of (uncompressed) log
+INDEX_STEP = 1 << 20
+INDEX_DIR = ".index"
+# bytes of the file start remembered to notice truncation (rotation) of a growing log
+_HEAD_BYTES = 256
+
+_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# [llamacpp-manager] 2024-05-01T12:00:00.000+02:00 launch ...   (written by spawn_process)
+_MARKER = re.compile(rb"^\[llamacpp-manager\] (\d{4}-\d\d-\d\dT\S+) launch\b")
+# 2024-05-01 12:00:00[.123] / [2024-05-01T12:00:00]
+_ISO = re.compile(rb"^\[?(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d(?:\.\d+)?)")
+# llama-server --log-timestamps: minutes.seconds.ms.us since the process started
+_ELAPSED = re.compile(rb"^(\d+)\.(\d\d)\.(\d{3})\.(\d{3}) ")
+# older llama-server JSON logs
+_JSON_TS = re.compile(rb'"timestamp":\s*(\d+(?:\.\d+)?)')
+
+
+def _iso(raw: bytes) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(raw.decode("ascii")).timestamp()
+    except ValueError:
+        return None
+
+
+class Clock:
+    """Wall-clock time of log lines, read in order.
+
+    Lines carry an ISO timestamp, a JSON ``timestamp``, or llama-server's
+    elapsed-time prefix, which is resolved against the launch marker the
+    manager writes before each start. Lines without a time inherit the last one.
+    """
+
+    def __init__(self, base: Optional[float] = None, now: Optional[float] = None):
+        self.base = base
+        self.now = now
+
+    def feed(self, line: bytes) -> Optional[float]:
+        """Advance over ``line``; return its own timestamp if it has one."""
+        ts = None
+        m = _MARKER.match(line)
+        if m:
+            ts = _iso(m.group(1))
+            self.base = ts
+        elif line[:1].isdigit():
+            m = _ELAPSED.match(line)
+            if m:
+                if self.base is not None:
+                    mins, secs, ms, us = (int(g) for g in m.groups())
+                    ts = self.base + mins * 60 + secs + ms / 1e3 + us / 1e6
+            else:
+                m = _ISO.match(line)
+                ts = _iso(m.group(1)) if m else None
+        elif line[:1] == b"[":
+            m = _ISO.match(line)
+            ts = _iso(m.group(1)) if m else None
+        elif b'"timestamp"' in line:
+            m = _JSON_TS.search(line)
+            ts = float(m.group(1)) if m else None
+        if ts is not None:
+            self.now = ts
+        return ts
+
+
+def _open(path: Path) -> BinaryIO:
+    # compressed segments are read as streams; seek() on them decompresses forward
+    opener = _OPENERS.get(path.suffix)
+    return opener(path, "rb") if opener else path.open("rb")
+
+
+def segments(log_dir: Path, name: str) -> List[Path]:
+    """A model's log files, oldest first: ``<name>.log.N[.gz|.bz2|.xz]`` ... ``<name>.log``."""
+    pat = re.compile(rf"^{re.escape(name)}\.log(?:\.(\d+))?(?:\.(?:gz|bz2|xz))?$")
+    found = []
+    for p in log_dir.glob(f"{name}.log*"):
+        m = pat.match(p.name)
+        if m and p.is_file():
+            found.append((-int(m.group(1) or 0), p.name, p))
+    return [p for _, _, p in sorted(found)]
+
+
+def _index_path(path: Path) -> Path:
+    return path.parent / INDEX_DIR / f"{path.name}.json"
+
+
+def _head(path: Path) -> str:
+    with _open(path) as f:
+        return f.read(_HEAD_BYTES).hex()
+
+
+def _load_index(path: Path, st: os.stat_result) -> Optional[Dict[str, Any]]:
+    try:
+        idx = json.loads(_index_path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    if idx.get("ino") != st.st_ino:
+        return None
+    if idx.get("size") == st.st_size and idx.get("mtime_ns") == st.st_mtime_ns:
+        return idx
+    # plain logs only ever grow until rotation truncates them; compressed segments never change
+    if path.suffix in _OPENERS or st.st_size < idx.get("size", 0):
+        return None
+    head = idx.get("head", "")
+    return idx if _head(path)[: len(head)] == head else None
+
+
+def ensure_index(path: Path) -> Dict[str, Any]:
+    """Load the sparse ``[offset, time, launch base]`` index of a log, extending or rebuilding it as needed.
+
+    An entry is taken at the first timestamped line after every INDEX_STEP
+    bytes, so a search can seek close to any start time. Growing logs are
+    indexed incrementally from where the last pass stopped.
+    """
+    st = path.stat()
+    idx = _load_index(path, st)
+    if idx is not None and idx["size"] == st.st_size and idx["mtime_ns"] == st.st_mtime_ns:
+        return idx
+    if idx is None:
+        idx = {"entries": [], "scanned": 0, "base": None, "last": None, "first_ts": None}
+    entries: List[List[Any]] = idx["entries"]
+    clock = Clock(idx["base"], idx["last"])
+    next_at = entries[-1][0] + INDEX_STEP if entries else 0
+    with _open(path) as f:
+        f.seek(idx["scanned"])
+        off = idx["scanned"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                # partial last line of a log being written; index it on the next pass
+                break
+            base = clock.base
+            ts = clock.feed(line)
+            if ts is not None:
+                if idx["first_ts"] is None:
+                    idx["first_ts"] = ts
+                if off >= next_at:
+                    entries.append([off, ts, base])
+                    next_at = off + INDEX_STEP
+            off += len(line)
+    idx.update(
+        ino=st.st_ino, size=st.st_size, mtime_ns=st.st_mtime_ns, head=_head(path),
+        scanned=off, base=clock.base, last=clock.now,
+    )
+    try:
+        atomic_write_text(_index_path(path), json.dumps(idx))
+    except OSError:
+        # read-only log dir: the index is only a cache
+        pass
+    return idx
+
+
+def search_file(
+    path: Path,
+    model: str,
+    pattern: str,
+    *,
+    flags: int = 0,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Matches of ``pattern`` in one log file, within ``[since, until]`` when given."""
+    rx = re.compile(pattern.encode("utf-8"), flags)
+    start, clock = 0, Clock()
+    if since is not None or until is not None:
+        idx = ensure_index(path)
+        last = idx["last"] if idx["last"] is not None else path.stat().st_mtime
+        if (since is not None and last < since) or (until is not None and idx["first_ts"] is not None and idx["first_ts"] > until):
+            return []
+        if since is not None:
+            # last indexed point before ``since``: every earlier line is older
+            i = bisect.bisect_left([e[1] for e in idx["entries"]], since) - 1
+            if i >= 0:
+                start, ts, base = idx["entries"][i]
+                clock = Clock(base, ts)
+    out: List[Dict[str, Any]] = []
+    with _open(path) as f:
+        f.seek(start)
+        off = start
+        for line in f:
+            here = off
+            off += len(line)
+            clock.feed(line)
+            ts = clock.now
+            if ts is not None:
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    break
+            if rx.search(line):
+                out.append({
+                    "model": model, "file": path.name, "offset": here, "ts": ts,
+                    "line": line.rstrip(b"\r\n").decode("utf-8", "replace"),
+                })
+                if limit is not None and len(out) >= limit:
+                    break
+    return out
+
+
+def _search_job(job: Tuple[Path, str, str, int, Optional[float], Optional[float], Optional[int]]) -> List[Dict[str, Any]]:
+    path, model, pattern, flags, since, until, limit = job
+    return search_file(path, model, pattern, flags=flags, since=since, until=until, limit=limit)
+
+
+def search(
+    log_dir: Path,
+    names: Iterable[str],
+    pattern: str,
+    *,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    ignore_case: bool = False,
+    limit: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Search every log segment of the named models, one process per file.
+
+    Results are ``{model, file, offset, ts, line}`` in time order (lines
+    before any known time first), at most ``limit`` of them.
+    """
+    re.compile(pattern)  # fail fast on a bad pattern, before starting workers
+    flags = re.IGNORECASE if ignore_case else 0
+    jobs = [(p, n, pattern, flags, since, until, limit) for n in names for p in segments(log_dir, n)]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        parts = [_search_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_search_job, jobs))
+    # segments are chronological within a model; a stable sort merges models
+    found = sorted((r for part in parts for r in part), key=lambda r: r["ts"] if r["ts"] is not None else float("-inf"))
+    return found[:limit] if limit is not None else found
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import ModelSpec
+from .draft import parse_draft
+from .gguf import GGUFError, arch_value, is_gguf, read_metadata
+from .utils import process_alive, read_pid, read_runtime
+
+
+MIB = 1024 * 1024
+GIB = 1024 * MIB
+
+# Compute buffers, CUDA/Metal contexts, HTTP server: a rough constant until
+# calibrated against observed RSS
+OVERHEAD_BYTES = 512 * MIB
+DEFAULT_CTX = 4096
+DEFAULT_BUDGET_FRACTION = 0.9
+
+# bytes per element for -ctk / -ctv cache types (block formats include scales)
+KV_TYPE_BYTES = {
+    "f32": 4.0, "f16": 2.0, "bf16": 2.0,
+    "q8_0": 34 / 32, "q5_1": 24 / 32, "q5_0": 22 / 32, "q4_1": 20 / 32, "q4_0": 18 / 32, "iq4_nl": 18 / 32,
+}
+
+
+def meminfo(path: Path = Path("/proc/meminfo")) -> Dict[str, int]:
+    """Return ``{total, available}`` in bytes.
+
+    Reads /proc/meminfo on Linux; elsewhere only the total is known (from
+    sysconf) and is also used as the available figure.
+    """
+    try:
+        fields: Dict[str, int] = {}
+        for line in path.read_text().splitlines():
+            key, _, rest = line.partition(":")
+            parts = rest.split()
+            if parts:
+                fields[key] = int(parts[0]) * 1024
+        return {"total": fields["MemTotal"], "available": fields.get("MemAvailable", fields.get("MemFree", 0))}
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        total = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return {}
+    return {"total": total, "available": total}
+
+
+def _arg(args: List[str], *names: str) -> Optional[str]:
+    for i, a in enumerate(args):
+        for n in names:
+            if a == n and i + 1 < len(args):
+                return args[i + 1]
+            if a.startswith(n + "="):
+                return a.split("=", 1)[1]
+    return None
+
+
+def kv_cache_bytes(meta: Dict[str, Any], args: List[str]) -> int:
+    """KV cache size implied by GGUF hyperparameters and llama-server args.
+
+    ``-c`` is the total context shared by all ``--parallel`` slots, so the
+    cache does not grow with ``--parallel`` when ``-c`` is given; when it is
+    omitted llama-server uses the model's training context.
+    """
+    n_layer = arch_value(meta, "block_count")
+    n_embd = arch_value(meta, "embedding_length")
+    n_head = arch_value(meta, "attention.head_count")
+    if not (n_layer and n_embd and n_head):
+        return 0
+    if isinstance(n_head, dict):  # per-layer head counts are summarised arrays
+        return 0
+    n_head_kv = arch_value(meta, "attention.head_count_kv") or n_head
+    if isinstance(n_head_kv, dict):
+        n_head_kv = n_head
+    k_len = arch_value(meta, "attention.key_length") or n_embd // n_head
+    v_len = arch_value(meta, "attention.value_length") or n_embd // n_head
+    ctx = int(_arg(args, "-c", "--ctx-size") or 0)
+    if ctx <= 0:
+        ctx = int(arch_value(meta, "context_length") or DEFAULT_CTX)
+    k_bytes = KV_TYPE_BYTES.get(_arg(args, "-ctk", "--cache-type-k") or "f16", 2.0)
+    v_bytes = KV_TYPE_BYTES.get(_arg(args, "-ctv", "--cache-type-v") or "f16", 2.0)
+    per_token = n_layer * n_head_kv * (k_len * k_bytes + v_len * v_bytes)
+    return int(per_token * ctx)
+
+
+def _metadata(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return _cached_metadata(str(path), st.st_size, st.st_mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def _cached_metadata(path: str, size: int, mtime_ns: int) -> Optional[Dict[str, Any]]:
+    # keyed by size/mtime so a replaced file is re-read
+    if not is_gguf(Path(path)):
+        return None
+    try:
+        return read_metadata(Path(path))
+    except (GGUFError, OSError):
+        return None
+
+
+def estimate_model_memory(spec: ModelSpec, calibration: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """Estimate a model's resident footprint in bytes.
+
+    weights = GGUF file size (mmapped), plus the KV cache from GGUF metadata
+    and ``args``, plus a fixed overhead. ``calibration`` (a runtime record
+    with ``rss_bytes`` and ``estimate_bytes``) scales the result by the
+    observed/estimated ratio once the model has been seen running.
+    """
+    path = Path(spec.model_path).expanduser()
+    try:
+        weights = path.stat().st_size
+    except OSError:
+        weights = 0
+    args = list(spec.args or [])
+    meta = _metadata(path)
+    kv = kv_cache_bytes(meta, args) if meta else 0
+    draft = _draft_memory(spec, meta, args) if spec.draft_model else 0
+    total = weights + kv + draft + OVERHEAD_BYTES
+    est = {"weights": weights, "kv_cache": kv, "draft": draft, "overhead": OVERHEAD_BYTES, "total": total}
+    if calibration and calibration.get("rss_bytes") and calibration.get("estimate_bytes"):
+        ratio = calibration["rss_bytes"] / calibration["estimate_bytes"]
+        est["total"] = int(total * min(3.0, max(0.5, ratio)))
+    return est
+
+
+def _draft_memory(spec: ModelSpec, meta: Optional[Dict[str, Any]], args: List[str]) -> int:
+    """Draft model weights plus its KV cache.
+
+    Each slot gets a draft context of ``ctx_size`` (``-cd``) tokens; without
+    it the draft shares the target's context size.
+    """
+    try:
+        d = parse_draft(spec.draft_model)
+    except ValueError:
+        return 0
+    path = Path(d["path"]).expanduser()
+    try:
+        weights = path.stat().st_size
+    except OSError:
+        return 0
+    dmeta = _metadata(path)
+    if not dmeta:
+        return weights
+    if d.get("ctx_size"):
+        ctx = d["ctx_size"] * max(1, int(_arg(args, "-np", "--parallel") or 1))
+    else:
+        ctx = int(_arg(args, "-c", "--ctx-size") or 0) or int((arch_value(meta, "context_length") if meta else 0) or DEFAULT_CTX)
+    cache = ["-c", str(ctx)]
+    for flag, names in (("-ctk", ("-ctkd", "--cache-type-k-draft")), ("-ctv", ("-ctvd", "--cache-type-v-draft"))):
+        v = _arg(args, *names)
+        if v:
+            cache += [flag, v]
+    return weights + kv_cache_bytes(dmeta, cache)
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """Resident set size in bytes from /proc (Linux); None elsewhere."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def memory_budget(cfg: Dict[str, Any], info: Dict[str, int]) -> Optional[int]:
+    """``memory_budget_mb`` if set, else ``memory_budget_fraction`` (0.9) of RAM."""
+    if cfg.get("memory_budget_mb"):
+        return int(float(cfg["memory_budget_mb"]) * MIB)
+    if not info.get("total"):
+        return None
+    return int(info["total"] * float(cfg.get("memory_budget_fraction", DEFAULT_BUDGET_FRACTION)))
+
+
+def admit(cfg: Dict[str, Any], need: int, committed: int, info: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Decide whether a model needing ``need`` bytes may start.
+
+    Refused when committed + need exceeds the budget, or when need exceeds
+    what the kernel reports as available right now.
+    """
+    info = meminfo() if info is None else info
+    budget = memory_budget(cfg, info)
+    available = info.get("available")
+    reasons = []
+    if budget is not None and committed + need > budget:
+        reasons.append("budget")
+    if available is not None and need > available:
+        reasons.append("available")
+    return {"ok": not reasons, "reasons": reasons, "need": need, "committed": committed, "budget": budget, "available": available}
+
+
+def committed_memory(cfg: Dict[str, Any], exclude: Optional[str], runtime: Dict[str, Dict[str, Any]]) -> int:
+    """Estimated footprint of every model other than ``exclude`` that is running right now."""
+    total = 0
+    for m in cfg.get("models", []):
+        name = m.get("name")
+        if name == exclude:
+            continue
+        try:
+            if not process_alive(read_pid(name, runtime)):
+                continue
+        except Exception:
+            continue
+        total += estimate_model_memory(ModelSpec.from_dict(m), runtime.get(name))["total"]
+    return total
+
+
+def admission(cfg: Dict[str, Any], spec: ModelSpec, alongside: bool = False) -> Dict[str, Any]:
+    """``admit`` for ``spec`` against the models currently running.
+
+    ``alongside`` is for a second instance started next to the running one
+    (a rolling restart): the old instance stays up until the new one is
+    ready, so its footprint is committed too.
+    """
+    runtime = read_runtime()
+    need = estimate_model_memory(spec, runtime.get(spec.name))["total"]
+    return admit(cfg, need, committed_memory(cfg, None if alongside else spec.name, runtime))
+
+
+def fmt_bytes(n: Optional[int]) -> str:
+    if n is None:
+        return "?"
+    return f"{n / GIB:.1f} GiB"
@@ -1,23 +1,93 @@
+import hashlib
+import json
 import os
+import select
 import signal
 from pathlib import Path
 from subprocess import Popen
 import time
-from typing import List, Optional
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from .config import ModelSpec
+from .draft import draft_args
 from .logs import rotate_file, open_log_append
+from .slots import parse_slot_cache, prepare as prepare_slot_dir, slot_args, slot_dir_of
+from .topology import apply_placement, placement_command, placement_for_config
+from .utils import child_exit, pid_fields, process_alive, track_child, update_runtime
+
+
+def launch_spec(cfg: Dict[str, Any], m: Dict[str, Any]) -> ModelSpec:
+    """The spec a model is launched with: its config plus CPU placement, if enabled."""
+    spec = ModelSpec.from_dict(m)
+    spec.placement = placement_for_config(cfg).get(spec.name)
+    return spec
 
 
 def build_argv(llama_server_path: str, spec: ModelSpec) -> List[str]:
     argv: List[str] = [llama_server_path, "-m", spec.model_path]
     if spec.args:
         argv.extend(spec.args)
+    argv.extend(draft_args(spec.draft_model))
+    # the slot cache key leaves out placement-derived threads: a fleet change must not orphan every cache
+    slots = slot_args(llama_server_path, spec.name, spec.model_path, spec.slot_cache, argv)
+    if spec.placement:
+        # Match llama.cpp's thread pools to the cores this model is pinned to,
+        # unless the user set them explicitly
+        user = set(spec.args or [])
+        threads = str(spec.placement["threads"])
+        if not user & {"-t", "--threads"}:
+            argv.extend(["--threads", threads])
+        if not user & {"-tb", "--threads-batch"}:
+            argv.extend(["--threads-batch", threads])
+    argv.extend(slots)
     argv.extend(["--host", spec.host, "--port", str(spec.port)])
     return argv
 
 
-def start_process(llama_server_path: str, spec: ModelSpec, log_dir: Path, extra_env: Optional[dict] = None) -> int:
+def spec_hash(llama_server_path: str, spec: ModelSpec) -> str:
+    """Stable digest of a model's configured launch: argv plus its own env.
+
+    CPU placement is left out. It follows the set of placed models, and
+    adding one model must not make ``reload`` restart all the others.
+    """
+    return argv_hash(build_argv(llama_server_path, replace(spec, placement=None)), spec.env)
+
+
+def argv_hash(argv: List[str], env: Optional[Dict[str, str]] = None) -> str:
+    payload = {"argv": list(argv), "env": dict(sorted((env or {}).items()))}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def record_launch(llama_server_path: str, spec: ModelSpec, pid: int, port: Optional[int] = None, log_dir: Optional[Path] = None) -> None:
+    """Record a launch in runtime.json: pid and start time, argv hash, start timestamp, port, log and slot cache paths.
+
+    ``port`` is the port actually listened on when it differs from the
+    configured one (rolling restarts); the hash always covers the configured spec.
+    """
+    fields = {
+        **pid_fields(pid),
+        "argv_hash": spec_hash(llama_server_path, spec),
+        "started_at": time.time(),
+        "port": port or spec.port,
+        # per-launch state such as the warm-up result starts over
+        "warmup": None,
+    }
+    if log_dir is not None:
+        fields["log_path"] = str(log_dir / f"{spec.name}.log")
+    slot_dir = slot_dir_of(build_argv(llama_server_path, spec))
+    fields["slot_dir"] = str(slot_dir) if slot_dir else None
+    update_runtime(spec.name, fields)
+
+
+def live_port(m: Dict[str, Any], runtime: Dict[str, Dict[str, Any]]) -> int:
+    """Port a model is actually listening on: the launch record's, else the configured one."""
+    rec = runtime.get(m["name"]) or {}
+    return int(rec.get("port") or m["port"])
+
+
+def spawn_process(llama_server_path: str, spec: ModelSpec, log_dir: Path, extra_env: Optional[dict] = None) -> Popen:
     log_path = log_dir / f"{spec.name}.log"
     rotate_file(log_path)
     env = os.environ.copy()
@@ -26,27 +96,131 @@ def start_process(llama_server_path: str, spec: ModelSpec, log_dir: Path, extra_
     if extra_env:
         env.update(extra_env)
     argv = build_argv(llama_server_path, spec)
+    slot_cache = parse_slot_cache(spec.slot_cache)
+    slot_dir = slot_dir_of(argv)
+    if slot_cache and slot_dir is not None:
+        prepare_slot_dir(slot_dir, slot_cache["keep"])
     # use the same file for stdout and stderr (append, line-buffered)
     with open_log_append(log_path) as f:
-        proc = Popen(argv, stdout=f, stderr=f, env=env)
-    return proc.pid
+        # wall-clock anchor for llama-server's elapsed-time log prefixes (see logsearch)
+        f.write(f"[llamacpp-manager] {datetime.now().astimezone().isoformat(timespec='milliseconds')} launch {spec.name}\n")
+        f.flush()
+        # affinity and priority are applied by an exec wrapper, so llama-server never runs unplaced
+        cpus = spec.placement.get("cpus") if spec.placement else None
+        launch = placement_command(argv, cpus, spec.nice, spec.ionice, prefix="[llamacpp-manager] ")
+        proc = Popen(launch, stdout=f, stderr=f, env=env)
+        if launch is argv and (cpus or spec.nice is not None or spec.ionice):
+            for w in apply_placement(proc.pid, cpus=cpus, nice=spec.nice, ionice=spec.ionice):
+                f.write(f"[llamacpp-manager] warning: {w}\n")
+    track_child(proc)
+    return proc
 
 
-def stop_process(pid: int, timeout: float = 5.0) -> None:
-    os.kill(pid, signal.SIGTERM)
-    # wait up to timeout for process to exit; if still alive, SIGKILL
-    deadline = time.time() + max(0.1, float(timeout))
-    while time.time() < deadline:
+def start_process(llama_server_path: str, spec: ModelSpec, log_dir: Path, extra_env: Optional[dict] = None) -> int:
+    return spawn_process(llama_server_path, spec, log_dir, extra_env).pid
+
+
+def _open_pidfd(pid: int) -> Optional[int]:
+    opener = getattr(os, "pidfd_open", None)
+    if opener is None:
+        return None
+    try:
+        return opener(pid)
+    except ProcessLookupError:
+        raise
+    except OSError:
+        return None
+
+
+def _has_exited(pid: int, fd: Optional[int]) -> bool:
+    if fd is not None:
+        readable, _, _ = select.select([fd], [], [], 0)
+        if readable:
+            # reap it if it is ours
+            child_exit(pid)
+        return bool(readable)
+    try:
+        # signal 0 checks existence; a zombie child counts as exited
+        return not process_alive(pid)
+    except PermissionError:
+        # assume still alive
+        return False
+
+
+def stop_processes(
+    targets: Dict[str, Tuple[int, float]],
+    on_exit: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Stop several processes concurrently.
+
+    ``targets`` maps a label to ``(pid, grace_seconds)``. Every process gets
+    SIGTERM up front, then all are waited on together (pidfds where the
+    platform has them, otherwise one shared polling loop); any still alive
+    at the end of its own grace period gets SIGKILL. ``on_exit`` is called
+    as each one finishes. Returns ``{label: {pid, duration_s, killed, error}}``;
+    ``error`` says why a process could not be signalled (e.g. EPERM), and
+    one such failure does not keep the other targets from being stopped.
+    """
+    started = time.monotonic()
+    results: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, Dict[str, Any]] = {}
+
+    def finish(label: str, pid: int, killed: bool, error: Optional[str] = None) -> None:
+        results[label] = {"pid": pid, "duration_s": round(time.monotonic() - started, 3), "killed": killed, "error": error}
+        if on_exit is not None:
+            on_exit(label, results[label])
+
+    for label, (pid, grace) in targets.items():
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            finish(label, pid, False)
+            continue
+        except OSError as e:
+            finish(label, pid, False, str(e))
+            continue
+        pending[label] = {"pid": pid, "deadline": started + max(0.1, float(grace)), "fd": None}
+    for label, t in list(pending.items()):
         try:
-            # signal 0 checks existence
-            os.kill(pid, 0)
+            t["fd"] = _open_pidfd(t["pid"])
         except ProcessLookupError:
-            return
-        except PermissionError:
-            # assume still alive
-            pass
-        time.sleep(0.1)
+            del pending[label]
+            finish(label, t["pid"], False)
+
     try:
-        os.kill(pid, signal.SIGKILL)
-    except ProcessLookupError:
-        pass
+        while pending:
+            now = time.monotonic()
+            for label, t in list(pending.items()):
+                killed = False
+                error = None
+                if not _has_exited(t["pid"], t["fd"]):
+                    if now < t["deadline"]:
+                        continue
+                    try:
+                        os.kill(t["pid"], signal.SIGKILL)
+                        killed = True
+                    except ProcessLookupError:
+                        pass
+                    except OSError as e:
+                        error = f"SIGKILL failed: {e}"
+                del pending[label]
+                if t["fd"] is not None:
+                    os.close(t["fd"])
+                finish(label, t["pid"], killed, error)
+            if not pending:
+                break
+            timeout = max(0.0, min(t["deadline"] for t in pending.values()) - time.monotonic())
+            fds = [t["fd"] for t in pending.values()]
+            if all(fd is not None for fd in fds):
+                select.select(fds, [], [], timeout)
+            else:
+                time.sleep(min(0.05, timeout))
+    finally:
+        for t in pending.values():
+            if t["fd"] is not None:
+                os.close(t["fd"])
+    return results
+
+
+def stop_process(pid: int, timeout: float = 5.0) -> None:
+    stop_processes({str(pid): (pid, timeout)})
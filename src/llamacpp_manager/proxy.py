@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import http.client
+import itertools
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from .config import load_config
+from .fanout import PATHS as FANOUT_PATHS, fan_out, splittable
+from .memory import _arg
+from .process import live_port
+from .qos import STATS_PATH, QoS, Rejected, classify
+from .trace import Trace, TraceWriter
+from .utils import config_path, process_alive, read_pid, read_runtime, runtime_path
+
+
+Backend = Tuple[str, int]
+
+# Not forwarded in either direction (RFC 7230 6.1); Date/Server are set by the proxy
+_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers",
+    "transfer-encoding", "upgrade", "host", "content-length", "date", "server",
+}
+
+
+def build_routes(cfg: Dict[str, Any], runtime: Dict[str, Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Map each ``public_port`` to its models and the live backends serving it.
+
+    Models sharing a public_port are replicas. A backend is live when the
+    model's recorded PID is a running process; its port comes from the
+    launch record so a rolling restart's spare port is picked up.
+    """
+    routes: Dict[int, Dict[str, Any]] = {}
+    for m in cfg.get("models", []):
+        if m.get("public_port") is None:
+            continue
+        r = routes.setdefault(int(m["public_port"]), {"models": [], "backends": [], "names": {}, "slots": {}})
+        r["models"].append(m["name"])
+        try:
+            pid = read_pid(m["name"], runtime)
+        except Exception:
+            continue
+        if process_alive(pid):
+            backend = (m.get("host", "127.0.0.1"), live_port(m, runtime))
+            r["backends"].append(backend)
+            r["names"][backend] = m["name"]
+            r["slots"][backend] = max(1, int(_arg(m.get("args") or [], "-np", "--parallel") or 1))
+    return routes
+
+
+class Router:
+    """Live routing table, rebuilt whenever config.yaml or runtime.json changes."""
+
+    def __init__(self, load: Callable[[], Dict[str, Any]] = load_config):
+        self._load = load
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[Any, ...]] = None
+        self._routes: Dict[int, Dict[str, Any]] = {}
+        self._inflight: Counter = Counter()
+        self._rr = itertools.count()
+
+    def _current_stamp(self) -> Tuple[Any, ...]:
+        out = []
+        for p in (config_path(), runtime_path()):
+            try:
+                st = p.stat()
+                out.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def routes(self, force: bool = False) -> Dict[int, Dict[str, Any]]:
+        stamp = self._current_stamp()
+        with self._lock:
+            if force or stamp != self._stamp:
+                try:
+                    self._routes = build_routes(self._load(), read_runtime())
+                    self._stamp = stamp
+                except Exception:
+                    pass  # keep serving the last good table while a config edit is half-written
+            return self._routes
+
+    def pick(self, public_port: int, exclude: List[Backend] = (), force: bool = False) -> Optional[Backend]:
+        """Least in-flight live backend for ``public_port`` (round-robin among ties)."""
+        backends = [b for b in self.routes(force).get(public_port, {}).get("backends", []) if b not in exclude]
+        if not backends:
+            return None
+        with self._lock:
+            start = next(self._rr) % len(backends)
+            ordered = backends[start:] + backends[:start]
+            return min(ordered, key=lambda b: self._inflight[b])
+
+    def slots(self, public_port: int) -> int:
+        """Total ``--parallel`` slots of the live backends behind ``public_port``."""
+        return sum(self.backend_slots(public_port).values())
+
+    def backend_slots(self, public_port: int) -> Dict[Backend, int]:
+        return dict(self.routes().get(public_port, {}).get("slots", {}))
+
+    def model_of(self, public_port: int, backend: Backend) -> Optional[str]:
+        return self.routes().get(public_port, {}).get("names", {}).get(backend)
+
+    @contextmanager
+    def using(self, backend: Backend) -> Iterator[None]:
+        with self._lock:
+            self._inflight[backend] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight[backend] -= 1
+
+    def inflight(self) -> Dict[Backend, int]:
+        with self._lock:
+            return {b: n for b, n in self._inflight.items() if n}
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "llamacpp-manager-proxy"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def do_GET(self) -> None:
+        qos: Optional[QoS] = self.server.qos  # type: ignore[attr-defined]
+        if qos is not None and self.command == "GET" and self.path == STATS_PATH:
+            body = json.dumps(qos.stats()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._forward()
+
+    do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = do_HEAD = do_GET
+
+    def _error(self, status: int, message: str, retry_after: Optional[int] = None) -> None:
+        body = json.dumps({"error": {"code": status, "message": message}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> Optional[bytes]:
+        if "chunked" in (self.headers.get("Transfer-Encoding") or "").lower():
+            self._error(411, "chunked request bodies are not supported; send Content-Length")
+            self.close_connection = True
+            return None
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _forward(self) -> None:
+        tracer: Optional[TraceWriter] = self.server.tracer  # type: ignore[attr-defined]
+        trace = tracer.begin(self.command, self.path, self.server.server_address[1]) if tracer is not None else None
+        if trace is None:
+            self._forward_traced(None)
+            return
+        fields: Dict[str, Any] = {}
+        try:
+            self._forward_traced(trace, fields)
+        except Exception as e:
+            fields["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            tracer.submit(trace.finish(**fields))
+
+    def _forward_traced(self, trace: Optional[Trace], fields: Optional[Dict[str, Any]] = None) -> None:
+        router: Router = self.server.router  # type: ignore[attr-defined]
+        public_port = self.server.server_address[1]
+        body = self._read_body()
+        if body is None:
+            return
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in _HOP_HEADERS}
+        headers["X-Forwarded-For"] = self.client_address[0]
+        if body or self.command in ("POST", "PUT", "PATCH"):
+            headers["Content-Length"] = str(len(body))
+        qos: Optional[QoS] = self.server.qos  # type: ignore[attr-defined]
+        # only inference (POST) competes for slots; /health, /v1/models etc. pass straight through
+        if qos is None or self.command != "POST":
+            self._send_upstream(router, public_port, body, headers, trace, fields)
+            return
+        client, cls, limits = classify(qos.q, self.headers, self.client_address[0])
+        if fields is not None:
+            fields.update(client=client, **{"class": cls})
+        gate = qos.gate(public_port)
+        try:
+            doc = self._splittable(body)
+            if doc is not None:
+                # charged once as one request; each chunk then queues for a slot of its own
+                with gate.charge(client, cls, limits):
+                    if trace is not None:
+                        trace.mark("admitted")
+                    self._fan_out(router, public_port, doc, headers, trace, fields, admit=lambda: gate.admit(client, cls, charged=True))
+                return
+            with gate.admit(client, cls, limits):
+                if trace is not None:
+                    trace.mark("admitted")
+                self._send_upstream(router, public_port, body, headers, trace, fields)
+        except Rejected as e:
+            self._error(e.status, str(e), e.retry_after)
+            if fields is not None:
+                models = router.routes().get(public_port, {}).get("models", [])
+                fields.update(status=e.status, rejected=str(e), model=models[0] if len(models) == 1 else None)
+
+    def _send_upstream(
+        self, router: Router, public_port: int, body: bytes, headers: Dict[str, str],
+        trace: Optional[Trace], fields: Optional[Dict[str, Any]],
+    ) -> None:
+        doc = self._splittable(body)
+        if doc is not None:
+            self._fan_out(router, public_port, doc, headers, trace, fields)
+            return
+        tried: List[Backend] = []
+        while True:
+            # after a refused connect, re-read routes: the model may just have switched ports
+            backend = router.pick(public_port, tried, force=bool(tried))
+            if backend is None:
+                self._error(502 if tried else 503, "no ready backend for this model")
+                if fields is not None:
+                    fields.update(status=502 if tried else 503, error="no ready backend")
+                return
+            conn = http.client.HTTPConnection(*backend, timeout=self.server.upstream_timeout)  # type: ignore[attr-defined]
+            try:
+                with router.using(backend):
+                    try:
+                        conn.connect()
+                        if trace is not None:
+                            trace.mark("connect")
+                            fields.update(backend=f"{backend[0]}:{backend[1]}", model=router.model_of(public_port, backend))  # type: ignore[union-attr]
+                        conn.request(self.command, self.path, body=body or None, headers=headers)
+                        resp = conn.getresponse()
+                    except ConnectionRefusedError:
+                        tried.append(backend)
+                        continue
+                    except OSError as e:
+                        self._error(502, f"upstream error: {e}")
+                        if fields is not None:
+                            fields.update(status=502, error=f"upstream error: {e}")
+                        return
+                    if trace is not None:
+                        trace.response(resp.status, resp.getheader("Content-Type"))
+                    self._relay(resp, trace)
+                    return
+            finally:
+                conn.close()
+
+    def _splittable(self, body: bytes) -> Optional[Dict[str, Any]]:
+        """The parsed request when it is an embeddings batch large enough to fan out, else None."""
+        fan: Optional[Dict[str, Any]] = self.server.fanout  # type: ignore[attr-defined]
+        if fan is None or self.command != "POST" or self.path.split("?", 1)[0] not in FANOUT_PATHS:
+            return None
+        return splittable(body, fan["chunk"])
+
+    def _fan_out(
+        self, router: Router, public_port: int, doc: Dict[str, Any], headers: Dict[str, str],
+        trace: Optional[Trace], fields: Optional[Dict[str, Any]],
+        admit: Callable[[], ContextManager[Any]] = nullcontext,
+    ) -> None:
+        """Split a large embeddings batch over every live replica and answer with the merged result."""
+        backends = router.backend_slots(public_port)
+        if not backends:
+            self._error(503, "no ready backend for this model")
+            if fields is not None:
+                fields.update(status=503, error="no ready backend")
+            return
+        fan = self.server.fanout  # type: ignore[attr-defined]
+        status, data, info = fan_out(
+            backends, self.path, headers, doc, chunk=fan["chunk"], attempts=fan["attempts"],
+            timeout=self.server.upstream_timeout, using=router.using, admit=admit,  # type: ignore[attr-defined]
+        )
+        if trace is not None:
+            trace.response(status, "application/json")
+            trace.feed(data)
+            models = {router.model_of(public_port, b) for b in backends}
+            fields.update(backend="fanout", model=models.pop() if len(models) == 1 else None, **info)  # type: ignore[union-attr]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _relay(self, resp: http.client.HTTPResponse, trace: Optional[Trace] = None) -> None:
+        length = resp.getheader("Content-Length")
+        bodyless = self.command == "HEAD" or resp.status in (204, 304) or 100 <= resp.status < 200
+        chunked = length is None and not bodyless
+        self.send_response(resp.status, resp.reason)
+        for k, v in resp.getheaders():
+            if k.lower() not in _HOP_HEADERS:
+                self.send_header(k, v)
+        if length is not None:
+            self.send_header("Content-Length", length)
+        elif chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if bodyless:
+            return
+        try:
+            # read1 returns as soon as data arrives, so streamed tokens are not held back
+            while True:
+                chunk = resp.read1(65536)
+                if not chunk:
+                    break
+                if trace is not None:
+                    trace.feed(chunk)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+                self.wfile.flush()
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address: Backend, router: Router, upstream_timeout: float = 600.0,
+        tracer: Optional[TraceWriter] = None, qos: Optional[QoS] = None, fanout: Optional[Dict[str, Any]] = None,
+    ):
+        self.router = router
+        self.upstream_timeout = upstream_timeout
+        self.tracer = tracer
+        self.qos = qos
+        self.fanout = fanout
+        super().__init__(address, ProxyHandler)
+
+
+def serve(
+    ports: List[int], router: Router, host: str = "127.0.0.1", upstream_timeout: float = 600.0,
+    tracer: Optional[TraceWriter] = None, qos: Optional[QoS] = None, fanout: Optional[Dict[str, Any]] = None,
+) -> List[ProxyServer]:
+    """Start one listener per public port in background threads; returns the servers.
+
+    ``fanout`` (see fanout.parse_embeddings) splits large ``/v1/embeddings``
+    batches across replicas; None forwards them whole.
+    """
+    servers = [ProxyServer((host, p), router, upstream_timeout, tracer, qos, fanout) for p in ports]
+    for s in servers:
+        threading.Thread(target=s.serve_forever, name=f"proxy-{s.server_address[1]}", daemon=True).start()
+    return servers
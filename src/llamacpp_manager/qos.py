@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Tuple
+
+
+DEFAULT_CLASSES = [{"name": "interactive", "queue": 64}, {"name": "batch", "queue": 1024}]
+DEFAULT_HEADER = "X-Priority"
+DEFAULT_QUEUE_TIMEOUT_S = 60.0
+STATS_PATH = "/_manager/qos"
+_LIMITS = ("concurrency", "rate", "burst")
+# wait samples kept per class for the percentiles in stats()
+_WAIT_SAMPLES = 2048
+# how often refilled rate-limit buckets are dropped
+_BUCKET_SWEEP_S = 60.0
+
+
+def _positive(value: Any, what: str, integer: bool = False) -> Any:
+    ok = (int,) if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, ok) or value <= 0:
+        raise ValueError(f"{what} must be a positive {'integer' if integer else 'number'}")
+    return value
+
+
+def _limits(value: Any, what: str) -> Dict[str, Any]:
+    if not isinstance(value, dict):
+        raise ValueError(f"{what} must be a mapping")
+    out: Dict[str, Any] = {}
+    if value.get("concurrency") is not None:
+        out["concurrency"] = _positive(value["concurrency"], f"{what}.concurrency", integer=True)
+    if value.get("rate") is not None:
+        out["rate"] = float(_positive(value["rate"], f"{what}.rate"))
+    if value.get("burst") is not None:
+        out["burst"] = float(_positive(value["burst"], f"{what}.burst"))
+    return out
+
+
+def parse_qos(value: Any) -> Optional[Dict[str, Any]]:
+    """Normalise the top-level ``qos`` section; None when admission control is off.
+
+    ``classes`` are listed highest priority first, each with a bounded
+    ``queue``. ``client`` holds the default per-client ``concurrency``,
+    ``rate`` (requests/s) and ``burst``; ``keys`` maps API keys to a
+    ``client`` name, a ``class`` and their own limits.
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError("qos must be true or a mapping")
+    unknown = set(value) - {"classes", "default_class", "header", "queue_timeout_s", "concurrency", "client", "keys"}
+    if unknown:
+        raise ValueError(f"qos: unknown key(s) {', '.join(sorted(unknown))}")
+    classes: List[Dict[str, Any]] = []
+    for c in value.get("classes") or DEFAULT_CLASSES:
+        if not isinstance(c, dict) or not isinstance(c.get("name"), str) or not c["name"]:
+            raise ValueError("qos.classes entries need a 'name'")
+        if any(c["name"] == o["name"] for o in classes):
+            raise ValueError(f"qos.classes: duplicate class '{c['name']}'")
+        classes.append({"name": c["name"], "queue": _positive(c.get("queue", 64), f"qos.classes.{c['name']}.queue", integer=True)})
+    names = [c["name"] for c in classes]
+    default = value.get("default_class", names[-1])
+    if default not in names:
+        raise ValueError(f"qos.default_class '{default}' is not one of: {', '.join(names)}")
+    out: Dict[str, Any] = {
+        "classes": classes,
+        "default_class": default,
+        "header": str(value.get("header") or DEFAULT_HEADER),
+        "queue_timeout_s": float(_positive(value.get("queue_timeout_s", DEFAULT_QUEUE_TIMEOUT_S), "qos.queue_timeout_s")),
+        "client": _limits(value.get("client") or {}, "qos.client"),
+        "keys": {},
+    }
+    if value.get("concurrency") is not None:
+        out["concurrency"] = _positive(value["concurrency"], "qos.concurrency", integer=True)
+    keys = value.get("keys") or {}
+    if not isinstance(keys, dict):
+        raise ValueError("qos.keys must map API keys to settings")
+    for key, entry in keys.items():
+        entry = entry or {}
+        what = f"qos.keys.{str(key)[:4]}..."
+        if not isinstance(entry, dict):
+            raise ValueError(f"{what} must be a mapping")
+        if entry.get("class") is not None and entry["class"] not in names:
+            raise ValueError(f"{what}: class '{entry['class']}' is not one of: {', '.join(names)}")
+        k = {**_limits({n: entry.get(n) for n in _LIMITS}, what), "client": str(entry.get("client") or _key_id(str(key)))}
+        if entry.get("class") is not None:
+            k["class"] = entry["class"]
+        out["keys"][str(key)] = k
+    return out
+
+
+def _key_id(key: str) -> str:
+    """A stable name for an API key that does not reveal it."""
+    return "key-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+
+
+def api_key(headers: Mapping[str, str]) -> Optional[str]:
+    auth = headers.get("Authorization") or ""
+    if auth[:7].lower() == "bearer ":
+        return auth[7:].strip() or None
+    return headers.get("X-Api-Key") or None
+
+
+def classify(q: Dict[str, Any], headers: Mapping[str, str], peer: str) -> Tuple[str, str, Dict[str, Any]]:
+    """``(client, class, limits)`` for a request.
+
+    The client is a configured API key's name, or else the peer address:
+    an unlisted key is ignored, so minting new keys cannot mint new
+    clients past the per-client limits. The request's ceiling is its key's
+    ``class``, else ``default_class``; the priority header can only lower it.
+    """
+    names = [c["name"] for c in q["classes"]]
+    key = api_key(headers)
+    entry = q["keys"].get(key) if key else None
+    client = entry["client"] if entry else peer
+    limits = {**q["client"], **{k: v for k, v in (entry or {}).items() if k in _LIMITS}}
+    wanted = headers.get(q["header"])
+    wanted = wanted.strip() if wanted else None
+    cap = (entry or {}).get("class") or q["default_class"]
+    cls = wanted if wanted in names and names.index(wanted) >= names.index(cap) else cap
+    return client, cls, limits
+
+
+class Rejected(Exception):
+    """A request turned away by admission control; sent as ``status`` with Retry-After."""
+
+    def __init__(self, status: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("event", "cls")
+
+    def __init__(self, cls: str):
+        self.event = threading.Event()
+        self.cls = cls
+
+
+class Gate:
+    """Admission in front of one public port's llama-server slots.
+
+    At most ``capacity()`` requests are forwarded at once. The rest wait in
+    one bounded FIFO per class, and a freed slot always goes to the highest
+    priority class with a waiter, so batch traffic queues behind
+    interactive traffic in the proxy instead of inside llama-server.
+    """
+
+    def __init__(self, q: Dict[str, Any], capacity: Callable[[], int], clock: Callable[[], float] = time.monotonic):
+        self.q = q
+        self._capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._order = [c["name"] for c in q["classes"]]
+        self._limit = {c["name"]: c["queue"] for c in q["classes"]}
+        self._queues: Dict[str, Deque[_Ticket]] = {n: deque() for n in self._order}
+        self._inflight = 0
+        self._clients: Counter = Counter()
+        # client -> [tokens, last update, time the bucket is full again]
+        self._buckets: Dict[str, List[float]] = {}
+        self._next_sweep = clock() + _BUCKET_SWEEP_S
+        self._service_s = 1.0
+        self._counts = {n: Counter() for n in self._order}
+        self._waits: Dict[str, Deque[float]] = {n: deque(maxlen=_WAIT_SAMPLES) for n in self._order}
+
+    def _cap(self) -> int:
+        return max(0, int(self.q.get("concurrency") or self._capacity()))
+
+    def _retry_after(self, ahead: int) -> int:
+        return max(1, math.ceil(self._service_s * (ahead + 1) / max(1, self._cap())))
+
+    def _take_token(self, client: str, limits: Dict[str, Any]) -> None:
+        rate = limits.get("rate")
+        if not rate:
+            return
+        burst = limits.get("burst") or max(1.0, rate)
+        now = self._clock()
+        if now >= self._next_sweep:
+            # a full bucket is the same as no bucket: forget clients that have been idle that long
+            self._buckets = {c: b for c, b in self._buckets.items() if b[2] > now}
+            self._next_sweep = now + _BUCKET_SWEEP_S
+        tokens, last, _ = self._buckets.get(client, (burst, now, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            self._buckets[client] = [tokens, now, now + (burst - tokens) / rate]
+            raise Rejected(429, f"rate limit of {rate:g} request(s)/s exceeded for {client}", max(1, math.ceil((1 - tokens) / rate)))
+        self._buckets[client] = [tokens - 1, now, now + (burst - tokens + 1) / rate]
+
+    def _dispatch(self) -> None:
+        # called with the lock held: hand free slots to the highest-priority waiters
+        cap = self._cap()
+        while cap <= 0 or self._inflight < cap:
+            ticket = next((self._queues[n].popleft() for n in self._order if self._queues[n]), None)
+            if ticket is None:
+                return
+            self._inflight += 1
+            ticket.event.set()
+
+    def _reject(self, cls: str, e: Rejected) -> Rejected:
+        self._counts[cls]["timeouts" if e.status == 503 else "rejected"] += 1
+        return e
+
+    def _charge(self, client: str, cls: str, limits: Dict[str, Any]) -> None:
+        # called with the lock held: count one request against the client's limits
+        limit = limits.get("concurrency")
+        if limit and self._clients[client] >= limit:
+            raise self._reject(cls, Rejected(429, f"{client} already has {limit} request(s) in flight or queued", self._retry_after(0)))
+        try:
+            self._take_token(client, limits)
+        except Rejected as e:
+            raise self._reject(cls, e)
+        self._clients[client] += 1
+
+    def _discharge(self, client: str) -> None:
+        self._clients[client] -= 1
+        if not self._clients[client]:
+            del self._clients[client]
+
+    @contextmanager
+    def charge(self, client: str, cls: str, limits: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+        """Count one request against ``client``'s concurrency and rate limits without holding a slot.
+
+        For a request that is split into pieces (an embeddings fan-out): it
+        is charged once here and each piece then takes its slot with
+        ``admit(..., charged=True)``. Raises Rejected (429) like ``admit``.
+        """
+        with self._lock:
+            self._charge(client, cls, limits or {})
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._discharge(client)
+
+    @contextmanager
+    def admit(self, client: str, cls: str, limits: Optional[Dict[str, Any]] = None, charged: bool = False) -> Iterator[float]:
+        """Hold a slot for the body of the ``with``; yields the time spent queued in ms.
+
+        Raises Rejected (429) when the client is over its concurrency or
+        rate limit or the class queue is full, and Rejected (503) when no
+        slot frees up within ``queue_timeout_s``. ``charged`` skips the
+        client limits for a piece of a request already held by ``charge``.
+        """
+        limits = limits or {}
+        start = self._clock()
+        ticket: Optional[_Ticket] = None
+        with self._lock:
+            if not charged:
+                self._charge(client, cls, limits)
+            cap = self._cap()
+            ahead = sum(len(self._queues[n]) for n in self._order[: self._order.index(cls) + 1])
+            if cap <= 0 or (self._inflight < cap and not ahead):
+                # no live backend means no slots to count: let the proxy answer 503 itself
+                self._inflight += 1
+            else:
+                if len(self._queues[cls]) >= self._limit[cls]:
+                    if not charged:
+                        self._discharge(client)
+                    raise self._reject(cls, Rejected(429, f"the {cls} queue is full ({self._limit[cls]} waiting)", self._retry_after(ahead)))
+                ticket = _Ticket(cls)
+                self._queues[cls].append(ticket)
+        if ticket is not None and not ticket.event.wait(self.q["queue_timeout_s"]):
+            with self._lock:
+                if not ticket.event.is_set():
+                    self._queues[cls].remove(ticket)
+                    if not charged:
+                        self._discharge(client)
+                    raise self._reject(cls, Rejected(503, f"no free slot within {self.q['queue_timeout_s']:g}s", self._retry_after(len(self._queues[cls]))))
+        admitted = self._clock()
+        wait_ms = (admitted - start) * 1000
+        with self._lock:
+            self._counts[cls]["admitted"] += 1
+            self._waits[cls].append(wait_ms)
+        try:
+            yield wait_ms
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                if not charged:
+                    self._discharge(client)
+                # smoothed request time, for Retry-After estimates
+                self._service_s = 0.8 * self._service_s + 0.2 * (self._clock() - admitted)
+                self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"capacity": self._cap(), "inflight": self._inflight, "clients": dict(self._clients), "classes": {}}
+            for n in self._order:
+                waits = sorted(self._waits[n])
+
+                def pct(p: float) -> Optional[float]:
+                    return round(waits[max(0, math.ceil(p * len(waits)) - 1)], 1) if waits else None
+
+                out["classes"][n] = {
+                    "depth": len(self._queues[n]), "limit": self._limit[n],
+                    "admitted": self._counts[n]["admitted"], "rejected": self._counts[n]["rejected"], "timeouts": self._counts[n]["timeouts"],
+                    "wait_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": round(waits[-1], 1) if waits else None},
+                }
+            return out
+
+
+class QoS:
+    """One Gate per public port, sized from the live replicas' ``--parallel`` slots."""
+
+    def __init__(self, q: Dict[str, Any], slots: Callable[[int], int]):
+        self.q = q
+        self._slots = slots
+        self._lock = threading.Lock()
+        self._gates: Dict[int, Gate] = {}
+
+    def gate(self, public_port: int) -> Gate:
+        with self._lock:
+            g = self._gates.get(public_port)
+            if g is None:
+                g = self._gates[public_port] = Gate(self.q, lambda: self._slots(public_port))
+            return g
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            gates = dict(self._gates)
+        return {str(port): g.stats() for port, g in sorted(gates.items())}
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .utils import app_support_dir, atomic_write_text, ensure_dir
+
+
+DEFAULT_KEEP = 2
+MANIFEST = "slots.json"
+_FLAG = "--slot-save-path"
+
+
+def parse_slot_cache(value: Any) -> Optional[Dict[str, Any]]:
+    """Normalise a model's ``slot_cache``: true, or a mapping with ``keep`` and ``dir``; None when off."""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return {"keep": DEFAULT_KEEP}
+    if not isinstance(value, dict):
+        raise ValueError("slot_cache must be true or a mapping with 'keep' and/or 'dir'")
+    unknown = set(value) - {"keep", "dir"}
+    if unknown:
+        raise ValueError(f"slot_cache: unknown key(s) {', '.join(sorted(unknown))}")
+    keep = value.get("keep", DEFAULT_KEEP)
+    if isinstance(keep, bool) or not isinstance(keep, int) or keep < 1:
+        raise ValueError("slot_cache.keep must be a positive integer")
+    out: Dict[str, Any] = {"keep": keep}
+    if value.get("dir") is not None:
+        if not isinstance(value["dir"], str) or not value["dir"]:
+            raise ValueError("slot_cache.dir must be a path")
+        out["dir"] = value["dir"]
+    return out
+
+
+def slot_root(name: str, value: Any) -> Path:
+    """Directory holding every cache version of one model."""
+    sc = parse_slot_cache(value) or {}
+    if sc.get("dir"):
+        return Path(sc["dir"]).expanduser()
+    return app_support_dir() / "slots" / name
+
+
+def _stat(path: str) -> List[Any]:
+    try:
+        st = Path(path).expanduser().stat()
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return [None, None]
+
+
+def cache_key(llama_server_path: str, model_path: str, argv: List[str]) -> str:
+    """Version of a saved KV cache: the launch args plus the model file and llama-server build.
+
+    A slot file only restores into a server with the same weights, cache
+    layout (``-c``, ``-np``, ``-ctk``...) and state format, so any change to
+    those starts a new version instead of feeding it an incompatible file.
+    """
+    payload = {
+        "argv": list(argv[1:]),
+        "model": [str(Path(model_path).expanduser()), *_stat(model_path)],
+        "server": [llama_server_path, *_stat(llama_server_path)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def slot_args(llama_server_path: str, name: str, model_path: str, value: Any, argv: List[str]) -> List[str]:
+    """``--slot-save-path`` for a model with ``slot_cache``, keyed on the rest of its argv; [] otherwise."""
+    if not parse_slot_cache(value):
+        return []
+    return [_FLAG, str(slot_root(name, value) / cache_key(llama_server_path, model_path, argv))]
+
+
+def slot_dir_of(argv: List[str]) -> Optional[Path]:
+    """The ``--slot-save-path`` a server was launched with, if any."""
+    for i, a in enumerate(argv):
+        if a == _FLAG and i + 1 < len(argv):
+            return Path(argv[i + 1])
+        if a.startswith(_FLAG + "="):
+            return Path(a.split("=", 1)[1])
+    return None
+
+
+def prepare(slot_dir: Path, keep: int = DEFAULT_KEEP) -> None:
+    """Create a launch's cache directory and drop all but the ``keep`` most recently used versions."""
+    ensure_dir(slot_dir)
+    os.utime(slot_dir)
+    versions = sorted((p for p in slot_dir.parent.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    for old in versions[keep:]:
+        if old != slot_dir:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _request(host: str, port: int, method: str, path: str, body: Optional[Dict[str, Any]], timeout: float) -> Any:
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        conn.request(method, path, body=data, headers={"Content-Type": "application/json"} if data else {})
+        resp = conn.getresponse()
+        raw = resp.read()
+    finally:
+        conn.close()
+    try:
+        doc = json.loads(raw or b"null")
+    except ValueError:
+        doc = None
+    if resp.status != 200:
+        msg = ((doc or {}).get("error") or {}).get("message") if isinstance(doc, dict) else None
+        raise OSError(f"{method} {path} returned HTTP {resp.status}" + (f": {msg}" if msg else ""))
+    return doc
+
+
+def _slot_ids(host: str, port: int, timeout: float) -> List[int]:
+    slots = _request(host, port, "GET", "/slots", None, timeout)
+    if not isinstance(slots, list):
+        raise OSError("/slots returned no slot list")
+    return [int(s["id"]) for s in slots if isinstance(s, dict) and "id" in s]
+
+
+def save(host: str, port: int, slot_dir: Path, timeout: float = 120.0) -> Dict[str, Any]:
+    """Save every slot's KV cache into ``slot_dir`` through llama-server's slot API.
+
+    Slots with nothing cached are skipped. The manifest lists what was
+    saved, so a later restore only asks for files that exist.
+    Returns ``{ok, slots, tokens, duration_s, errors}``.
+    """
+    start = time.perf_counter()
+    saved: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    try:
+        ids = _slot_ids(host, port, timeout)
+    except (OSError, http.client.HTTPException) as e:
+        ids = []
+        errors.append(str(e) or type(e).__name__)
+    for i in ids:
+        filename = f"slot-{i}.bin"
+        try:
+            r = _request(host, port, "POST", f"/slots/{i}?action=save", {"filename": filename}, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f"slot {i}: {e}")
+            continue
+        n = int((r or {}).get("n_saved") or 0)
+        if n:
+            saved.append({"id": i, "filename": filename, "n_saved": n})
+        else:
+            (slot_dir / filename).unlink(missing_ok=True)
+    if saved:
+        atomic_write_text(slot_dir / MANIFEST, json.dumps({"saved_at": time.time(), "slots": saved}) + "\n")
+    return {
+        "ok": not errors, "slots": len(saved), "tokens": sum(s["n_saved"] for s in saved),
+        "duration_s": round(time.perf_counter() - start, 3), "errors": errors,
+    }
+
+
+def restore(host: str, port: int, slot_dir: Path, timeout: float = 120.0) -> Dict[str, Any]:
+    """Load the slots listed in ``slot_dir``'s manifest back into a freshly started server.
+
+    Returns ``{ok, slots, tokens, duration_s, errors}``; nothing saved yet is not an error.
+    """
+    start = time.perf_counter()
+    errors: List[str] = []
+    restored: List[Dict[str, Any]] = []
+    try:
+        manifest = json.loads((slot_dir / MANIFEST).read_text())
+    except (OSError, ValueError):
+        manifest = {"slots": []}
+    for s in manifest.get("slots") or []:
+        if not (slot_dir / s["filename"]).exists():
+            continue
+        try:
+            r = _request(host, port, "POST", f"/slots/{s['id']}?action=restore", {"filename": s["filename"]}, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f"slot {s['id']}: {e}")
+            continue
+        restored.append({"id": s["id"], "n_restored": int((r or {}).get("n_restored") or 0)})
+    return {
+        "ok": not errors, "slots": len(restored), "tokens": sum(s["n_restored"] for s in restored),
+        "duration_s": round(time.perf_counter() - start, 3), "errors": errors,
+    }
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+# A stand-in for llama-server that needs no model or GPU: it loads for
+# LLAMACPP_STUB_LOAD_S seconds, then answers /health, /v1/models, /slots,
+# /completion and /v1/embeddings (plus the /slots save/restore actions when launched with
+# --slot-save-path), taking longer per token the further its launch arguments are
+# from a synthetic optimum. Used to exercise `tune` (and anything else that
+# only needs llama-server's HTTP surface) offline:
+#
+#   llamacpp-manager tune NAME --stub
+#   python -m llamacpp_manager.stubserver -m model.gguf --port 8081 -t 4 -np 2
+#
+# Knobs (environment):
+#   LLAMACPP_STUB_TOKEN_MS    ms per generated token at the optimum (default 2)
+#   LLAMACPP_STUB_THREADS     thread count the stub runs fastest with (default 4)
+#   LLAMACPP_STUB_UBATCH      best -ub value (default 256)
+#   LLAMACPP_STUB_MAX_SLOTS   exit at startup ("out of memory") above this -np
+#   LLAMACPP_STUB_LOAD_S      seconds spent "loading" (default 0.2)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="stubserver", add_help=False)
+    p.add_argument("-m", "--model", default="stub.gguf")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("-t", "--threads", type=int, default=4)
+    p.add_argument("-b", "--batch-size", type=int, default=2048)
+    p.add_argument("-ub", "--ubatch-size", type=int, default=512)
+    p.add_argument("-np", "--parallel", type=int, default=1)
+    p.add_argument("-c", "--ctx-size", type=int, default=4096)
+    p.add_argument("-fa", "--flash-attn", nargs="?", const="on", default="auto")
+    p.add_argument("--slot-save-path")
+    # everything else llama-server accepts is ignored
+    args, _ = p.parse_known_args(argv)
+    return args
+
+
+def token_ms(args: argparse.Namespace) -> float:
+    """Synthetic per-token cost of a launch configuration, lowest at the configured optimum."""
+    base = _env_float("LLAMACPP_STUB_TOKEN_MS", 2.0)
+    best_threads = max(1.0, _env_float("LLAMACPP_STUB_THREADS", 4))
+    best_ub = max(1.0, _env_float("LLAMACPP_STUB_UBATCH", 256))
+    cost = base
+    cost *= 1 + 0.3 * abs(math.log2(max(1, args.threads) / best_threads))
+    cost *= 1 + 0.1 * abs(math.log2(max(1, min(args.ubatch_size, args.batch_size)) / best_ub))
+    if args.flash_attn == "on":
+        cost *= 0.85
+    return cost
+
+
+class Stub:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.per_token_ms = token_ms(args)
+        self.slots = threading.Semaphore(max(1, args.parallel))
+        self.lock = threading.Lock()
+        self.busy: Dict[int, bool] = {i: False for i in range(max(1, args.parallel))}
+        # tokens held in each slot's KV cache (prompt + generated)
+        self.cached: Dict[int, int] = {i: 0 for i in self.busy}
+        self.loaded = threading.Event()
+
+    def _acquire_slot(self) -> int:
+        self.slots.acquire()
+        with self.lock:
+            slot = next(i for i, b in self.busy.items() if not b)
+            self.busy[slot] = True
+            return slot
+
+    def _release_slot(self, slot: int) -> None:
+        with self.lock:
+            self.busy[slot] = False
+        self.slots.release()
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        n = int(body.get("n_predict", 16) or 0)
+        prompt_n = max(1, len(str(body.get("prompt", "")).split()))
+        slot = self._acquire_slot()
+        try:
+            with self.lock:
+                active = sum(self.busy.values())
+            # batching several slots costs a little per token, but far less than queueing
+            ms = n * self.per_token_ms * (1 + 0.15 * (active - 1))
+            time.sleep(ms / 1000.0)
+            with self.lock:
+                self.cached[slot] = prompt_n + n
+        finally:
+            self._release_slot(slot)
+        return {
+            "content": " lorem" * n,
+            "id_slot": slot,
+            "tokens_predicted": n,
+            "tokens_evaluated": prompt_n,
+            "timings": {"prompt_n": prompt_n, "prompt_ms": 0.0, "predicted_n": n, "predicted_ms": round(ms, 3)},
+        }
+
+    def embed(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """OpenAI-style embeddings: one slot, one token-time per input, a vector derived from the text."""
+        inputs = body.get("input", "")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        slot = self._acquire_slot()
+        try:
+            time.sleep(len(inputs) * self.per_token_ms / 1000.0)
+        finally:
+            self._release_slot(slot)
+        data = [
+            {"object": "embedding", "index": i, "embedding": [float(len(str(x))), float(sum(map(ord, str(x))) % 997)]}
+            for i, x in enumerate(inputs)
+        ]
+        n = sum(max(1, len(str(x).split())) for x in inputs)
+        return {"object": "list", "data": data, "model": self.args.model, "usage": {"prompt_tokens": n, "total_tokens": n}}
+
+    def slot_action(self, slot: int, action: str, filename: str) -> Dict[str, Any]:
+        """``/slots/{id}?action=save|restore``: the cache "state" is just its token count."""
+        if not self.args.slot_save_path:
+            raise LookupError("This server does not support slots action")
+        if slot not in self.cached or not filename or "/" in filename:
+            raise ValueError("Invalid slot or filename")
+        path = os.path.join(self.args.slot_save_path, filename)
+        if action == "save":
+            with self.lock:
+                n = self.cached[slot]
+            with open(path, "w") as f:
+                json.dump({"tokens": n}, f)
+            return {"id_slot": slot, "filename": filename, "n_saved": n, "n_written": n * 16, "timings": {"save_ms": 0.1}}
+        if action == "restore":
+            try:
+                with open(path) as f:
+                    n = int(json.load(f)["tokens"])
+            except (OSError, ValueError, KeyError):
+                raise ValueError(f"failed to restore slot {slot} from {filename}")
+            with self.lock:
+                self.cached[slot] = n
+            return {"id_slot": slot, "filename": filename, "n_restored": n, "n_read": n * 16, "timings": {"restore_ms": 0.1}}
+        raise ValueError(f"Invalid action: {action}")
+
+    def slot_states(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [
+                {"id": i, "is_processing": b, "n_ctx": self.args.ctx_size // len(self.busy), "n_cached": self.cached[i]}
+                for i, b in self.busy.items()
+            ]
+
+
+def make_handler(stub: Stub):
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive like llama-server: clients close first, so the port is not left in TIME_WAIT
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, status: int, payload: Any) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> Dict[str, Any]:
+            n = int(self.headers.get("Content-Length") or 0)
+            try:
+                return json.loads(self.rfile.read(n) or b"{}")
+            except ValueError:
+                return {}
+
+        def do_GET(self):
+            if not stub.loaded.is_set():
+                return self._send(503, {"error": {"code": 503, "message": "Loading model"}})
+            path = self.path.split("?", 1)[0]
+            if path == "/health":
+                return self._send(200, {"status": "ok"})
+            if path == "/v1/models":
+                return self._send(200, {"object": "list", "data": [{"id": stub.args.model, "object": "model"}]})
+            if path == "/slots":
+                return self._send(200, stub.slot_states())
+            return self._send(404, {"error": {"code": 404, "message": "File Not Found"}})
+
+        def do_POST(self):
+            if not stub.loaded.is_set():
+                return self._send(503, {"error": {"code": 503, "message": "Loading model"}})
+            body = self._body()
+            path, _, query = self.path.partition("?")
+            if path == "/completion":
+                return self._send(200, stub.complete(body))
+            if path == "/v1/embeddings":
+                return self._send(200, stub.embed(body))
+            if path.startswith("/slots/"):
+                action = dict(kv.split("=", 1) for kv in query.split("&") if "=" in kv).get("action", "")
+                try:
+                    return self._send(200, stub.slot_action(int(path[len("/slots/"):]), action, str(body.get("filename", ""))))
+                except LookupError as e:
+                    return self._send(501, {"error": {"code": 501, "message": str(e)}})
+                except ValueError as e:
+                    return self._send(400, {"error": {"code": 400, "message": str(e)}})
+            return self._send(404, {"error": {"code": 404, "message": "File Not Found"}})
+
+    return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    max_slots = os.environ.get("LLAMACPP_STUB_MAX_SLOTS")
+    if max_slots and args.parallel > int(max_slots):
+        print(f"stubserver: failed to allocate KV cache for {args.parallel} slots: out of memory", file=sys.stderr, flush=True)
+        return 1
+    stub = Stub(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub))
+    server.daemon_threads = True
+    print(f"main: server is listening on http://{args.host}:{args.port} - starting the main loop", file=sys.stderr, flush=True)
+
+    def load() -> None:
+        time.sleep(_env_float("LLAMACPP_STUB_LOAD_S", 0.2))
+        stub.loaded.set()
+
+    threading.Thread(target=load, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
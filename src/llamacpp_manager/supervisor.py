@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import heapq
+import os
+import select
+import signal
+import time
+from pathlib import Path
+from subprocess import Popen
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import ModelSpec
+from .process import record_launch, spawn_process
+from .utils import process_alive, read_pid, update_runtime
+
+
+class _PollWaiter:
+    """Portable fallback: check registered processes every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._pids: Dict[int, Optional[Popen]] = {}
+
+    def register(self, pid: int, proc: Optional[Popen]) -> None:
+        self._pids[pid] = proc
+
+    def unregister(self, pid: int) -> None:
+        self._pids.pop(pid, None)
+
+    def wait(self, timeout: Optional[float]) -> List[int]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            exited = [pid for pid, proc in self._pids.items() if (proc.poll() is not None if proc else not process_alive(pid))]
+            if exited:
+                return exited
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self.interval, remaining))
+
+    def close(self) -> None:
+        self._pids.clear()
+
+
+class _EpollWaiter:
+    """Linux: one pidfd per process, all waited on in a single epoll set."""
+
+    def __init__(self):
+        self._ep = select.epoll()
+        self._fds: Dict[int, int] = {}  # fd -> pid
+        self._gone: List[int] = []
+
+    def register(self, pid: int, proc: Optional[Popen]) -> None:
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            self._gone.append(pid)
+            return
+        self._fds[fd] = pid
+        self._ep.register(fd, select.EPOLLIN)
+
+    def unregister(self, pid: int) -> None:
+        for fd, p in list(self._fds.items()):
+            if p == pid:
+                self._ep.unregister(fd)
+                os.close(fd)
+                del self._fds[fd]
+
+    def wait(self, timeout: Optional[float]) -> List[int]:
+        if self._gone:
+            gone, self._gone = self._gone, []
+            return gone
+        events = self._ep.poll(-1 if timeout is None else max(0.0, timeout))
+        return [self._fds[fd] for fd, _ in events if fd in self._fds]
+
+    def close(self) -> None:
+        for fd in list(self._fds):
+            os.close(fd)
+        self._fds.clear()
+        self._ep.close()
+
+
+class _KqueueWaiter:
+    """macOS/BSD: EVFILT_PROC NOTE_EXIT events on a single kqueue."""
+
+    def __init__(self):
+        self._kq = select.kqueue()
+        self._gone: List[int] = []
+
+    def register(self, pid: int, proc: Optional[Popen]) -> None:
+        ev = select.kevent(pid, filter=select.KQ_FILTER_PROC, flags=select.KQ_EV_ADD | select.KQ_EV_ONESHOT, fflags=select.KQ_NOTE_EXIT)
+        try:
+            self._kq.control([ev], 0, 0)
+        except ProcessLookupError:
+            self._gone.append(pid)
+
+    def unregister(self, pid: int) -> None:
+        ev = select.kevent(pid, filter=select.KQ_FILTER_PROC, flags=select.KQ_EV_DELETE)
+        try:
+            self._kq.control([ev], 0, 0)
+        except OSError:
+            pass
+
+    def wait(self, timeout: Optional[float]) -> List[int]:
+        if self._gone:
+            gone, self._gone = self._gone, []
+            return gone
+        events = self._kq.control(None, 64, None if timeout is None else max(0.0, timeout))
+        return [int(ev.ident) for ev in events]
+
+    def close(self) -> None:
+        self._kq.close()
+
+
+def exit_waiter():
+    """Return the best available process-exit waiter for this platform."""
+    if hasattr(os, "pidfd_open") and hasattr(select, "epoll"):
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+            return _EpollWaiter()
+        except OSError:
+            pass
+    if hasattr(select, "kqueue"):
+        return _KqueueWaiter()
+    return _PollWaiter()
+
+
+class Supervisor:
+    """Keep direct-mode llama-server processes alive.
+
+    Each child is watched without polling; when one exits while its PID record
+    still points at it, it is restarted after an exponential backoff. A model
+    that crashes ``crash_limit`` times within ``crash_window`` seconds is
+    considered crash-looping and left down. Running ``stop`` drops the PID
+    record first, so intentional stops are never restarted.
+    """
+
+    def __init__(
+        self,
+        llama_server_path: str,
+        specs: List[ModelSpec],
+        log_dir: Path,
+        *,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        crash_limit: int = 5,
+        crash_window: float = 120.0,
+        stable_after: float = 60.0,
+        waiter=None,
+        spawn: Callable[..., Popen] = spawn_process,
+        log: Callable[[str], None] = print,
+    ):
+        self.llama_server_path = llama_server_path
+        self.specs = {s.name: s for s in specs}
+        self.log_dir = log_dir
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.crash_limit = crash_limit
+        self.crash_window = crash_window
+        self.stable_after = stable_after
+        self.waiter = waiter or exit_waiter()
+        self.spawn = spawn
+        self.log = log
+        self.children: Dict[int, Tuple[str, Optional[Popen], float]] = {}
+        self.crashes: Dict[str, List[float]] = {n: [] for n in self.specs}
+        self.consecutive: Dict[str, int] = {n: 0 for n in self.specs}
+        self.restarts: Dict[str, int] = {n: 0 for n in self.specs}
+        self._pending: List[Tuple[float, str]] = []
+
+    def backoff_delay(self, consecutive: int) -> float:
+        return min(self.backoff_max, self.backoff_base * (2 ** max(0, consecutive - 1)))
+
+    def _watch(self, name: str, pid: int, proc: Optional[Popen]) -> None:
+        self.waiter.register(pid, proc)
+        self.children[pid] = (name, proc, time.monotonic())
+
+    def adopt_or_start(self) -> None:
+        """Watch models already running from a PID record; start the rest."""
+        for name in self.specs:
+            try:
+                pid = read_pid(name)
+                if process_alive(pid):
+                    self._watch(name, pid, None)
+                    update_runtime(name, {"supervisor": "watching"})
+                    self.log(f"supervising {name} pid={pid}")
+                    continue
+            except (FileNotFoundError, ValueError):
+                pass
+            self._start(name)
+
+    def _start(self, name: str) -> None:
+        try:
+            proc = self.spawn(self.llama_server_path, self.specs[name], self.log_dir)
+        except OSError as e:
+            self.log(f"error: failed to start {name}: {e}")
+            self._crashed(name, None, time.monotonic())
+            return
+        record_launch(self.llama_server_path, self.specs[name], proc.pid, log_dir=self.log_dir)
+        self._watch(name, proc.pid, proc)
+        update_runtime(name, {"supervisor": "watching", "restarts": self.restarts[name]})
+        self.log(f"started {name} pid={proc.pid}")
+
+    def _handle_exit(self, pid: int, now: float) -> None:
+        name, proc, started = self.children.pop(pid)
+        self.waiter.unregister(pid)
+        code = proc.wait() if proc is not None else None
+        try:
+            intentional = read_pid(name) != pid
+        except (FileNotFoundError, ValueError):
+            intentional = True
+        update_runtime(name, {"last_exit_code": code, "last_exit_at": time.time()})
+        if intentional:
+            update_runtime(name, {"supervisor": "stopped"})
+            self.log(f"{name} pid={pid} stopped (exit={code}); not restarting")
+            return
+        if now - started >= self.stable_after:
+            self.consecutive[name] = 0
+        self.log(f"{name} pid={pid} exited (exit={code})")
+        self._crashed(name, code, now)
+
+    def _crashed(self, name: str, code: Optional[int], now: float) -> None:
+        self.consecutive[name] += 1
+        window = [t for t in self.crashes[name] if now - t <= self.crash_window] + [now]
+        self.crashes[name] = window
+        if len(window) >= self.crash_limit:
+            update_runtime(name, {"supervisor": "crash-loop"})
+            self.log(f"{name} crashed {len(window)} times in {self.crash_window:.0f}s (exit={code}); giving up")
+            return
+        delay = self.backoff_delay(self.consecutive[name])
+        update_runtime(name, {"supervisor": "backoff"})
+        self.log(f"restarting {name} in {delay:.1f}s")
+        heapq.heappush(self._pending, (now + delay, name))
+
+    def step(self, timeout: Optional[float] = None) -> None:
+        """Wait once for exits or a due restart, then act on it."""
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            _, name = heapq.heappop(self._pending)
+            self.restarts[name] += 1
+            self._start(name)
+        if self._pending:
+            until = self._pending[0][0] - now
+            timeout = until if timeout is None else min(timeout, until)
+        for pid in self.waiter.wait(timeout):
+            if pid in self.children:
+                self._handle_exit(pid, time.monotonic())
+
+    def active(self) -> bool:
+        return bool(self.children or self._pending)
+
+    def run(self) -> None:
+        def _term(signum, frame):
+            raise KeyboardInterrupt
+
+        prev = signal.signal(signal.SIGTERM, _term)
+        try:
+            self.adopt_or_start()
+            while self.active():
+                self.step()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            signal.signal(signal.SIGTERM, prev)
+            for name in {n for n, _, _ in self.children.values()}:
+                update_runtime(name, {"supervisor": None})
+            self.waiter.close()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import ctypes
+import errno
+import json
+import os
+import platform
+import shutil
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+SYSFS = Path("/sys/devices/system")
+
+# ioprio_set(2): syscall numbers per architecture and scheduling classes
+_IOPRIO_SYSCALL = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "arm64": 30, "riscv64": 30, "armv7l": 314, "ppc64le": 273}
+_IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+_IOPRIO_WHO_PROCESS = 1
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """Parse a sysfs cpulist such as ``0-3,8,10-11``."""
+    cpus: List[int] = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpulist(cpus: Sequence[int]) -> str:
+    out: List[str] = []
+    ordered = sorted(set(cpus))
+    i = 0
+    while i < len(ordered):
+        j = i
+        while j + 1 < len(ordered) and ordered[j + 1] == ordered[j] + 1:
+            j += 1
+        out.append(str(ordered[i]) if i == j else f"{ordered[i]}-{ordered[j]}")
+        i = j + 1
+    return ",".join(out)
+
+
+def _read(p: Path) -> Optional[str]:
+    try:
+        return p.read_text().strip()
+    except OSError:
+        return None
+
+
+def read_topology(root: Path = SYSFS) -> List[Dict[str, Any]]:
+    """Return physical cores as ``[{node, package, core, cpus}]``, NUMA-node ordered.
+
+    Reads ``<root>/cpu`` and ``<root>/node``; hyperthread siblings share one
+    entry. Only CPUs this process may run on are included. Without sysfs
+    (e.g. macOS) every logical CPU is reported as its own core on node 0.
+    """
+    allowed = set(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    online = _read(root / "cpu" / "online")
+    if online is None:
+        n = os.cpu_count() or 1
+        return [{"node": 0, "package": 0, "core": c, "cpus": [c]} for c in range(n)]
+    node_of: Dict[int, int] = {}
+    for d in sorted((root / "node").glob("node[0-9]*")):
+        text = _read(d / "cpulist")
+        if text:
+            for c in parse_cpulist(text):
+                node_of[c] = int(d.name[4:])
+    cores: Dict[Tuple[int, int, int], List[int]] = {}
+    for c in parse_cpulist(online):
+        if allowed is not None and c not in allowed:
+            continue
+        topo = root / "cpu" / f"cpu{c}" / "topology"
+        package = int(_read(topo / "physical_package_id") or 0)
+        core = int(_read(topo / "core_id") or c)
+        cores.setdefault((node_of.get(c, 0), package, core), []).append(c)
+    return [{"node": k[0], "package": k[1], "core": k[2], "cpus": sorted(v)} for k, v in sorted(cores.items())]
+
+
+def _shares(total: int, weights: List[float]) -> List[int]:
+    # one core each, the remainder split by weight (largest remainder)
+    n = len(weights)
+    base = [1] * n
+    spare = total - n
+    wsum = sum(weights)
+    if spare <= 0 or wsum <= 0:
+        return base
+    exact = [spare * w / wsum for w in weights]
+    floors = [int(x) for x in exact]
+    left = spare - sum(floors)
+    order = sorted(range(n), key=lambda i: exact[i] - floors[i], reverse=True)
+    for i in order[:left]:
+        floors[i] += 1
+    return [b + f for b, f in zip(base, floors)]
+
+
+def plan_placement(models: List[Tuple[str, float]], cores: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Split physical cores among ``(name, weight)`` pairs.
+
+    Each model gets a contiguous run of cores in NUMA-node order, so small
+    shares stay on one node; its thread count equals its physical core count.
+    With more models than cores, models share cores round-robin.
+    """
+    models = [(n, float(w)) for n, w in models if float(w) > 0]
+    if not models or not cores:
+        return {}
+    plan: Dict[str, Dict[str, Any]] = {}
+    if len(models) > len(cores):
+        slices = [[cores[i % len(cores)]] for i in range(len(models))]
+    else:
+        slices = []
+        pos = 0
+        for share in _shares(len(cores), [w for _, w in models]):
+            slices.append(cores[pos:pos + share])
+            pos += share
+    for (name, _), chunk in zip(models, slices):
+        cpus = sorted(c for core in chunk for c in core["cpus"])
+        node = Counter(core["node"] for core in chunk).most_common(1)[0][0]
+        plan[name] = {"cpus": cpus, "threads": len(chunk), "node": node}
+    return plan
+
+
+def placement_for_config(cfg: Dict[str, Any], cores: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Static placement for all configured models when ``cpu_placement`` is on.
+
+    Weights come from each model's ``cpu_weight`` (default 1; 0 opts out).
+    Partitioning over the configured fleet rather than whatever happens to
+    be running keeps a model's cores stable across starts and restarts.
+    """
+    if not cfg.get("cpu_placement"):
+        return {}
+    models = []
+    for m in cfg.get("models", []):
+        w = m.get("cpu_weight")
+        models.append((m.get("name"), 1.0 if w is None else float(w)))
+    return plan_placement(models, read_topology() if cores is None else cores)
+
+
+def parse_ionice(value: str) -> Tuple[int, int]:
+    """``idle``, ``best-effort[:0-7]`` or ``realtime[:0-7]`` -> (class, level)."""
+    cls, _, level = value.partition(":")
+    if cls not in _IOPRIO_CLASSES:
+        raise ValueError(f"invalid ionice class '{cls}' (expected one of {', '.join(_IOPRIO_CLASSES)})")
+    lvl = int(level) if level else 4
+    if not 0 <= lvl <= 7:
+        raise ValueError("ionice level must be in 0..7")
+    return _IOPRIO_CLASSES[cls], lvl
+
+
+def _ioprio_setter(cls: int, level: int) -> Callable[[int], None]:
+    nr = _IOPRIO_SYSCALL.get(platform.machine())
+    if nr is None or not platform.system() == "Linux":
+        raise OSError("ioprio_set is not supported on this platform")
+    syscall = ctypes.CDLL(None, use_errno=True).syscall
+    value = (cls << 13) | level
+
+    def set_ioprio(pid: int) -> None:
+        if syscall(nr, _IOPRIO_WHO_PROCESS, pid, value) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    return set_ioprio
+
+
+def _placer(cpus: Optional[List[int]], nice: Optional[int], ionice: Optional[str]) -> Callable[[int], List[str]]:
+    """Everything that can be checked before launch, and a function applying the rest to a pid."""
+    early: List[str] = []
+    if cpus and not hasattr(os, "sched_setaffinity"):
+        early.append("CPU affinity is not supported on this platform")
+        cpus = None
+    set_ioprio: Optional[Callable[[int], None]] = None
+    if ionice:
+        try:
+            set_ioprio = _ioprio_setter(*parse_ionice(ionice))
+        except (OSError, ValueError) as e:
+            early.append(f"could not set ionice {ionice}: {e}")
+
+    def apply(pid: int) -> List[str]:
+        warnings = list(early)
+        if cpus:
+            try:
+                os.sched_setaffinity(pid, cpus)
+            except OSError as e:
+                warnings.append(f"could not set CPU affinity: {e}")
+        if nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, pid, int(nice))
+            except OSError as e:
+                warnings.append(f"could not set nice {nice}: {e}")
+        if set_ioprio is not None:
+            try:
+                set_ioprio(pid)
+            except OSError as e:
+                warnings.append(f"could not set ionice {ionice}: {e}")
+        return warnings
+
+    return apply
+
+
+def apply_placement(pid: int, *, cpus: Optional[List[int]] = None, nice: Optional[int] = None, ionice: Optional[str] = None) -> List[str]:
+    """Best-effort affinity/priority for a running process; returns warnings."""
+    return _placer(cpus, nice, ionice)(pid)
+
+
+def placement_command(
+    argv: List[str], cpus: Optional[List[int]] = None, nice: Optional[int] = None, ionice: Optional[str] = None, prefix: str = "",
+) -> List[str]:
+    """``argv`` wrapped so affinity and priority are applied before the server execs; ``argv`` itself if there is nothing to apply.
+
+    The wrapper is a short-lived interpreter that places itself and then
+    ``execvp``s the server in the same process, so llama-server starts its
+    thread pools on the right cores and keeps the pid Popen returned. Doing
+    this in a ``preexec_fn`` instead is unsafe in a threaded parent. Warnings
+    go to the server's stderr, each line starting with ``prefix``. Returns
+    ``argv`` unchanged without a Python executable; apply_placement is then
+    the caller's fallback.
+    """
+    if (not cpus and nice is None and not ionice) or not sys.executable:
+        return argv
+    if shutil.which(argv[0]) is None:
+        # the wrapper would only fail at exec; report a missing binary from the parent as Popen does
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), argv[0])
+    settings = json.dumps({"cpus": cpus, "nice": nice, "ionice": ionice, "prefix": prefix})
+    root = str(Path(__file__).resolve().parent.parent)
+    script = "import sys; sys.path.insert(0, sys.argv[1]); from llamacpp_manager.topology import _exec_placed; _exec_placed(sys.argv[2:])"
+    return [sys.executable, "-I", "-S", "-c", script, root, settings, *argv]
+
+
+def _exec_placed(args: List[str]) -> None:
+    # runs in the wrapper interpreter: args are the settings JSON and then the server argv
+    settings = json.loads(args[0])
+    prefix = settings["prefix"]
+    for w in _placer(settings["cpus"], settings["nice"], settings["ionice"])(0):
+        os.write(2, f"{prefix}warning: {w}\n".encode("utf-8", "replace"))
+    try:
+        os.execvp(args[1], args[1:])
+    except OSError as e:
+        os.write(2, f"{prefix}error: could not exec {args[1]}: {e}\n".encode("utf-8", "replace"))
+        os._exit(127)
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import json
+import math
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .logs import open_log_append, rotate_file
+
+
+TRACE_FILE = "proxy-trace.jsonl"
+DEFAULT_SAMPLE = 0.1
+DEFAULT_MAX_MB = 50
+DEFAULT_BACKUPS = 5
+# bytes of a non-streamed response body kept for reading its token counts
+_BODY_CAP = 4 * 1024 * 1024
+PHASES = ("admit", "connect", "queue", "prompt", "decode", "total")
+
+
+def parse_trace(value: Any) -> Dict[str, Any]:
+    """Normalise the top-level ``trace`` section: ``sample`` (0..1), ``max_mb`` and ``backups``."""
+    value = value or {}
+    if not isinstance(value, dict):
+        raise ValueError("trace must be a mapping with 'sample', 'max_mb' and/or 'backups'")
+    sample = value.get("sample", DEFAULT_SAMPLE)
+    if isinstance(sample, bool) or not isinstance(sample, (int, float)) or not 0 <= sample <= 1:
+        raise ValueError("trace.sample must be between 0 and 1")
+    out = {"sample": float(sample), "max_mb": value.get("max_mb", DEFAULT_MAX_MB), "backups": value.get("backups", DEFAULT_BACKUPS)}
+    for key in ("max_mb", "backups"):
+        if isinstance(out[key], bool) or not isinstance(out[key], (int, float)) or out[key] <= 0:
+            raise ValueError(f"trace.{key} must be positive")
+    return out
+
+
+def _usage(doc: Any) -> Dict[str, Any]:
+    """Token counts and server timings from a llama-server or OpenAI-style response object."""
+    if not isinstance(doc, dict):
+        return {}
+    timings = doc.get("timings") if isinstance(doc.get("timings"), dict) else {}
+    usage = doc.get("usage") if isinstance(doc.get("usage"), dict) else {}
+    out = {
+        "prompt_tokens": usage.get("prompt_tokens", timings.get("prompt_n", doc.get("tokens_evaluated"))),
+        "completion_tokens": usage.get("completion_tokens", timings.get("predicted_n", doc.get("tokens_predicted"))),
+        "prompt_ms": timings.get("prompt_ms"),
+        "predicted_ms": timings.get("predicted_ms"),
+    }
+    return {k: v for k, v in out.items() if v is not None}
+
+
+class Trace:
+    """Timings of one proxied request, in ms since its arrival."""
+
+    def __init__(self, method: str, path: str, public_port: int):
+        self._t0 = time.perf_counter()
+        self.rec: Dict[str, Any] = {"ts": round(time.time(), 3), "method": method, "path": path, "public_port": public_port}
+        self._stream = False
+        self._buf = bytearray()
+        self._events = 0
+
+    def mark(self, name: str) -> None:
+        self.rec[f"{name}_ms"] = round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def response(self, status: int, content_type: Optional[str]) -> None:
+        self.mark("first_byte")
+        self.rec["status"] = status
+        self._stream = "text/event-stream" in (content_type or "")
+        self.rec["stream"] = self._stream
+
+    def feed(self, chunk: bytes) -> None:
+        """Body bytes as they are relayed: marks first/last token and keeps what token counts need."""
+        if "first_token_ms" not in self.rec:
+            self.mark("first_token")
+        self.mark("last_token")
+        self.rec["bytes"] = self.rec.get("bytes", 0) + len(chunk)
+        if not self._stream:
+            if len(self._buf) < _BODY_CAP:
+                self._buf += chunk[: _BODY_CAP - len(self._buf)]
+            return
+        # SSE: only complete "data:" lines matter; the final one carries timings/usage
+        self._buf += chunk
+        *lines, rest = bytes(self._buf).split(b"\n")
+        self._buf = bytearray(rest)
+        for line in lines:
+            if not line.startswith(b"data:"):
+                continue
+            self._events += 1
+            if b'"timings"' in line or b'"usage"' in line:
+                try:
+                    self.rec.update(_usage(json.loads(line[5:])))
+                except ValueError:
+                    pass
+
+    def finish(self, **fields: Any) -> Dict[str, Any]:
+        self.rec.update({k: v for k, v in fields.items() if v is not None})
+        if self._stream:
+            # without timings in the stream, each data event is about one token
+            self.rec.setdefault("completion_tokens", max(0, self._events - 1) if self._events else None)
+        elif self._buf:
+            try:
+                self.rec.update(_usage(json.loads(bytes(self._buf))))
+            except ValueError:
+                pass
+        self._buf = bytearray()
+        return {k: v for k, v in self.rec.items() if v is not None}
+
+
+class TraceWriter:
+    """Samples proxied requests and appends their traces to a rotating JSONL file.
+
+    Request threads only hand finished records to a bounded queue; one
+    background thread does all file I/O. When the queue is full the record
+    is dropped and counted rather than slowing the request down.
+    """
+
+    def __init__(self, path: Path, sample: float = DEFAULT_SAMPLE, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024, backups: int = DEFAULT_BACKUPS, queue_size: int = 10000):
+        self.path = path
+        self.sample = sample
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def begin(self, method: str, path: str, public_port: int) -> Optional[Trace]:
+        """A Trace for a sampled request, else None (untraced requests pay nothing more)."""
+        if self.sample <= 0 or (self.sample < 1 and random.random() >= self.sample):
+            return None
+        return Trace(method, path, public_port)
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        rotate_file(self.path, self.max_bytes, self.backups)
+        f = open_log_append(self.path)
+        try:
+            while True:
+                item = self._q.get()
+                batch = [item]
+                # drain whatever else is waiting, then write it in one go
+                while item is not None and not self._q.empty():
+                    item = self._q.get_nowait()
+                    batch.append(item)
+                f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch if r is not None))
+                f.flush()
+                if f.tell() >= self.max_bytes:
+                    f.close()
+                    rotate_file(self.path, self.max_bytes, self.backups)
+                    f = open_log_append(self.path)
+                if batch[-1] is None:
+                    return
+        finally:
+            f.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out queued records and stop the background thread."""
+        self._q.put(None)
+        self._thread.join(timeout)
+
+
+def trace_files(path: Path) -> List[Path]:
+    """The trace file and its rotated copies, oldest first."""
+    rotated = sorted(path.parent.glob(path.name + ".*"), key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0, reverse=True)
+    return [p for p in rotated if p.suffix[1:].isdigit()] + ([path] if path.exists() else [])
+
+
+def read_traces(path: Path, since: Optional[float] = None, until: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    for p in trace_files(path):
+        try:
+            with p.open("r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by rotation or a crash
+                    ts = rec.get("ts") or 0
+                    if (since is None or ts >= since) and (until is None or ts <= until):
+                        yield rec
+        except OSError:
+            continue
+
+
+def phases(rec: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Split one request's latency into admit, connect, queue, prompt, decode and total (ms).
+
+    ``admit`` is the wait in the proxy's own admission queue (``qos``).
+    ``prompt`` and ``decode`` are llama-server's own timings. ``queue`` is
+    the rest of the time spent waiting on the backend: waiting for a free
+    slot, mostly, plus transfer overhead.
+    """
+    total = rec.get("last_token_ms", rec.get("first_byte_ms"))
+    admit = rec.get("admitted_ms")
+    connect = rec.get("connect_ms")
+    prompt = rec.get("prompt_ms")
+    decode = rec.get("predicted_ms")
+    if decode is None and rec.get("stream") and "first_token_ms" in rec:
+        decode = rec["last_token_ms"] - rec["first_token_ms"]
+    queue_ms = None
+    if total is not None and connect is not None and prompt is not None and decode is not None:
+        queue_ms = max(0.0, total - connect - prompt - decode)
+    if connect is not None and admit is not None:
+        connect = max(0.0, connect - admit)
+    return {"admit": admit, "connect": connect, "queue": queue_ms, "prompt": prompt, "decode": decode, "total": total}
+
+
+def _stats(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    s = sorted(values)
+
+    def pct(q: float) -> float:
+        return round(s[max(0, math.ceil(q * len(s)) - 1)], 1)
+
+    return {"count": len(s), "mean": round(sum(s) / len(s), 1), "p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(s[-1], 1)}
+
+
+def summarize(records: Iterator[Dict[str, Any]], models: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Latency by phase per model (and ``*`` for all of them), with request, error, rejection and token totals."""
+    acc: Dict[str, Dict[str, Any]] = {}
+    for rec in records:
+        model = rec.get("model") or "?"
+        if models and model not in models:
+            continue
+        for key in (model, "*"):
+            a = acc.setdefault(key, {"requests": 0, "errors": 0, "rejected": 0, "prompt_tokens": 0, "completion_tokens": 0, "decoded": 0, "decode_ms": 0.0, **{p: [] for p in PHASES}})
+            a["requests"] += 1
+            if rec.get("rejected"):
+                a["rejected"] += 1
+            elif rec.get("error") or int(rec.get("status") or 0) >= 500:
+                a["errors"] += 1
+            a["prompt_tokens"] += int(rec.get("prompt_tokens") or 0)
+            a["completion_tokens"] += int(rec.get("completion_tokens") or 0)
+            split = phases(rec)
+            for name, v in split.items():
+                if v is not None:
+                    a[name].append(float(v))
+            if rec.get("completion_tokens") and split["decode"]:
+                a["decoded"] += int(rec["completion_tokens"])
+                a["decode_ms"] += split["decode"]
+    out: Dict[str, Dict[str, Any]] = {}
+    for key, a in acc.items():
+        out[key] = {
+            "requests": a["requests"],
+            "errors": a["errors"],
+            "rejected": a["rejected"],
+            "prompt_tokens": a["prompt_tokens"],
+            "completion_tokens": a["completion_tokens"],
+            "decode_tokens_per_s": round(a["decoded"] / (a["decode_ms"] / 1000), 1) if a["decode_ms"] else None,
+            "phases": {p: _stats(a[p]) for p in PHASES},
+        }
+    return out
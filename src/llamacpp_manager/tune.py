@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import http.client
+import json
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from subprocess import Popen
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .health import wait_ready
+from .logs import open_log_append
+from .process import stop_processes
+from .utils import app_support_dir, atomic_write_text, ensure_dir, to_json
+
+
+OBJECTIVES = ("tokens_per_s", "p95_latency")
+
+# Tuned parameters in search order -> llama-server flags (first one is emitted).
+# Slots first: they change the most and decide how the rest behave.
+PARAMS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("parallel", ("-np", "--parallel")),
+    ("threads", ("-t", "--threads")),
+    ("batch", ("-b", "--batch-size")),
+    ("ubatch", ("-ub", "--ubatch-size")),
+    ("flash_attn", ("-fa", "--flash-attn")),
+    ("ctx", ("-c", "--ctx-size")),
+)
+_FLAG_PARAM = {flag: name for name, flags in PARAMS for flag in flags}
+_FA_VALUES = ("on", "off", "auto")
+
+# Fixed workload: the same prompts in the same order for every candidate
+PROMPTS = (
+    "Summarise the causes of the French Revolution in three sentences.",
+    "Write a Python function that checks whether a string is a palindrome.",
+    "List five practical tips for reducing the memory use of a web service.",
+    "Explain the difference between a process and a thread to a new programmer.",
+    "Translate into French: The quick brown fox jumps over the lazy dog.",
+    "Describe how a hash map handles collisions.",
+)
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*([smh]?)$")
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text: str) -> float:
+    """Seconds from ``90``, ``90s``, ``20m`` or ``1.5h``."""
+    m = _DURATION.match(text.strip())
+    if not m:
+        raise ValueError(f"invalid duration: {text!r} (expected e.g. 90s, 20m, 1h)")
+    return float(m.group(1)) * _DURATION_UNITS[m.group(2)]
+
+
+def default_space(cpus: Optional[int] = None) -> Dict[str, List[Any]]:
+    """Candidate values per parameter; ``ctx`` is left alone unless asked for."""
+    cpus = cpus or os.cpu_count() or 4
+    return {
+        "parallel": [1, 2, 4],
+        "threads": sorted({max(1, cpus // 4), max(1, cpus // 2), cpus}),
+        "batch": [512, 1024, 2048],
+        "ubatch": [128, 256, 512],
+        "flash_attn": ["off", "on"],
+    }
+
+
+def parse_space(items: List[str], base: Optional[Dict[str, List[Any]]] = None) -> Dict[str, List[Any]]:
+    """Override search-space entries from ``name=v1,v2`` items; an empty list drops the parameter."""
+    space = dict(default_space() if base is None else base)
+    names = [n for n, _ in PARAMS]
+    for item in items:
+        if "=" not in item:
+            raise ValueError(f"invalid --space item (expected NAME=V1,V2): {item}")
+        name, values = item.split("=", 1)
+        name = name.strip().replace("-", "_")
+        if name not in names:
+            raise ValueError(f"unknown tuning parameter {name!r} (choose from {', '.join(names)})")
+        parsed: List[Any] = []
+        for v in filter(None, (v.strip() for v in values.split(","))):
+            if name == "flash_attn":
+                if v not in _FA_VALUES:
+                    raise ValueError(f"flash_attn values must be one of {', '.join(_FA_VALUES)}")
+                parsed.append(v)
+            else:
+                try:
+                    parsed.append(int(v))
+                except ValueError:
+                    raise ValueError(f"{name} values must be integers: {v!r}")
+                if parsed[-1] <= 0:
+                    raise ValueError(f"{name} values must be positive")
+        if parsed:
+            space[name] = sorted(set(parsed), key=lambda x: (str(type(x)), x))
+        else:
+            space.pop(name, None)
+    return space
+
+
+def _split(args: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+    """Separate tuned flags from the rest of a model's args: ``(other_args, {param: value})``."""
+    rest: List[str] = []
+    found: Dict[str, Any] = {}
+    i = 0
+    while i < len(args):
+        a = args[i]
+        flag, eq, inline = a.partition("=")
+        name = _FLAG_PARAM.get(flag)
+        if name is None:
+            rest.append(a)
+            i += 1
+            continue
+        if eq:
+            value: Any = inline
+            i += 1
+        elif name == "flash_attn" and (i + 1 >= len(args) or args[i + 1] not in _FA_VALUES):
+            # older llama-server: bare -fa switches it on
+            value = "on"
+            i += 1
+        elif i + 1 < len(args):
+            value = args[i + 1]
+            i += 2
+        else:
+            rest.append(a)
+            i += 1
+            continue
+        if name != "flash_attn":
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        found[name] = value
+    return rest, found
+
+
+def current_params(args: List[str]) -> Dict[str, Any]:
+    """Tuned parameters as set in a model's args; unset ones are None (llama-server's default)."""
+    _, found = _split(args or [])
+    return {name: found.get(name) for name, _ in PARAMS}
+
+
+def with_params(args: List[str], params: Dict[str, Any]) -> List[str]:
+    """``args`` with the tuned flags replaced by ``params``; None values leave the flag unset."""
+    rest, found = _split(args or [])
+    merged = {**found, **params}
+    out = list(rest)
+    for name, flags in PARAMS:
+        if merged.get(name) is not None:
+            out += [flags[0], str(merged[name])]
+    return out
+
+
+def slot_context(base: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Scale ``-c`` with ``-np`` so each slot keeps the context it has today.
+
+    llama-server splits ``-c`` across its slots; comparing 4 slots of 1k
+    against 1 slot of 4k would reward a config that cannot serve the same
+    prompts. Only applies when the model sets ``-c`` and ctx is not tuned itself.
+    """
+    ctx, np_ = base.get("ctx"), base.get("parallel") or 1
+    if not isinstance(ctx, int) or params.get("ctx") != ctx or not isinstance(params.get("parallel"), int):
+        return params
+    return {**params, "ctx": ctx // np_ * params["parallel"]}
+
+
+def _valid(params: Dict[str, Any]) -> bool:
+    b, ub = params.get("batch"), params.get("ubatch")
+    # llama.cpp clamps -ub to -b; such a candidate would just repeat another
+    return not (isinstance(b, int) and isinstance(ub, int) and ub > b)
+
+
+def _post(host: str, port: int, prompt: str, tokens: int, timeout: float) -> Tuple[float, int]:
+    body = json.dumps({"prompt": prompt, "n_predict": tokens, "temperature": 0, "seed": 42, "cache_prompt": False}).encode("utf-8")
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    start = time.perf_counter()
+    try:
+        conn.request("POST", "/completion", body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.status != 200:
+            raise OSError(f"/completion returned HTTP {resp.status}")
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    try:
+        doc = json.loads(data)
+        n = (doc.get("timings") or {}).get("predicted_n", doc.get("tokens_predicted"))
+    except (ValueError, AttributeError):
+        n = None
+    return elapsed, int(n) if n is not None else tokens
+
+
+def _percentile(values: List[float], q: float) -> float:
+    s = sorted(values)
+    # nearest rank
+    k = max(0, min(len(s) - 1, math.ceil(q * len(s)) - 1))
+    return s[k]
+
+
+def drive(host: str, port: int, workload: Dict[str, Any], count: int, offset: int = 0) -> Dict[str, Any]:
+    """Send ``count`` workload requests, ``concurrency`` at a time; tokens/s and latency over them."""
+    timeout = float(workload.get("timeout", 300.0))
+
+    def one(i: int) -> Tuple[float, int]:
+        return _post(host, port, PROMPTS[(offset + i) % len(PROMPTS)], workload["tokens"], timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workload["concurrency"])) as pool:
+        results = list(pool.map(one, range(count)))
+    wall = time.perf_counter() - start
+    latencies = [r[0] for r in results]
+    tokens = sum(r[1] for r in results)
+    return {
+        "requests": count,
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / wall, 2) if wall > 0 else 0.0,
+        "p95_latency_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+    }
+
+
+def drive_summary(rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine workload rounds: throughput over their total time, the worst round's p95."""
+    requests = sum(r["requests"] for r in rounds)
+    tokens = sum(r["tokens"] for r in rounds)
+    secs = sum(r["tokens"] / r["tokens_per_s"] for r in rounds if r["tokens_per_s"])
+    return {
+        "requests": requests,
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / secs, 2) if secs else 0.0,
+        "p95_latency_ms": max(r["p95_latency_ms"] for r in rounds),
+    }
+
+
+def score(result: Dict[str, Any], objective: str) -> float:
+    """Higher is better for either objective."""
+    if objective == "tokens_per_s":
+        return float(result["tokens_per_s"])
+    return -float(result["p95_latency_ms"])
+
+
+def _hopeless(partial: Dict[str, Any], best: Optional[Dict[str, Any]], objective: str, margin: float) -> bool:
+    if best is None:
+        return False
+    if objective == "tokens_per_s":
+        return partial["tokens_per_s"] < best["tokens_per_s"] * (1 - margin)
+    return partial["p95_latency_ms"] > best["p95_latency_ms"] * (1 + margin)
+
+
+def run_trial(
+    argv: List[str],
+    host: str,
+    port: int,
+    workload: Dict[str, Any],
+    *,
+    objective: str,
+    best: Optional[Dict[str, Any]] = None,
+    prune_margin: float = 0.25,
+    ready_timeout: float = 600.0,
+    log_path: Optional[Path] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Launch one candidate, drive the workload against it and stop it again.
+
+    One untimed request warms the server up. The first ``concurrency``
+    requests are then measured on their own: a candidate already worse than
+    ``best`` by more than ``prune_margin`` stops there as ``pruned``.
+    Returns ``{status, tokens_per_s, p95_latency_ms, requests, load_s, duration_s, error}``.
+    """
+    started = time.monotonic()
+    out: Dict[str, Any] = {"status": "failed", "tokens_per_s": None, "p95_latency_ms": None, "requests": 0, "load_s": None, "error": None}
+    full_env = os.environ.copy()
+    full_env.update(env or {})
+    log = open_log_append(log_path) if log_path is not None else open(os.devnull, "w")
+    try:
+        log.write(f"[llamacpp-manager] tune trial: {' '.join(argv)}\n")
+        log.flush()
+        proc = Popen(argv, stdout=log, stderr=log, env=full_env)
+    except OSError as e:
+        log.close()
+        out["error"] = f"failed to launch: {e}"
+        out["duration_s"] = round(time.monotonic() - started, 3)
+        return out
+    try:
+        deadline = time.monotonic() + ready_timeout
+        ready = False
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                break
+            if wait_ready(host, port, min(1.0, max(0.1, deadline - time.monotonic())), interval=0.1):
+                ready = True
+                break
+        if not ready:
+            code = proc.poll()
+            out["error"] = f"exited with code {code} while loading" if code is not None else f"not ready after {ready_timeout:g}s"
+            return out
+        out["load_s"] = round(time.monotonic() - started, 3)
+        _post(host, port, PROMPTS[0], min(8, workload["tokens"]), float(workload.get("timeout", 300.0)))
+        total = max(1, workload["requests"])
+        first = min(total, max(1, workload["concurrency"]))
+        rounds = [drive(host, port, workload, first)]
+        if first < total and _hopeless(rounds[0], best, objective, prune_margin):
+            out.update(rounds[0], status="pruned")
+            return out
+        if first < total:
+            rounds.append(drive(host, port, workload, total - first, offset=first))
+        merged = drive_summary(rounds)
+        out.update(merged, status="ok")
+        return out
+    except (OSError, http.client.HTTPException) as e:
+        out["error"] = str(e) or type(e).__name__
+        return out
+    finally:
+        if proc.poll() is None:
+            stop_processes({"trial": (proc.pid, 10.0)})
+        proc.wait()
+        log.close()
+        out["duration_s"] = round(time.monotonic() - started, 3)
+
+
+def search(
+    base: Dict[str, Any],
+    space: Dict[str, List[Any]],
+    trial: Callable[[Dict[str, Any], Optional[Dict[str, Any]]], Dict[str, Any]],
+    *,
+    objective: str,
+    budget_s: float,
+    on_trial: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Coordinate search from the current parameters ``base``.
+
+    The baseline runs first; then each parameter in PARAMS order is varied
+    over its candidate values while the others stay at the best so far, and
+    a better result becomes the new incumbent at once. Bad regions are cut
+    off early: a candidate that fails to load or errors drops every larger
+    value of that parameter (more slots, bigger batches and contexts only
+    need more memory), and ``trial`` itself may prune a clearly slower
+    candidate after its first round. No new trial starts once the average
+    trial time would overrun ``budget_s``.
+
+    ``trial(params, best_result)`` returns a run_trial-style dict.
+    Returns ``{best, trials, stopped}``, where ``stopped`` is "budget" or "done".
+    """
+    started = time.monotonic()
+    trials: List[Dict[str, Any]] = []
+    seen = set()
+    best: Optional[Dict[str, Any]] = None
+
+    def fits() -> bool:
+        if not trials:
+            return True
+        avg = sum(t["duration_s"] for t in trials) / len(trials)
+        return time.monotonic() - started + avg <= budget_s
+
+    def run(params: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal best
+        seen.add(tuple(sorted(params.items(), key=lambda kv: kv[0])))
+        res = dict(trial(params, best))
+        res["params"] = dict(params)
+        res["score"] = score(res, objective) if res["status"] == "ok" else None
+        trials.append(res)
+        if res["score"] is not None and (best is None or res["score"] > best["score"]):
+            best = res
+        if on_trial is not None:
+            on_trial(res)
+        return res
+
+    if run(dict(base))["status"] != "ok":
+        return {"best": None, "trials": trials, "stopped": "baseline"}
+    for name, _ in PARAMS:
+        values = space.get(name) or []
+        failed_at = None
+        for value in values:
+            assert best is not None
+            cand = {**best["params"], name: value}
+            if tuple(sorted(cand.items(), key=lambda kv: kv[0])) in seen or not _valid(cand):
+                continue
+            if failed_at is not None and isinstance(value, int) and value > failed_at:
+                continue
+            if not fits():
+                return {"best": best, "trials": trials, "stopped": "budget"}
+            res = run(cand)
+            if res["status"] == "failed" and isinstance(value, int):
+                failed_at = value if failed_at is None else min(failed_at, value)
+    return {"best": best, "trials": trials, "stopped": "done"}
+
+
+def results_path(name: str) -> Path:
+    return app_support_dir() / "tune" / f"{name}.json"
+
+
+def save_results(name: str, doc: Dict[str, Any]) -> Path:
+    path = results_path(name)
+    ensure_dir(path.parent)
+    atomic_write_text(path, to_json(doc) + "\n")
+    return path
+
+
+def stub_argv(argv: List[str]) -> List[str]:
+    """Swap the llama-server binary in ``argv`` for the bundled stub server."""
+    return [sys.executable, "-m", "llamacpp_manager.stubserver", *argv[1:]]
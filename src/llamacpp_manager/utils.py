@@ -1,12 +1,15 @@
+import fcntl
 import json
 import os
 import shutil
 import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional, Set
 from datetime import datetime
 import signal
 import socket
+import subprocess
 
 import yaml
 
@@ -54,38 +57,245 @@ def pid_dir() -> Path:
 
 
 def pid_path(name: str) -> Path:
+    """Legacy per-model PID file; only read to migrate it into runtime.json."""
     return pid_dir() / f"{name}.pid"
 
 
+def process_start_time(pid: int) -> Optional[str]:
+    """Kernel start time of a process, or None if it is gone.
+
+    Linux reads field 22 of ``/proc/<pid>/stat`` (clock ticks since boot);
+    elsewhere ``ps -o lstart=`` is asked. A PID plus its start time names a
+    process uniquely, which a PID alone does not once PIDs are recycled.
+    """
+    try:
+        data = Path(f"/proc/{pid}/stat").read_bytes()
+    except FileNotFoundError:
+        if Path("/proc/self/stat").exists():
+            return None
+        try:
+            cp = subprocess.run(["ps", "-o", "lstart=", "-p", str(pid)], capture_output=True, text=True)
+        except OSError:
+            return None
+        return cp.stdout.strip() or None
+    except OSError:
+        return None
+    # comm may contain spaces and parentheses; fields resume after the last ')'
+    return data[data.rindex(b")") + 2:].split()[19].decode("ascii")
+
+
+def pid_fields(pid: int) -> Dict[str, Any]:
+    return {"pid": pid, "pid_start": process_start_time(pid)}
+
+
+def _same_process(pid: int, start: Optional[str]) -> bool:
+    if start is None:
+        return True
+    now = process_start_time(pid)
+    # an exited process is still "ours": it simply reads as not alive
+    return now is None or now == start
+
+
 def write_pid(name: str, pid: int) -> None:
-    p = pid_path(name)
-    ensure_dir(p.parent)
-    atomic_write_text(p, str(pid))
+    update_runtime(name, pid_fields(pid))
 
 
-def read_pid(name: str) -> int:
-    p = pid_path(name)
-    if not p.exists():
-        raise FileNotFoundError(f"pid file not found for {name}: {p}")
-    return int(p.read_text().strip())
+def read_pid(name: str, runtime: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+    """PID recorded for a model in runtime.json (``runtime`` saves re-reading it).
+
+    Raises FileNotFoundError when none is recorded, or when the PID now
+    belongs to a different process (its start time changed); a recycled
+    record is dropped.
+    """
+    rec = (read_runtime() if runtime is None else runtime).get(name) or {}
+    pid = rec.get("pid")
+    if not pid:
+        raise FileNotFoundError(f"no pid recorded for {name}")
+    if not _same_process(int(pid), rec.get("pid_start")):
+        remove_pid(name)
+        raise FileNotFoundError(f"pid {pid} recorded for {name} now belongs to another process")
+    return int(pid)
+
+
+def pid_names(runtime: Optional[Dict[str, Dict[str, Any]]] = None) -> List[str]:
+    """Names of all models that currently have a PID recorded."""
+    data = read_runtime() if runtime is None else runtime
+    return sorted(n for n, rec in data.items() if isinstance(rec, dict) and rec.get("pid"))
 
 
 def remove_pid(name: str) -> None:
-    p = pid_path(name)
+    _migrate_pid_files()
+    with _runtime_lock():
+        data = _load_runtime()
+        rec = data.get(name)
+        if not isinstance(rec, dict) or "pid" not in rec:
+            return
+        rec.pop("pid", None)
+        rec.pop("pid_start", None)
+        _store_runtime(data)
+
+
+def runtime_path() -> Path:
+    return pid_dir() / "runtime.json"
+
+
+@contextmanager
+def _runtime_lock() -> Iterator[None]:
+    ensure_dir(pid_dir())
+    with (pid_dir() / "runtime.lock").open("a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def config_lock() -> Iterator[None]:
+    """Exclusive lock on ``<config dir>/config.lock`` held across a read-modify-write of config.yaml.
+
+    Blocks until free. Any writer of config.yaml (the CLI, the macOS app)
+    should take it so concurrent edits cannot overwrite each other.
+    """
+    ensure_dir(app_support_dir())
+    with (app_support_dir() / "config.lock").open("a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def instance_lock(name: str) -> Iterator[Optional[int]]:
+    """Non-blocking exclusive lock on ``<config dir>/<name>.lock``.
+
+    Yields None when acquired, else the PID recorded by the holder (0 if
+    unknown). The lock dies with its process, so a crash never leaves it stale.
+    """
+    ensure_dir(app_support_dir())
+    path = app_support_dir() / f"{name}.lock"
+    with path.open("a+") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.seek(0)
+            text = f.read().strip()
+            yield int(text) if text.isdigit() else 0
+            return
+        try:
+            f.seek(0)
+            f.truncate()
+            f.write(str(os.getpid()))
+            f.flush()
+            yield None
+        finally:
+            f.seek(0)
+            f.truncate()
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _load_runtime() -> Dict[str, Dict[str, Any]]:
     try:
-        if p.exists():
-            p.unlink()
-    except Exception:
+        data = json.loads(runtime_path().read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _store_runtime(data: Dict[str, Dict[str, Any]]) -> None:
+    atomic_write_text(runtime_path(), json.dumps(data, indent=2, sort_keys=True))
+
+
+# PID directories whose legacy <name>.pid files were already folded into runtime.json
+_MIGRATED: Set[Path] = set()
+
+
+def _migrate_pid_files() -> None:
+    d = pid_dir()
+    if d in _MIGRATED:
+        return
+    legacy = sorted(d.glob("*.pid")) if d.is_dir() else []
+    if legacy:
+        with _runtime_lock():
+            data = _load_runtime()
+            for p in legacy:
+                try:
+                    pid = int(p.read_text().strip())
+                except (OSError, ValueError):
+                    pid = 0
+                rec = data.setdefault(p.stem, {})
+                if pid and not rec.get("pid"):
+                    rec.update(pid_fields(pid))
+                p.unlink(missing_ok=True)
+            _store_runtime(data)
+    _MIGRATED.add(d)
+
+
+def read_runtime() -> Dict[str, Dict[str, Any]]:
+    """Per-model runtime state: pid and its start time, launch record, restart counts, ..."""
+    _migrate_pid_files()
+    return _load_runtime()
+
+
+def update_runtime(name: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge fields into a model's runtime record under a lock; return the record."""
+    _migrate_pid_files()
+    with _runtime_lock():
+        data = _load_runtime()
+        rec = dict(data.get(name) or {})
+        rec.update(fields)
+        data[name] = rec
+        _store_runtime(data)
+    return rec
+
+
+# Servers launched by this process, by pid. Long-lived callers (ensure-running
+# --loop, agent, aio) never wait() on them, so liveness checks poll() them here:
+# that reaps an exited server instead of leaving a zombie that looks alive.
+_children: Dict[int, subprocess.Popen] = {}
+_MAX_EXITED_CHILDREN = 256
+
+
+def track_child(proc: subprocess.Popen) -> None:
+    """Remember a launched server so process_alive reaps it and child_exit reports its exit code."""
+    if len(_children) >= _MAX_EXITED_CHILDREN:
+        for pid, p in list(_children.items()):
+            if getattr(p, "returncode", None) is not None:
+                _children.pop(pid, None)
+    _children[proc.pid] = proc
+
+
+def child_exit(pid: int) -> Optional[int]:
+    """Exit code of a server this process launched, once it has exited; None while it runs or if it is not ours."""
+    proc = _children.get(pid)
+    return proc.poll() if proc is not None else None
+
+
+def _zombie(pid: int) -> bool:
+    # an exited process nobody has waited for still answers signal 0
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return True
+    except ChildProcessError:
         pass
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return False
+    return stat[stat.rindex(")") + 2:].startswith("Z")
 
 
 def process_alive(pid: int) -> bool:
+    proc = _children.get(pid)
+    if proc is not None:
+        return proc.poll() is None
     try:
         # On POSIX, signal 0 checks existence/permission
         os.kill(pid, 0)
-        return True
     except ProcessLookupError:
         return False
+    return not _zombie(pid)
 
 
 def port_in_use(host: str, port: int) -> bool:
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import http.client
+import json
+import time
+from typing import Any, Dict, List
+
+
+DEFAULT_TOKENS = 16
+
+
+def parse_warmup(value: Any) -> Dict[str, Any]:
+    """Normalise a model's ``warmup`` section to ``{prompts: [str], tokens: int}``."""
+    if not isinstance(value, dict):
+        raise ValueError("warmup must be a mapping with 'prompts' and optional 'tokens'")
+    prompts = value.get("prompts") or []
+    if isinstance(prompts, str):
+        prompts = [prompts]
+    if not isinstance(prompts, list) or not all(isinstance(p, str) for p in prompts):
+        raise ValueError("warmup.prompts must be a list of strings")
+    tokens = value.get("tokens", DEFAULT_TOKENS)
+    if not isinstance(tokens, int) or isinstance(tokens, bool) or tokens < 0:
+        raise ValueError("warmup.tokens must be a non-negative integer")
+    return {"prompts": list(prompts), "tokens": tokens}
+
+
+def _post_completion(host: str, port: int, prompt: str, tokens: int, timeout: float) -> None:
+    body = json.dumps({"prompt": prompt, "n_predict": tokens, "cache_prompt": True}).encode("utf-8")
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("POST", "/completion", body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise OSError(f"/completion returned HTTP {resp.status}")
+    finally:
+        conn.close()
+
+
+def run_warmup(host: str, port: int, warmup: Dict[str, Any], timeout: float = 300.0) -> Dict[str, Any]:
+    """Send each warm-up prompt to a ready llama-server, one after another.
+
+    Sequential on purpose: the point is to fault in weights and build the
+    graph and prompt cache, not to measure throughput.
+    Returns ``{ok, duration_s, requests, errors}``.
+    """
+    w = parse_warmup(warmup)
+    errors: List[str] = []
+    start = time.perf_counter()
+    for prompt in w["prompts"]:
+        try:
+            _post_completion(host, port, prompt, w["tokens"], timeout)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e) or type(e).__name__)
+    return {"ok": not errors, "duration_s": round(time.perf_counter() - start, 3), "requests": len(w["prompts"]), "errors": errors}
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import ctypes
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+from .utils import ensure_dir
+
+
+# inotify(7) constants (Linux)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+# Only files appearing, disappearing or being replaced: a launch rotates its
+# log and runtime.json is replaced atomically. Plain writes are left out, since
+# llama-server logs every request, the probe's own included.
+_WATCH_MASK = _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+# For files edited in place (an editor saving config.yaml, a `>` redirect)
+_WRITE_MASK = _WATCH_MASK | _IN_MODIFY | _IN_CLOSE_WRITE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _signature(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    # Fields that define a model's state; latency jitter is not a state change
+    return (entry.get("mode"), entry.get("pid"), entry.get("up"), entry.get("http_status"), entry.get("state"))
+
+
+class ProbeScheduler:
+    """Decide which models are due for a health probe.
+
+    Models whose state was unchanged and healthy at their last probe back off
+    geometrically up to ``max_interval``; models that are down or changed state
+    are probed again after ``min_interval``.
+    """
+
+    def __init__(self, names: Iterable[str], *, min_interval: float, max_interval: float, backoff: float = 2.0):
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.backoff = max(1.0, float(backoff))
+        self._next: Dict[str, float] = {n: 0.0 for n in names}
+        self._interval: Dict[str, float] = {n: self.min_interval for n in self._next}
+        self._last: Dict[str, Tuple[Any, ...]] = {}
+        self._probed: Dict[str, float] = {}
+
+    def due(self, now: float) -> List[str]:
+        return [n for n, t in self._next.items() if t <= now]
+
+    def next_deadline(self) -> float:
+        return min(self._next.values()) if self._next else time.monotonic() + self.max_interval
+
+    def interval(self, name: str) -> float:
+        return self._interval[name]
+
+    def record(self, name: str, entry: Dict[str, Any], now: float) -> None:
+        sig = _signature(entry)
+        healthy = entry["state"] == "ready" if "state" in entry else bool(entry.get("up"))
+        stable = self._last.get(name) == sig and healthy
+        if stable:
+            self._interval[name] = min(self.max_interval, self._interval[name] * self.backoff)
+        else:
+            self._interval[name] = self.min_interval
+        self._last[name] = sig
+        self._probed[name] = now
+        self._next[name] = now + self._interval[name]
+
+    def poke(self, names: Iterable[str]) -> None:
+        """Bring models' next probe forward, e.g. after a relaunch rotated their log.
+
+        Never earlier than ``min_interval`` after a model's last probe, so a
+        burst of file events costs at most one extra probe per interval.
+        The backoff itself is only reset by ``record`` seeing a change.
+        """
+        for n in names:
+            if n in self._next:
+                self._next[n] = min(self._next[n], self._probed.get(n, 0.0) + self.min_interval)
+
+
+# shared state files: a change may concern any model
+_SHARED_FILES = ("runtime.json",)
+# runtime.json fields that mean a model was (re)launched, stopped or finished warming up;
+# others, such as the RSS peaks recorded by status itself, do not call for a probe
+_IDENTITY_FIELDS = ("pid", "pid_start", "port", "started_at", "warmup")
+
+
+class RuntimeChanges:
+    """Which models' launch identity changed since the previous call, from ``read()`` of runtime.json."""
+
+    def __init__(self, read: Callable[[], Dict[str, Dict[str, Any]]]):
+        self._read = read
+        self._seen = self._identities()
+
+    def _identities(self) -> Dict[str, Tuple[Any, ...]]:
+        try:
+            data = self._read()
+        except Exception:
+            return {}
+        return {n: tuple(repr(rec.get(k)) for k in _IDENTITY_FIELDS) for n, rec in data.items() if isinstance(rec, dict)}
+
+    def __call__(self) -> Set[str]:
+        now = self._identities()
+        changed = {n for n in set(now) | set(self._seen) if now.get(n) != self._seen.get(n)}
+        self._seen = now
+        return changed
+
+
+def _model_for_file(filename: str, names: Iterable[str]) -> Optional[str]:
+    # <name>.log, <name>.log.1, <name>.out.log, <name>.pid (legacy), ...
+    best = None
+    for n in names:
+        if filename.startswith(n + ".") and (best is None or len(n) > len(best)):
+            best = n
+    return best
+
+
+def _load_inotify():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """Wait for files being created, removed or replaced in the runtime and log dirs, reported per model name.
+
+    Uses inotify on Linux; elsewhere falls back to comparing directory
+    listings (device and inode) once per wait, which needs no subprocesses.
+    Writes to an existing file are ignored unless ``writes`` is set, which
+    also reports in-place edits (inotify modify/close-write events; mtime
+    and size when polling): wanted for config.yaml, not for busy logs.
+    """
+
+    def __init__(
+        self, dirs: Iterable[Path], names: Iterable[str], *, use_inotify: bool = True,
+        shared: Optional[Callable[[], Set[str]]] = None, writes: bool = False,
+    ):
+        self.dirs = [Path(d) for d in dirs]
+        self.names = list(names)
+        self.writes = writes
+        # models concerned by a change of a shared file; every model unless told otherwise
+        self._shared = shared or (lambda: set(self.names))
+        self._fd: Optional[int] = None
+        self._snapshot: Dict[str, Tuple[int, ...]] = {}
+        for d in self.dirs:
+            ensure_dir(d)
+        libc = _load_inotify() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+            if fd >= 0:
+                for d in self.dirs:
+                    libc.inotify_add_watch(fd, os.fsencode(str(d)), _WRITE_MASK if writes else _WATCH_MASK)
+                self._fd = fd
+        if self._fd is None:
+            self._snapshot = self._scan()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def _models_for_files(self, filenames: Iterable[str]) -> Set[str]:
+        changed: Set[str] = set()
+        shared = False
+        for f in filenames:
+            if f in _SHARED_FILES:
+                shared = True
+                continue
+            name = _model_for_file(f, self.names)
+            if name:
+                changed.add(name)
+        if shared:
+            changed |= self._shared() & set(self.names)
+        return changed
+
+    def _scan(self) -> Dict[str, Tuple[int, ...]]:
+        # inode: a replaced or recreated file counts; mtime and size only when in-place writes do
+        snap: Dict[str, Tuple[int, ...]] = {}
+        for d in self.dirs:
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        try:
+                            st = e.stat()
+                        except OSError:
+                            continue
+                        snap[e.name] = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size) if self.writes else (st.st_dev, st.st_ino)
+            except OSError:
+                continue
+        return snap
+
+    def _read_events(self) -> Set[str]:
+        files: Set[str] = set()
+        assert self._fd is not None
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            off = 0
+            while off + _EVENT_HEADER.size <= len(buf):
+                _wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, off)
+                off += _EVENT_HEADER.size
+                raw = buf[off:off + length].split(b"\0", 1)[0]
+                off += length
+                files.add(os.fsdecode(raw))
+        return self._models_for_files(files)
+
+    def wait(self, timeout: float) -> Set[str]:
+        """Block up to ``timeout`` seconds; return models with file activity."""
+        timeout = max(0.0, timeout)
+        if self._fd is not None:
+            try:
+                ready, _, _ = select.select([self._fd], [], [], timeout)
+            except InterruptedError:
+                return set()
+            return self._read_events() if ready else set()
+        time.sleep(timeout)
+        snap = self._scan()
+        files = {f for f in set(snap) | set(self._snapshot) if snap.get(f) != self._snapshot.get(f)}
+        self._snapshot = snap
+        return self._models_for_files(files)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+
+class TableRenderer:
+    """Redraw only the table rows that changed since the previous render.
+
+    On a terminal, changed rows are rewritten in place with ANSI cursor
+    movement. When output is not a terminal, only changed rows are printed.
+    A change in row count triggers a full redraw.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self._lines: List[str] = []
+        try:
+            self.tty = stream.isatty()
+        except Exception:
+            self.tty = False
+
+    def render(self, header: str, lines: List[str]) -> int:
+        """Write the update and return the number of rows written."""
+        w = self.stream.write
+        if not self._lines or len(lines) != len(self._lines):
+            w(header + "\n")
+            for line in lines:
+                w(line + "\n")
+            written = len(lines)
+        else:
+            written = 0
+            n = len(lines)
+            for i, line in enumerate(lines):
+                if line == self._lines[i]:
+                    continue
+                written += 1
+                if self.tty:
+                    up = n - i
+                    w(f"\x1b[{up}A\r\x1b[2K{line}\x1b[{up}B\r")
+                else:
+                    w(line + "\n")
+        self.stream.flush()
+        self._lines = list(lines)
+        return written
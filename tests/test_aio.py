@@ -0,0 +1,99 @@
+import asyncio
+import sys
+import textwrap
+
+import pytest
+
+from llamacpp_manager import aio
+from llamacpp_manager.cli import main
+from llamacpp_manager.utils import read_pid
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+STUB = """\
+#!{python}
+import sys, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+port = int(sys.argv[sys.argv.index("--port") + 1])
+time.sleep(0.3)  # "loading"
+class H(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+    def do_GET(self):
+        self.send_response(200); self.send_header("Content-Length", "2"); self.end_headers(); self.wfile.write(b"ok")
+HTTPServer(("127.0.0.1", port), H).serve_forever()
+"""
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_start_wait_status_stop_many(tmp_path):
+    stub = tmp_path / "llama-server"
+    stub.write_text(STUB.format(python=sys.executable))
+    stub.chmod(0o755)
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)))
+    names = [f"m{i}" for i in range(4)]
+    for n in names:
+        model = tmp_path / f"{n}.gguf"; model.write_text("x")
+        assert main(["config", "add", n, str(model), "--port", str(free_port())]) == 0
+
+    async def scenario():
+        started = await aio.start(names, ignore_memory=True)
+        assert [r["started"] for r in started] == [True] * 4
+        again = await aio.start("m0", ignore_memory=True)
+        assert again[0]["error"] == "already running"
+        ready = await aio.wait_ready(names, timeout=15)
+        assert ready == {n: True for n in names}
+        st = await aio.status()
+        assert {s["name"]: s["state"] for s in st} == {n: "ready" for n in names}
+        stopped = await aio.stop(names)
+        assert sorted(r["name"] for r in stopped) == names and not any(r["killed"] for r in stopped)
+        return await aio.status(names)
+
+    final = asyncio.run(scenario())
+    assert [s["state"] for s in final] == ["stopped"] * 4
+    with pytest.raises(FileNotFoundError):
+        read_pid("m0")
+
+
+def test_unknown_model_raises():
+    assert main(["init"]) == 0
+    with pytest.raises(KeyError):
+        asyncio.run(aio.status("nope"))
+
+
+def test_wait_ready_returns_early_when_a_server_exits(tmp_path):
+    stub = tmp_path / "llama-server"
+    stub.write_text("#!/bin/sh\nexit 1\n")
+    stub.chmod(0o755)
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)))
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["config", "add", "m1", str(model), "--port", str(free_port())]) == 0
+
+    async def scenario():
+        assert (await aio.start("m1", ignore_memory=True))[0]["started"]
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        ready = await aio.wait_ready("m1", timeout=60)
+        return ready, loop.time() - t0
+
+    ready, waited = asyncio.run(scenario())
+    assert ready == {"m1": False} and waited < 10
@@ -21,12 +21,12 @@ def test_start_stop_dry_run_and_pidfile(tmp_path, monkeypatch, capsys):
     assert main(["init"]) == 0
     assert main(["config", "add", "m1", str(model), "--port", "9200"]) == 0
 
-    # Dry run prints command and does not create pid
+    # Dry run prints command and does not record a pid
+    from llamacpp_manager.utils import read_runtime
     assert main(["start", "m1", "--dry-run"]) == 0
     out = capsys.readouterr().out
     assert "DRY-RUN:" in out
-    p = tmp_path / "pids" / "m1.pid"
-    assert not p.exists()
+    assert "pid" not in read_runtime().get("m1", {})
 
     # Monkeypatch start/stop
     import llamacpp_manager.cli as cli
@@ -36,15 +36,122 @@ def test_start_stop_dry_run_and_pidfile(tmp_path, monkeypatch, capsys):
         called["start"] = (llama, spec.name)
         return 55555
 
-    def fake_stop(pid):
-        called["stop"] = pid
+    def fake_stop(targets, on_exit=None):
+        called["stop"] = targets
+        for name, (pid, grace) in targets.items():
+            on_exit(name, {"pid": pid, "duration_s": 0.1, "killed": False})
 
     monkeypatch.setattr(cli, "start_process", fake_start)
-    monkeypatch.setattr(cli, "stop_process", fake_stop)
+    monkeypatch.setattr(cli, "stop_processes", fake_stop)
 
-    # Start (writes pid)
+    # Start (records pid)
     assert main(["start", "m1"]) == 0
-    assert p.exists() and p.read_text().strip() == "55555"
-    # Stop (reads pid and removes file)
+    assert read_runtime()["m1"]["pid"] == 55555
+    # Stop (reads pid and drops it)
     assert main(["stop", "m1"]) == 0
-    assert not p.exists()
+    assert "pid" not in read_runtime()["m1"]
+    assert called["stop"] == {"m1": (55555, 5.0)}
+    assert "stopped m1 pid=55555" in capsys.readouterr().out
+
+
+def test_restart_all_starts_each_model_as_it_stops(tmp_path, monkeypatch, capsys):
+    a = tmp_path / "a.gguf"; a.write_text("x")
+    b = tmp_path / "b.gguf"; b.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "a", str(a), "--port", "9211", "--stop-timeout", "2"]) == 0
+    assert main(["config", "add", "b", str(b), "--port", "9212"]) == 0
+    from llamacpp_manager.utils import write_pid
+    write_pid("a", 1001)  # b is not running
+
+    import llamacpp_manager.cli as cli
+    events = []
+
+    def fake_start(llama, spec, logdir):
+        events.append(("start", spec.name))
+        return 2000 + len(events)
+
+    def fake_stop(targets, on_exit=None):
+        events.append(("stop", dict(targets)))
+        for name, (pid, grace) in targets.items():
+            on_exit(name, {"pid": pid, "duration_s": 0.2, "killed": False})
+
+    monkeypatch.setattr(cli, "start_process", fake_start)
+    monkeypatch.setattr(cli, "stop_processes", fake_stop)
+
+    assert main(["restart", "all"]) == 0
+    assert events == [("start", "b"), ("stop", {"a": (1001, 2.0)}), ("start", "a")]
+
+
+def test_restart_does_not_start_models_inside_the_stop_loop(tmp_path, monkeypatch, capsys):
+    import threading
+    import time
+    for n in ("a", "b"):
+        (tmp_path / f"{n}.gguf").write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "a", str(tmp_path / "a.gguf"), "--port", "9221"]) == 0
+    assert main(["config", "add", "b", str(tmp_path / "b.gguf"), "--port", "9222"]) == 0
+    from llamacpp_manager.utils import write_pid
+    write_pid("a", 1001)
+    write_pid("b", 1002)
+
+    import llamacpp_manager.cli as cli
+    release = threading.Event()
+    started, callbacks = [], []
+
+    def slow_start(llama, spec, logdir):
+        # e.g. waiting for the port or for memory to free up
+        assert release.wait(10)
+        started.append(spec.name)
+        return 3000 + len(started)
+
+    def fake_stop(targets, on_exit=None):
+        for name, (pid, grace) in targets.items():
+            t0 = time.monotonic()
+            on_exit(name, {"pid": pid, "duration_s": 0.1, "killed": False})
+            callbacks.append(time.monotonic() - t0)
+        release.set()
+
+    monkeypatch.setattr(cli, "start_process", slow_start)
+    monkeypatch.setattr(cli, "stop_processes", fake_stop)
+    monkeypatch.setattr(cli, "port_in_use", lambda host, port: False)
+
+    assert main(["restart", "all", "--ignore-memory"]) == 0
+    assert len(callbacks) == 2 and max(callbacks) < 1.0
+    # both starts still finish before restart returns
+    assert started == ["a", "b"]
+
+
+def test_stop_keeps_the_record_of_a_process_it_could_not_signal(tmp_path, monkeypatch, capsys):
+    import subprocess
+    import sys
+    import llamacpp_manager.cli as cli
+    from llamacpp_manager.utils import read_pid, write_pid
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9211"]) == 0
+    assert main(["config", "add", "m2", str(model), "--port", "9212"]) == 0
+    procs = [subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]) for _ in range(2)]
+    try:
+        write_pid("m1", procs[0].pid)
+        write_pid("m2", procs[1].pid)
+        real_stop = cli.stop_processes
+
+        def stop(targets, on_exit=None):
+            # m1 belongs to another user: signalling it fails
+            denied = {"m1": {"pid": targets["m1"][0], "duration_s": 0.0, "killed": False, "error": "Operation not permitted"}}
+            on_exit("m1", denied["m1"])
+            return {**denied, **real_stop({"m2": targets["m2"]}, on_exit=on_exit)}
+
+        monkeypatch.setattr(cli, "stop_processes", stop)
+        capsys.readouterr()
+        assert main(["stop", "all"]) == 2
+        captured = capsys.readouterr()
+        assert "error: could not stop m1" in captured.err and "stopped m2" in captured.out
+        assert read_pid("m1") == procs[0].pid
+        with pytest.raises(FileNotFoundError):
+            read_pid("m2")
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+                p.wait()
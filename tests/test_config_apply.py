@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+
+import pytest
+import yaml
+
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import load_config, plan_manifest, uniqueness_errors
+from llamacpp_manager.utils import config_lock
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def _manifest(tmp_path, models, **settings):
+    p = tmp_path / "manifest.yaml"
+    p.write_text(yaml.safe_dump({**settings, "models": models}, sort_keys=False))
+    return str(p)
+
+
+def test_uniqueness_is_checked_across_the_whole_list():
+    models = [{"name": f"m{i}", "port": 9000 + i} for i in range(2000)]
+    assert uniqueness_errors(models) == []
+    models += [{"name": "m5", "port": 8000}, {"name": "x", "port": 9001}, {"name": "y", "port": 8100, "public_port": 9002}]
+    errors = uniqueness_errors(models)
+    assert "model name 'm5' is used 2 times" in errors
+    assert "port 9001 used by models 'm1', 'x'" in errors
+    assert "public_port 9002 of 'y' is a backend port of model 'm2'" in errors
+
+
+def test_apply_adds_updates_and_prunes(tmp_path, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "keep", str(model), "--port", "8101"]) == 0
+    assert main(["config", "add", "old", str(model), "--port", "8102"]) == 0
+    assert main(["config", "add", "edit", str(model), "--port", "8103"]) == 0
+    capsys.readouterr()
+    before = load_config()
+    manifest = _manifest(tmp_path, [
+        {"name": "keep", "model_path": str(model), "port": 8101},
+        {"name": "edit", "model_path": str(model), "port": 8104, "args": ["-c", "4096"]},
+        {"name": "new", "model_path": str(model), "port": 8105},
+    ], timeout_ms=1500)
+
+    assert main(["config", "apply", manifest, "--prune", "--dry-run"]) == 0
+    out = capsys.readouterr().out
+    assert "add new\nupdate edit (args, port)\nremove old\nset timeout_ms\n" in out and "would change" in out
+    assert load_config() == before
+
+    assert main(["config", "apply", manifest]) == 0
+    cfg = load_config()
+    assert [m["name"] for m in cfg["models"]] == ["keep", "old", "edit", "new"] and cfg["timeout_ms"] == 1500
+    capsys.readouterr()
+    assert main(["config", "apply", manifest, "--prune", "--json"]) == 0
+    plan = json.loads(capsys.readouterr().out)
+    assert plan["remove"] == ["old"] and plan["unchanged"] == ["keep", "edit", "new"] and plan["errors"] == []
+    assert [m["name"] for m in load_config()["models"]] == ["keep", "edit", "new"]
+    assert main(["config", "apply", manifest, "--prune"]) == 0
+    assert "3 unchanged, nothing to do" in capsys.readouterr().out
+
+
+def test_apply_rejects_the_whole_manifest_on_any_error(tmp_path, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "a", str(model), "--port", "8201"]) == 0
+    before = load_config()
+    manifest = _manifest(tmp_path, [
+        {"name": "b", "model_path": str(model), "port": 8202},
+        {"name": "c", "model_path": str(tmp_path / "missing.gguf"), "port": 8203},
+        {"name": "d", "model_path": str(model), "port": 8201},
+        {"name": "e", "model_path": str(model)},
+    ])
+    capsys.readouterr()
+    assert main(["config", "apply", manifest]) == 2
+    err = capsys.readouterr().err
+    assert "error: e: port is required" in err and "c: model_path not found" in err
+    assert "port 8201 used by models 'a', 'd'" in err
+    assert load_config() == before
+    plan = plan_manifest(before, {"models": [{"name": "b", "model_path": str(model), "port": 8202}]})
+    assert plan["add"] == ["b"] and plan["errors"] == []
+    assert main(["config", "apply", str(tmp_path / "nope.yaml")]) == 2
+
+
+def test_writers_wait_for_the_config_lock(tmp_path):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    done = []
+    with config_lock():
+        t = threading.Thread(target=lambda: done.append(main(["config", "add", "m1", str(model), "--port", "8301"])))
+        t.start()
+        time.sleep(0.3)
+        assert done == []
+    t.join(10)
+    assert done == [0] and [m["name"] for m in load_config()["models"]] == ["m1"]
+
+
+def test_apply_validates_settings_before_writing(tmp_path, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    before = load_config()
+    models = [{"name": "a", "model_path": str(model), "port": 8501}]
+    for settings, message in (
+        ({"qos": 5}, "qos"),
+        ({"trace": "nonsense"}, "trace"),
+        ({"timeout_ms": "soon"}, "timeout_ms must be a positive number"),
+        ({"history": {"raw_day": 3}}, "history: unknown key 'raw_day'"),
+        ({"qoss": {}}, "unknown setting 'qoss'"),
+    ):
+        capsys.readouterr()
+        assert main(["config", "apply", _manifest(tmp_path, models, **settings)]) == 2, settings
+        assert message in capsys.readouterr().err
+        assert load_config() == before
+    assert main(["config", "apply", _manifest(tmp_path, models, memory_budget_fraction=0.5, history={"raw_days": 1})]) == 0
+    assert load_config()["memory_budget_fraction"] == 0.5
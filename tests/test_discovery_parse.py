@@ -7,10 +7,12 @@ def test_find_llama_processes_parsing(monkeypatch):
     sample = """
 1234 /opt/homebrew/bin/llama-server -m /path/model.gguf --host 127.0.0.1 --port 9999
 5678 /usr/bin/python script.py
+4321 tail -f /var/log/llama-server.log
+4322 /usr/bin/python3 /opt/stub/llama-server --port 9000
     """.strip()
     monkeypatch.setattr(disc, "_ps_output", lambda: sample)
     procs = disc.find_llama_processes()
-    assert len(procs) == 1
-    assert procs[0]["pid"] == 1234
+    # matched by program basename, not by a substring of the command line
+    assert [p["pid"] for p in procs] == [1234, 4322]
     assert "llama-server" in procs[0]["argv"][0]
 
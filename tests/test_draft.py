@@ -0,0 +1,161 @@
+import json
+import os
+import struct
+from pathlib import Path
+
+import pytest
+
+from llamacpp_manager import draft
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import ModelSpec, load_config
+from llamacpp_manager.launchd import build_program_arguments
+from llamacpp_manager.memory import OVERHEAD_BYTES, estimate_model_memory
+from llamacpp_manager.process import build_argv
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def _s(text):
+    b = text.encode()
+    return struct.pack("<Q", len(b)) + b
+
+
+def write_gguf(path: Path, kv: dict):
+    body = b""
+    for k, v in kv.items():
+        body += _s(k)
+        if isinstance(v, str):
+            body += struct.pack("<I", 8) + _s(v)
+        elif isinstance(v, list):
+            body += struct.pack("<IIQ", 9, 8, len(v)) + b"".join(_s(x) for x in v)
+        else:
+            body += struct.pack("<II", 4, v)
+    path.write_bytes(b"GGUF" + struct.pack("<IQQ", 3, 0, len(kv)) + body)
+
+
+TOKENS = [f"tok{i}" for i in range(300)]
+
+
+def meta(layers=32, tokens=TOKENS, tokenizer="gpt2"):
+    return {
+        "general.architecture": "llama",
+        "llama.block_count": layers,
+        "llama.embedding_length": 4096,
+        "llama.attention.head_count": 32,
+        "llama.attention.head_count_kv": 8,
+        "llama.context_length": 8192,
+        "tokenizer.ggml.model": tokenizer,
+        "tokenizer.ggml.bos_token_id": 1,
+        "tokenizer.ggml.tokens": tokens,
+    }
+
+
+@pytest.fixture
+def pair(tmp_path):
+    target = tmp_path / "big.gguf"; small = tmp_path / "small.gguf"
+    write_gguf(target, meta())
+    write_gguf(small, meta(layers=4, tokens=TOKENS[:250]))
+    return target, small
+
+
+def test_parse_and_argv(tmp_path):
+    assert draft.parse_draft("/m/d.gguf") == {"path": "/m/d.gguf"}
+    assert draft.draft_args({"path": "/m/d.gguf", "max": 16, "min": 2, "p_min": 0.8, "gpu_layers": 99}) == [
+        "-md", "/m/d.gguf", "--draft-max", "16", "--draft-min", "2", "--draft-p-min", "0.8", "-ngld", "99",
+    ]
+    for bad in ({"max": 4}, {"path": "/d", "max": -1}, {"path": "/d", "p_min": 2}, {"path": "/d", "speed": 1}):
+        with pytest.raises(ValueError):
+            draft.parse_draft(bad)
+    spec = ModelSpec(name="m", model_path="/m/big.gguf", port=9000, args=["-c", "4096"], draft_model={"path": "/m/d.gguf", "max": 8})
+    tail = ["-c", "4096", "-md", "/m/d.gguf", "--draft-max", "8", "--host", "127.0.0.1", "--port", "9000"]
+    assert build_argv("llama-server", spec)[3:] == tail
+    assert build_program_arguments("llama-server", spec)[3:] == tail
+
+
+def test_vocab_compatibility(tmp_path, pair):
+    target, small = pair
+    assert draft.vocab_mismatch(str(target), str(small)) is None
+
+    other = tmp_path / "other.gguf"
+    write_gguf(other, meta(tokens=TOKENS[:5] + ["zzz"] + TOKENS[6:]))
+    assert "token 5 differs" in draft.vocab_mismatch(str(target), str(other))
+    # ids below VOCAB_CHECK_START_TOKEN_ID are not compared, as in llama.cpp
+    write_gguf(other, meta(tokens=["x"] + TOKENS[1:]))
+    assert draft.vocab_mismatch(str(target), str(other)) is None
+    write_gguf(other, meta(tokens=TOKENS[:100]))
+    assert "vocab sizes differ" in draft.vocab_mismatch(str(target), str(other))
+    write_gguf(other, meta(tokenizer="llama"))
+    assert "tokenizer.ggml.model differs" in draft.vocab_mismatch(str(target), str(other))
+
+
+def test_config_add_checks_draft(tmp_path, pair, capsys):
+    target, small = pair
+    bad = tmp_path / "bad.gguf"; write_gguf(bad, meta(tokenizer="llama"))
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(target), "--port", "9401", "--draft-model", str(bad)]) == 2
+    assert "not compatible with m1: tokenizer.ggml.model differs" in capsys.readouterr().err
+    assert main(["config", "add", "m1", str(target), "--port", "9401", "--draft-model", str(small), "--draft-max", "16"]) == 0
+    assert load_config()["models"][0]["draft_model"] == {"path": str(small), "max": 16}
+    assert main(["config", "update", "m1", "--draft-min", "2"]) == 0
+    assert load_config()["models"][0]["draft_model"] == {"path": str(small), "max": 16, "min": 2}
+    assert main(["config", "update", "m1", "--draft-model", ""]) == 0
+    assert "draft_model" not in load_config()["models"][0]
+
+
+def test_memory_includes_draft(pair):
+    target, small = pair
+    base = ModelSpec(name="m", model_path=str(target), port=9000, args=["-c", "2048", "-np", "2"])
+    with_draft = ModelSpec(name="m", model_path=str(target), port=9000, args=["-c", "2048", "-np", "2"], draft_model=str(small))
+    a = estimate_model_memory(base)
+    b = estimate_model_memory(with_draft)
+    draft_kv = 4 * 8 * 128 * 4 * 2048  # 4 layers, shares the target's context
+    assert b["draft"] == small.stat().st_size + draft_kv
+    assert b["total"] == a["total"] + b["draft"]
+    assert a["draft"] == 0 and a["total"] == a["weights"] + a["kv_cache"] + OVERHEAD_BYTES
+    # -cd sizes each slot's draft context
+    per_slot = ModelSpec(name="m", model_path=str(target), port=9000, args=["-c", "2048", "-np", "2"], draft_model={"path": str(small), "ctx_size": 512})
+    assert estimate_model_memory(per_slot)["draft"] == small.stat().st_size + 4 * 8 * 128 * 4 * 1024
+
+
+TIMINGS = (
+    "slot print_timing: id  0 | task 3 | \n"
+    "draft acceptance rate = {rate} ( {acc} accepted / {gen} generated)\n"
+)
+
+
+def test_acceptance_since_last_launch(tmp_path, pair, monkeypatch, capsys):
+    target, small = pair
+    log = tmp_path / "logs" / "m1.log"
+    log.parent.mkdir(parents=True)
+    log.write_text(
+        "[llamacpp-manager] 2024-05-01T10:00:00.000+00:00 launch m1\n"
+        + TIMINGS.format(rate="0.10000", acc=1, gen=10)
+        + "[llamacpp-manager] 2024-05-01T11:00:00.000+00:00 launch m1\n"
+        + TIMINGS.format(rate="0.75000", acc=15, gen=20)
+        + TIMINGS.format(rate="0.50000", acc=10, gen=20)
+    )
+    assert draft.acceptance(log) == {"accepted": 25, "generated": 40, "rate": 0.625}
+    assert draft.acceptance(tmp_path / "missing.log") is None
+
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(target), "--port", "9402", "--draft-model", str(small)]) == 0
+    import llamacpp_manager.cli as cli
+    from llamacpp_manager.utils import write_pid
+    write_pid("m1", os.getpid())
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": True, "latency_ms": 1, "http_status": 200, "health": "ok"})
+    monkeypatch.setattr(cli, "_observe_memory", lambda m, pid, rec: None)
+    capsys.readouterr()
+    assert main(["status", "--json"]) == 0
+    entry = json.loads(capsys.readouterr().out)[0]
+    assert entry["draft"] == {"model_path": str(small), "acceptance": {"accepted": 25, "generated": 40, "rate": 0.625}}
+    assert main(["status"]) == 0
+    out = capsys.readouterr().out
+    assert "draft_accept" in out and "62.5%" in out
@@ -47,3 +47,141 @@ def test_ensure_running_skips_when_up(tmp_path, monkeypatch, capsys):
     assert main(["ensure-running"]) == 0
     out = capsys.readouterr().out
     assert "ensure-running: started 0 model" in out
+
+
+def test_ensure_running_leaves_loading_instance_alone(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m3.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m3", str(model), "--port", "9403", "--autostart"]) == 0
+    import os
+    import llamacpp_manager.cli as cli
+    from llamacpp_manager.utils import write_pid
+    write_pid("m3", os.getpid())  # a live process that has not bound its port yet
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": False})
+    monkeypatch.setattr(cli, "start_process", lambda *a: pytest.fail("started a duplicate"))
+    assert main(["ensure-running"]) == 0
+    assert "ensure-running: started 0 model" in capsys.readouterr().out
+
+    # /health 503: loading, also left alone
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": True, "health": "loading"})
+    assert main(["ensure-running"]) == 0
+    assert main(["status", "--json"]) == 0
+    assert '"state": "loading"' in capsys.readouterr().out
+
+
+def _autostart_models(tmp_path, n):
+    assert main(["init"]) == 0
+    for i in range(n):
+        model = tmp_path / f"a{i}.gguf"; model.write_text("x")
+        assert main(["config", "add", f"a{i}", str(model), "--port", str(9410 + i), "--autostart"]) == 0
+
+
+def test_ensure_running_exits_when_another_reconciler_holds_the_lock(tmp_path, monkeypatch, capsys):
+    _autostart_models(tmp_path, 1)
+    import llamacpp_manager.cli as cli
+    from llamacpp_manager.utils import instance_lock
+    monkeypatch.setattr(cli, "start_process", lambda *a: pytest.fail("raced the active reconciler"))
+    with instance_lock("ensure-running") as holder:
+        assert holder is None
+        assert main(["ensure-running"]) == 0
+    assert "another reconciler is active" in capsys.readouterr().out
+
+
+def test_ensure_running_loop_probes_concurrently_and_rate_limits(tmp_path, monkeypatch, capsys):
+    import time
+    import llamacpp_manager.cli as cli
+    _autostart_models(tmp_path, 3)
+
+    def slow_probe(host, port, timeout_ms=2000):
+        time.sleep(0.3)
+        return {"up": False}
+
+    started = []
+    monkeypatch.setattr(cli, "check_endpoint", slow_probe)
+    monkeypatch.setattr(cli, "port_in_use", lambda host, port: False)
+    monkeypatch.setattr(cli, "start_process", lambda lp, spec, ld: started.append(spec.name) or 1)
+    # never alive, so every round sees the models stopped again
+    monkeypatch.setattr(cli, "_pid_alive", lambda name: False)
+    monkeypatch.setattr(cli, "_admission", lambda cfg, spec: {"ok": True})
+    rounds = []
+    real_sleep = time.sleep
+
+    def fake_sleep(s):
+        if s >= 1.0:
+            rounds.append(time.monotonic())
+            if len(rounds) == 4:
+                raise KeyboardInterrupt
+        else:
+            real_sleep(s)
+
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+    t0 = time.monotonic()
+    assert main(["ensure-running", "--loop", "--interval", "5", "--max-starts", "2"]) == 0
+    # three 0.3s probes per round run in parallel
+    assert rounds[0] - t0 < 0.8
+    assert sorted(started) == ["a0", "a0", "a1", "a1", "a2", "a2"]
+    assert "started 2 times in 600s" in capsys.readouterr().err
+
+
+def test_ensure_running_loop_survives_a_failed_round(tmp_path, monkeypatch, capsys):
+    import time
+    import llamacpp_manager.cli as cli
+    _autostart_models(tmp_path, 1)
+    started = []
+
+    def flaky_start(lp, spec, ld):
+        if not started:
+            started.append(None)
+            raise OSError("llama-server vanished")
+        started.append(spec.name)
+        return 1
+
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": False})
+    monkeypatch.setattr(cli, "port_in_use", lambda host, port: False)
+    monkeypatch.setattr(cli, "start_process", flaky_start)
+    monkeypatch.setattr(cli, "_pid_alive", lambda name: False)
+    monkeypatch.setattr(cli, "_admission", lambda cfg, spec: {"ok": True})
+    rounds = []
+
+    def fake_sleep(s):
+        rounds.append(s)
+        if len(rounds) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+    assert main(["ensure-running", "--loop", "--interval", "5"]) == 0
+    assert started == [None, "a0"]
+    assert "error: ensure-running round failed: llama-server vanished" in capsys.readouterr().err
+
+
+def test_ensure_running_loop_relaunches_a_server_that_crashed(tmp_path, monkeypatch, capsys):
+    import os
+    import time
+    import llamacpp_manager.cli as cli
+    from llamacpp_manager.utils import process_alive
+    crash = tmp_path / "llama-server"; crash.write_text("#!/bin/sh\nexit 1\n"); crash.chmod(0o755)
+    _autostart_models(tmp_path, 1)
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(crash)))
+    pids = []
+    real_start = cli.start_process
+    monkeypatch.setattr(cli, "start_process", lambda *a, **k: pids.append(real_start(*a, **k)) or pids[-1])
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": False})
+    monkeypatch.setattr(cli, "port_in_use", lambda host, port: False)
+    monkeypatch.setattr(cli, "_admission", lambda cfg, spec: {"ok": True})
+    alive = []
+    real_sleep = time.sleep
+
+    def fake_sleep(s):
+        if s < 1.0:
+            return real_sleep(s)
+        real_sleep(0.5)
+        # between rounds the crashed server must not linger as a zombie that looks alive
+        alive.append(process_alive(pids[-1]))
+        if len(alive) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+    assert main(["ensure-running", "--loop", "--interval", "5"]) == 0
+    assert alive == [False, False] and len(pids) == 2
+    assert not os.path.exists(f"/proc/{pids[0]}")
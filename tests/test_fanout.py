@@ -0,0 +1,181 @@
+import http.client
+import json
+import socket
+import sys
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import llamacpp_manager
+from llamacpp_manager import fanout, qos, trace
+from llamacpp_manager.cli import main
+from llamacpp_manager.health import wait_ready
+from llamacpp_manager.proxy import Router, serve
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_split_and_merge():
+    assert fanout.parse_embeddings(None) == {"chunk": 64, "attempts": 3}
+    assert fanout.parse_embeddings(False) is None
+    with pytest.raises(ValueError):
+        fanout.parse_embeddings({"chunk": 0})
+    assert fanout.splittable(json.dumps({"input": ["a"] * 3}).encode(), 2) is not None
+    assert fanout.splittable(json.dumps({"input": ["a"] * 2}).encode(), 2) is None
+    # a list of token ids is a single input
+    assert fanout.splittable(json.dumps({"input": [1, 2, 3]}).encode(), 2) is None
+    merged = fanout.merge([
+        (2, {"model": "m", "data": [{"index": 0, "embedding": [2]}], "usage": {"prompt_tokens": 1, "total_tokens": 1}}),
+        (0, {"model": "m", "data": [{"index": 1, "embedding": [1]}, {"index": 0, "embedding": [0]}], "usage": {"prompt_tokens": 2, "total_tokens": 2}}),
+    ])
+    assert [(d["index"], d["embedding"]) for d in merged["data"]] == [(0, [0]), (1, [1]), (2, [2])]
+    assert merged["usage"] == {"prompt_tokens": 3, "total_tokens": 3} and merged["model"] == "m"
+
+
+def _backend(status):
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def do_POST(self):
+            inputs = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+            calls.append(len(inputs))
+            doc = {"data": [{"index": i, "embedding": [int(x)]} for i, x in enumerate(inputs)], "model": "m"} if status == 200 else {"error": {"code": status}}
+            data = json.dumps(doc).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, calls
+
+
+def test_failed_chunks_move_to_other_backends():
+    good, good_calls = _backend(200)
+    bad, bad_calls = _backend(500)
+    try:
+        backends = {("127.0.0.1", good.server_address[1]): 2, ("127.0.0.1", bad.server_address[1]): 2}
+        doc = {"input": [str(i) for i in range(50)]}
+        status, body, info = fanout.fan_out(backends, "/v1/embeddings", {}, doc, chunk=4)
+        assert status == 200
+        assert [d["embedding"] for d in json.loads(body)["data"]] == [[i] for i in range(50)]
+        assert info["chunks"] == 13 and info["backends"] == 1 and info["retries"] == len(bad_calls) >= 1
+        assert sum(good_calls) == 50
+
+        # a client error is not retried
+        client_err, _ = _backend(400)
+        try:
+            status, _, _ = fanout.fan_out({("127.0.0.1", client_err.server_address[1]): 1}, "/v1/embeddings", {}, doc, chunk=4)
+            assert status == 400
+        finally:
+            client_err.shutdown(); client_err.server_close()
+        status, body, _ = fanout.fan_out({("127.0.0.1", bad.server_address[1]): 1}, "/v1/embeddings", {}, doc, chunk=4)
+        assert status == 500
+    finally:
+        for s in (good, bad):
+            s.shutdown(); s.server_close()
+
+
+def test_chunks_take_qos_slots_one_at_a_time():
+    srv, calls = _backend(200)
+    backend = ("127.0.0.1", srv.server_address[1])
+    doc = {"input": [str(i) for i in range(50)]}
+    gate = qos.Gate(qos.parse_qos({"classes": [{"name": "only", "queue": 8}]}), lambda: 2)
+    inflight = []
+
+    @contextmanager
+    def admit():
+        with gate.admit("c", "only", charged=True):
+            inflight.append(gate.stats()["inflight"])
+            yield
+
+    try:
+        # charged once for the whole batch, even though it runs as 13 chunks on 4 workers
+        with gate.charge("c", "only", {"concurrency": 1}):
+            status, _, info = fanout.fan_out({backend: 4}, "/v1/embeddings", {}, doc, chunk=4, admit=admit)
+            with pytest.raises(qos.Rejected):
+                with gate.charge("c", "only", {"concurrency": 1}):
+                    pass
+        assert status == 200 and info["chunks"] == 13 and sum(calls) == 50
+        assert len(inflight) == 13 and max(inflight) <= 2
+        assert gate.stats()["inflight"] == 0 and gate.stats()["clients"] == {}
+
+        # a chunk the gate turns away fails the whole request with the gate's answer
+        full = qos.Gate(qos.parse_qos({"classes": [{"name": "only", "queue": 1}], "queue_timeout_s": 0.2}), lambda: 1)
+        with full.admit("other", "only"):
+            with pytest.raises(qos.Rejected) as e:
+                fanout.fan_out({backend: 4}, "/v1/embeddings", {}, doc, chunk=4, admit=lambda: full.admit("c", "only", charged=True))
+        assert e.value.status in (429, 503) and full.stats()["inflight"] == 0
+    finally:
+        srv.shutdown(); srv.server_close()
+
+
+STUB = """\
+#!{python}
+import sys
+sys.path.insert(0, {src!r})
+from llamacpp_manager.stubserver import main
+sys.exit(main())
+"""
+
+
+def test_proxy_spreads_embeddings_over_replicas(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLAMACPP_STUB_TOKEN_MS", "1")
+    stub = tmp_path / "llama-server"
+    stub.write_text(STUB.format(python=sys.executable, src=str(Path(llamacpp_manager.__file__).parent.parent)))
+    stub.chmod(0o755)
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)))
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    ports, public = [free_port(), free_port()], free_port()
+    for name, port in zip(("e1", "e2"), ports):
+        assert main(["config", "add", name, str(model), "--port", str(port), "--public-port", str(public), "--extra-args", "-np 2"]) == 0
+    tracer = trace.TraceWriter(tmp_path / "logs" / trace.TRACE_FILE, sample=1.0)
+    servers = []
+    try:
+        assert main(["start", "all", "--ignore-memory"]) == 0
+        for port in ports:
+            assert wait_ready("127.0.0.1", port, timeout=15)
+        servers = serve([public], Router(), tracer=tracer, fanout=fanout.parse_embeddings({"chunk": 16}))
+        inputs = [f"text number {i}" for i in range(200)]
+        conn = http.client.HTTPConnection("127.0.0.1", public, timeout=30)
+        conn.request("POST", "/v1/embeddings", body=json.dumps({"input": inputs, "model": "e"}))
+        resp = conn.getresponse()
+        doc = json.loads(resp.read())
+        conn.close()
+        assert resp.status == 200
+        assert [d["index"] for d in doc["data"]] == list(range(200))
+        assert [d["embedding"][0] for d in doc["data"]] == [float(len(x)) for x in inputs]
+        assert doc["usage"]["prompt_tokens"] == 600
+    finally:
+        for s in servers:
+            s.shutdown(); s.server_close()
+        tracer.close()
+        main(["stop", "all"])
+    rec = next(trace.read_traces(tmp_path / "logs" / trace.TRACE_FILE))
+    assert (rec["backend"], rec["chunks"], rec["backends"], rec["prompt_tokens"]) == ("fanout", 13, 2, 600)
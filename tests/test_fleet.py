@@ -0,0 +1,251 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import llamacpp_manager
+from llamacpp_manager import agent, fleet
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import load_config, save_config
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_token_is_created_private_and_required(tmp_path, monkeypatch):
+    monkeypatch.delenv(agent.TOKEN_ENV, raising=False)
+    assert agent.load_token() is None
+    token = agent.load_token(create=True)
+    assert agent.load_token() == token and oct(agent.token_path().stat().st_mode & 0o777) == "0o600"
+    srv = agent.serve(("127.0.0.1", 0), token, lambda: [{"name": "m1"}], lambda a, t: {"rc": 0, "output": f"{a} {t}\n", "errors": ""})
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+        conn.request("GET", "/v1/status", headers={"Authorization": "Bearer wrong"})
+        resp = conn.getresponse()
+        assert resp.status == 401 and resp.getheader("WWW-Authenticate") == "Bearer"
+        resp.read()
+        conn.request("GET", "/health")
+        assert conn.getresponse().read() == b'{"status": "ok"}'
+        client = fleet.AgentClient({"name": "a", "scheme": "http", "host": "127.0.0.1", "port": srv.server_address[1], "token": token})
+        assert client.request("GET", "/v1/status")["models"] == [{"name": "m1"}]
+        assert client.request("POST", "/v1/restart", {"target": "m1"})["output"] == "restart m1\n"
+        # both calls went over the one pooled connection
+        assert client._pool.qsize() == 1
+        with pytest.raises(fleet.AgentError, match="404"):
+            client.request("POST", "/v1/reboot", {"target": "m1"})
+        client.close()
+    finally:
+        srv.shutdown(); srv.server_close()
+
+
+def _raw_post(port, headers):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as s:
+        s.sendall(("POST /v1/restart HTTP/1.1\r\nHost: x\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n").encode())
+        status_line = s.makefile("rb").readline().decode()
+    return int(status_line.split()[1])
+
+
+def test_agent_checks_the_token_and_length_before_reading_the_body():
+    acted = []
+    srv = agent.serve(("127.0.0.1", 0), "t", lambda: [], lambda a, t: acted.append((a, t)) or {"rc": 0})
+    port = srv.server_address[1]
+    try:
+        # the claimed body is never sent: a handler that read it first would hang until the timeout
+        assert _raw_post(port, {"Authorization": "Bearer wrong", "Content-Length": "100000000"}) == 401
+        auth = {"Authorization": "Bearer t"}
+        assert _raw_post(port, auth) == 400
+        for bad in ("abc", "-1", "1e3"):
+            assert _raw_post(port, {**auth, "Content-Length": bad}) == 400
+        assert _raw_post(port, {**auth, "Content-Length": str(agent.MAX_BODY + 1)}) == 413
+        assert not acted
+    finally:
+        srv.shutdown(); srv.server_close()
+
+
+def _scripted_agent(replies):
+    """A raw HTTP server: for each request it receives, pops the next of "ok", "close" (FIN), "reset" (RST) or "hang"."""
+    import struct
+    import threading
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(8)
+    seen = []
+
+    def handle(c):
+        f = c.makefile("rb")
+        while replies:
+            line = f.readline()
+            if not line:
+                break
+            n = 0
+            while True:
+                h = f.readline()
+                if h in (b"\r\n", b""):
+                    break
+                if h.lower().startswith(b"content-length:"):
+                    n = int(h.split(b":")[1])
+            f.read(n)
+            seen.append(line.split()[0].decode())
+            reply = replies.pop(0)
+            if reply == "ok":
+                c.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+                continue
+            if reply == "hang":
+                f.read()  # until the client gives up
+            if reply == "reset":
+                c.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            break
+        c.close()
+
+    def accept():
+        while True:
+            try:
+                c, _ = srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(c,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return srv, seen
+
+
+def test_agent_client_retries_only_requests_that_never_ran():
+    # the agent dropped the idle connection: the POST is resent on a new one
+    srv, seen = _scripted_agent(["ok", "close", "ok"])
+    client = fleet.AgentClient({"name": "a", "scheme": "http", "host": "127.0.0.1", "port": srv.getsockname()[1], "token": "t"})
+    try:
+        assert client.request("GET", "/v1/status") == {}
+        assert client.request("POST", "/v1/restart", {"target": "m1"}) == {}
+        assert seen == ["GET", "POST", "POST"]
+    finally:
+        client.close(); srv.close()
+
+    # a reset after the agent read the request, or a timeout, may mean it ran: no second POST
+    for replies, timeout in ((["ok", "reset", "ok"], 5.0), (["ok", "hang", "ok"], 0.5)):
+        srv, seen = _scripted_agent(replies)
+        client = fleet.AgentClient({"name": "a", "scheme": "http", "host": "127.0.0.1", "port": srv.getsockname()[1], "token": "t"})
+        try:
+            assert client.request("GET", "/v1/status") == {}
+            with pytest.raises(fleet.AgentError):
+                client.request("POST", "/v1/restart", {"target": "m1"}, timeout=timeout)
+            time.sleep(0.2)
+            assert seen == ["GET", "POST"]
+        finally:
+            client.close(); srv.close()
+
+
+def test_fleet_status_merges_agents_within_deadline():
+    def slow():
+        time.sleep(3)
+        return []
+
+    fast = agent.serve(("127.0.0.1", 0), "t", lambda: [{"name": "m1", "up": True}, {"name": "m2", "up": False}], lambda a, t: {})
+    stuck = agent.serve(("127.0.0.1", 0), "t", slow, lambda a, t: {})
+    try:
+        f = fleet.Fleet(fleet.parse_agents([
+            {"name": "fast", "url": f"http://127.0.0.1:{fast.server_address[1]}", "token": "t"},
+            {"name": "stuck", "url": f"127.0.0.1:{stuck.server_address[1]}", "token": "t"},
+            {"name": "gone", "url": f"http://127.0.0.1:{free_port()}", "token": "t"},
+        ]))
+        start = time.monotonic()
+        result = f.status(timeout=0.5)
+        assert time.monotonic() - start < 2
+        f.close()
+    finally:
+        for s in (fast, stuck):
+            s.shutdown(); s.server_close()
+    assert [(m["agent"], m["name"]) for m in result["models"]] == [("fast", "m1"), ("fast", "m2")]
+    by_agent = {a["agent"]: a for a in result["agents"]}
+    assert by_agent["fast"]["ok"] and by_agent["fast"]["models"] == 2
+    assert not by_agent["stuck"]["ok"] and not by_agent["gone"]["ok"]
+    with pytest.raises(ValueError):
+        fleet.parse_agents([{"name": "a", "url": "http://h"}])
+
+
+STUB = """\
+#!{python}
+import sys
+sys.path.insert(0, {src!r})
+from llamacpp_manager.stubserver import main
+sys.exit(main())
+"""
+
+AGENT = "import sys; sys.path.insert(0, {src!r}); from llamacpp_manager.cli import main; sys.exit(main(sys.argv[1:]))"
+
+
+def test_localhost_cluster(tmp_path, capsys):
+    src = str(Path(llamacpp_manager.__file__).parent.parent)
+    stub = tmp_path / "llama-server"
+    stub.write_text(STUB.format(python=sys.executable, src=src))
+    stub.chmod(0o755)
+    procs, agents = [], []
+    try:
+        for name in ("node-a", "node-b"):
+            home = tmp_path / name
+            # a model file per node: status would otherwise discover the other node's process by its path
+            model = tmp_path / f"{name}.gguf"; model.write_text("x")
+            env = {
+                **os.environ, agent.TOKEN_ENV: f"secret-{name}",
+                "LLAMACPP_MANAGER_CONFIG_DIR": str(home / "cfg"), "LLAMACPP_MANAGER_LOG_DIR": str(home / "logs"),
+                "LLAMACPP_MANAGER_PID_DIR": str(home / "pids"),
+            }
+            run = [sys.executable, "-c", AGENT.format(src=src)]
+            subprocess.run(run + ["init"], env=env, check=True, capture_output=True)
+            cfg_file = home / "cfg" / "config.yaml"
+            cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)))
+            subprocess.run(run + ["config", "add", "m1", str(model), "--port", str(free_port())], env=env, check=True, capture_output=True)
+            port = free_port()
+            procs.append(subprocess.Popen(run + ["agent", "--port", str(port)], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+            agents.append({"name": name, "url": f"http://127.0.0.1:{port}", "token": f"secret-{name}"})
+        for a in agents:
+            deadline = time.monotonic() + 15
+            while True:
+                try:
+                    conn = http.client.HTTPConnection("127.0.0.1", int(a["url"].rsplit(":", 1)[1]), timeout=1)
+                    conn.request("GET", "/health")
+                    conn.getresponse().read()
+                    conn.close()
+                    break
+                except OSError:
+                    assert time.monotonic() < deadline
+                    time.sleep(0.1)
+        assert main(["init"]) == 0
+        cfg = load_config()
+        cfg["agents"] = agents
+        save_config(cfg)
+        capsys.readouterr()
+
+        assert main(["fleet", "start", "node-a", "m1"]) == 0
+        assert "[node-a] started m1 pid=" in capsys.readouterr().out
+        assert main(["fleet", "status", "--json"]) == 0
+        status = json.loads(capsys.readouterr().out)
+        assert {a["agent"]: a["ok"] for a in status["agents"]} == {"node-a": True, "node-b": True}
+        assert {(m["agent"], m["name"]): m["pid"] is not None for m in status["models"]} == {("node-a", "m1"): True, ("node-b", "m1"): False}
+        # node-b had nothing to stop: its warning comes back with the worst exit code
+        assert main(["fleet", "stop", "all", "all"]) == 1
+        captured = capsys.readouterr()
+        assert "[node-a] stopped m1" in captured.out and "[node-b] warning: no pid recorded for m1" in captured.err
+        assert main(["fleet", "restart", "node-c", "m1"]) == 2
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait(10)
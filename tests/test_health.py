@@ -2,7 +2,7 @@ import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import TCPServer
 
-from llamacpp_manager.health import check_endpoint
+from llamacpp_manager.health import check_endpoint, health_state
 
 
 class Handler(BaseHTTPRequestHandler):
@@ -33,3 +33,42 @@ def test_health_check():
     assert status["http_status"] == 200
     assert status["latency_ms"] >= 0
 
+
+
+class LoadingHandler(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):  # noqa: N802
+        body = b'{"error":{"code":503,"message":"Loading model"}}'
+        self.send_response(503 if self.path == "/health" else 200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_health_endpoint_reports_loading():
+    httpd = HTTPServer(("127.0.0.1", 0), LoadingHandler)
+    t = threading.Thread(target=run_server, args=(httpd,), daemon=True)
+    t.start()
+    status = check_endpoint("127.0.0.1", httpd.server_port, timeout_ms=500)
+    httpd.shutdown()
+    assert status["up"] is True and status["http_status"] == 503
+    assert status["health"] == "loading"
+    assert health_state(status, True) == "loading"
+
+
+def test_health_state_transitions():
+    down, ok = {"up": False}, {"up": True, "health": "ok", "latency_ms": 3}
+    assert health_state(down, None) == "stopped"
+    assert health_state(down, False) == "stopped"
+    assert health_state(down, True, started_at=100.0, now=110.0) == "starting"
+    assert health_state(down, True, started_at=100.0, now=800.0) == "unhealthy"
+    assert health_state({"up": True, "health": "loading"}, True, started_at=100.0, now=800.0) == "unhealthy"
+    assert health_state({"up": True, "health": "error"}, True) == "unhealthy"
+    assert health_state(ok, True) == "ready"
+    assert health_state({"up": True}, None) == "ready"  # servers without /health
+    assert health_state(ok, True, warmup={"state": "running"}) == "loading"
+    assert health_state(ok, True, warmup={"state": "failed"}) == "degraded"
+    assert health_state(ok, False) == "degraded"  # stale PID file, something else answers
+    assert health_state(ok, True, slow_ms=1) == "degraded"
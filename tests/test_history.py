@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from llamacpp_manager import history
+from llamacpp_manager.cli import main
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+DAY = 86400
+T0 = 1_700_000_000 // DAY * DAY
+
+
+def test_rollup_keeps_totals_and_applies_retention():
+    cfg = {"history": {"raw_days": 1, "minute_days": 3, "hour_days": 10}}
+    # one sample every 30s for 5 days, down for the first 10 minutes of each day
+    rows = []
+    for t in range(T0, T0 + 5 * DAY, 30):
+        up = (t - T0) % DAY >= 600
+        rows.append(history._sample({"name": "m", "up": up, "latency_ms": 10, "pid": 1}, t))
+    with history.connect() as conn:
+        conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    history.compact(cfg, now=T0 + 5 * DAY)
+    with history.connect() as conn:
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("samples", "minute", "hour")}
+    assert counts["samples"] <= DAY // 30 + 1
+    assert 0 < counts["minute"] <= 2 * 24 * 60 + 1
+    assert counts["hour"] > 0
+
+    res = history.query("m", T0, T0 + 5 * DAY, DAY)
+    s = res["summary"]
+    assert s["samples"] == 5 * DAY // 30
+    assert s["up_ratio"] == pytest.approx(1 - 600 / DAY, abs=1e-3)
+    assert s["latency_avg_ms"] == 10 and s["down_buckets"] == 5
+    assert [b["samples"] for b in res["buckets"]] == [DAY // 30] * 5
+
+    # hours older than hour_days are dropped
+    history.compact(cfg, now=T0 + 20 * DAY)
+    assert history.query("m", T0, T0 + 5 * DAY, DAY)["summary"]["samples"] == 0
+
+
+def test_parse_time():
+    assert history.parse_time("2h", now=10_000) == 10_000 - 7200
+    assert history.parse_time("1700000000") == 1_700_000_000
+    with pytest.raises(ValueError):
+        history.parse_time("yesterday")
+
+
+def test_status_records_and_history_command(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9601"]) == 0
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": True, "latency_ms": 4, "http_status": 200, "health": "ok"})
+    assert main(["status", "--json"]) == 0
+    capsys.readouterr()
+    assert main(["history", "m1", "--since", "1h", "--json"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert out["summary"]["samples"] == 1 and out["summary"]["up_ratio"] == 1.0
+    assert main(["history", "m1", "--since", "1h"]) == 0
+    assert "m1: up 100.00% of 1 samples" in capsys.readouterr().out
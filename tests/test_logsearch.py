@@ -0,0 +1,122 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+from llamacpp_manager import logsearch
+from llamacpp_manager.cli import main
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+T0 = datetime(2024, 5, 1, 12, 0, 0).timestamp()
+
+
+def _iso_lines(start, count, step=1.0, word="tick"):
+    out = []
+    for i in range(count):
+        t = datetime.fromtimestamp(start + i * step).isoformat(sep=" ", timespec="seconds")
+        out.append(f"{t} {word} {i}\n")
+    return "".join(out)
+
+
+def _setup(logdir):
+    logdir.mkdir(parents=True, exist_ok=True)
+    # oldest first: m1.log.2.gz, m1.log.1, m1.log
+    with gzip.open(logdir / "m1.log.2.gz", "wt") as f:
+        f.write(_iso_lines(T0, 1000, word="old"))
+    (logdir / "m1.log.1").write_text(_iso_lines(T0 + 1000, 1000, word="mid"))
+    (logdir / "m1.log").write_text(_iso_lines(T0 + 2000, 1000, word="new"))
+    (logdir / "m2.log").write_text(_iso_lines(T0 + 500, 10, step=100, word="other"))
+
+
+def test_segments_oldest_first(isolated_env):
+    _, logdir, _ = isolated_env
+    _setup(logdir)
+    (logdir / "m10.log").write_text("x\n")
+    assert [p.name for p in logsearch.segments(logdir, "m1")] == ["m1.log.2.gz", "m1.log.1", "m1.log"]
+
+
+def test_time_bounded_search_across_segments(isolated_env, monkeypatch):
+    _, logdir, _ = isolated_env
+    monkeypatch.setattr(logsearch, "INDEX_STEP", 1024)
+    _setup(logdir)
+    found = logsearch.search(logdir, ["m1", "m2"], r"(old|mid|new|other) \d+$", since=T0 + 995, until=T0 + 1004, workers=2)
+    assert [r["line"].split(" ", 2)[2] for r in found] == [
+        "old 995", "old 996", "old 997", "old 998", "old 999",
+        "mid 0", "other 5", "mid 1", "mid 2", "mid 3", "mid 4",
+    ]
+    assert [r["model"] for r in found].count("m2") == 1
+
+    # sparse indexes were written and let the seek skip most of each file
+    idx = json.loads((logdir / ".index" / "m1.log.1.json").read_text())
+    assert len(idx["entries"]) > 10
+    assert idx["first_ts"] == T0 + 1000 and idx["last"] == T0 + 1999
+    assert all(a[0] < b[0] and a[1] <= b[1] for a, b in zip(idx["entries"], idx["entries"][1:]))
+
+    # segments wholly outside the range are skipped from their index alone
+    assert logsearch.search_file(logdir / "m1.log.2.gz", "m1", "old", since=T0 + 1500) == []
+    assert logsearch.search_file(logdir / "m1.log", "m1", "new", until=T0 + 1500) == []
+
+
+def test_index_extends_on_append_and_rebuilds_after_truncation(isolated_env, monkeypatch):
+    _, logdir, _ = isolated_env
+    monkeypatch.setattr(logsearch, "INDEX_STEP", 512)
+    logdir.mkdir(parents=True)
+    log = logdir / "m1.log"
+    log.write_text(_iso_lines(T0, 100))
+    first = logsearch.ensure_index(log)
+    with log.open("a") as f:
+        f.write(_iso_lines(T0 + 100, 100))
+    grown = logsearch.ensure_index(log)
+    assert grown["entries"][: len(first["entries"])] == first["entries"]
+    assert grown["last"] == T0 + 199 and grown["scanned"] == log.stat().st_size
+
+    # rotation truncates in place and starts a new run of lines
+    log.write_text(_iso_lines(T0 + 5000, 300, word="fresh"))
+    rebuilt = logsearch.ensure_index(log)
+    assert rebuilt["first_ts"] == T0 + 5000 and rebuilt["last"] == T0 + 5299
+
+
+def test_elapsed_prefixes_use_launch_marker():
+    clock = logsearch.Clock()
+    assert clock.feed(b"0.00.001.000 I no base yet\n") is None
+    marker = datetime.fromtimestamp(T0).astimezone().isoformat(timespec="milliseconds")
+    assert clock.feed(f"[llamacpp-manager] {marker} launch m1\n".encode()) == T0
+    assert clock.feed(b"1.02.500.000 I srv  request\n") == pytest.approx(T0 + 62.5)
+    assert clock.feed(b"continuation without time\n") is None
+    assert clock.now == pytest.approx(T0 + 62.5)
+    assert clock.feed(b'{"timestamp": 1714560000, "level": "INFO"}\n') == 1714560000
+
+
+def test_cli_logs_search(isolated_env, tmp_path, capsys):
+    _, logdir, _ = isolated_env
+    assert main(["init"]) == 0
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    for n, port in (("m1", "8081"), ("m2", "8082")):
+        assert main(["config", "add", n, str(model), "--port", port]) == 0
+    _setup(logdir)
+    capsys.readouterr()
+    until = datetime.fromtimestamp(T0 + 2002).isoformat()
+    assert main(["logs", "search", "NEW", "-i", "--model", "m1", "--since", str(T0 + 1999), "--until", until]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert [" ".join(line.split()[-2:]) for line in out] == ["new 0", "new 1", "new 2"]
+    assert all(line.startswith("m1 2024-05-01 ") for line in out)
+
+    assert main(["logs", "search", "other", "--json", "--limit", "2"]) == 0
+    res = json.loads(capsys.readouterr().out)
+    assert [r["line"].split(" ", 2)[2] for r in res] == ["other 0", "other 1"]
+
+    assert main(["logs", "search", "(", "--model", "m1"]) == 2
+    assert "invalid pattern" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        main(["logs", "search", "x", "--model", "nope"])
@@ -0,0 +1,139 @@
+import os
+import struct
+from pathlib import Path
+
+import pytest
+
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import ModelSpec, load_config
+from llamacpp_manager.gguf import GGUFError, read_metadata
+from llamacpp_manager.memory import MIB, OVERHEAD_BYTES, admission, admit, estimate_model_memory, kv_cache_bytes, meminfo
+from llamacpp_manager.utils import pid_fields, update_runtime
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def _s(text):
+    b = text.encode()
+    return struct.pack("<Q", len(b)) + b
+
+
+def write_gguf(path: Path, kv: dict, pad: int = 0):
+    body = b""
+    for k, v in kv.items():
+        body += _s(k)
+        if isinstance(v, str):
+            body += struct.pack("<I", 8) + _s(v)
+        elif isinstance(v, list):
+            body += struct.pack("<IIQ", 9, 8, len(v)) + b"".join(_s(x) for x in v)
+        else:
+            body += struct.pack("<II", 4, v)
+    path.write_bytes(b"GGUF" + struct.pack("<IQQ", 3, 0, len(kv)) + body + b"\0" * pad)
+
+
+LLAMA_META = {
+    "general.architecture": "llama",
+    "llama.block_count": 32,
+    "llama.embedding_length": 4096,
+    "llama.attention.head_count": 32,
+    "llama.attention.head_count_kv": 8,
+    "llama.context_length": 8192,
+    "tokenizer.ggml.tokens": ["a", "b", "c"],
+}
+
+
+def test_read_metadata_skips_arrays(tmp_path):
+    p = tmp_path / "m.gguf"
+    write_gguf(p, LLAMA_META)
+    meta = read_metadata(p)
+    assert meta["llama.block_count"] == 32
+    assert meta["tokenizer.ggml.tokens"] == {"array_type": 8, "len": 3}
+    assert read_metadata(p, arrays=True)["tokenizer.ggml.tokens"] == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("body", [
+    struct.pack("<Q", 1 << 60),                                   # key length
+    _s("k") + struct.pack("<IQ", 8, 1 << 40),                     # string value length
+    _s("k") + struct.pack("<IIQ", 9, 8, 1 << 40),                 # array count
+    _s("k") + struct.pack("<IIQ", 9, 4, 1 << 40),                 # skipped scalar array
+])
+def test_read_metadata_rejects_lengths_past_end_of_file(tmp_path, body):
+    p = tmp_path / "bad.gguf"
+    p.write_bytes(b"GGUF" + struct.pack("<IQQ", 3, 0, 1) + body + b"\0" * 64)
+    for arrays in (False, True):
+        with pytest.raises(GGUFError, match="truncated"):
+            read_metadata(p, arrays=arrays)
+    p.write_bytes(b"GGUF" + struct.pack("<IQQ", 3, 0, 1 << 62))
+    with pytest.raises(GGUFError, match="truncated"):
+        read_metadata(p)
+
+
+def test_kv_cache_from_metadata_and_args(tmp_path):
+    p = tmp_path / "m.gguf"
+    write_gguf(p, LLAMA_META)
+    meta = read_metadata(p)
+    # 32 layers * 8 kv heads * 128 dims * (2+2 bytes) = 128 KiB per token
+    per_token = 32 * 8 * 128 * 4
+    assert kv_cache_bytes(meta, ["-c", "4096", "--parallel", "4"]) == per_token * 4096
+    assert kv_cache_bytes(meta, []) == per_token * 8192  # training context
+    assert kv_cache_bytes(meta, ["-c", "4096", "-ctk", "q8_0", "-ctv", "q8_0"]) == int(32 * 8 * 128 * 2 * 34 / 32 * 4096)
+
+
+def test_estimate_includes_weights_and_calibration(tmp_path):
+    p = tmp_path / "m.gguf"
+    write_gguf(p, LLAMA_META, pad=10 * MIB)
+    spec = ModelSpec(name="m", model_path=str(p), port=9000, args=["-c", "1024"])
+    est = estimate_model_memory(spec)
+    assert est["weights"] == p.stat().st_size
+    assert est["kv_cache"] == 32 * 8 * 128 * 4 * 1024
+    assert est["total"] == est["weights"] + est["kv_cache"] + OVERHEAD_BYTES
+    cal = estimate_model_memory(spec, {"rss_bytes": est["total"] * 2, "estimate_bytes": est["total"]})
+    assert cal["total"] == est["total"] * 2
+
+
+def test_admit_checks_budget_and_available():
+    info = {"total": 1000 * MIB, "available": 500 * MIB}
+    assert admit({}, 100 * MIB, 700 * MIB, info)["ok"]
+    assert admit({}, 300 * MIB, 700 * MIB, info)["reasons"] == ["budget"]
+    assert admit({"memory_budget_mb": 4000}, 600 * MIB, 0, info)["reasons"] == ["available"]
+
+
+def test_meminfo_parses_proc(tmp_path):
+    p = tmp_path / "meminfo"
+    p.write_text("MemTotal:  2048 kB\nMemFree: 100 kB\nMemAvailable: 1024 kB\n")
+    assert meminfo(p) == {"total": 2048 * 1024, "available": 1024 * 1024}
+
+
+def test_start_refuses_over_budget(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text() + "memory_budget_mb: 100\n")
+    assert main(["config", "add", "m1", str(model), "--port", "9261"]) == 0
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "start_process", lambda lp, spec, ld: 4321)
+    assert main(["start", "m1"]) == 2
+    err = capsys.readouterr().err
+    assert "not enough memory to start m1 (budget exceeded)" in err
+    assert "of 0.1 GiB budget" in err
+    assert main(["start", "m1", "--ignore-memory"]) == 0
+
+
+def test_rolling_admission_counts_the_running_instance(tmp_path):
+    model = tmp_path / "m.gguf"; model.write_bytes(b"\0" * (4 * MIB))
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9262"]) == 0
+    update_runtime("m1", pid_fields(os.getpid()))
+    cfg = load_config()
+    spec = ModelSpec.from_dict(cfg["models"][0])
+    plain, rolling = admission(cfg, spec), admission(cfg, spec, alongside=True)
+    assert plain["committed"] == 0
+    assert rolling["committed"] == rolling["need"] == plain["need"] > 4 * MIB
@@ -59,6 +59,8 @@ def test_start_process_builds_correct_args_and_logs(tmp_path, monkeypatch):
     assert "-m" in argv and spec.model_path in argv
     assert "--host" in argv and "127.0.0.1" in argv
     assert "--port" in argv and "8081" in argv
+    # nothing to place, so the server is launched directly rather than through the placement wrapper
+    assert argv[0] == "/opt/homebrew/bin/llama-server"
     # Log file opened
     assert (tmp_path / "logs" / "m1.log").exists()
 
@@ -91,3 +93,67 @@ def test_stop_process_sends_sigterm(monkeypatch):
     # stop should call os.kill with SIGTERM
     proc.stop_process(dummy.pid)
     assert sent_calls[0] == (dummy.pid, signal.SIGTERM)
+
+
+def test_stop_processes_waits_concurrently_and_kills_stragglers():
+    import subprocess
+    import sys
+    import time
+    from llamacpp_manager.process import stop_processes
+
+    polite = [subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]) for _ in range(3)]
+    stubborn = subprocess.Popen([sys.executable, "-c", "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print('ready', flush=True); time.sleep(30)"], stdout=subprocess.PIPE)
+    stubborn.stdout.readline()
+    targets = {f"p{i}": (p.pid, 5.0) for i, p in enumerate(polite)}
+    targets["stubborn"] = (stubborn.pid, 0.5)
+    seen = []
+    t0 = time.monotonic()
+    try:
+        results = stop_processes(targets, on_exit=lambda name, r: seen.append(name))
+    finally:
+        for p in polite + [stubborn]:
+            p.wait(timeout=5)
+    # total time is bounded by the longest grace period, not the sum
+    assert time.monotonic() - t0 < 3.0
+    assert seen[-1] == "stubborn"
+    assert results["stubborn"]["killed"] is True
+    assert all(not results[f"p{i}"]["killed"] for i in range(3))
+    assert results["p0"]["duration_s"] < 0.5 <= results["stubborn"]["duration_s"]
+
+
+def test_stop_processes_reports_a_failed_signal_and_stops_the_rest(monkeypatch):
+    import subprocess
+    import sys
+    from llamacpp_manager import process as proc
+
+    procs = [subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]) for _ in range(2)]
+    real_kill = os.kill
+
+    def kill(pid, sig):
+        if pid == procs[0].pid and sig != 0:
+            raise PermissionError(1, "Operation not permitted")
+        return real_kill(pid, sig)
+
+    monkeypatch.setattr(proc.os, "kill", kill)
+    try:
+        results = proc.stop_processes({"denied": (procs[0].pid, 5.0), "other": (procs[1].pid, 5.0)})
+        assert "not permitted" in results["denied"]["error"] and procs[0].poll() is None
+        assert results["other"]["error"] is None and procs[1].wait(timeout=5) is not None
+    finally:
+        monkeypatch.undo()
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+                p.wait()
+
+
+def test_process_alive_treats_an_unreaped_child_as_dead():
+    import subprocess
+    import time
+    from llamacpp_manager.utils import process_alive
+
+    p = subprocess.Popen(["sh", "-c", "exit 3"])
+    time.sleep(0.3)
+    # exited but not waited for: signal 0 still succeeds on the zombie
+    assert not process_alive(p.pid)
+    p.wait()
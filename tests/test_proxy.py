@@ -0,0 +1,140 @@
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from llamacpp_manager.cli import main
+from llamacpp_manager.proxy import Router, serve
+from llamacpp_manager.utils import read_pid, track_child
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as r:
+        return r.status, r.read().decode()
+
+
+def test_public_port_validation(tmp_path):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9401", "--public-port", "9400"]) == 0
+    # replicas may share a public port, but it cannot be a backend port
+    assert main(["config", "add", "m2", str(model), "--port", "9402", "--public-port", "9400"]) == 0
+    assert main(["config", "add", "m3", str(model), "--port", "9400"]) == 2
+    assert main(["config", "add", "m4", str(model), "--port", "9404", "--public-port", "9401"]) == 2
+
+
+def test_rolling_restart_switches_proxy_without_downtime(tmp_path, monkeypatch, capsys):
+    # Backends are http.server processes; /health and /who are files they serve
+    generations = []
+
+    def fake_start(llama, spec, logdir):
+        d = tmp_path / f"gen{len(generations)}"
+        d.mkdir()
+        (d / "health").write_text("ok")
+        (d / "who").write_text(d.name)
+        p = subprocess.Popen([sys.executable, "-m", "http.server", str(spec.port), "--bind", spec.host, "--directory", str(d)],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        generations.append(p)
+        return p.pid
+
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "start_process", fake_start)
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    port, public = free_port(), free_port()
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", str(port), "--public-port", str(public)]) == 0
+    servers = []
+    try:
+        assert main(["start", "m1", "--ignore-memory"]) == 0
+        servers = serve([public], Router())
+        old_pid = read_pid("m1")
+        from llamacpp_manager.health import wait_ready
+        assert wait_ready("127.0.0.1", port, timeout=10)
+        assert get(public, "/who") == (200, "gen0")
+
+        assert main(["restart", "m1", "--rolling", "--drain", "0", "--ready-timeout", "10", "--ignore-memory"]) == 0
+        out = capsys.readouterr().out
+        assert f"switched m1 :{public} ->" in out and f"stopped m1 pid={old_pid}" in out
+        assert generations[0].wait(timeout=5) is not None
+        assert read_pid("m1") == generations[1].pid
+        assert get(public, "/who") == (200, "gen1")
+        # the old instance held the configured port, so the replacement took a spare one
+        assert main(["status", "--json"]) == 0
+        entry = json.loads(capsys.readouterr().out)[0]
+        assert entry["port"] != port and entry["public_port"] == public and entry["up"]
+    finally:
+        for s in servers:
+            s.shutdown(); s.server_close()
+        for p in generations:
+            p.kill(); p.wait()
+
+
+def test_rolling_restart_keeps_the_old_instance_when_the_replacement_crashes(tmp_path, monkeypatch, capsys):
+    procs = []
+
+    def fake_start(llama, spec, logdir):
+        if not procs:
+            d = tmp_path / "gen0"
+            d.mkdir()
+            (d / "health").write_text("ok")
+            argv = [sys.executable, "-m", "http.server", str(spec.port), "--bind", spec.host, "--directory", str(d)]
+        else:
+            argv = ["sh", "-c", "exit 7"]
+        p = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        track_child(p)
+        procs.append(p)
+        return p.pid
+
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "start_process", fake_start)
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    port, public = free_port(), free_port()
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", str(port), "--public-port", str(public)]) == 0
+    try:
+        assert main(["start", "m1", "--ignore-memory", "--no-warmup"]) == 0
+        old_pid = read_pid("m1")
+        started = time.monotonic()
+        assert main(["restart", "m1", "--rolling", "--drain", "0", "--ready-timeout", "60", "--ignore-memory"]) == 2
+        assert time.monotonic() - started < 20
+        assert f"exited with code 7 while loading; keeping pid={old_pid}" in capsys.readouterr().err
+        assert read_pid("m1") == old_pid and procs[0].poll() is None
+    finally:
+        for p in procs:
+            p.kill(); p.wait()
+
+
+def test_proxy_returns_503_without_backend(tmp_path):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    public = free_port()
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", str(free_port()), "--public-port", str(public)]) == 0
+    servers = serve([public], Router())
+    try:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            get(public, "/v1/models")
+        assert e.value.code == 503
+    finally:
+        for s in servers:
+            s.shutdown(); s.server_close()
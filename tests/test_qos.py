@@ -0,0 +1,217 @@
+import http.client
+import json
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import llamacpp_manager
+from llamacpp_manager import qos
+from llamacpp_manager.cli import main
+from llamacpp_manager.health import wait_ready
+from llamacpp_manager.proxy import Router, serve
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_classify_by_key_and_header():
+    q = qos.parse_qos({
+        "client": {"concurrency": 2},
+        "keys": {"sk-batch": {"client": "indexer", "class": "batch", "rate": 5}, "sk-ui": {"class": "interactive"}},
+    })
+    assert [c["name"] for c in q["classes"]] == ["interactive", "batch"] and q["default_class"] == "batch"
+    assert qos.classify(q, {}, "10.0.0.1") == ("10.0.0.1", "batch", {"concurrency": 2})
+    # without a key that grants it, the header cannot raise a request above default_class
+    assert qos.classify(q, {"X-Priority": "interactive"}, "10.0.0.1")[1] == "batch"
+    # a key's class is a ceiling: the header may lower it but not raise it
+    client, cls, limits = qos.classify(q, {"Authorization": "Bearer sk-batch", "X-Priority": "interactive"}, "x")
+    assert (client, cls, limits) == ("indexer", "batch", {"concurrency": 2, "rate": 5.0})
+    assert qos.classify(q, {"Authorization": "Bearer sk-ui", "X-Priority": "batch"}, "x")[1] == "batch"
+    assert qos.classify(q, {"Authorization": "Bearer sk-ui"}, "x")[0].startswith("key-")
+    # an unlisted key is no identity: it is the peer, with the peer's limits and class
+    assert qos.classify(q, {"X-Api-Key": "sk-other", "X-Priority": "interactive"}, "10.0.0.9") == ("10.0.0.9", "batch", {"concurrency": 2})
+    for bad in ({"classes": [{"name": "a"}, {"name": "a"}]}, {"default_class": "nope"}, {"client": {"rate": 0}}, {"size": 1}):
+        with pytest.raises(ValueError):
+            qos.parse_qos(bad)
+
+
+def test_freed_slot_goes_to_highest_priority_waiter():
+    gate = qos.Gate(qos.parse_qos(True), lambda: 1)
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with gate.admit("a", "batch"):
+            release.wait(5)
+
+    def wait(client, cls):
+        with gate.admit(client, cls):
+            order.append(cls)
+
+    threads = [threading.Thread(target=hold)]
+    threads[0].start()
+    until(lambda: gate.stats()["inflight"] == 1)
+    for client, cls in (("b", "batch"), ("c", "interactive")):
+        threads.append(threading.Thread(target=wait, args=(client, cls)))
+        threads[-1].start()
+        until(lambda: gate.stats()["classes"][cls]["depth"] == 1)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert order == ["interactive", "batch"]
+    st = gate.stats()
+    assert st["classes"]["batch"]["admitted"] == 2 and st["classes"]["interactive"]["wait_ms"]["max"] > 0
+
+
+def test_gate_fails_fast_with_retry_after():
+    now = [0.0]
+    q = qos.parse_qos({"classes": [{"name": "only", "queue": 1}], "queue_timeout_s": 0.05})
+    gate = qos.Gate(q, lambda: 1, clock=lambda: now[0])
+    with gate.admit("a", "only"):
+        # per-client concurrency is checked before queueing
+        with pytest.raises(qos.Rejected) as e:
+            with gate.admit("a", "only", {"concurrency": 1}):
+                pass
+        assert e.value.status == 429 and e.value.retry_after >= 1
+        # one waiter fits the queue (and times out); a second is turned away at once
+        timed_out = []
+
+        def queued():
+            try:
+                with gate.admit("b", "only"):
+                    pass
+            except qos.Rejected as e:
+                timed_out.append(e.status)
+
+        waiter = threading.Thread(target=queued)
+        waiter.start()
+        until(lambda: gate.stats()["classes"]["only"]["depth"] == 1)
+        with pytest.raises(qos.Rejected) as e:
+            with gate.admit("c", "only"):
+                pass
+        assert e.value.status == 429 and "queue is full" in str(e.value)
+        waiter.join(5)
+    assert timed_out == [503]
+    st = gate.stats()["classes"]["only"]
+    assert (st["rejected"], st["timeouts"], st["depth"]) == (2, 1, 0)
+
+    # token bucket: a burst of 2, then one request per second at rate 1
+    limits = {"rate": 1.0, "burst": 2.0}
+    for _ in range(2):
+        with gate.admit("d", "only", limits):
+            pass
+    with pytest.raises(qos.Rejected) as e:
+        with gate.admit("d", "only", limits):
+            pass
+    assert e.value.status == 429 and e.value.retry_after == 1
+    now[0] += 1.0
+    with gate.admit("d", "only", limits):
+        pass
+    # buckets of clients that have been idle long enough to refill are dropped
+    for i in range(100):
+        with gate.admit(f"e{i}", "only", limits):
+            pass
+    assert len(gate._buckets) == 101
+    now[0] += 120.0
+    with gate.admit("d", "only", limits):
+        pass
+    assert list(gate._buckets) == ["d"]
+
+
+STUB = """\
+#!{python}
+import sys
+sys.path.insert(0, {src!r})
+from llamacpp_manager.stubserver import main
+sys.exit(main())
+"""
+
+
+def _post(port, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("POST", "/completion", body=json.dumps({"prompt": "hi", "n_predict": 200}), headers=headers or {})
+        resp = conn.getresponse()
+        return resp.status, resp.getheader("Retry-After"), resp.read()
+    finally:
+        conn.close()
+
+
+def _stats(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("GET", qos.STATS_PATH)
+        # a port shows up once its first POST has arrived
+        return json.loads(conn.getresponse().read()).get(str(port), {})
+    finally:
+        conn.close()
+
+
+def test_proxy_queues_batch_and_rejects_overflow(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLAMACPP_STUB_TOKEN_MS", "2")
+    stub = tmp_path / "llama-server"
+    stub.write_text(STUB.format(python=sys.executable, src=str(Path(llamacpp_manager.__file__).parent.parent)))
+    stub.chmod(0o755)
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)))
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    port, public = free_port(), free_port()
+    assert main(["config", "add", "m1", str(model), "--port", str(port), "--public-port", str(public)]) == 0
+    q = qos.parse_qos({"classes": [{"name": "interactive", "queue": 4}, {"name": "batch", "queue": 1}]})
+    servers = []
+    results = []
+    try:
+        assert main(["start", "m1", "--ignore-memory"]) == 0
+        assert wait_ready("127.0.0.1", port, timeout=15)
+        router = Router()
+        servers = serve([public], router, qos=qos.QoS(q, router.slots))
+        threads = []
+        for depth in (0, 1):
+            threads.append(threading.Thread(target=lambda: results.append(_post(public))))
+            threads[-1].start()
+            if depth == 0:
+                until(lambda: _stats(public).get("inflight") == 1)
+            else:
+                until(lambda: _stats(public)["classes"]["batch"]["depth"] == 1)
+        status, retry_after, body = _post(public)
+        assert status == 429 and int(retry_after) >= 1
+        assert "batch queue is full" in json.loads(body)["error"]["message"]
+        # GETs are never queued
+        conn = http.client.HTTPConnection("127.0.0.1", public, timeout=10)
+        conn.request("GET", "/health")
+        assert conn.getresponse().status == 200
+        conn.close()
+        for t in threads:
+            t.join(10)
+        assert [r[0] for r in results] == [200, 200]
+        st = _stats(public)
+        assert st["capacity"] == 1 and st["classes"]["batch"]["admitted"] == 2 and st["classes"]["batch"]["rejected"] == 1
+    finally:
+        for s in servers:
+            s.shutdown(); s.server_close()
+        main(["stop", "m1"])
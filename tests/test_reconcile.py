@@ -0,0 +1,107 @@
+import json
+import subprocess
+
+import pytest
+
+from llamacpp_manager import discovery as disc
+from llamacpp_manager.cli import main
+from llamacpp_manager.utils import read_pid, read_runtime, write_pid
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def _proc(pid, model, port=None, host=None, extra=()):
+    argv = ["/usr/local/bin/llama-server", "-m", str(model)]
+    if host:
+        argv += ["--host", host]
+    if port:
+        argv += ["--port", str(port)]
+    return {"pid": pid, "argv": argv + list(extra)}
+
+
+def test_server_args_defaults_and_forms(tmp_path):
+    info = disc.server_args(["llama-server", f"--model={tmp_path}/a/../m.gguf"])
+    assert info == {"host": "127.0.0.1", "port": 8080, "model_path": str(tmp_path / "m.gguf")}
+    assert disc.server_args(["llama-server", "--host", "localhost", "--port=9001"])["host"] == "127.0.0.1"
+
+
+def test_classification(tmp_path):
+    a = tmp_path / "a.gguf"; b = tmp_path / "b.gguf"; link = tmp_path / "link.gguf"
+    a.write_text("x"); b.write_text("x"); link.symlink_to(a)
+    models = [
+        {"name": "a", "model_path": str(a), "port": 9001},
+        {"name": "b", "model_path": str(b), "port": 9002},
+        {"name": "c", "model_path": str(b), "port": 9003},
+    ]
+    procs = [
+        _proc(10, a, 9001),                    # PID file owner
+        _proc(11, a, 9101),                    # a's weights elsewhere
+        _proc(12, link, 9002),                 # b's port, a's weights (via symlink)
+        _proc(13, b, 9003, host="0.0.0.0"),    # c, bound on all interfaces
+        _proc(14, b, 9003),                    # second claimant of c
+        _proc(15, tmp_path / "z.gguf", 7000),  # unknown
+    ]
+    procs[1]["argv"] += ["--slot-save-path", str(tmp_path / "cfg" / "slots" / "x")]
+    rows = {r["pid"]: r for r in disc.reconcile(models, procs, {10: "a"}, roots=[str(tmp_path / "cfg")])}
+    assert {p: (r["class"], r["model"]) for p, r in rows.items()} == {
+        10: ("managed", "a"),
+        11: ("orphaned", None),
+        12: ("conflicting", "b"),
+        13: ("adoptable", "c"),
+        14: ("conflicting", "c"),
+        15: ("foreign", None),
+    }
+    assert "weights of a" in rows[11]["reason"] and "slots" in rows[11]["reason"]
+    # a rolling restart's live port counts as the model's own
+    rows = disc.reconcile(models, [_proc(20, b, 9102)], {}, {"b": [9102]})
+    assert (rows[0]["class"], rows[0]["model"]) == ("adoptable", "b")
+
+
+def test_cli_adopt_and_reap(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9601"]) == 0
+    assert main(["config", "add", "m2", str(model), "--port", "9602"]) == 0
+    import llamacpp_manager.cli as cli
+    stray = subprocess.Popen(["sleep", "30"])
+    managed = subprocess.Popen(["sleep", "30"])
+    hand_run = subprocess.Popen(["sleep", "30"])
+    try:
+        write_pid("m2", managed.pid)
+        cfg = cli.load_config()
+        exact = {"pid": 4242, "argv": cli.build_argv(cfg["llama_server_path"], cli.launch_spec(cfg, cfg["models"][0]))}
+        # the stray keeps its slot cache under this config dir; the hand-run server has nothing of ours
+        ours = ["--slot-save-path", str(tmp_path / "cfg" / "slots" / "old" / "v1")]
+        procs = [exact, _proc(managed.pid, model, 9602), _proc(stray.pid, tmp_path / "other.gguf", 9999, extra=ours), _proc(hand_run.pid, tmp_path / "other.gguf", 9998)]
+        monkeypatch.setattr(cli, "find_llama_processes", lambda: procs)
+        real_alive = cli.process_alive
+        monkeypatch.setattr(cli, "process_alive", lambda pid: True if pid == 4242 else real_alive(pid))
+        capsys.readouterr()
+
+        assert main(["reconcile", "--json"]) == 1
+        rows = json.loads(capsys.readouterr().out)
+        assert [r["class"] for r in rows] == ["adoptable", "managed", "orphaned", "foreign"]
+
+        assert main(["reconcile", "--adopt", "--reap"]) == 0
+        out = capsys.readouterr().out
+        assert "adopted" in out and "reaped" in out
+        assert stray.wait(timeout=5) is not None
+        assert read_pid("m1") == 4242
+        rec = read_runtime()["m1"]
+        assert rec["adopted"] and rec["port"] == 9601
+        # launched exactly as configured: reload sees no change
+        assert rec["argv_hash"] == cli.spec_hash(cfg["llama_server_path"], cli.launch_spec(cfg, cfg["models"][0]))
+        assert managed.poll() is None and hand_run.poll() is None
+    finally:
+        for p in (stray, managed, hand_run):
+            if p.poll() is None:
+                p.kill()
+                p.wait()
@@ -0,0 +1,65 @@
+import pytest
+
+from llamacpp_manager.cli import main
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def test_reload_restarts_only_changed_models(tmp_path, monkeypatch, capsys):
+    for n in ("a", "b", "c", "d"):
+        (tmp_path / f"{n}.gguf").write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "a", str(tmp_path / "a.gguf"), "--port", "9301"]) == 0
+    assert main(["config", "add", "b", str(tmp_path / "b.gguf"), "--port", "9302"]) == 0
+    assert main(["config", "add", "c", str(tmp_path / "c.gguf"), "--port", "9303"]) == 0
+
+    import llamacpp_manager.cli as cli
+    pids = iter(range(1000, 2000))
+    started, stopped = [], {}
+
+    def fake_start(llama, spec, logdir):
+        started.append(spec.name)
+        return next(pids)
+
+    def fake_stop(targets, on_exit=None):
+        stopped.update(targets)
+        for name, (pid, grace) in targets.items():
+            on_exit(name, {"pid": pid, "duration_s": 0.1, "killed": False})
+
+    monkeypatch.setattr(cli, "start_process", fake_start)
+    monkeypatch.setattr(cli, "stop_processes", fake_stop)
+    monkeypatch.setattr(cli, "process_alive", lambda pid: True)
+    monkeypatch.setattr(cli, "port_in_use", lambda host, port: False)
+    assert main(["start", "all", "--ignore-memory"]) == 0
+    started.clear()
+    capsys.readouterr()
+
+    # change a's args, remove c, add d with autostart
+    assert main(["config", "update", "a", "--extra-args=-c 2048"]) == 0
+    assert main(["config", "remove", "c"]) == 0
+    assert main(["config", "add", "d", str(tmp_path / "d.gguf"), "--port", "9304", "--autostart"]) == 0
+    capsys.readouterr()
+
+    assert main(["reload", "--dry-run"]) == 0
+    out = capsys.readouterr().out
+    assert "reload: restart a" in out and "reload: stop c" in out and "reload: start d" in out
+    assert "b" not in {line.split()[-1] for line in out.splitlines() if line.startswith("reload: ")}
+    assert not started and not stopped
+
+    assert main(["reload"]) == 0
+    assert sorted(started) == ["a", "d"]
+    assert set(stopped) == {"a", "c"}
+    assert "started 1, stopped 1, restarted 1, unchanged 1" in capsys.readouterr().out
+
+    # nothing changed since: a second reload is a no-op
+    started.clear(); stopped.clear()
+    assert main(["reload"]) == 0
+    assert not started and not stopped
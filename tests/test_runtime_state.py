@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from llamacpp_manager import utils
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import ModelSpec
+from llamacpp_manager.process import record_launch
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+@pytest.fixture
+def child():
+    p = subprocess.Popen(["sleep", "30"])
+    yield p
+    p.kill()
+    p.wait()
+
+
+def _dead_pid():
+    p = subprocess.Popen(["true"])
+    p.wait()
+    return p.pid
+
+
+def test_process_start_time_identifies_process(child):
+    start = utils.process_start_time(child.pid)
+    assert start is not None and start == utils.process_start_time(child.pid)
+    assert utils.process_start_time(_dead_pid()) is None
+
+
+def test_legacy_pid_files_are_migrated(isolated_env, child):
+    _, _, piddir = isolated_env
+    piddir.mkdir(parents=True)
+    (piddir / "runtime.json").write_text(json.dumps({"a": {"restarts": 2}}))
+    (piddir / "a.pid").write_text(str(child.pid))
+    (piddir / "b.pid").write_text("garbage")
+    rt = utils.read_runtime()
+    assert not list(piddir.glob("*.pid"))
+    assert rt["a"] == {"restarts": 2, "pid": child.pid, "pid_start": utils.process_start_time(child.pid)}
+    assert "pid" not in rt["b"]
+    assert utils.pid_names() == ["a"] and utils.read_pid("a") == child.pid
+
+
+def test_recycled_pid_is_rejected(child):
+    utils.write_pid("m1", child.pid)
+    assert utils.read_pid("m1") == child.pid
+    # same PID number, different process start: the PID was reused
+    utils.update_runtime("m1", {"pid_start": "1"})
+    with pytest.raises(FileNotFoundError, match="another process"):
+        utils.read_pid("m1")
+    assert "pid" not in utils.read_runtime()["m1"]
+
+    # a process that has exited still reads as ours, just not alive
+    dead = _dead_pid()
+    utils.update_runtime("m2", {"pid": dead, "pid_start": "12345"})
+    assert utils.read_pid("m2") == dead and not utils.process_alive(dead)
+
+
+def test_record_launch_writes_one_record(tmp_path, child):
+    spec = ModelSpec(name="m1", model_path=str(tmp_path / "m.gguf"), port=9301)
+    record_launch("/bin/llama-server", spec, child.pid, log_dir=tmp_path / "logs")
+    rec = utils.read_runtime()["m1"]
+    assert rec["pid"] == child.pid and rec["pid_start"] == utils.process_start_time(child.pid)
+    assert rec["log_path"] == str(tmp_path / "logs" / "m1.log")
+    assert rec["argv_hash"] and rec["started_at"] and rec["port"] == 9301
+
+
+def test_status_reads_runtime_once(tmp_path, monkeypatch, capsys, child):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    for n, port in (("m1", "9311"), ("m2", "9312"), ("m3", "9313")):
+        assert main(["config", "add", n, str(model), "--port", port]) == 0
+    utils.write_pid("m1", child.pid)
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "check_endpoint", lambda host, port, timeout_ms=2000: {"up": False, "latency_ms": 1})
+    monkeypatch.setattr(cli, "find_llama_processes", lambda: [])
+    monkeypatch.setattr(cli, "_observe_memory", lambda m, pid, rec: None)
+    loads = []
+    real = utils._load_runtime
+    monkeypatch.setattr(utils, "_load_runtime", lambda: loads.append(1) or real())
+    capsys.readouterr()
+    assert main(["status", "--json"]) == 0
+    data = {e["name"]: e for e in json.loads(capsys.readouterr().out)}
+    assert data["m1"]["pid"] == child.pid and data["m1"]["mode"] == "direct"
+    assert data["m2"]["mode"] == "stopped"
+    assert len(loads) == 1
@@ -0,0 +1,132 @@
+import http.client
+import json
+import socket
+import sys
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+import llamacpp_manager
+from llamacpp_manager import slots
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import ModelSpec, load_config
+from llamacpp_manager.process import build_argv
+from llamacpp_manager.utils import read_runtime
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_cache_versions_follow_model_and_args(tmp_path):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    spec = ModelSpec(name="m1", model_path=str(model), port=9000, args=["-c", "4096"], slot_cache=True)
+    argv = build_argv("llama-server", spec)
+    d = slots.slot_dir_of(argv)
+    assert d.parent == tmp_path / "cfg" / "slots" / "m1"
+    assert argv[-6:-4] == ["--slot-save-path", str(d)]
+    # the port is not part of the cache layout; args and the weights are
+    assert slots.slot_dir_of(build_argv("llama-server", replace(spec, port=9100))) == d
+    assert slots.slot_dir_of(build_argv("llama-server", replace(spec, args=["-c", "8192"]))) != d
+    model.write_text("xy")
+    assert slots.slot_dir_of(build_argv("llama-server", spec)) != d
+    assert slots.slot_dir_of(build_argv("llama-server", replace(spec, slot_cache=None))) is None
+
+    assert slots.parse_slot_cache({"keep": 3, "dir": "~/c"}) == {"keep": 3, "dir": "~/c"}
+    for bad in ("yes", {"keep": 0}, {"size": 1}):
+        with pytest.raises(ValueError):
+            slots.parse_slot_cache(bad)
+
+
+def test_prepare_keeps_recent_versions(tmp_path):
+    import os
+    root = tmp_path / "slots"
+    for i, name in enumerate(["a", "b", "c"]):
+        (root / name).mkdir(parents=True)
+        os.utime(root / name, (1000 + i, 1000 + i))
+    slots.prepare(root / "a", keep=2)
+    assert sorted(p.name for p in root.iterdir()) == ["a", "c"]
+
+
+STUB = """\
+#!{python}
+import sys
+sys.path.insert(0, {src!r})
+from llamacpp_manager.stubserver import main
+sys.exit(main())
+"""
+
+
+def _request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request(method, path, body=json.dumps(body).encode() if body else None)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def _complete(port, prompt):
+    return _request(port, "POST", "/completion", {"prompt": prompt, "n_predict": 4})
+
+
+def _cached(port):
+    return [s["n_cached"] for s in _request(port, "GET", "/slots")]
+
+
+def test_stop_saves_and_start_restores(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("LLAMACPP_STUB_TOKEN_MS", "1")
+    stub = tmp_path / "llama-server"
+    stub.write_text(STUB.format(python=sys.executable, src=str(Path(llamacpp_manager.__file__).parent.parent)))
+    stub.chmod(0o755)
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)).replace("ready_timeout_s: 600", "ready_timeout_s: 15"))
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    port = free_port()
+    assert main(["config", "add", "m1", str(model), "--port", str(port), "--extra-args", "-np 2", "--slot-cache"]) == 0
+    assert load_config()["models"][0]["slot_cache"] is True
+    try:
+        assert main(["start", "m1"]) == 0
+        slot_dir = Path(read_runtime()["m1"]["slot_dir"])
+        assert slot_dir.is_dir() and read_runtime()["m1"]["slot_cache"]["slots"] == 0
+        _complete(port, "a long shared system prompt")
+        capsys.readouterr()
+
+        assert main(["stop", "m1"]) == 0
+        out = capsys.readouterr().out
+        assert "saved 1 slot(s) of m1 (9 tokens)" in out
+        manifest = json.loads((slot_dir / slots.MANIFEST).read_text())
+        assert [s["filename"] for s in manifest["slots"]] == ["slot-0.bin"]
+        assert not (slot_dir / "slot-1.bin").exists()
+
+        assert main(["start", "m1"]) == 0
+        assert "restored 1 slot(s) of m1 (9 tokens)" in capsys.readouterr().out
+        assert _cached(port) == [9, 0]
+        assert read_runtime()["m1"]["slot_cache"]["state"] == "restored"
+
+        # a restart carries the cache over too
+        _complete(port, "another prompt")
+        assert main(["restart", "m1"]) == 0
+        out = capsys.readouterr().out
+        assert "saved 1 slot(s)" in out and "restored 1 slot(s)" in out
+        # changed args: a new cache version, nothing to restore into it
+        assert main(["config", "update", "m1", "--extra-args", "-np 3"]) == 0
+        assert main(["restart", "m1"]) == 0
+        assert "restored" not in capsys.readouterr().out
+        assert Path(read_runtime()["m1"]["slot_dir"]) != slot_dir and slot_dir.exists()
+    finally:
+        main(["stop", "m1"])
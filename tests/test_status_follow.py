@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from llamacpp_manager.cli import main
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def test_follow_emits_snapshot_changes_and_heartbeats(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9501"]) == 0
+    import llamacpp_manager.cli as cli
+
+    stopped = {"name": "m1", "mode": "stopped", "pid": None, "up": False, "state": "stopped", "latency_ms": 0, "port": 9501}
+    loading = dict(stopped, mode="direct", pid=42, up=True, state="loading", latency_ms=3)
+    jitter = dict(loading, latency_ms=7)  # latency noise below the threshold is not an event
+    slow = dict(loading, latency_ms=5000)
+    script = [stopped, stopped, loading, jitter, slow] + [slow] * 6
+    calls = []
+
+    def fake_gather(cfg, names=None):
+        calls.append(names)
+        if len(calls) > len(script):
+            raise KeyboardInterrupt
+        return [script[len(calls) - 1]]
+
+    monkeypatch.setattr(cli, "_gather_status", fake_gather)
+    capsys.readouterr()
+    assert main(["status", "--follow", "--interval", "0.2", "--max-interval", "0.2", "--heartbeat", "1"]) == 0
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert events[0]["event"] == "snapshot" and events[0]["models"][0]["state"] == "stopped"
+    changes = [e for e in events if e["event"] == "change"]
+    assert changes[0]["changes"]["state"] == {"from": "stopped", "to": "loading"}
+    assert changes[0]["changes"]["pid"] == {"from": None, "to": 42}
+    assert changes[1]["changes"] == {"slow": {"from": False, "to": True}}
+    assert len(changes) == 2
+    assert any(e["event"] == "heartbeat" for e in events)
@@ -0,0 +1,75 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from llamacpp_manager.config import ModelSpec
+from llamacpp_manager.supervisor import Supervisor, exit_waiter, _PollWaiter
+from llamacpp_manager.utils import read_runtime, remove_pid
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    return cfgdir, logdir, piddir
+
+
+def _spawner(code, calls):
+    def spawn(llama, spec, log_dir):
+        calls.append(spec.name)
+        return subprocess.Popen([sys.executable, "-c", code])
+    return spawn
+
+
+@pytest.mark.parametrize("waiter_factory", [exit_waiter, _PollWaiter])
+def test_waiter_reports_exit(waiter_factory):
+    w = waiter_factory()
+    p = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"])
+    w.register(p.pid, p)
+    exited = []
+    deadline = time.monotonic() + 5
+    while not exited and time.monotonic() < deadline:
+        exited = w.wait(1.0)
+    assert exited == [p.pid]
+    p.wait()
+    w.close()
+
+
+def test_backoff_doubles_and_caps(tmp_path):
+    sup = Supervisor("llama", [], tmp_path, backoff_base=1.0, backoff_max=5.0)
+    assert [sup.backoff_delay(n) for n in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5.0]
+
+
+def test_crash_restart_and_crash_loop_detection(tmp_path):
+    calls = []
+    spec = ModelSpec(name="m1", model_path="m.gguf", port=9001)
+    sup = Supervisor("llama", [spec], tmp_path, backoff_base=0.01, backoff_max=0.02, crash_limit=3,
+                     spawn=_spawner("import sys; sys.exit(3)", calls), log=lambda msg: None)
+    sup.adopt_or_start()
+    deadline = time.monotonic() + 10
+    while sup.active() and time.monotonic() < deadline:
+        sup.step(timeout=1.0)
+    assert not sup.active()
+    assert calls == ["m1", "m1", "m1"]
+    rec = read_runtime()["m1"]
+    assert rec["last_exit_code"] == 3
+    assert rec["restarts"] == 2
+    assert rec["supervisor"] == "crash-loop"
+
+
+def test_intentional_stop_is_not_restarted(tmp_path):
+    calls = []
+    spec = ModelSpec(name="m1", model_path="m.gguf", port=9001)
+    sup = Supervisor("llama", [spec], tmp_path, backoff_base=0.01,
+                     spawn=_spawner("import time; time.sleep(0.3)", calls), log=lambda msg: None)
+    sup.adopt_or_start()
+    remove_pid("m1")  # what `stop` does before signalling
+    deadline = time.monotonic() + 10
+    while sup.active() and time.monotonic() < deadline:
+        sup.step(timeout=1.0)
+    assert calls == ["m1"]
+    assert read_runtime()["m1"]["supervisor"] == "stopped"
@@ -0,0 +1,137 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from llamacpp_manager.config import ModelSpec
+from llamacpp_manager.process import build_argv, spec_hash
+from llamacpp_manager.slots import slot_dir_of
+from llamacpp_manager.topology import (
+    apply_placement,
+    format_cpulist,
+    parse_cpulist,
+    parse_ionice,
+    placement_command,
+    plan_placement,
+    read_topology,
+)
+
+
+def make_sysfs(root: Path, nodes, smt=2):
+    """nodes: list of physical core counts per NUMA node."""
+    cpu = 0
+    total_cores = sum(nodes)
+    for node, ncores in enumerate(nodes):
+        node_cpus = []
+        for core in range(ncores):
+            for t in range(smt):
+                c = cpu + t * total_cores  # Linux numbers SMT siblings after all cores
+                d = root / "cpu" / f"cpu{c}" / "topology"
+                d.mkdir(parents=True)
+                (d / "physical_package_id").write_text(str(node))
+                (d / "core_id").write_text(str(core))
+                node_cpus.append(c)
+            cpu += 1
+        (root / "node" / f"node{node}").mkdir(parents=True)
+        (root / "node" / f"node{node}" / "cpulist").write_text(format_cpulist(node_cpus))
+    (root / "cpu" / "online").write_text(f"0-{total_cores * smt - 1}")
+
+
+def test_cpulist_roundtrip():
+    assert parse_cpulist("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpulist([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+
+
+def test_read_topology_groups_siblings_by_node(tmp_path, monkeypatch):
+    make_sysfs(tmp_path, [4, 4])
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    cores = read_topology(tmp_path)
+    assert len(cores) == 8
+    assert cores[0] == {"node": 0, "package": 0, "core": 0, "cpus": [0, 8]}
+    assert [c["node"] for c in cores] == [0] * 4 + [1] * 4
+
+
+def test_plan_splits_by_weight_and_keeps_nodes(tmp_path, monkeypatch):
+    make_sysfs(tmp_path, [4, 4])
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    plan = plan_placement([("big", 1.0), ("small", 1.0), ("off", 0)], read_topology(tmp_path))
+    assert set(plan) == {"big", "small"}
+    assert plan["big"] == {"cpus": [0, 1, 2, 3, 8, 9, 10, 11], "threads": 4, "node": 0}
+    assert plan["small"]["node"] == 1 and plan["small"]["threads"] == 4
+
+    plan = plan_placement([("a", 3), ("b", 1)], read_topology(tmp_path))
+    assert (plan["a"]["threads"], plan["b"]["threads"]) == (6, 2)
+    assert not set(plan["a"]["cpus"]) & set(plan["b"]["cpus"])
+
+
+def test_plan_shares_cores_when_oversubscribed():
+    cores = [{"node": 0, "package": 0, "core": i, "cpus": [i]} for i in range(2)]
+    plan = plan_placement([("a", 1), ("b", 1), ("c", 1)], cores)
+    assert [plan[n]["cpus"] for n in "abc"] == [[0], [1], [0]]
+    assert all(plan[n]["threads"] == 1 for n in "abc")
+
+
+def test_build_argv_adds_threads_unless_user_set(tmp_path):
+    pl = {"cpus": [0, 1], "threads": 2, "node": 0}
+    spec = ModelSpec(name="m", model_path="m.gguf", port=9000, args=["-c", "4096"], placement=pl)
+    argv = build_argv("llama-server", spec)
+    assert argv[argv.index("--threads") + 1] == "2"
+    assert argv[argv.index("--threads-batch") + 1] == "2"
+    spec = ModelSpec(name="m", model_path="m.gguf", port=9000, args=["-t", "8"], placement=pl)
+    argv = build_argv("llama-server", spec)
+    assert "--threads" not in argv and "--threads-batch" in argv
+    # runtime placement never reaches YAML
+    assert "placement" not in spec.to_dict()
+
+
+def test_placement_does_not_change_hash_or_slot_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(tmp_path))
+    base = ModelSpec(name="m", model_path="m.gguf", port=9000, slot_cache=True)
+    a = ModelSpec(name="m", model_path="m.gguf", port=9000, slot_cache=True, placement={"cpus": [0, 1], "threads": 2, "node": 0})
+    b = ModelSpec(name="m", model_path="m.gguf", port=9000, slot_cache=True, placement={"cpus": [2], "threads": 1, "node": 0})
+    assert spec_hash("llama-server", a) == spec_hash("llama-server", b) == spec_hash("llama-server", base)
+    assert slot_dir_of(build_argv("llama-server", a)) == slot_dir_of(build_argv("llama-server", b)) is not None
+    # configured args still count
+    c = ModelSpec(name="m", model_path="m.gguf", port=9000, args=["-t", "4"], slot_cache=True)
+    assert spec_hash("llama-server", c) != spec_hash("llama-server", base)
+
+
+def test_parse_ionice():
+    assert parse_ionice("idle") == (3, 4)
+    assert parse_ionice("best-effort:7") == (2, 7)
+    with pytest.raises(ValueError):
+        parse_ionice("fast")
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="Linux only")
+def test_apply_placement_sets_affinity_and_nice():
+    p = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        cpu = sorted(os.sched_getaffinity(0))[0]
+        assert apply_placement(p.pid, cpus=[cpu], nice=10) == []
+        assert os.sched_getaffinity(p.pid) == {cpu}
+        assert os.getpriority(os.PRIO_PROCESS, p.pid) == 10
+    finally:
+        p.kill(); p.wait()
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="Linux only")
+def test_placement_is_applied_before_exec():
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    code = "import os; print(os.getpid(), sorted(os.sched_getaffinity(0)), os.getpriority(os.PRIO_PROCESS, 0))"
+    argv = [sys.executable, "-c", code]
+    assert placement_command(argv) is argv
+    p = subprocess.Popen(placement_command(argv, [cpu], 7, "bogus", prefix="[x] "),
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    out, err = p.communicate(timeout=30)
+    # the server execs in the wrapper's process, already placed; a failed setting is reported on stderr
+    assert p.returncode == 0
+    assert out.split() == [str(p.pid), f"[{cpu}]", "7"]
+    assert "[x] warning: could not set ionice bogus" in err
+
+
+def test_placement_command_reports_a_missing_binary(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        placement_command([str(tmp_path / "no-such-server")], nice=5)
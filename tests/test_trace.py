@@ -0,0 +1,138 @@
+import http.client
+import json
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+import llamacpp_manager
+from llamacpp_manager import trace
+from llamacpp_manager.cli import main
+from llamacpp_manager.health import wait_ready
+from llamacpp_manager.proxy import Router, serve
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_stream_trace_reads_final_timings():
+    t = trace.Trace("POST", "/v1/chat/completions", 8080)
+    t.mark("connect")
+    t.response(200, "text/event-stream")
+    # events split across chunk boundaries; the last one carries llama-server's timings
+    t.feed(b'data: {"choices":[{"delta":{"content":"a"}}]}\n\ndata: {"choi')
+    t.feed(b'ces":[{"delta":{"content":"b"}}]}\n\n')
+    t.feed(b'data: {"choices":[],"usage":{"prompt_tokens":12,"completion_tokens":2},"timings":{"prompt_ms":5.0,"predicted_ms":9.5}}\n\ndata: [DONE]\n\n')
+    rec = t.finish(model="m1", backend="127.0.0.1:9000")
+    assert rec["stream"] and rec["status"] == 200 and rec["model"] == "m1"
+    assert rec["prompt_tokens"] == 12 and rec["completion_tokens"] == 2
+    assert rec["connect_ms"] <= rec["first_byte_ms"] <= rec["first_token_ms"] <= rec["last_token_ms"]
+
+    plain = trace.Trace("POST", "/completion", 8080)
+    plain.response(200, "application/json")
+    plain.feed(b'{"content":"x","tokens_evaluated":3,')
+    plain.feed(b'"tokens_predicted":4,"timings":{"prompt_ms":1.0,"predicted_ms":2.0}}')
+    rec = plain.finish()
+    assert (rec["prompt_tokens"], rec["completion_tokens"], rec["predicted_ms"]) == (3, 4, 2.0)
+
+
+def test_summarize_splits_phases_per_model():
+    recs = [
+        {"ts": 1, "model": "a", "status": 200, "connect_ms": 1, "last_token_ms": 100, "prompt_ms": 20, "predicted_ms": 50, "prompt_tokens": 10, "completion_tokens": 25},
+        {"ts": 2, "model": "a", "status": 200, "connect_ms": 1, "last_token_ms": 200, "prompt_ms": 20, "predicted_ms": 50, "prompt_tokens": 10, "completion_tokens": 25},
+        {"ts": 3, "model": "b", "status": 502, "error": "upstream error"},
+    ]
+    assert trace.phases(recs[0]) == {"admit": None, "connect": 1, "queue": 29, "prompt": 20, "decode": 50, "total": 100}
+    out = trace.summarize(iter(recs))
+    assert out["a"]["requests"] == 2 and out["a"]["completion_tokens"] == 50
+    assert out["a"]["decode_tokens_per_s"] == 500.0
+    assert out["a"]["phases"]["queue"]["p50"] == 29 and out["a"]["phases"]["queue"]["max"] == 129
+    assert out["b"]["errors"] == 1 and out["*"]["requests"] == 3
+    assert set(trace.summarize(iter(recs), ["b"])) == {"b", "*"}
+
+
+def test_writer_samples_and_rotates(tmp_path):
+    path = tmp_path / "t.jsonl"
+    off = trace.TraceWriter(path, sample=0)
+    assert off.begin("GET", "/", 1) is None
+    off.close()
+
+    w = trace.TraceWriter(path, sample=1.0, max_bytes=2000, backups=3)
+    for i in range(200):
+        w.submit(w.begin("GET", "/health", 1).finish(ts=i, i=i))
+    w.close()
+    assert w.dropped == 0
+    assert [p.name for p in trace.trace_files(path)][-1] == "t.jsonl"
+    assert 1 < len(trace.trace_files(path)) <= 4
+    got = [r["i"] for r in trace.read_traces(path)]
+    # oldest records rotate away, the rest come back in order
+    assert got == list(range(200 - len(got), 200))
+    assert [r["i"] for r in trace.read_traces(path, since=195)] == [195, 196, 197, 198, 199]
+
+    with pytest.raises(ValueError):
+        trace.parse_trace({"sample": 2})
+
+
+STUB = """\
+#!{python}
+import sys
+sys.path.insert(0, {src!r})
+from llamacpp_manager.stubserver import main
+sys.exit(main())
+"""
+
+
+def test_proxy_writes_traces_for_summarize(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("LLAMACPP_STUB_TOKEN_MS", "1")
+    stub = tmp_path / "llama-server"
+    stub.write_text(STUB.format(python=sys.executable, src=str(Path(llamacpp_manager.__file__).parent.parent)))
+    stub.chmod(0o755)
+    assert main(["init"]) == 0
+    cfg_file = tmp_path / "cfg" / "config.yaml"
+    cfg_file.write_text(cfg_file.read_text().replace("/opt/homebrew/bin/llama-server", str(stub)).replace("ready_timeout_s: 600", "ready_timeout_s: 15"))
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    port, public = free_port(), free_port()
+    assert main(["config", "add", "m1", str(model), "--port", str(port), "--public-port", str(public)]) == 0
+    path = tmp_path / "logs" / trace.TRACE_FILE
+    tracer = trace.TraceWriter(path, sample=1.0)
+    servers = []
+    try:
+        assert main(["start", "m1", "--ignore-memory"]) == 0
+        assert wait_ready("127.0.0.1", port, timeout=15)
+        servers = serve([public], Router(), tracer=tracer)
+        for _ in range(3):
+            conn = http.client.HTTPConnection("127.0.0.1", public, timeout=10)
+            conn.request("POST", "/completion", body=json.dumps({"prompt": "hello there", "n_predict": 8}))
+            assert conn.getresponse().read()
+            conn.close()
+    finally:
+        for s in servers:
+            s.shutdown(); s.server_close()
+        tracer.close()
+        main(["stop", "m1"])
+    recs = list(trace.read_traces(path))
+    assert len(recs) == 3
+    assert recs[0]["model"] == "m1" and recs[0]["path"] == "/completion" and recs[0]["public_port"] == public
+    assert recs[0]["completion_tokens"] == 8 and recs[0]["prompt_tokens"] == 2 and recs[0]["connect_ms"] > 0
+    capsys.readouterr()
+
+    assert main(["trace", "summarize", "--json"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert out["m1"]["requests"] == 3 and out["m1"]["phases"]["decode"]["count"] == 3
+    assert main(["trace", "summarize", "--model", "m1"]) == 0
+    text = capsys.readouterr().out
+    assert "m1: 3 request(s), 0 error(s), 6 prompt / 24 completion tokens" in text and "decode" in text
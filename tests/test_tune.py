@@ -0,0 +1,178 @@
+import json
+import socket
+
+import pytest
+
+from llamacpp_manager import tune
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import load_config
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def test_args_round_trip():
+    args = ["--threads=4", "-fa", "--jinja", "-c", "8192", "-np", "2"]
+    assert tune.current_params(args) == {"parallel": 2, "threads": 4, "batch": None, "ubatch": None, "flash_attn": "on", "ctx": 8192}
+    assert tune.with_params(args, {"threads": 8, "ubatch": 256}) == ["--jinja", "-np", "2", "-t", "8", "-ub", "256", "-fa", "on", "-c", "8192"]
+    # each slot keeps its 4096 tokens
+    base = tune.current_params(args)
+    assert tune.slot_context(base, {**base, "parallel": 4})["ctx"] == 16384
+    assert tune.parse_space(["threads=2,8", "flash-attn=", "batch=1024"], {"threads": [4], "flash_attn": ["on"]}) == {"threads": [2, 8], "batch": [1024]}
+    for bad in ("speed=1", "threads=x", "flash_attn=maybe", "threads"):
+        with pytest.raises(ValueError):
+            tune.parse_space([bad])
+    assert tune.parse_duration("20m") == 1200 and tune.parse_duration("90") == 90
+
+
+def fake_trial(model, fails=lambda p: False):
+    """A trial whose tokens/s is ``model(params)``; runs no processes."""
+    calls = []
+
+    def trial(params, best):
+        calls.append(dict(params))
+        if fails(params):
+            return {"status": "failed", "tokens_per_s": None, "p95_latency_ms": None, "error": "out of memory", "duration_s": 1.0}
+        tps = model(params)
+        return {"status": "ok", "tokens_per_s": tps, "p95_latency_ms": 1000 / tps, "duration_s": 1.0}
+
+    return trial, calls
+
+
+def test_search_walks_each_parameter_and_prunes_failed_regions():
+    base = {"parallel": 1, "threads": 4, "batch": 2048, "ubatch": 512, "flash_attn": None, "ctx": None}
+    space = {"parallel": [1, 2, 4, 8], "threads": [2, 4, 8], "ubatch": [256, 512, 4096], "flash_attn": ["off", "on"]}
+    trial, calls = fake_trial(
+        lambda p: 10 * p["parallel"] + (5 if p["threads"] == 8 else 0) + (3 if p["flash_attn"] == "on" else 0),
+        fails=lambda p: p["parallel"] >= 4,
+    )
+    result = tune.search(base, space, trial, objective="tokens_per_s", budget_s=3600)
+    assert result["stopped"] == "done"
+    assert result["best"]["params"] == {**base, "parallel": 2, "threads": 8, "flash_attn": "on"}
+    # parallel=8 is never launched once parallel=4 ran out of memory; ubatch > batch is skipped
+    assert {"parallel": 8} not in [{"parallel": c["parallel"]} for c in calls]
+    assert all(c["ubatch"] <= c["batch"] for c in calls)
+    assert len(calls) == 1 + 2 + 2 + 1 + 2
+
+    # p95 objective: lower is better
+    result = tune.search(base, space, trial, objective="p95_latency", budget_s=3600)
+    assert result["best"]["params"]["parallel"] == 2
+
+
+def test_search_respects_budget(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(tune.time, "monotonic", lambda: clock[0])
+
+    def trial(params, best):
+        clock[0] += 100
+        return {"status": "ok", "tokens_per_s": params["threads"], "p95_latency_ms": 1.0, "duration_s": 100.0}
+
+    base = {n: None for n, _ in tune.PARAMS}
+    base["threads"] = 1
+    result = tune.search(base, {"threads": [2, 3, 4, 5, 6]}, trial, objective="tokens_per_s", budget_s=350)
+    assert result["stopped"] == "budget" and len(result["trials"]) == 3
+    assert result["best"]["params"]["threads"] == 3
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_run_trial_against_stub_prunes_slow_candidate(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLAMACPP_STUB_TOKEN_MS", "1")
+    port = free_port()
+    workload = {"requests": 6, "tokens": 16, "concurrency": 2}
+    argv = tune.stub_argv(["llama-server", "-m", "x.gguf", "-np", "2", "-t", "4", "--port", str(port)])
+    res = tune.run_trial(argv, "127.0.0.1", port, workload, objective="tokens_per_s", ready_timeout=15, log_path=tmp_path / "t.log")
+    assert res["status"] == "ok" and res["requests"] == 6 and res["tokens_per_s"] > 0
+    assert "server is listening" in (tmp_path / "t.log").read_text()
+
+    slow = tune.stub_argv(["llama-server", "-m", "x.gguf", "-np", "1", "-t", "1", "--port", str(port)])
+    res2 = tune.run_trial(slow, "127.0.0.1", port, workload, objective="tokens_per_s", best=res, ready_timeout=15)
+    assert res2["status"] == "pruned" and res2["requests"] == 2
+
+    monkeypatch.setenv("LLAMACPP_STUB_MAX_SLOTS", "1")
+    res3 = tune.run_trial(argv, "127.0.0.1", port, workload, objective="tokens_per_s", ready_timeout=15)
+    assert res3["status"] == "failed" and "exited with code 1" in res3["error"]
+
+
+def test_cli_tune_with_stub_applies_winner(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("LLAMACPP_STUB_TOKEN_MS", "1")
+    monkeypatch.setenv("LLAMACPP_STUB_THREADS", "4")
+    monkeypatch.setenv("LLAMACPP_STUB_MAX_SLOTS", "2")
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9701", "--extra-args", "-t 1 --jinja"]) == 0
+    capsys.readouterr()
+    rc = main([
+        "tune", "m1", "--stub", "--budget", "2m", "--requests", "4", "--tokens", "16", "--concurrency", "2",
+        "--space", "threads=1,4", "--space", "parallel=1,2,4", "--space", "batch=", "--space", "ubatch=", "--space", "flash_attn=",
+        "--apply",
+    ])
+    out = capsys.readouterr().out
+    assert rc == 0, out
+    assert "failed" in out and "Updated model 'm1'" in out
+    args = load_config()["models"][0]["args"]
+    assert tune.current_params(args)["parallel"] == 2 and tune.current_params(args)["threads"] == 4
+    assert "--jinja" in args
+    doc = json.loads((tmp_path / "cfg" / "tune" / "m1.json").read_text())
+    assert doc["best"]["args"] == args and doc["stopped"] == "done"
+    assert [t["status"] for t in doc["trials"]].count("failed") == 1
+
+
+def test_cli_tune_rejects_bad_space(tmp_path):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9702"]) == 0
+    assert main(["tune", "m1", "--stub", "--space", "nope=1"]) == 2
+    assert main(["tune", "m1", "--stub", "--budget", "soon"]) == 2
+
+
+def _fake_sweep(monkeypatch, winner, during=None):
+    """Replace the sweep: the baseline, then one candidate that wins if ``winner`` is set."""
+    def run_trial(argv, *a, **k):
+        return {"status": "ok", "tokens_per_s": 10.0, "p95_latency_ms": 5.0, "duration_s": 0.0}
+
+    def search(base, space, trial, **kw):
+        baseline = trial(base, None)
+        if during:
+            during()
+        if winner is None:
+            return {"best": baseline, "trials": [baseline], "stopped": "done"}
+        best = dict(trial({**base, **winner}, baseline), tokens_per_s=20.0)
+        return {"best": best, "trials": [baseline, best], "stopped": "done"}
+
+    monkeypatch.setattr(tune, "run_trial", run_trial)
+    monkeypatch.setattr(tune, "search", search)
+
+
+def test_cli_tune_keeps_args_when_the_baseline_wins(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9703", "--extra-args", "-c 4096 -ngl 99 -fa"]) == 0
+    before = load_config()
+    _fake_sweep(monkeypatch, None)
+    capsys.readouterr()
+    assert main(["tune", "m1", "--stub", "--apply"]) == 0
+    assert "current args are the best" in capsys.readouterr().out
+    assert load_config() == before
+
+
+def test_cli_tune_apply_keeps_edits_made_during_the_sweep(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "9704", "--extra-args", "-t 1"]) == 0
+    _fake_sweep(monkeypatch, {"threads": 4}, during=lambda: main(["config", "add", "m2", str(model), "--port", "9705"]))
+    assert main(["tune", "m1", "--stub", "--apply"]) == 0
+    cfg = load_config()
+    assert [m["name"] for m in cfg["models"]] == ["m1", "m2"]
+    assert cfg["models"][0]["args"] == ["-t", "4"]
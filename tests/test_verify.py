@@ -0,0 +1,99 @@
+import hashlib
+import json
+import subprocess
+
+import pytest
+
+from llamacpp_manager import integrity
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import load_config
+from llamacpp_manager.utils import pid_fields, process_alive, read_runtime, update_runtime
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+def test_digest_matches_hashlib_across_chunks_and_is_cached(tmp_path, monkeypatch):
+    data = bytes(range(256)) * 5000
+    a = tmp_path / "a.gguf"; a.write_bytes(data)
+    empty = tmp_path / "empty.gguf"; empty.write_bytes(b"")
+    for algo in integrity.ALGORITHMS:
+        assert integrity.file_digest(a, algo, chunk=1 << 16) == hashlib.new(algo, data).hexdigest()
+    assert integrity.file_digest(empty) == hashlib.sha256().hexdigest()
+
+    pin = "sha256:" + hashlib.sha256(data).hexdigest()
+    # the same file listed twice is hashed once
+    rows = integrity.verify_files([(str(a), pin), (str(a), None), (str(tmp_path / "missing.gguf"), None)])
+    assert [r["ok"] for r in rows] == [True, None, False] and rows[1]["digest"] == rows[0]["expected"]
+    assert rows[2]["error"] and not rows[0]["cached"]
+
+    calls = []
+    real = integrity.file_digest
+    monkeypatch.setattr(integrity, "file_digest", lambda *a, **k: calls.append(a) or real(*a, **k))
+    assert integrity.verify_files([(str(a), pin)])[0]["cached"] and calls == []
+    a.write_bytes(data[:-1] + b"x")
+    row = integrity.verify_files([(str(a), pin)])[0]
+    assert not row["cached"] and row["ok"] is False and len(calls) == 1
+    assert "digest mismatch" in integrity.problem(row)
+    with pytest.raises(ValueError):
+        integrity.parse_digest("md5:abc")
+
+
+def test_verify_command_pins_and_detects_corruption(tmp_path, capsys):
+    model = tmp_path / "m.gguf"; model.write_bytes(b"GGUF" + b"\0" * 4096)
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", "8401"]) == 0
+    assert main(["config", "add", "m2", str(model), "--port", "8402", "--digest", "blake2b:" + "0" * 64]) == 2
+    capsys.readouterr()
+
+    assert main(["verify", "all", "--pin"]) == 0
+    assert "pinned m1 sha256:" in capsys.readouterr().out
+    digest = load_config()["models"][0]["digest"]
+    assert digest == "sha256:" + hashlib.sha256(model.read_bytes()).hexdigest()
+    assert main(["verify", "m1", "--json"]) == 0
+    row = json.loads(capsys.readouterr().out)[0]
+    assert row["ok"] and row["cached"]
+
+    model.write_bytes(b"GGUF" + b"\0" * 2048)
+    assert main(["verify", "m1"]) == 2
+    assert "error: m1: digest mismatch" in capsys.readouterr().err
+    # the pre-start check refuses to launch a file that no longer matches its pin
+    assert main(["start", "m1", "--verify", "--ignore-memory"]) == 2
+    assert "not starting it" in capsys.readouterr().err
+    assert "pid" not in (read_runtime().get("m1") or {})
+
+
+def test_restart_verifies_before_stopping_anything(tmp_path, monkeypatch, capsys):
+    good = tmp_path / "good.gguf"; good.write_bytes(b"GGUF" + b"\1" * 1024)
+    bad = tmp_path / "bad.gguf"; bad.write_bytes(b"GGUF" + b"\2" * 1024)
+    assert main(["init"]) == 0
+    assert main(["config", "add", "ok", str(good), "--port", "8411"]) == 0
+    assert main(["config", "add", "bad", str(bad), "--port", "8412"]) == 0
+    assert main(["verify", "all", "--pin"]) == 0
+    bad.write_bytes(b"GGUF" + b"\3" * 1024)
+    calls = []
+    real = integrity.verify_models
+    monkeypatch.setattr(integrity, "verify_models", lambda models, **k: calls.append([m["name"] for m in models]) or real(models, **k))
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "start_process", lambda lp, spec, ld: 4321)
+    p = subprocess.Popen(["sleep", "30"])
+    try:
+        update_runtime("bad", pid_fields(p.pid))
+        capsys.readouterr()
+        assert main(["start", "all", "--verify", "--ignore-memory", "--dry-run"]) == 0
+        assert calls == []
+        assert main(["restart", "all", "--verify", "--ignore-memory"]) == 2
+        # one hashing pass for every selected model, before anything was stopped
+        assert calls == [["ok", "bad"]]
+        assert "error: bad: digest mismatch" in capsys.readouterr().err
+        assert process_alive(p.pid) and read_runtime()["bad"]["pid"] == p.pid
+        assert read_runtime()["ok"]["pid"] == 4321
+    finally:
+        p.kill(); p.wait()
@@ -0,0 +1,112 @@
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llamacpp_manager.cli import main
+from llamacpp_manager.config import load_config
+from llamacpp_manager.utils import read_runtime, track_child
+from llamacpp_manager.warmup import parse_warmup
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    cfgdir = tmp_path / "cfg"; logdir = tmp_path / "logs"; piddir = tmp_path / "pids"
+    monkeypatch.setenv("LLAMACPP_MANAGER_CONFIG_DIR", str(cfgdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_LOG_DIR", str(logdir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_PID_DIR", str(piddir))
+    monkeypatch.setenv("LLAMACPP_MANAGER_SKIP_BIN_CHECK", "1")
+    return cfgdir, logdir, piddir
+
+
+@pytest.fixture
+def llama_stub():
+    """Minimal llama-server: /health is 503 for the first probe, /completion records bodies."""
+    seen = {"health": 0, "completions": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            seen["health"] += 1
+            if seen["health"] == 1:
+                self._reply(503, {"error": {"message": "Loading model"}})
+            else:
+                self._reply(200, {"status": "ok"})
+
+        def do_POST(self):
+            n = int(self.headers["Content-Length"])
+            seen["completions"].append(json.loads(self.rfile.read(n)))
+            self._reply(200, {"content": "..."})
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1], seen
+    srv.shutdown(); srv.server_close()
+
+
+def test_parse_warmup():
+    assert parse_warmup({"prompts": "hi"}) == {"prompts": ["hi"], "tokens": 16}
+    with pytest.raises(ValueError):
+        parse_warmup({"prompts": ["a"], "tokens": -1})
+
+
+def test_start_runs_warmup_after_load(tmp_path, monkeypatch, capsys, llama_stub):
+    port, seen = llama_stub
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", str(port),
+                 "--warmup-prompt", "Hello", "--warmup-prompt", "Summarise: x", "--warmup-tokens", "4"]) == 0
+    assert load_config()["models"][0]["warmup"] == {"prompts": ["Hello", "Summarise: x"], "tokens": 4}
+
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "start_process", lambda lp, spec, ld: os.getpid())
+    monkeypatch.setattr(cli, "port_in_use", lambda host, port: False)
+    assert main(["start", "m1", "--ignore-memory"]) == 0
+    assert "warmed up m1 in" in capsys.readouterr().out
+    assert seen["health"] >= 2  # waited through the loading 503
+    assert [c["prompt"] for c in seen["completions"]] == ["Hello", "Summarise: x"]
+    assert seen["completions"][0]["n_predict"] == 4
+    rec = read_runtime()["m1"]["warmup"]
+    assert rec["state"] == "done" and rec["requests"] == 2 and rec["duration_s"] >= 0
+
+    seen["completions"].clear()
+    assert main(["start", "m1", "--ignore-memory", "--no-warmup"]) == 0
+    assert not seen["completions"]
+    assert read_runtime()["m1"]["warmup"] is None
+
+
+def test_warmup_stops_waiting_when_the_server_exits(tmp_path, monkeypatch, capsys):
+    model = tmp_path / "m.gguf"; model.write_text("x")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    assert main(["init"]) == 0
+    assert main(["config", "add", "m1", str(model), "--port", str(port), "--warmup-prompt", "Hello"]) == 0
+    capsys.readouterr()
+
+    def crashing_start(lp, spec, ld):
+        proc = subprocess.Popen(["sh", "-c", "exit 3"])
+        track_child(proc)
+        return proc.pid
+
+    import llamacpp_manager.cli as cli
+    monkeypatch.setattr(cli, "start_process", crashing_start)
+    started = time.monotonic()
+    assert main(["start", "m1", "--ignore-memory"]) == 1
+    assert time.monotonic() - started < 10
+    assert "m1 exited with code 3 while loading; warm-up skipped" in capsys.readouterr().err
+    assert read_runtime()["m1"]["warmup"]["errors"] == ["exited with code 3 while loading"]
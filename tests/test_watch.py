@@ -0,0 +1,110 @@
+import io
+import sys
+
+import pytest
+
+from llamacpp_manager.watch import FileWatcher, ProbeScheduler, RuntimeChanges, TableRenderer
+
+
+def test_scheduler_backs_off_stable_models_and_resets_on_change():
+    s = ProbeScheduler(["a", "b"], min_interval=1.0, max_interval=8.0)
+    assert sorted(s.due(0.0)) == ["a", "b"]
+    up = {"mode": "direct", "pid": 1, "up": True, "http_status": 200}
+    down = {"mode": "stopped", "pid": None, "up": False, "http_status": None}
+    now = 0.0
+    for _ in range(5):
+        s.record("a", up, now)
+        s.record("b", down, now)
+    # stable healthy model decays toward the ceiling, down model stays fast
+    assert s.interval("a") == 8.0
+    assert s.interval("b") == 1.0
+    assert s.due(1.0) == ["b"]
+    # a state change snaps back to the fast interval
+    s.record("a", dict(up, pid=2), now)
+    assert s.interval("a") == 1.0
+
+
+def test_scheduler_poke_brings_probe_forward_but_not_within_min_interval():
+    s = ProbeScheduler(["a"], min_interval=1.0, max_interval=30.0)
+    up = {"mode": "direct", "pid": 1, "up": True}
+    for now in (0.0, 1.0, 3.0):
+        s.record("a", up, now)
+    assert s.interval("a") == 4.0 and s.due(5.0) == []
+    s.poke(["a", "unknown"])
+    assert s.due(3.5) == [] and s.due(4.0) == ["a"]
+    # a poke alone does not undo the backoff; only a changed probe result does
+    s.record("a", up, 4.0)
+    assert s.interval("a") == 8.0
+
+
+def test_runtime_changes_ignore_bookkeeping_fields():
+    data = {"m1": {"pid": 1, "rss_bytes": 10}, "m2": {"pid": 2}}
+    changes = RuntimeChanges(lambda: data)
+    data["m1"]["rss_bytes"] = 20
+    assert changes() == set()
+    data["m2"] = {"pid": 3, "started_at": 5.0}
+    assert changes() == {"m2"}
+    assert changes() == set()
+
+
+def test_renderer_redraws_only_changed_rows():
+    buf = io.StringIO()
+    r = TableRenderer(buf)
+    assert r.render("hdr", ["row1", "row2", "row3"]) == 3
+    buf.seek(0); buf.truncate()
+    assert r.render("hdr", ["row1", "ROW2", "row3"]) == 1
+    assert buf.getvalue() == "ROW2\n"
+    # tty output rewrites the row in place
+    r.tty = True
+    buf.seek(0); buf.truncate()
+    assert r.render("hdr", ["row1", "ROW2", "ROW3"]) == 1
+    assert buf.getvalue() == "\x1b[1A\r\x1b[2KROW3\x1b[1B\r"
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_file_watcher_maps_files_to_models(tmp_path, use_inotify):
+    if use_inotify and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux-only")
+    piddir = tmp_path / "pids"; logdir = tmp_path / "logs"
+    w = FileWatcher([piddir, logdir], ["m1", "m1.big", "m2"], use_inotify=use_inotify)
+    try:
+        assert w.wait(0.01) == set()
+        (piddir / "m1.big.pid").write_text("1")
+        (logdir / "m2.log").write_text("hello")
+        assert w.wait(0.5) == {"m1.big", "m2"}
+        # requests being logged are not activity: only files appearing, going or being replaced
+        with (logdir / "m2.log").open("a") as f:
+            f.write("GET /v1/models 200\n")
+        assert w.wait(0.2) == set()
+        (logdir / "m2.log").rename(logdir / "m2.log.1")
+        assert w.wait(0.5) == {"m2"}
+    finally:
+        w.close()
+
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_config_watcher_sees_in_place_saves(tmp_path, use_inotify):
+    if use_inotify and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux-only")
+    cfg = tmp_path / "config.yaml"; cfg.write_text("models: []\n")
+    w = FileWatcher([tmp_path], ["config"], use_inotify=use_inotify, writes=True, shared=set)
+    try:
+        assert w.wait(0.01) == set()
+        # an editor or `>` rewriting the same inode
+        with cfg.open("r+") as f:
+            f.write("models: [1]\n")
+        assert w.wait(0.3) == {"config"}
+        (tmp_path / "runtime.json").write_text("{}")
+        assert w.wait(0.3) == set()
+    finally:
+        w.close()
+
+def test_file_watcher_asks_which_models_a_runtime_change_concerns(tmp_path):
+    piddir = tmp_path / "pids"
+    w = FileWatcher([piddir], ["m1", "m2"], use_inotify=False, shared=lambda: {"m2", "gone"})
+    try:
+        (piddir / "runtime.json").write_text("{}")
+        assert w.wait(0.01) == {"m2"}
+    finally:
+        w.close()